@@ -0,0 +1,621 @@
+/*
+ * _redis_pubsub：redis_pubsub的CPython扩展模块（可选）
+ *
+ * 与ctypes包装（redis_client.RedisPubSubDLL）使用同一个原生库，区别在调用边界：
+ *   - 方法使用METH_FASTCALL，参数直接从调用方的栈上取，不经过ctypes的参数转换；
+ *     str参数使用CPython缓存的UTF-8表示，bytes/buffer直接传指针，不复制
+ *   - 订阅使用redis_client_subscribe_data，事件循环线程获取GIL后用vectorcall
+ *     直接调用处理对象，不经过ctypes回调桩（libffi）和string_at
+ * 只提供connect/publish/publish_many/subscribe/unsubscribe/psubscribe/punsubscribe/disconnect，
+ * 其余功能仍通过RedisPubSubDLL使用，Python层的入口见redis_fast.py。
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include "redis_pubsub.h"
+
+#if PY_VERSION_HEX < 0x03090000
+#define PyObject_Vectorcall _PyObject_Vectorcall
+#endif
+
+/* 压缩消息的头部，与redis_compress.MAGIC相同 */
+#define COMPRESSED_MAGIC     "\0RZ"
+#define COMPRESSED_MAGIC_LEN 3
+
+/* 一个订阅的处理方式，作为userdata交给原生库
+ * 被替换或取消订阅后事件循环可能仍在使用，因此由Client.records持有到disconnect */
+typedef struct Handler {
+    PyObject *channel;          /* 普通订阅的频道名（str），模式订阅为NULL（每条消息解码实际频道名） */
+    PyObject *callback;
+    PyObject *message_type;     /* 不为NULL时先构造message_type(channel, data)，再调用callback(message) */
+    PyObject *decompress;       /* 不为NULL时（订阅方开启了压缩）以魔数开头的payload先经decompress(channel, data)处理，
+                                 * 返回None时丢弃该消息 */
+    int text;                   /* 1表示payload按UTF-8解码为str，回调签名为callback(channel, message) */
+} Handler;
+
+typedef struct {
+    PyObject_HEAD
+    redis_client *client;
+    PyObject *records;          /* 所有Handler的capsule */
+} ClientObject;
+
+/* ==================== 参数转换 ==================== */
+
+/* 取str（UTF-8）或bytes-like对象的数据指针，view->obj不为NULL时调用方需要PyBuffer_Release */
+static int get_data(PyObject *obj, Py_buffer *view, const char **data, Py_ssize_t *len, const char *what) {
+    view->obj = NULL;
+    if (PyUnicode_Check(obj)) {
+        *data = PyUnicode_AsUTF8AndSize(obj, len);
+        return *data ? 0 : -1;
+    }
+    if (PyBytes_Check(obj)) {
+        *data = PyBytes_AS_STRING(obj);
+        *len = PyBytes_GET_SIZE(obj);
+        return 0;
+    }
+    if (PyObject_CheckBuffer(obj)) {
+        if (PyObject_GetBuffer(obj, view, PyBUF_SIMPLE) != 0) {
+            return -1;
+        }
+        *data = (const char*)view->buf;
+        *len = view->len;
+        return 0;
+    }
+    PyErr_Format(PyExc_TypeError, "%s must be str or bytes-like, not %.100s", what, Py_TYPE(obj)->tp_name);
+    return -1;
+}
+
+static void release_data(Py_buffer *view) {
+    if (view->obj) {
+        PyBuffer_Release(view);
+    }
+}
+
+static int check_nargs(const char *name, Py_ssize_t nargs, Py_ssize_t min, Py_ssize_t max) {
+    if (nargs < min || nargs > max) {
+        if (min == max) {
+            PyErr_Format(PyExc_TypeError, "%s() takes exactly %zd arguments (%zd given)", name, min, nargs);
+        } else {
+            PyErr_Format(PyExc_TypeError, "%s() takes %zd to %zd arguments (%zd given)", name, min, max, nargs);
+        }
+        return -1;
+    }
+    return 0;
+}
+
+static int check_client(ClientObject *self) {
+    if (!self->client) {
+        PyErr_SetString(PyExc_MemoryError, "Failed to create native redis client");
+        return -1;
+    }
+    return 0;
+}
+
+/* ==================== 消息投递（事件循环线程） ==================== */
+
+static void handler_free(PyObject *capsule) {
+    Handler *h = (Handler*)PyCapsule_GetPointer(capsule, "_redis_pubsub.Handler");
+    if (!h) {
+        return;
+    }
+    Py_XDECREF(h->channel);
+    Py_XDECREF(h->callback);
+    Py_XDECREF(h->message_type);
+    Py_XDECREF(h->decompress);
+    PyMem_Free(h);
+}
+
+/* 调用处理对象，异常按RedisPubSubDLL的方式打印后忽略 */
+static void invoke(Handler *h, const char *channel, size_t channel_len,
+                   const char *message, size_t message_len) {
+    PyObject *name = NULL, *data = NULL, *result = NULL;
+
+    if (h->channel) {
+        name = h->channel;
+        Py_INCREF(name);
+    } else {
+        name = PyUnicode_DecodeUTF8(channel, (Py_ssize_t)channel_len, "replace");
+        if (!name) {
+            goto error;
+        }
+    }
+
+    int compressed = h->decompress && message_len >= COMPRESSED_MAGIC_LEN &&
+                     memcmp(message, COMPRESSED_MAGIC, COMPRESSED_MAGIC_LEN) == 0;
+    if (h->text && !compressed) {
+        data = PyUnicode_DecodeUTF8(message, (Py_ssize_t)message_len, NULL);
+    } else {
+        data = PyBytes_FromStringAndSize(message, (Py_ssize_t)message_len);
+    }
+    if (!data) {
+        goto error;
+    }
+
+    if (compressed) {
+        PyObject *args[2] = { name, data };
+        PyObject *plain = PyObject_Vectorcall(h->decompress, args, 2, NULL);
+        Py_SETREF(data, plain);
+        if (!data) {
+            goto error;
+        }
+        if (data == Py_None) {
+            /* 无法解压，decompress已打印错误 */
+            Py_DECREF(name);
+            Py_DECREF(data);
+            return;
+        }
+        if (h->text) {
+            if (!PyBytes_Check(data)) {
+                PyErr_SetString(PyExc_TypeError, "decompress() must return bytes");
+                goto error;
+            }
+            Py_SETREF(data, PyUnicode_DecodeUTF8(PyBytes_AS_STRING(data), PyBytes_GET_SIZE(data), NULL));
+            if (!data) {
+                goto error;
+            }
+        }
+    }
+
+    if (h->message_type) {
+        PyObject *args[2] = { name, data };
+        PyObject *msg = PyObject_Vectorcall(h->message_type, args, 2, NULL);
+        if (!msg) {
+            goto error;
+        }
+        result = PyObject_Vectorcall(h->callback, &msg, 1, NULL);
+        Py_DECREF(msg);
+    } else {
+        PyObject *args[2] = { name, data };
+        result = PyObject_Vectorcall(h->callback, args, 2, NULL);
+    }
+    if (!result) {
+        goto error;
+    }
+    Py_DECREF(result);
+    Py_DECREF(name);
+    Py_DECREF(data);
+    return;
+
+error:
+    PySys_WriteStderr("[ERROR] Callback error:\n");
+    PyErr_Print();
+    Py_XDECREF(name);
+    Py_XDECREF(data);
+}
+
+static void on_message(void *userdata, const char *channel, size_t channel_len,
+                       const char *message, size_t message_len) {
+    PyGILState_STATE state = PyGILState_Ensure();
+    invoke((Handler*)userdata, channel, channel_len, message, message_len);
+    PyGILState_Release(state);
+}
+
+/* ==================== Client ==================== */
+
+static PyObject *client_new(PyTypeObject *type, PyObject *args, PyObject *kwds) {
+    ClientObject *self;
+
+    if ((args && PyTuple_GET_SIZE(args) > 0) || (kwds && PyDict_GET_SIZE(kwds) > 0)) {
+        PyErr_SetString(PyExc_TypeError, "Client() takes no arguments");
+        return NULL;
+    }
+    self = (ClientObject*)type->tp_alloc(type, 0);
+    if (!self) {
+        return NULL;
+    }
+    self->records = PyList_New(0);
+    if (!self->records) {
+        Py_DECREF(self);
+        return NULL;
+    }
+    /* 每个对象拥有独立的原生客户端 */
+    self->client = redis_client_new();
+    if (!self->client) {
+        Py_DECREF(self);
+        return PyErr_NoMemory();
+    }
+    return (PyObject*)self;
+}
+
+static void client_dealloc(ClientObject *self) {
+    redis_client *client = self->client;
+
+    /* redis_client_free等待事件循环线程退出，它们可能正在等待GIL */
+    self->client = NULL;
+    if (client) {
+        Py_BEGIN_ALLOW_THREADS
+        redis_client_free(client);
+        Py_END_ALLOW_THREADS
+    }
+    Py_XDECREF(self->records);
+    Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+PyDoc_STRVAR(connect_doc,
+"connect(hostname, port) -> int\n\n"
+"连接到Redis服务器，成功返回0，失败返回负数。");
+
+static PyObject *client_connect(ClientObject *self, PyObject *const *args, Py_ssize_t nargs) {
+    if (check_nargs("connect", nargs, 2, 2) != 0 || check_client(self) != 0) {
+        return NULL;
+    }
+    const char *hostname = PyUnicode_AsUTF8(args[0]);
+    if (!hostname) {
+        return NULL;
+    }
+    int port = PyLong_AsLong(args[1]);
+    if (port == -1 && PyErr_Occurred()) {
+        return NULL;
+    }
+
+    int result;
+    Py_BEGIN_ALLOW_THREADS
+    result = redis_client_connect(self->client, hostname, port);
+    Py_END_ALLOW_THREADS
+    return PyLong_FromLong(result);
+}
+
+PyDoc_STRVAR(disconnect_doc,
+"disconnect() -> int\n\n"
+"断开连接，等待事件循环线程退出后释放所有订阅的处理对象，成功返回0。");
+
+static PyObject *client_disconnect(ClientObject *self, PyObject *const *args, Py_ssize_t nargs) {
+    (void)args;
+    if (check_nargs("disconnect", nargs, 0, 0) != 0 || check_client(self) != 0) {
+        return NULL;
+    }
+
+    int result;
+    Py_BEGIN_ALLOW_THREADS
+    result = redis_client_close(self->client);
+    Py_END_ALLOW_THREADS
+
+    /* 事件循环已退出，不再有线程使用这些处理对象 */
+    if (PyList_SetSlice(self->records, 0, PY_SSIZE_T_MAX, NULL) != 0) {
+        return NULL;
+    }
+    return PyLong_FromLong(result);
+}
+
+PyDoc_STRVAR(publish_doc,
+"publish(channel, message) -> int\n\n"
+"发布消息（二进制安全），str按UTF-8编码，bytes-like原样发送。\n"
+"返回接收消息的订阅者数量，-1表示发送失败，其余负数的含义与RedisPubSubDLL.publish()相同。");
+
+static PyObject *client_publish(ClientObject *self, PyObject *const *args, Py_ssize_t nargs) {
+    Py_buffer channel_view, message_view;
+    const char *channel, *message;
+    Py_ssize_t channel_len, message_len;
+    int result;
+
+    if (check_nargs("publish", nargs, 2, 2) != 0 || check_client(self) != 0) {
+        return NULL;
+    }
+    if (get_data(args[0], &channel_view, &channel, &channel_len, "channel") != 0) {
+        return NULL;
+    }
+    if (get_data(args[1], &message_view, &message, &message_len, "message") != 0) {
+        release_data(&channel_view);
+        return NULL;
+    }
+
+    /* 不持有GIL：多个线程可以并行发布，本地投递的回调也能获取GIL */
+    Py_BEGIN_ALLOW_THREADS
+    result = redis_client_publish_binary(self->client, channel, (size_t)channel_len,
+                                         message, (size_t)message_len);
+    Py_END_ALLOW_THREADS
+
+    release_data(&message_view);
+    release_data(&channel_view);
+    return PyLong_FromLong(result);
+}
+
+PyDoc_STRVAR(publish_many_doc,
+"publish_many(messages) -> list\n\n"
+"批量发布(channel, message)序列（管道方式，一次网络往返），返回每条消息的结果。");
+
+static PyObject *client_publish_many(ClientObject *self, PyObject *const *args, Py_ssize_t nargs) {
+    if (check_nargs("publish_many", nargs, 1, 1) != 0 || check_client(self) != 0) {
+        return NULL;
+    }
+
+    PyObject *seq = PySequence_Fast(args[0], "messages must be iterable");
+    if (!seq) {
+        return NULL;
+    }
+    Py_ssize_t count = PySequence_Fast_GET_SIZE(seq);
+    if (count > INT_MAX) {
+        Py_DECREF(seq);
+        PyErr_SetString(PyExc_OverflowError, "too many messages");
+        return NULL;
+    }
+
+    PyObject *result = NULL;
+    Py_ssize_t filled = 0;
+    const char **channels = PyMem_New(const char*, count + 1);
+    const char **messages = PyMem_New(const char*, count + 1);
+    size_t *channel_lens = PyMem_New(size_t, count + 1);
+    size_t *message_lens = PyMem_New(size_t, count + 1);
+    int *results = PyMem_New(int, count + 1);
+    Py_buffer *views = PyMem_New(Py_buffer, 2 * count + 1);
+    if (!channels || !messages || !channel_lens || !message_lens || !results || !views) {
+        PyErr_NoMemory();
+        goto done;
+    }
+
+    for (; filled < count; filled++) {
+        PyObject *item = PySequence_Fast_GET_ITEM(seq, filled);
+        Py_ssize_t channel_len, message_len;
+        if (!PyTuple_Check(item) || PyTuple_GET_SIZE(item) != 2) {
+            PyErr_SetString(PyExc_TypeError, "messages must be (channel, message) tuples");
+            goto done;
+        }
+        if (get_data(PyTuple_GET_ITEM(item, 0), &views[2 * filled], &channels[filled],
+                     &channel_len, "channel") != 0) {
+            goto done;
+        }
+        if (get_data(PyTuple_GET_ITEM(item, 1), &views[2 * filled + 1], &messages[filled],
+                     &message_len, "message") != 0) {
+            release_data(&views[2 * filled]);
+            goto done;
+        }
+        channel_lens[filled] = (size_t)channel_len;
+        message_lens[filled] = (size_t)message_len;
+    }
+
+    result = PyList_New(count);
+    if (!result || count == 0) {
+        goto done;
+    }
+
+    int published;
+    Py_BEGIN_ALLOW_THREADS
+    published = redis_client_publish_batch(self->client, (int)count, channels, channel_lens,
+                                           messages, message_lens, results);
+    Py_END_ALLOW_THREADS
+
+    /* 与RedisPubSubDLL.publish_many()相同：整体失败且没有进入spool的消息时每条都是-1 */
+    int spooled = 0;
+    for (Py_ssize_t i = 0; i < count && published < 0; i++) {
+        spooled |= results[i] == REDIS_PUBLISH_SPOOLED;
+    }
+    for (Py_ssize_t i = 0; i < count; i++) {
+        PyObject *value = PyLong_FromLong(published < 0 && !spooled ? -1 : results[i]);
+        if (!value) {
+            Py_CLEAR(result);
+            break;
+        }
+        PyList_SET_ITEM(result, i, value);
+    }
+
+done:
+    if (views) {
+        for (Py_ssize_t i = 0; i < 2 * filled; i++) {
+            release_data(&views[i]);
+        }
+    }
+    PyMem_Free(channels);
+    PyMem_Free(messages);
+    PyMem_Free(channel_lens);
+    PyMem_Free(message_lens);
+    PyMem_Free(results);
+    PyMem_Free(views);
+    Py_DECREF(seq);
+    return result;
+}
+
+/* subscribe/psubscribe的公共实现：
+ * (name, callback[, message_type[, text[, decompress]]])，None表示不使用该项 */
+static PyObject *add_subscription(ClientObject *self, int is_pattern, const char *func,
+                                  PyObject *const *args, Py_ssize_t nargs) {
+    const char *name;
+    Py_ssize_t name_len;
+
+    if (check_nargs(func, nargs, 2, 5) != 0 || check_client(self) != 0) {
+        return NULL;
+    }
+    if (!PyUnicode_Check(args[0])) {
+        PyErr_Format(PyExc_TypeError, "%s() argument 1 must be str", func);
+        return NULL;
+    }
+    if (!PyCallable_Check(args[1])) {
+        PyErr_SetString(PyExc_TypeError, "Callback must be callable");
+        return NULL;
+    }
+    PyObject *message_type = nargs > 2 && args[2] != Py_None ? args[2] : NULL;
+    PyObject *decompress = nargs > 4 && args[4] != Py_None ? args[4] : NULL;
+    int text = nargs > 3 ? PyObject_IsTrue(args[3]) : 0;
+    if (text < 0) {
+        return NULL;
+    }
+    if ((message_type && !PyCallable_Check(message_type)) || (decompress && !PyCallable_Check(decompress))) {
+        PyErr_SetString(PyExc_TypeError, "message_type and decompress must be callable");
+        return NULL;
+    }
+    if (message_type && text) {
+        PyErr_SetString(PyExc_ValueError, "message_type cannot be combined with text");
+        return NULL;
+    }
+    name = PyUnicode_AsUTF8AndSize(args[0], &name_len);
+    if (!name) {
+        return NULL;
+    }
+
+    Handler *h = PyMem_New(Handler, 1);
+    if (!h) {
+        return PyErr_NoMemory();
+    }
+    h->channel = is_pattern ? NULL : args[0];
+    h->callback = args[1];
+    h->message_type = message_type;
+    h->decompress = decompress;
+    h->text = text;
+    Py_XINCREF(h->channel);
+    Py_INCREF(h->callback);
+    Py_XINCREF(h->message_type);
+    Py_XINCREF(h->decompress);
+
+    /* 先登记再订阅：订阅返回前事件循环就可能开始投递 */
+    PyObject *capsule = PyCapsule_New(h, "_redis_pubsub.Handler", handler_free);
+    if (!capsule) {
+        Py_XDECREF(h->channel);
+        Py_DECREF(h->callback);
+        Py_XDECREF(h->message_type);
+        Py_XDECREF(h->decompress);
+        PyMem_Free(h);
+        return NULL;
+    }
+    int appended = PyList_Append(self->records, capsule);
+    Py_DECREF(capsule);
+    if (appended != 0) {
+        return NULL;
+    }
+
+    int result;
+    Py_BEGIN_ALLOW_THREADS
+    if (is_pattern) {
+        result = redis_client_psubscribe_data(self->client, name, (size_t)name_len, on_message, h);
+    } else {
+        result = redis_client_subscribe_data(self->client, name, (size_t)name_len, on_message, h);
+    }
+    Py_END_ALLOW_THREADS
+    return PyLong_FromLong(result);
+}
+
+PyDoc_STRVAR(subscribe_doc,
+"subscribe(channel, callback, message_type=None, text=False, decompress=None) -> int\n\n"
+"订阅频道，成功返回0。回调在事件循环线程中调用：\n"
+"  text为真时为callback(channel: str, message: str)；\n"
+"  指定message_type时为callback(message_type(channel, data: bytes))；\n"
+"  否则为callback(channel, data: bytes)。\n"
+"decompress只应在订阅方对频道开启了压缩时传入：以压缩头部开头的payload先经decompress(channel, data)处理，\n"
+"返回None时丢弃该消息；为None时payload原样投递。\n"
+"参数只能按位置传递。");
+
+static PyObject *client_subscribe(ClientObject *self, PyObject *const *args, Py_ssize_t nargs) {
+    return add_subscription(self, 0, "subscribe", args, nargs);
+}
+
+PyDoc_STRVAR(psubscribe_doc,
+"psubscribe(pattern, callback, message_type=None, text=False, decompress=None) -> int\n\n"
+"模式订阅，回调收到的是实际频道名，其余与subscribe()相同。");
+
+static PyObject *client_psubscribe(ClientObject *self, PyObject *const *args, Py_ssize_t nargs) {
+    return add_subscription(self, 1, "psubscribe", args, nargs);
+}
+
+/* unsubscribe/punsubscribe的公共实现 */
+static PyObject *remove_subscription(ClientObject *self, int is_pattern, const char *func,
+                                     PyObject *const *args, Py_ssize_t nargs) {
+    Py_buffer view;
+    const char *name;
+    Py_ssize_t name_len;
+    int result;
+
+    if (check_nargs(func, nargs, 1, 1) != 0 || check_client(self) != 0) {
+        return NULL;
+    }
+    if (get_data(args[0], &view, &name, &name_len, "name") != 0) {
+        return NULL;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    if (is_pattern) {
+        result = redis_client_punsubscribe(self->client, name, (size_t)name_len);
+    } else {
+        result = redis_client_unsubscribe(self->client, name, (size_t)name_len);
+    }
+    Py_END_ALLOW_THREADS
+
+    release_data(&view);
+    return PyLong_FromLong(result);
+}
+
+PyDoc_STRVAR(unsubscribe_doc,
+"unsubscribe(channel) -> int\n\n"
+"取消订阅频道，成功返回0。处理对象保留到disconnect()（事件循环可能仍在投递最后一条消息）。");
+
+static PyObject *client_unsubscribe(ClientObject *self, PyObject *const *args, Py_ssize_t nargs) {
+    return remove_subscription(self, 0, "unsubscribe", args, nargs);
+}
+
+PyDoc_STRVAR(punsubscribe_doc,
+"punsubscribe(pattern) -> int\n\n"
+"取消模式订阅，成功返回0。");
+
+static PyObject *client_punsubscribe(ClientObject *self, PyObject *const *args, Py_ssize_t nargs) {
+    return remove_subscription(self, 1, "punsubscribe", args, nargs);
+}
+
+PyDoc_STRVAR(set_subscriber_shards_doc,
+"set_subscriber_shards(count) -> int\n\n"
+"设置订阅分片数（只能在connect()之前调用），成功返回0。");
+
+static PyObject *client_set_subscriber_shards(ClientObject *self, PyObject *const *args, Py_ssize_t nargs) {
+    if (check_nargs("set_subscriber_shards", nargs, 1, 1) != 0 || check_client(self) != 0) {
+        return NULL;
+    }
+    int count = PyLong_AsLong(args[0]);
+    if (count == -1 && PyErr_Occurred()) {
+        return NULL;
+    }
+    return PyLong_FromLong(redis_client_set_subscriber_shards(self->client, count));
+}
+
+static PyMethodDef client_methods[] = {
+    {"connect", (PyCFunction)(void(*)(void))client_connect, METH_FASTCALL, connect_doc},
+    {"disconnect", (PyCFunction)(void(*)(void))client_disconnect, METH_FASTCALL, disconnect_doc},
+    {"publish", (PyCFunction)(void(*)(void))client_publish, METH_FASTCALL, publish_doc},
+    {"publish_many", (PyCFunction)(void(*)(void))client_publish_many, METH_FASTCALL, publish_many_doc},
+    {"subscribe", (PyCFunction)(void(*)(void))client_subscribe, METH_FASTCALL, subscribe_doc},
+    {"psubscribe", (PyCFunction)(void(*)(void))client_psubscribe, METH_FASTCALL, psubscribe_doc},
+    {"unsubscribe", (PyCFunction)(void(*)(void))client_unsubscribe, METH_FASTCALL, unsubscribe_doc},
+    {"punsubscribe", (PyCFunction)(void(*)(void))client_punsubscribe, METH_FASTCALL, punsubscribe_doc},
+    {"set_subscriber_shards", (PyCFunction)(void(*)(void))client_set_subscriber_shards, METH_FASTCALL,
+     set_subscriber_shards_doc},
+    {NULL, NULL, 0, NULL}
+};
+
+PyDoc_STRVAR(client_doc,
+"Client()\n\n"
+"一个原生客户端实例（独立的连接、事件循环线程和订阅表），方法返回值与原生API相同。");
+
+static PyTypeObject ClientType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "_redis_pubsub.Client",
+    .tp_basicsize = sizeof(ClientObject),
+    .tp_dealloc = (destructor)client_dealloc,
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_doc = client_doc,
+    .tp_methods = client_methods,
+    .tp_new = client_new,
+};
+
+/* ==================== 模块 ==================== */
+
+static struct PyModuleDef module_def = {
+    PyModuleDef_HEAD_INIT,
+    .m_name = "_redis_pubsub",
+    .m_doc = "redis_pubsub的CPython扩展模块，见redis_fast.py",
+    .m_size = -1,
+};
+
+PyMODINIT_FUNC PyInit__redis_pubsub(void) {
+    if (PyType_Ready(&ClientType) < 0) {
+        return NULL;
+    }
+    PyObject *module = PyModule_Create(&module_def);
+    if (!module) {
+        return NULL;
+    }
+    Py_INCREF(&ClientType);
+    if (PyModule_AddObject(module, "Client", (PyObject*)&ClientType) < 0 ||
+        PyModule_AddIntConstant(module, "PUBLISH_SPOOLED", REDIS_PUBLISH_SPOOLED) < 0 ||
+        PyModule_AddIntConstant(module, "PUBLISH_MOVED", REDIS_PUBLISH_MOVED) < 0) {
+        Py_DECREF(&ClientType);
+        Py_DECREF(module);
+        return NULL;
+    }
+    return module;
+}
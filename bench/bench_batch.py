@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+批量订阅测试（定长二进制记录）
+
+发布--messages条定长传感器记录（struct '<Iqd'：sensor, ts, value），分别用三种方式接收并累加value：
+  struct  subscribe(binary=True)，每条消息一次回调，struct.unpack解析
+  batch   subscribe_batch()，每批一次回调，handler收到Message列表，逐条struct.unpack解析
+  numpy   subscribe_batch(dtype=...)，每批一次回调，handler收到结构化数组，按列求和（需要numpy）
+测量订阅端事件循环线程平均每条消息消耗的CPU时间（读取、解析、进入Python、处理）和回调次数。
+
+用法:
+    python bench/bench_batch.py --messages 200000
+    python bench/bench_batch.py --server external --host 127.0.0.1 --port 6379
+"""
+
+import argparse
+import os
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from redis_client import RedisPubSubDLL
+from resp_server import add_server_arguments, bench_server
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+RECORD = struct.Struct('<Iqd')
+
+
+def run(args, mode: str):
+    """返回(每条消息的CPU纳秒数, 回调次数, value之和)"""
+    with RedisPubSubDLL(args.dll) as subscriber, RedisPubSubDLL(args.dll) as publisher:
+        if not subscriber.connect(args.host, args.port) or not publisher.connect(args.host, args.port):
+            sys.exit(1)
+
+        received = 0
+        calls = 0
+        total = 0.0
+        first_cpu = last_cpu = 0
+        done = threading.Event()
+
+        def count(n: int):
+            nonlocal received, calls, first_cpu, last_cpu
+            if received == 0:
+                first_cpu = time.thread_time_ns()
+            received += n
+            calls += 1
+            if received >= args.messages:
+                last_cpu = time.thread_time_ns()
+                done.set()
+
+        def on_message(message):
+            nonlocal total
+            total += RECORD.unpack(message.data)[2]
+            count(1)
+
+        def on_batch(messages):
+            nonlocal total
+            unpack = RECORD.unpack
+            for message in messages:
+                total += unpack(message.data)[2]
+            count(len(messages))
+
+        def on_records(records):
+            nonlocal total
+            total += float(records['value'].sum())
+            count(len(records))
+
+        channel = "bench:batch"
+        if mode == 'struct':
+            ok = subscriber.subscribe(channel, on_message, binary=True)
+        elif mode == 'batch':
+            ok = subscriber.subscribe_batch(channel, on_batch, args.max_batch, args.max_delay_ms)
+        else:
+            dtype = np.dtype([('sensor', '<u4'), ('ts', '<i8'), ('value', '<f8')])
+            ok = subscriber.subscribe_batch(channel, on_records, args.max_batch, args.max_delay_ms, dtype=dtype)
+        if not ok:
+            sys.exit(1)
+
+        records = [RECORD.pack(i % 64, i, i * 0.5) for i in range(args.messages)]
+        for i in range(0, len(records), 500):
+            publisher.publish_many([(channel, record) for record in records[i:i + 500]])
+        if not done.wait(60):
+            print(f"[ERROR] {mode}: received {received}/{args.messages} messages")
+            sys.exit(1)
+        return (last_cpu - first_cpu) / max(1, received - 1), calls, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="逐条回调与批量订阅的每条消息开销")
+    add_server_arguments(parser)
+    parser.add_argument("--dll", default=None, help="DLL路径，默认自动查找")
+    parser.add_argument("--messages", type=int, default=200000, help="发布的记录数")
+    parser.add_argument("--max-batch", type=int, default=1024, help="subscribe_batch的max_batch")
+    parser.add_argument("--max-delay-ms", type=int, default=5, help="subscribe_batch的max_delay_ms")
+    args = parser.parse_args()
+
+    with bench_server(args) as kind:
+        print(f"server: {kind}")
+        modes = ['struct', 'batch'] + (['numpy'] if np is not None else [])
+        if np is None:
+            print("[WARNING] numpy is not installed, skipping the numpy mode")
+
+        print(f"messages={args.messages} record={RECORD.size}B max_batch={args.max_batch} "
+              f"max_delay={args.max_delay_ms}ms")
+        print(f"{'mode':>7} | {'cpu ns/msg':>10} | {'calls':>8} | sum(value)")
+        print("-" * 48)
+        for mode in modes:
+            cpu_ns, calls, total = run(args, mode)
+            print(f"{mode:>7} | {cpu_ns:>10.0f} | {calls:>8} | {total:.1f}")
+
+
+if __name__ == "__main__":
+    main()
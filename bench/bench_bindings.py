@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+ctypes包装与CPython扩展模块的调用开销对比
+
+对RedisPubSubDLL（ctypes）和RedisPubSubExt（_redis_pubsub扩展模块）分别测量：
+  publish      单条publish()的耗时（包含一次网络往返，两者的差值即绑定层开销）
+  publish_many publish_many()中平均每条消息的耗时（往返被批量分摊，主要是参数转换）
+  deliver      订阅端事件循环线程平均每条消息消耗的CPU时间（读取、解析、进入Python、构造Message、调用处理函数）
+扩展模块未编译时只测量ctypes包装。
+
+用法:
+    python bench/bench_bindings.py --messages 100000
+    python bench/bench_bindings.py --server external --host 127.0.0.1 --port 6379
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from redis_fast import HAVE_EXTENSION, create_client
+from resp_server import add_server_arguments, bench_server
+
+
+def measure_publish(args, client) -> float:
+    """返回单条publish的平均纳秒数"""
+    payload = b"x" * args.payload_size
+    publish = client.publish
+    for _ in range(min(1000, args.publishes)):
+        publish("bench:bindings:none", payload)
+    start = time.perf_counter_ns()
+    for _ in range(args.publishes):
+        publish("bench:bindings:none", payload)
+    return (time.perf_counter_ns() - start) / args.publishes
+
+
+def measure_publish_many(args, client) -> float:
+    """返回publish_many中平均每条消息的纳秒数"""
+    batch = [("bench:bindings:none", b"x" * args.payload_size)] * args.batch
+    rounds = max(1, args.messages // args.batch)
+    client.publish_many(batch)
+    start = time.perf_counter_ns()
+    for _ in range(rounds):
+        client.publish_many(batch)
+    return (time.perf_counter_ns() - start) / (rounds * args.batch)
+
+
+def measure_deliver(args, subscriber, publisher) -> float:
+    """返回订阅端事件循环线程平均每条消息消耗的CPU纳秒数"""
+    received = 0
+    first_cpu = last_cpu = 0
+    done = threading.Event()
+
+    def handler(message):
+        nonlocal received, first_cpu, last_cpu
+        received += 1
+        if received == 1:
+            first_cpu = time.thread_time_ns()
+        elif received == args.messages:
+            last_cpu = time.thread_time_ns()
+            done.set()
+
+    if not subscriber.subscribe("bench:bindings", handler, binary=True):
+        sys.exit(1)
+
+    payload = b"x" * args.payload_size
+    for i in range(0, args.messages, args.batch):
+        publisher.publish_many([("bench:bindings", payload)] * min(args.batch, args.messages - i))
+    if not done.wait(60):
+        print(f"[ERROR] received {received}/{args.messages} messages")
+        sys.exit(1)
+    subscriber.unsubscribe("bench:bindings")
+    return (last_cpu - first_cpu) / (args.messages - 1)
+
+
+def run(args, extension: bool):
+    with create_client(args.dll, extension=False) as publisher, \
+            create_client(args.dll, extension=extension) as client:
+        if not publisher.connect(args.host, args.port) or not client.connect(args.host, args.port):
+            sys.exit(1)
+        return (measure_publish(args, client), measure_publish_many(args, client),
+                measure_deliver(args, client, publisher))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ctypes包装与扩展模块的调用开销")
+    add_server_arguments(parser)
+    parser.add_argument("--dll", default=None, help="DLL路径，默认自动查找")
+    parser.add_argument("--publishes", type=int, default=20000, help="单条publish的次数")
+    parser.add_argument("--messages", type=int, default=100000, help="publish_many和投递测试的消息数")
+    parser.add_argument("--batch", type=int, default=500, help="每次publish_many的消息数")
+    parser.add_argument("--payload-size", type=int, default=64, help="消息大小（字节）")
+    args = parser.parse_args()
+
+    with bench_server(args) as kind:
+        print(f"server: {kind}")
+        bindings = [("ctypes", False)] + ([("extension", True)] if HAVE_EXTENSION else [])
+        if not HAVE_EXTENSION:
+            print("[WARNING] _redis_pubsub extension is not built, measuring ctypes only")
+
+        print(f"publishes={args.publishes} messages={args.messages} batch={args.batch} payload={args.payload_size}B")
+        print(f"{'binding':>9} | {'publish ns':>10} | {'many ns/msg':>11} | {'deliver ns/msg':>14}")
+        print("-" * 54)
+        for name, extension in bindings:
+            publish_ns, many_ns, deliver_ns = run(args, extension)
+            print(f"{name:>9} | {publish_ns:>10.0f} | {many_ns:>11.0f} | {deliver_ns:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+集群分片发布/订阅测试（替身集群，不需要Redis）
+
+分别启动 N = 1, 2, 4 个替身集群节点（bench/resp_server.py --cluster，每个节点一个进程），
+订阅端用RedisClusterPubSub.subscribe_many订阅一组频道，N个发布线程用publish_many向这些频道发布，
+测量订阅端的接收吞吐量和各节点的消息分布。替身节点是单线程的，吞吐量上限就是单个节点的处理能力，
+因此总吞吐量随节点数的变化直接反映SPUBLISH按槽位分流的效果（需要足够的CPU核数）。
+
+--migrate 时在发布过程中把0号节点的全部槽位迁到最后一个节点，测量MOVED重试和订阅迁移的影响。
+发布/订阅不缓存消息：从新节点接管槽位到订阅端在新节点重新订阅之间发往新节点的消息会丢失（真实集群同样如此），
+lost列就是这段窗口内丢失的数量，通常在一两批publish_many以内；迁移完成后不再丢失（见tests/test_cluster.py）。
+per node包括槽位迁走后不再持有槽位的节点。
+
+用法:
+    python bench/bench_cluster.py --channels 256 --messages 200000
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from redis_cluster import RedisClusterPubSub
+from resp_server import LocalCluster, split_slots
+
+
+NODE_COUNTS = [1, 2, 4]
+
+
+def run(args, nodes: int):
+    """返回(消息/秒, 丢失数, 各节点收到的消息数)"""
+    with LocalCluster(nodes) as cluster, RedisClusterPubSub(args.dll) as subscriber, \
+            RedisClusterPubSub(args.dll) as publisher:
+        if not subscriber.connect(cluster.startup_nodes) or not publisher.connect(cluster.startup_nodes):
+            sys.exit(1)
+
+        received = 0
+        done = threading.Event()
+        lock = threading.Lock()
+
+        def on_message(message):
+            nonlocal received
+            with lock:
+                received += 1
+                if received >= args.messages:
+                    done.set()
+
+        channels = [f"bench:cluster:{i}" for i in range(args.channels)]
+        if not subscriber.subscribe_many(channels, on_message, binary=True):
+            sys.exit(1)
+
+        payload = b"x" * args.payload_size
+        threads = max(nodes, args.threads)
+        per_thread = args.messages // threads
+        total = per_thread * threads
+
+        def publish(offset: int):
+            batch = [(channels[(offset + i) % len(channels)], payload) for i in range(args.batch)]
+            sent = 0
+            while sent < per_thread:
+                count = min(len(batch), per_thread - sent)
+                results = publisher.publish_many(batch[:count])
+                sent += count
+                if min(results) < 0:
+                    print(f"[ERROR] {sum(1 for r in results if r < 0)} publishes failed")
+
+        workers = [threading.Thread(target=publish, args=(i * 7,)) for i in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        if args.migrate and nodes > 1:
+            time.sleep(0.2)
+            first_start, first_end = split_slots(nodes)[0]
+            cluster.move_slots(first_start, first_end, nodes - 1)
+        for worker in workers:
+            worker.join()
+
+        # 迁移期间发往新节点、而订阅尚未迁过去的消息会丢失：接收数1秒不再增长就结束
+        last = -1
+        while not done.wait(1.0) and received != last:
+            last = received
+        elapsed = time.perf_counter() - start
+        per_node = [stats['messages_in'] for stats in subscriber.stats().values()]
+        rate = received / elapsed if elapsed > 0 else float("inf")
+        return rate, total - received, per_node
+
+
+def main():
+    parser = argparse.ArgumentParser(description="集群节点数与分片发布/订阅吞吐量")
+    parser.add_argument("--dll", default=None, help="DLL路径，默认自动查找")
+    parser.add_argument("--channels", type=int, default=256, help="频道数")
+    parser.add_argument("--messages", type=int, default=200000, help="消息总数")
+    parser.add_argument("--batch", type=int, default=500, help="每次publish_many的消息数")
+    parser.add_argument("--payload-size", type=int, default=64, help="消息大小（字节）")
+    parser.add_argument("--threads", type=int, default=1, help="发布线程数（至少为节点数）")
+    parser.add_argument("--nodes", type=int, nargs="*", default=NODE_COUNTS, help="要测试的节点数")
+    parser.add_argument("--migrate", action="store_true", help="发布过程中迁移0号节点的槽位")
+    args = parser.parse_args()
+
+    print(f"channels={args.channels} messages={args.messages} batch={args.batch} "
+          f"payload={args.payload_size}B migrate={args.migrate}")
+    print(f"{'nodes':>5} | {'msg/s':>12} | {'lost':>6} | per node")
+    print("-" * 60)
+    for nodes in args.nodes:
+        rate, lost, per_node = run(args, nodes)
+        print(f"{nodes:>5} | {rate:>12,.0f} | {lost:>6} | {per_node}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+编解码器开销测试（不需要Redis）
+
+对小负载（一条约80字节的行情记录）和大负载（几百KB的快照）分别测量各编解码器
+每条消息的编码、解码时间和编码后的大小；另外测量惰性解码的收益：
+处理函数不访问message.value时，每条消息只付出创建Message的开销。
+
+用法:
+    python bench/bench_codecs.py --repeat 20000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from redis_client import Message
+from redis_codec import BinaryCodec, JsonCodec, StructCodec
+
+
+def small_payload():
+    return {"seq": 123456789, "sym": "AAPL", "bid": 187.21, "ask": 187.23, "live": True}
+
+
+def large_payload(rows: int):
+    return {"snapshot": [{"id": i, "name": f"item-{i}", "price": i * 0.5, "tags": ["a", "b"]}
+                         for i in range(rows)]}
+
+
+def measure(func, arg, repeat: int) -> float:
+    """func(arg)的平均耗时（纳秒）"""
+    start = time.perf_counter_ns()
+    for _ in range(repeat):
+        func(arg)
+    return (time.perf_counter_ns() - start) / repeat
+
+
+def run_case(title: str, cases, repeat: int):
+    print(f"\n[{title}] repeat={repeat}")
+    print(f"{'codec':<10} | {'bytes':>9} | {'encode ns':>12} | {'decode ns':>12}")
+    print("-" * 52)
+    for name, codec, obj in cases:
+        data = codec.encode(obj)
+        assert codec.decode(data) is not None
+        encode_ns = measure(codec.encode, obj, repeat)
+        decode_ns = measure(codec.decode, data, repeat)
+        print(f"{name:<10} | {len(data):>9,} | {encode_ns:>12,.0f} | {decode_ns:>12,.0f}")
+
+
+def run_lazy(repeat: int):
+    codec = JsonCodec()
+    data = codec.encode(small_payload())
+    channel = "bench:codec"
+
+    def untouched(_):
+        Message(channel, data, codec)
+
+    def touched(_):
+        Message(channel, data, codec).value
+
+    print(f"\n[lazy decode] small JSON payload, repeat={repeat}")
+    print(f"  handler ignores value   {measure(untouched, None, repeat):>10,.0f} ns/msg")
+    print(f"  handler reads value     {measure(touched, None, repeat):>10,.0f} ns/msg")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="编解码器每条消息的开销")
+    parser.add_argument("--repeat", type=int, default=20000, help="小负载的重复次数")
+    parser.add_argument("--large-repeat", type=int, default=50, help="大负载的重复次数")
+    parser.add_argument("--rows", type=int, default=2000, help="大负载中的记录数")
+    args = parser.parse_args()
+
+    json_codec = JsonCodec()
+    binary_codec = BinaryCodec()
+    quote = small_payload()
+    struct_small = StructCodec("<Q8sdd?", ("seq", "sym", "bid", "ask", "live"))
+    struct_quote = dict(quote, sym=quote["sym"].encode())
+
+    run_case("small", [
+        ("json", json_codec, quote),
+        ("binary", binary_codec, quote),
+        ("struct", struct_small, struct_quote),
+    ], args.repeat)
+
+    snapshot = large_payload(args.rows)
+    prices = tuple(row["price"] for row in snapshot["snapshot"])
+    run_case("large", [
+        ("json", json_codec, snapshot),
+        ("binary", binary_codec, snapshot),
+        ("struct", StructCodec(f"<{len(prices)}d"), prices),
+    ], args.large_repeat)
+
+    run_lazy(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+合并投递（只保留最新值）测试
+
+向若干频道突发发布一批更新，处理函数每条消息耗时--handler-us微秒，分别测量
+普通订阅、conflate=True（原生层按频道合并）和key_fn（合并线程池按key合并）三种方式下：
+处理函数被调用的次数、最后一条更新从发布到处理完的时间，以及处理函数最后看到的是否为最新值。
+
+用法:
+    python bench/bench_conflation.py --messages 50000
+    python bench/bench_conflation.py --server external --host 127.0.0.1 --port 6379
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from redis_client import RedisPubSubDLL
+from resp_server import add_server_arguments, bench_server
+
+
+MODES = ['plain', 'conflate', 'key_fn']
+
+
+def run(args, mode: str):
+    """返回(回调次数, 最后一条的延迟秒数, 是否看到了所有频道/key的最新值)"""
+    with RedisPubSubDLL(args.dll) as subscriber, RedisPubSubDLL(args.dll) as publisher:
+        if not subscriber.connect(args.host, args.port) or not publisher.connect(args.host, args.port):
+            sys.exit(1)
+
+        handler_s = args.handler_us / 1e6
+        latest = {}
+        calls = 0
+        done = threading.Event()
+        expected = {f"{i % args.keys}".encode(): i for i in range(args.messages - args.keys, args.messages)}
+
+        def handler(message):
+            nonlocal calls
+            key, value = message.data.split(b':')
+            end = time.perf_counter() + handler_s
+            while time.perf_counter() < end:
+                pass
+            calls += 1
+            latest[key] = int(value)
+            if latest == expected:
+                done.set()
+
+        channels = [f"bench:conflate:{i}" for i in range(args.channels)]
+        for channel in channels:
+            if mode == 'plain':
+                ok = subscriber.subscribe(channel, handler, binary=True)
+            elif mode == 'conflate':
+                ok = subscriber.subscribe(channel, handler, binary=True, conflate=True)
+            else:
+                ok = subscriber.subscribe(channel, handler, binary=True,
+                                          key_fn=lambda message: message.data.split(b':')[0])
+            if not ok:
+                sys.exit(1)
+
+        # key i % keys总是发往同一个频道；conflate模式下一个频道只保留一个值，因此keys应等于channels
+        batch = []
+        for i in range(args.messages):
+            key = i % args.keys
+            batch.append((channels[key % len(channels)], f"{key}:{i}"))
+            if len(batch) == 500:
+                publisher.publish_many(batch)
+                batch = []
+        if batch:
+            publisher.publish_many(batch)
+        published = time.perf_counter()
+
+        finished = done.wait(args.timeout)
+        lag = time.perf_counter() - published
+        return calls, lag, finished
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合并投递与处理函数负载")
+    add_server_arguments(parser)
+    parser.add_argument("--dll", default=None, help="DLL路径，默认自动查找")
+    parser.add_argument("--messages", type=int, default=50000, help="发布的更新数")
+    parser.add_argument("--channels", type=int, default=8, help="频道数")
+    parser.add_argument("--keys", type=int, default=8, help="key数（key_fn模式下可大于频道数）")
+    parser.add_argument("--handler-us", type=float, default=200, help="处理函数每条消息的耗时（微秒）")
+    parser.add_argument("--timeout", type=float, default=60, help="等待最新值的最长时间（秒）")
+    args = parser.parse_args()
+
+    with bench_server(args) as kind:
+        print(f"server: {kind}")
+        print(f"messages={args.messages} channels={args.channels} keys={args.keys} handler={args.handler_us}us")
+        print(f"{'mode':>9} | {'calls':>8} | {'lag ms':>9} | latest")
+        print("-" * 44)
+        for mode in MODES:
+            if mode == 'conflate' and args.keys != args.channels:
+                continue
+            calls, lag, finished = run(args, mode)
+            print(f"{mode:>9} | {calls:>8} | {lag * 1000:>9.1f} | {'yes' if finished else 'timeout'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+频道分发性能测试
+
+逐步增加已订阅频道数（10 -> 100,000），每一级都向随机的已订阅频道发布一批消息，
+测量订阅线程查表分发并经投递队列取出的吞吐量。哈希表分发时各级的结果应基本持平。
+
+用法:
+    python bench/bench_dispatch.py
+    python bench/bench_dispatch.py --server external --host 127.0.0.1 --port 6379
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from redis_client import RedisPubSubDLL
+from resp_server import add_server_arguments, bench_server
+
+
+CHANNEL_COUNTS = [10, 100, 1000, 10000, 100000]
+
+
+def drain(client: RedisPubSubDLL, expected: int, timeout: float) -> int:
+    """从投递队列取出expected条消息或超时，返回实际取到的数量"""
+    received = 0
+    deadline = time.perf_counter() + timeout
+    while received < expected and time.perf_counter() < deadline:
+        received += len(client.poll(4096, 0.05))
+    return received
+
+
+def main():
+    parser = argparse.ArgumentParser(description="已订阅频道数与分发吞吐量的关系")
+    add_server_arguments(parser)
+    parser.add_argument("--dll", default=None, help="DLL路径，默认自动查找")
+    parser.add_argument("--messages", type=int, default=20000, help="每一级发布的消息数")
+    parser.add_argument("--max-channels", type=int, default=CHANNEL_COUNTS[-1])
+    args = parser.parse_args()
+
+    with bench_server(args) as kind:
+        print(f"server: {kind}")
+        with RedisPubSubDLL(args.dll) as client:
+            if not client.connect(args.host, args.port):
+                sys.exit(1)
+            client.set_queue_capacity(max(args.messages * 2, 16384))
+
+            channels = []
+            print(f"{'channels':>9} | {'msg/s':>12} | {'ns/msg':>9} | {'lost':>6}")
+            print("-" * 46)
+            for count in CHANNEL_COUNTS:
+                if count > args.max_channels:
+                    break
+
+                while len(channels) < count:
+                    name = f"bench:dispatch:{len(channels)}"
+                    if not client.subscribe(name):
+                        sys.exit(1)
+                    channels.append(name)
+
+                targets = [(random.choice(channels), "x" * 32) for _ in range(args.messages)]
+                drain(client, 1 << 30, 0.2)  # 清掉上一级残留
+
+                start = time.perf_counter()
+                client.publish_many(targets)
+                received = drain(client, len(targets), timeout=30)
+                elapsed = time.perf_counter() - start
+
+                rate = received / elapsed if elapsed > 0 else float("inf")
+                ns_per_msg = elapsed / received * 1e9 if received else float("nan")
+                print(f"{count:>9} | {rate:>12,.0f} | {ns_per_msg:>9,.0f} | {len(targets) - received:>6}")
+
+
+if __name__ == "__main__":
+    main()
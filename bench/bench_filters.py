@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+原生过滤条件测试
+
+发布--messages条JSON消息，其中--match比例属于目标租户，分别用
+Python处理函数中判断（python）和原生过滤条件（native）丢弃其余消息，
+测量收齐目标消息所需的时间和本进程消耗的CPU时间（发布方在同一进程中，两种方式相同）。
+
+用法:
+    python bench/bench_filters.py --messages 100000 --match 0.1
+    python bench/bench_filters.py --server external --host 127.0.0.1 --port 6379
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from redis_client import RedisPubSubDLL
+from redis_filter import json_field
+from resp_server import add_server_arguments, bench_server
+
+
+def run(args, mode: str):
+    """返回(耗时秒数, CPU秒数, 收到的目标消息数)"""
+    with RedisPubSubDLL(args.dll) as subscriber, RedisPubSubDLL(args.dll) as publisher:
+        if not subscriber.connect(args.host, args.port) or not publisher.connect(args.host, args.port):
+            sys.exit(1)
+
+        every = max(1, round(1 / args.match))
+        expected = (args.messages + every - 1) // every
+        received = 0
+        done = threading.Event()
+
+        def handler(message):
+            nonlocal received
+            if mode == 'python' and message.value['tenant'] != 'target':
+                return
+            received += 1
+            if received == expected:
+                done.set()
+
+        filters = [json_field('tenant', 'target')] if mode == 'native' else None
+        if not subscriber.subscribe('bench:filters', handler, codec='json', filters=filters):
+            sys.exit(1)
+
+        payloads = [json.dumps({'tenant': 'target' if i % every == 0 else f'other-{i % 7}',
+                                'seq': i, 'body': 'x' * args.payload_size}, separators=(',', ':'))
+                    for i in range(args.messages)]
+
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        for i in range(0, len(payloads), 500):
+            publisher.publish_many([('bench:filters', payload) for payload in payloads[i:i + 500]])
+        done.wait(60)
+        return time.perf_counter() - start, time.process_time() - cpu_start, received
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Python过滤与原生过滤对比")
+    add_server_arguments(parser)
+    parser.add_argument("--dll", default=None, help="DLL路径，默认自动查找")
+    parser.add_argument("--messages", type=int, default=100000, help="发布的消息数")
+    parser.add_argument("--match", type=float, default=0.1, help="目标消息所占比例")
+    parser.add_argument("--payload-size", type=int, default=64, help="body字段的长度")
+    args = parser.parse_args()
+
+    with bench_server(args) as kind:
+        print(f"server: {kind}")
+        print(f"messages={args.messages} match={args.match} payload={args.payload_size}B")
+        print(f"{'mode':>7} | {'elapsed ms':>10} | {'cpu ms':>8} | received")
+        print("-" * 44)
+        for mode in ('python', 'native'):
+            elapsed, cpu, received = run(args, mode)
+            print(f"{mode:>7} | {elapsed * 1000:>10.1f} | {cpu * 1000:>8.1f} | {received}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+批量发布性能测试
+
+对比逐条 publish() 与管道方式 publish_many() 在不同批量大小下的吞吐量（消息/秒）
+
+用法:
+    python bench/bench_publish_many.py
+    python bench/bench_publish_many.py --server external --host 127.0.0.1 --port 6379
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from redis_client import RedisPubSubDLL
+from resp_server import add_server_arguments, bench_server
+
+
+BATCH_SIZES = [1, 10, 100, 1000, 10000]
+
+
+def bench_single(client: RedisPubSubDLL, channel: str, payload: str, count: int) -> float:
+    """逐条发布count条消息，返回消息/秒"""
+    start = time.perf_counter()
+    for _ in range(count):
+        client.publish(channel, payload)
+    elapsed = time.perf_counter() - start
+    return count / elapsed if elapsed > 0 else float("inf")
+
+
+def bench_batch(client: RedisPubSubDLL, channel: str, payload: str, count: int) -> float:
+    """一次publish_many发布count条消息，返回消息/秒"""
+    messages = [(channel, payload)] * count
+    start = time.perf_counter()
+    client.publish_many(messages)
+    elapsed = time.perf_counter() - start
+    return count / elapsed if elapsed > 0 else float("inf")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="publish vs publish_many 吞吐量对比")
+    add_server_arguments(parser)
+    parser.add_argument("--dll", default=None, help="DLL路径，默认自动查找")
+    parser.add_argument("--channel", default="bench:publish_many")
+    parser.add_argument("--payload-size", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=3, help="每个批量大小重复次数，取最好成绩")
+    args = parser.parse_args()
+
+    with bench_server(args) as kind:
+        print(f"server: {kind}")
+        payload = "x" * args.payload_size
+
+        with RedisPubSubDLL(args.dll) as client:
+            if not client.connect(args.host, args.port):
+                sys.exit(1)
+
+            print(f"{'batch':>8} | {'publish msg/s':>15} | {'publish_many msg/s':>19} | {'speedup':>8}")
+            print("-" * 60)
+            for size in BATCH_SIZES:
+                single = max(bench_single(client, args.channel, payload, size) for _ in range(args.repeat))
+                batch = max(bench_batch(client, args.channel, payload, size) for _ in range(args.repeat))
+                print(f"{size:>8} | {single:>15,.0f} | {batch:>19,.0f} | {batch / single:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+异步发布性能测试
+
+对比同步 publish() 与 publish_nowait() + flush() 的吞吐量，以及 publish_nowait() 单次调用耗时
+
+用法:
+    python bench/bench_publish_nowait.py
+    python bench/bench_publish_nowait.py --server external --host 127.0.0.1 --port 6379
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from redis_client import RedisPubSubDLL
+from resp_server import add_server_arguments, bench_server
+
+
+def bench_sync(client: RedisPubSubDLL, channel: str, payload: bytes, count: int) -> float:
+    """逐条同步发布，返回消息/秒"""
+    start = time.perf_counter()
+    for _ in range(count):
+        client.publish(channel, payload)
+    elapsed = time.perf_counter() - start
+    return count / elapsed if elapsed > 0 else float("inf")
+
+
+def bench_nowait(client: RedisPubSubDLL, channel: str, payload: bytes, count: int):
+    """异步发布并flush，返回(消息/秒, 平均单次调用耗时ns)"""
+    start = time.perf_counter()
+    for _ in range(count):
+        client.publish_nowait(channel, payload)
+    submitted = time.perf_counter()
+    client.flush()
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else float("inf")
+    return rate, (submitted - start) / count * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="publish vs publish_nowait 吞吐量对比")
+    add_server_arguments(parser)
+    parser.add_argument("--dll", default=None, help="DLL路径，默认自动查找")
+    parser.add_argument("--channel", default="bench:publish_nowait")
+    parser.add_argument("--payload-size", type=int, default=64)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--max-batch", type=int, default=1024)
+    parser.add_argument("--linger-ms", type=int, default=0)
+    args = parser.parse_args()
+
+    with bench_server(args) as kind:
+        print(f"server: {kind}")
+        payload = b"x" * args.payload_size
+
+        with RedisPubSubDLL(args.dll) as client:
+            client.set_async_publish(max_batch=args.max_batch, linger_ms=args.linger_ms)
+            if not client.connect(args.host, args.port):
+                sys.exit(1)
+
+            sync_count = min(args.messages, 20000)
+            sync_rate = bench_sync(client, args.channel, payload, sync_count)
+            nowait_rate, call_ns = bench_nowait(client, args.channel, payload, args.messages)
+            stats = client.async_publish_stats()
+
+            print(f"publish        : {sync_rate:>12,.0f} msg/s")
+            print(f"publish_nowait : {nowait_rate:>12,.0f} msg/s  ({nowait_rate / sync_rate:.1f}x)")
+            print(f"call cost      : {call_ns:>12,.0f} ns/call")
+            print(f"batches        : {stats['batches']:>12,}  (avg {stats['completed'] / max(stats['batches'], 1):,.0f} msg/batch)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+发布连接池性能测试
+
+多个线程同时调用 publish()，对比不同连接池大小下的总吞吐量和连接等待时间
+
+用法:
+    python bench/bench_publish_pool.py --threads 8
+    python bench/bench_publish_pool.py --server external --host 127.0.0.1 --port 6379
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from redis_client import RedisPubSubDLL
+from resp_server import add_server_arguments, bench_server
+
+
+POOL_SIZES = [1, 2, 4, 8]
+
+
+def run(args, pool_size: int, mode: str):
+    """用pool_size个发布连接、args.threads个线程发布，返回(消息/秒, 连接池统计)"""
+    with RedisPubSubDLL(args.dll) as client:
+        client.set_publish_pool(pool_size, mode)
+        if not client.connect(args.host, args.port):
+            sys.exit(1)
+
+        payload = "x" * args.payload_size
+        barrier = threading.Barrier(args.threads + 1)
+
+        def worker():
+            barrier.wait()
+            for _ in range(args.messages):
+                client.publish(args.channel, payload)
+
+        threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+        for t in threads:
+            t.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        total = args.threads * args.messages
+        return total / elapsed if elapsed > 0 else float("inf"), client.pool_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="发布连接池大小与多线程发布吞吐量")
+    add_server_arguments(parser)
+    parser.add_argument("--dll", default=None, help="DLL路径，默认自动查找")
+    parser.add_argument("--channel", default="bench:publish_pool")
+    parser.add_argument("--payload-size", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--messages", type=int, default=5000, help="每个线程发布的消息数")
+    parser.add_argument("--mode", default="round_robin", choices=["round_robin", "thread_affine"])
+    args = parser.parse_args()
+
+    with bench_server(args) as kind:
+        print(f"server: {kind}")
+        print(f"{'pool':>5} | {'msg/s':>12} | {'contended':>10} | {'avg wait us':>11} | {'max wait us':>11}")
+        print("-" * 62)
+        for size in POOL_SIZES:
+            rate, stats = run(args, size, args.mode)
+            print(f"{size:>5} | {rate:>12,.0f} | {stats['contended']:>10,} | "
+                  f"{stats['wait_avg_us']:>11,} | {stats['wait_max_us']:>11,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+订阅分片性能测试
+
+订阅端分别使用 M = 1, 2, 4, 8 个订阅分片订阅同一组频道，另一个客户端用publish_many
+向这些频道发布消息，测量订阅端的接收吞吐量和各分片的消息分布。
+
+--mode queued（默认）时消息只经过原生解析和投递队列，主要体现各分片线程并行解析的效果；
+--mode callback 时每条消息都进入Python回调，GIL会限制分片带来的提升。
+
+用法:
+    python bench/bench_subscriber_shards.py --channels 64
+    python bench/bench_subscriber_shards.py --server external --host 127.0.0.1 --port 6379
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from redis_client import RedisPubSubDLL
+from resp_server import add_server_arguments, bench_server
+
+
+SHARD_COUNTS = [1, 2, 4, 8]
+
+
+def run(args, shards: int):
+    """用shards个订阅分片接收args.messages条消息，返回(消息/秒, 丢失数, 各分片消息数)"""
+    with RedisPubSubDLL(args.dll) as subscriber, RedisPubSubDLL(args.dll) as publisher:
+        subscriber.set_subscriber_shards(shards)
+        if not subscriber.connect(args.host, args.port) or not publisher.connect(args.host, args.port):
+            sys.exit(1)
+        subscriber.set_queue_capacity(max(args.messages, 16384))
+
+        received = 0
+        done = threading.Event()
+        lock = threading.Lock()
+
+        def on_message(message):
+            nonlocal received
+            with lock:
+                received += 1
+                if received >= args.messages:
+                    done.set()
+
+        channels = [f"bench:shards:{i}" for i in range(args.channels)]
+        for name in channels:
+            callback = on_message if args.mode == "callback" else None
+            if not subscriber.subscribe(name, callback, binary=True):
+                sys.exit(1)
+
+        payload = b"x" * args.payload_size
+        batch = [(channels[i % len(channels)], payload) for i in range(args.batch)]
+
+        start = time.perf_counter()
+        sent = 0
+        while sent < args.messages:
+            publisher.publish_many(batch[:args.messages - sent])
+            sent += min(len(batch), args.messages - sent)
+
+        if args.mode == "callback":
+            done.wait(30)
+        else:
+            deadline = time.perf_counter() + 30
+            while received < args.messages and time.perf_counter() < deadline:
+                received += len(subscriber.poll(4096, 0.05))
+        elapsed = time.perf_counter() - start
+
+        per_shard = [stats['messages'] for stats in subscriber.shard_stats()]
+        rate = received / elapsed if elapsed > 0 else float("inf")
+        return rate, args.messages - received, per_shard
+
+
+def main():
+    parser = argparse.ArgumentParser(description="订阅分片数与接收吞吐量")
+    add_server_arguments(parser)
+    parser.add_argument("--dll", default=None, help="DLL路径，默认自动查找")
+    parser.add_argument("--channels", type=int, default=64, help="订阅的频道数")
+    parser.add_argument("--messages", type=int, default=200000, help="每一级发布的消息数")
+    parser.add_argument("--batch", type=int, default=1000, help="publish_many每批的消息数")
+    parser.add_argument("--payload-size", type=int, default=64)
+    parser.add_argument("--mode", default="queued", choices=["queued", "callback"])
+    args = parser.parse_args()
+
+    with bench_server(args) as kind:
+        print(f"server: {kind}")
+        print(f"{'shards':>6} | {'msg/s':>12} | {'lost':>6} | per-shard messages")
+        print("-" * 60)
+        for shards in SHARD_COUNTS:
+            rate, lost, per_shard = run(args, shards)
+            print(f"{shards:>6} | {rate:>12,.0f} | {lost:>6} | {per_shard}")
+
+
+if __name__ == "__main__":
+    main()
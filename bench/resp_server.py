@@ -0,0 +1,716 @@
+# -*- coding: utf-8 -*-
+"""
+本地RESP替身服务器（纯Python asyncio）
+
+只实现发布/订阅测试需要的命令：PING、ECHO、PUBLISH、SUBSCRIBE、UNSUBSCRIBE、PSUBSCRIBE、PUNSUBSCRIBE，
+以及Streams测试需要的XADD（MAXLEN）、XLEN、XGROUP CREATE、XREADGROUP（COUNT/BLOCK）、XACK、XPENDING（摘要）。
+没有安装redis-server时，基准测试用它作为本地服务器；它是单线程的，吞吐量上限远低于真实Redis，
+测试结果只适合在同一台机器、同一种服务器之间比较。
+
+以--cluster启动时模拟Redis Cluster的一个主节点：CLUSTER SLOTS/KEYSLOT，以及分片发布/订阅
+SPUBLISH、SSUBSCRIBE、SUNSUBSCRIBE（槽位不属于本节点时回复MOVED）。替身专用的
+CLUSTER SETMAP start end host port ... 替换整张槽位表，模拟重新分片：迁出槽位上的分片频道订阅
+由服务器主动以sunsubscribe取消，与Redis 7相同。LocalCluster启动多个这样的进程。
+
+LocalServer优先启动本机的redis-server，找不到时启动本模块：
+
+    with LocalServer() as server:
+        client.connect(server.host, server.port)
+
+基准测试脚本用add_server_arguments()/bench_server()获得与run_suite.py相同的--server选项，
+默认自己启动本地服务器，--server external时才连接--host/--port指定的服务器。
+
+用法（单独运行）:
+    python bench/resp_server.py --port 6399
+    python bench/resp_server.py --port 7001 --cluster 127.0.0.1:7001,127.0.0.1:7002
+"""
+
+import argparse
+import asyncio
+import contextlib
+import fnmatch
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+
+CLUSTER_SLOTS = 16384
+
+
+def _crc16_table() -> List[int]:
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else crc << 1
+        table.append(crc & 0xFFFF)
+    return table
+
+
+_CRC16 = _crc16_table()
+
+
+def keyslot(key: bytes) -> int:
+    """Redis Cluster槽位：CRC16（XMODEM）对16384取模，有非空hash tag（{...}）时只计算其中的内容"""
+    left = key.find(b"{")
+    if left >= 0:
+        right = key.find(b"}", left + 1)
+        if right > left + 1:
+            key = key[left + 1:right]
+    crc = 0
+    for byte in key:
+        crc = ((crc << 8) & 0xFFFF) ^ _CRC16[(crc >> 8) ^ byte]
+    return crc & (CLUSTER_SLOTS - 1)
+
+
+def split_slots(count: int) -> List[Tuple[int, int]]:
+    """把16384个槽位平均分成count段（含两端）"""
+    bounds = [CLUSTER_SLOTS * i // count for i in range(count + 1)]
+    return [(bounds[i], bounds[i + 1] - 1) for i in range(count)]
+
+
+class _Connection:
+    """一个客户端连接的订阅状态"""
+
+    __slots__ = ('writer', 'channels', 'patterns', 'shard_channels')
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.channels: Set[bytes] = set()
+        self.patterns: Set[bytes] = set()
+        self.shard_channels: Set[bytes] = set()
+
+    def subscription_count(self) -> int:
+        return len(self.channels) + len(self.patterns)
+
+
+class ReplyError(Exception):
+    """带错误码的错误回复（例如 "BUSYGROUP ..."），原样写出，不加ERR前缀"""
+
+
+class _Group:
+    """消费者组：最后投递的ID和待确认条目（ID -> 消费者）"""
+
+    __slots__ = ('last_id', 'pending')
+
+    def __init__(self, last_id: Tuple[int, int]):
+        self.last_id = last_id
+        self.pending: Dict[Tuple[int, int], bytes] = {}
+
+
+class _Stream:
+    """一个流：按ID递增的条目列表和消费者组"""
+
+    __slots__ = ('entries', 'last_id', 'groups')
+
+    def __init__(self):
+        self.entries: List[Tuple[Tuple[int, int], List[bytes]]] = []
+        self.last_id = (0, 0)
+        self.groups: Dict[bytes, _Group] = {}
+
+    def find(self, entry_id: Tuple[int, int]) -> Optional[List[bytes]]:
+        for candidate, fields in self.entries:
+            if candidate == entry_id:
+                return fields
+        return None
+
+
+def _format_id(entry_id: Tuple[int, int]) -> bytes:
+    return b"%d-%d" % entry_id
+
+
+def _parse_id(raw: bytes) -> Tuple[int, int]:
+    ms, _, seq = raw.partition(b"-")
+    return int(ms), int(seq or 0)
+
+
+def encode(value) -> bytes:
+    """把Python值编码为RESP2：int/bytes/None/list/str（简单字符串）/Exception（错误）"""
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, str):
+        return b"+" + value.encode() + b"\r\n"
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(encode(item) for item in value)
+    if isinstance(value, ReplyError):
+        return b"-" + str(value).encode() + b"\r\n"
+    if isinstance(value, Exception):
+        return b"-ERR " + str(value).encode() + b"\r\n"
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+class RespServer:
+    """发布/订阅替身服务器；提供address和slot_map时作为集群的一个节点"""
+
+    def __init__(self, address: Optional[Tuple[str, int]] = None,
+                 slot_map: Optional[List[Tuple[int, int, str, int]]] = None):
+        self.channels: Dict[bytes, Set[_Connection]] = {}
+        self.patterns: Dict[bytes, Set[_Connection]] = {}
+        self.shard_channels: Dict[bytes, Set[_Connection]] = {}
+        self.streams: Dict[bytes, _Stream] = {}
+        self._stream_added: Optional[asyncio.Event] = None
+        self.address = address
+        self.slot_map: List[Tuple[int, int, str, int]] = []
+        self._owners: List[Optional[Tuple[str, int]]] = []
+        if slot_map is not None:
+            self._set_slot_map(slot_map)
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        """读取一条命令（RESP数组或inline命令），连接关闭时返回None"""
+        line = await reader.readline()
+        if not line:
+            return None
+        if line[:1] != b"*":
+            return line.split()
+
+        args = []
+        for _ in range(int(line[1:])):
+            header = await reader.readline()
+            length = int(header[1:])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    def _publish(self, channel: bytes, message: bytes) -> int:
+        """把消息写给订阅了channel（或匹配的模式）的连接，返回接收者数量"""
+        receivers = 0
+        for conn in self.channels.get(channel, ()):
+            conn.writer.write(encode([b"message", channel, message]))
+            receivers += 1
+
+        if self.patterns:
+            name = channel.decode('latin-1')
+            for pattern, conns in self.patterns.items():
+                if conns and fnmatch.fnmatchcase(name, pattern.decode('latin-1')):
+                    for conn in conns:
+                        conn.writer.write(encode([b"pmessage", pattern, channel, message]))
+                        receivers += 1
+        return receivers
+
+    def _subscribe(self, conn: _Connection, command: bytes, names: List[bytes]) -> List[bytes]:
+        table, mine = (self.channels, conn.channels) if command == b"subscribe" else (self.patterns, conn.patterns)
+        replies = []
+        for name in names:
+            table.setdefault(name, set()).add(conn)
+            mine.add(name)
+            replies.append(encode([command, name, conn.subscription_count()]))
+        return replies
+
+    def _unsubscribe(self, conn: _Connection, command: bytes, names: List[bytes]) -> List[bytes]:
+        table, mine = (self.channels, conn.channels) if command == b"unsubscribe" else (self.patterns, conn.patterns)
+        replies = []
+        for name in names or list(mine):
+            subscribers = table.get(name)
+            if subscribers is not None:
+                subscribers.discard(conn)
+                if not subscribers:
+                    del table[name]
+            mine.discard(name)
+            replies.append(encode([command, name, conn.subscription_count()]))
+        if not replies:
+            replies.append(encode([command, None, conn.subscription_count()]))
+        return replies
+
+    # ==================== Cluster ====================
+
+    def _set_slot_map(self, slot_map: List[Tuple[int, int, str, int]]):
+        self.slot_map = sorted(slot_map)
+        self._owners = [None] * CLUSTER_SLOTS
+        for start, end, host, port in self.slot_map:
+            for slot in range(start, end + 1):
+                self._owners[slot] = (host, port)
+
+    def _redirect(self, name: bytes) -> Optional[ReplyError]:
+        """name的槽位不属于本节点时返回MOVED错误"""
+        slot = keyslot(name)
+        owner = self._owners[slot]
+        if owner == self.address:
+            return None
+        if owner is None:
+            return ReplyError(f"CLUSTERDOWN Hash slot {slot} not served")
+        return ReplyError(f"MOVED {slot} {owner[0]}:{owner[1]}")
+
+    def _cluster(self, args: List[bytes]):
+        if self.address is None:
+            return Exception("This instance has cluster support disabled")
+        subcommand = args[1].lower() if len(args) > 1 else b""
+        if subcommand == b"slots":
+            return [[start, end, [host.encode(), port, f"{host}:{port}".encode()]]
+                    for start, end, host, port in self.slot_map]
+        if subcommand == b"keyslot" and len(args) == 3:
+            return keyslot(args[2])
+        if subcommand == b"setmap" and len(args) >= 6 and (len(args) - 2) % 4 == 0:
+            fields = args[2:]
+            self._set_slot_map([(int(fields[i]), int(fields[i + 1]), fields[i + 2].decode(), int(fields[i + 3]))
+                                for i in range(0, len(fields), 4)])
+            self._drop_moved_channels()
+            return "OK"
+        return Exception("unsupported CLUSTER subcommand")
+
+    def _drop_moved_channels(self):
+        """槽位迁出后，主动取消这些槽位上的分片频道订阅（Redis 7的行为）"""
+        for channel in [channel for channel in self.shard_channels if self._redirect(channel) is not None]:
+            for conn in self.shard_channels.pop(channel):
+                conn.shard_channels.discard(channel)
+                conn.writer.write(encode([b"sunsubscribe", channel, len(conn.shard_channels)]))
+
+    def _spublish(self, channel: bytes, message: bytes):
+        error = self._redirect(channel)
+        if error is not None:
+            return error
+        receivers = 0
+        for conn in self.shard_channels.get(channel, ()):
+            conn.writer.write(encode([b"smessage", channel, message]))
+            receivers += 1
+        return receivers
+
+    def _ssubscribe(self, conn: _Connection, names: List[bytes]) -> List[bytes]:
+        if len({keyslot(name) for name in names}) > 1:
+            return [encode(ReplyError("CROSSSLOT Keys in request don't hash to the same slot"))]
+        error = self._redirect(names[0])
+        if error is not None:
+            return [encode(error)]
+        replies = []
+        for name in names:
+            self.shard_channels.setdefault(name, set()).add(conn)
+            conn.shard_channels.add(name)
+            replies.append(encode([b"ssubscribe", name, len(conn.shard_channels)]))
+        return replies
+
+    def _sunsubscribe(self, conn: _Connection, names: List[bytes]) -> List[bytes]:
+        replies = []
+        for name in names or list(conn.shard_channels):
+            subscribers = self.shard_channels.get(name)
+            if subscribers is not None:
+                subscribers.discard(conn)
+                if not subscribers:
+                    del self.shard_channels[name]
+            conn.shard_channels.discard(name)
+            replies.append(encode([b"sunsubscribe", name, len(conn.shard_channels)]))
+        if not replies:
+            replies.append(encode([b"sunsubscribe", None, 0]))
+        return replies
+
+    # ==================== Streams ====================
+
+    def _xadd(self, args: List[bytes]):
+        """XADD key [MAXLEN [~|=] n] *|id field value ..."""
+        key, index, maxlen = args[1], 2, None
+        if args[index].lower() == b"maxlen":
+            index += 1
+            if args[index] in (b"~", b"="):
+                index += 1
+            maxlen = int(args[index])
+            index += 1
+        raw_id, fields = args[index], args[index + 1:]
+        if not fields or len(fields) % 2:
+            return Exception("wrong number of arguments for 'xadd' command")
+
+        stream = self.streams.setdefault(key, _Stream())
+        if raw_id == b"*":
+            ms = int(time.time() * 1000)
+            entry_id = (ms, 0) if ms > stream.last_id[0] else (stream.last_id[0], stream.last_id[1] + 1)
+        else:
+            entry_id = _parse_id(raw_id)
+            if entry_id <= stream.last_id:
+                return Exception("The ID specified in XADD is equal or smaller than the target stream top item")
+        stream.entries.append((entry_id, fields))
+        stream.last_id = entry_id
+        if maxlen is not None and len(stream.entries) > maxlen:
+            del stream.entries[:len(stream.entries) - maxlen]
+
+        if self._stream_added is not None:
+            self._stream_added.set()
+            self._stream_added = None
+        return _format_id(entry_id)
+
+    def _xgroup(self, args: List[bytes]):
+        """XGROUP CREATE key group $|id [MKSTREAM]"""
+        if len(args) < 5 or args[1].lower() != b"create":
+            return Exception("unsupported XGROUP subcommand")
+        key, group, start = args[2], args[3], args[4]
+        stream = self.streams.get(key)
+        if stream is None:
+            if b"mkstream" not in (arg.lower() for arg in args[5:]):
+                return Exception("The XGROUP subcommand requires the key to exist")
+            stream = self.streams[key] = _Stream()
+        if group in stream.groups:
+            return ReplyError("BUSYGROUP Consumer Group name already exists")
+        stream.groups[group] = _Group(stream.last_id if start == b"$" else _parse_id(start))
+        return "OK"
+
+    def _xreadgroup_once(self, group: bytes, consumer: bytes, count: Optional[int],
+                         keys: List[bytes], ids: List[bytes]):
+        """执行一次XREADGROUP，没有新条目时返回None"""
+        result = []
+        for key, raw_id in zip(keys, ids):
+            stream = self.streams.get(key)
+            state = stream.groups.get(group) if stream is not None else None
+            if state is None:
+                raise ReplyError(f"NOGROUP No such key '{key.decode('latin-1')}' or consumer group "
+                                 f"'{group.decode('latin-1')}' in XREADGROUP with GROUP option")
+
+            entries = []
+            if raw_id == b">":
+                for entry_id, fields in stream.entries:
+                    if entry_id > state.last_id:
+                        entries.append([_format_id(entry_id), fields])
+                        state.pending[entry_id] = consumer
+                        state.last_id = entry_id
+                        if count is not None and len(entries) >= count:
+                            break
+                if entries:
+                    result.append([key, entries])
+            else:
+                start = _parse_id(raw_id)
+                for entry_id in sorted(state.pending):
+                    if entry_id > start and state.pending[entry_id] == consumer:
+                        entries.append([_format_id(entry_id), stream.find(entry_id)])
+                        if count is not None and len(entries) >= count:
+                            break
+                result.append([key, entries])
+        return result or None
+
+    async def _xreadgroup(self, args: List[bytes]) -> List[bytes]:
+        """XREADGROUP GROUP g c [COUNT n] [BLOCK ms] [NOACK] STREAMS key... id..."""
+        group, consumer = args[2], args[3]
+        count, block, index = None, None, 4
+        while index < len(args) and args[index].lower() != b"streams":
+            option = args[index].lower()
+            if option == b"count":
+                count = int(args[index + 1])
+                index += 2
+            elif option == b"block":
+                block = int(args[index + 1])
+                index += 2
+            else:
+                index += 1
+        names = args[index + 1:]
+        keys, ids = names[:len(names) // 2], names[len(names) // 2:]
+
+        deadline = None if not block else time.monotonic() + block / 1000
+        while True:
+            try:
+                result = self._xreadgroup_once(group, consumer, count, keys, ids)
+            except ReplyError as e:
+                return [encode(e)]
+            if result is not None or block is None or b">" not in ids:
+                return [encode(result)]
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return [encode(None)]
+
+            if self._stream_added is None:
+                self._stream_added = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._stream_added.wait(), remaining)
+            except asyncio.TimeoutError:
+                return [encode(None)]
+
+    def _xack(self, args: List[bytes]) -> int:
+        stream = self.streams.get(args[1])
+        state = stream.groups.get(args[2]) if stream is not None else None
+        if state is None:
+            return 0
+        acked = 0
+        for raw_id in args[3:]:
+            if state.pending.pop(_parse_id(raw_id), None) is not None:
+                acked += 1
+        return acked
+
+    def _xpending(self, args: List[bytes]):
+        """XPENDING key group（只支持摘要形式）"""
+        stream = self.streams.get(args[1])
+        state = stream.groups.get(args[2]) if stream is not None else None
+        if state is None:
+            return ReplyError("NOGROUP No such key or consumer group")
+        if not state.pending:
+            return [0, None, None, None]
+        ids = sorted(state.pending)
+        consumers: Dict[bytes, int] = {}
+        for consumer in state.pending.values():
+            consumers[consumer] = consumers.get(consumer, 0) + 1
+        return [len(ids), _format_id(ids[0]), _format_id(ids[-1]),
+                [[name, str(total).encode()] for name, total in consumers.items()]]
+
+    def execute(self, conn: _Connection, args: List[bytes]) -> List[bytes]:
+        """执行一条命令，返回要写回的RESP回复"""
+        command = args[0].lower()
+        if command == b"ping":
+            return [encode("PONG")]
+        if command == b"echo" and len(args) == 2:
+            return [encode(args[1])]
+        if command == b"publish" and len(args) == 3:
+            return [encode(self._publish(args[1], args[2]))]
+        if command in (b"subscribe", b"psubscribe") and len(args) >= 2:
+            return self._subscribe(conn, command, args[1:])
+        if command in (b"unsubscribe", b"punsubscribe"):
+            return self._unsubscribe(conn, command, args[1:])
+        if command == b"spublish" and len(args) == 3 and self.address is not None:
+            return [encode(self._spublish(args[1], args[2]))]
+        if command == b"ssubscribe" and len(args) >= 2 and self.address is not None:
+            return self._ssubscribe(conn, args[1:])
+        if command == b"sunsubscribe" and self.address is not None:
+            return self._sunsubscribe(conn, args[1:])
+        if command == b"cluster":
+            return [encode(self._cluster(args))]
+        if command == b"xadd" and len(args) >= 5:
+            return [encode(self._xadd(args))]
+        if command == b"xlen" and len(args) == 2:
+            stream = self.streams.get(args[1])
+            return [encode(len(stream.entries) if stream is not None else 0)]
+        if command == b"xgroup":
+            return [encode(self._xgroup(args))]
+        if command == b"xack" and len(args) >= 4:
+            return [encode(self._xack(args))]
+        if command == b"xpending" and len(args) == 3:
+            return [encode(self._xpending(args))]
+        return [encode(Exception(f"unknown command '{args[0].decode('latin-1')}'"))]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        conn = _Connection(writer)
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    break
+                if not args:
+                    continue
+                if args[0].lower() == b"xreadgroup" and len(args) >= 7:
+                    replies = await self._xreadgroup(args)
+                else:
+                    replies = self.execute(conn, args)
+                writer.write(b"".join(replies))
+                if writer.transport.get_write_buffer_size() > 1 << 20:
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._unsubscribe(conn, b"unsubscribe", [])
+            self._unsubscribe(conn, b"punsubscribe", [])
+            self._sunsubscribe(conn, [])
+            writer.close()
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def free_port(host: str = "127.0.0.1") -> int:
+    """获取一个当前空闲的TCP端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+class LocalServer:
+    """
+    启动一个本地服务器进程供基准测试使用，退出上下文时结束进程
+
+    kind: 'auto'优先使用本机redis-server，找不到时使用本模块的替身服务器；
+          'redis-server'只使用redis-server；'python'只使用替身服务器
+    extra_args: 附加给替身服务器的命令行参数（例如 ["--cluster", ...]）
+    """
+
+    def __init__(self, kind: str = 'auto', host: str = "127.0.0.1", port: Optional[int] = None,
+                 extra_args: Optional[List[str]] = None):
+        if kind not in ('auto', 'redis-server', 'python'):
+            raise ValueError(f"Invalid server kind: {kind}")
+        self.host = host
+        self.port = port or free_port(host)
+        self.requested = kind
+        self.kind = None
+        self.extra_args = list(extra_args or [])
+        self._process = None
+
+    def start(self) -> "LocalServer":
+        redis_server = shutil.which("redis-server")
+        if self.requested == 'redis-server' and not redis_server:
+            raise FileNotFoundError("redis-server not found in PATH")
+
+        if redis_server and self.requested != 'python':
+            self.kind = 'redis-server'
+            command = [redis_server, "--port", str(self.port), "--bind", self.host,
+                       "--save", "", "--appendonly", "no"]
+        else:
+            self.kind = 'python'
+            command = [sys.executable, os.path.abspath(__file__), "--host", self.host, "--port", str(self.port),
+                       *self.extra_args]
+
+        self._process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self._wait_ready(10.0)
+        return self
+
+    def _wait_ready(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError(f"{self.kind} exited with code {self._process.returncode}")
+            try:
+                with socket.create_connection((self.host, self.port), timeout=0.2):
+                    return
+            except OSError:
+                time.sleep(0.05)
+        self.stop()
+        raise TimeoutError(f"{self.kind} did not start on {self.host}:{self.port}")
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            try:
+                self._process.wait(5)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+            self._process = None
+
+    def __enter__(self) -> "LocalServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    """添加--server/--host/--port参数（含义与run_suite.py相同）"""
+    parser.add_argument("--server", default="auto", choices=["auto", "python", "redis-server", "external"],
+                        help="auto: 优先redis-server，否则替身服务器；external: 使用--host/--port指定的服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None)
+
+
+@contextlib.contextmanager
+def bench_server(args: argparse.Namespace):
+    """
+    按args.server启动本地服务器，把args.host/args.port改为它的地址，产生服务器类型；
+    external时不启动，直接使用args.host/args.port（端口默认6379）
+    """
+    if args.server == "external":
+        args.port = args.port or 6379
+        yield "external"
+        return
+    with LocalServer(args.server, args.host, args.port) as server:
+        args.host, args.port = server.host, server.port
+        yield server.kind
+
+
+def _send_command(host: str, port: int, *args: str) -> bytes:
+    """发送一条命令并返回回复的第一行（只用于替身集群的管理命令）"""
+    payload = b"*%d\r\n" % len(args) + b"".join(
+        b"$%d\r\n%s\r\n" % (len(arg.encode()), arg.encode()) for arg in args)
+    with socket.create_connection((host, port), timeout=5) as s:
+        s.sendall(payload)
+        return s.makefile('rb').readline().rstrip(b"\r\n")
+
+
+class LocalCluster:
+    """
+    启动nodes个替身集群节点（每个节点一个进程），槽位平均分配，退出上下文时结束所有进程
+
+        with LocalCluster(3) as cluster:
+            client.connect(cluster.startup_nodes)
+            cluster.move_slots(0, 999, 2)   # 把槽位0~999迁到2号节点
+    """
+
+    def __init__(self, nodes: int = 3, host: str = "127.0.0.1"):
+        if nodes <= 0:
+            raise ValueError("nodes must be > 0")
+        self.host = host
+        self.ports = [free_port(host) for _ in range(nodes)]
+        self._owners = [0] * CLUSTER_SLOTS
+        for index, (start, end) in enumerate(split_slots(nodes)):
+            for slot in range(start, end + 1):
+                self._owners[slot] = index
+        self._servers: List[LocalServer] = []
+
+    @property
+    def startup_nodes(self) -> List[Tuple[str, int]]:
+        return [(self.host, port) for port in self.ports]
+
+    def slot_map(self) -> List[Tuple[int, int, str, int]]:
+        """当前槽位表：连续属于同一节点的槽位合并为一段"""
+        ranges = []
+        start = 0
+        for slot in range(1, CLUSTER_SLOTS + 1):
+            if slot == CLUSTER_SLOTS or self._owners[slot] != self._owners[start]:
+                ranges.append((start, slot - 1, self.host, self.ports[self._owners[start]]))
+                start = slot
+        return ranges
+
+    def _map_argument(self) -> str:
+        return ",".join(f"{start}-{end}@{host}:{port}" for start, end, host, port in self.slot_map())
+
+    def start(self) -> "LocalCluster":
+        try:
+            for port in self.ports:
+                server = LocalServer('python', self.host, port, ["--cluster", self._map_argument()])
+                self._servers.append(server.start())
+        except Exception:
+            self.stop()
+            raise
+        return self
+
+    def move_slots(self, start: int, end: int, node: int):
+        """把槽位start~end（含）迁到node号节点，并把新槽位表下发给所有节点"""
+        for slot in range(start, end + 1):
+            self._owners[slot] = node
+        args = []
+        for range_start, range_end, host, port in self.slot_map():
+            args += [str(range_start), str(range_end), host, str(port)]
+        for port in self.ports:
+            _send_command(self.host, port, "CLUSTER", "SETMAP", *args)
+
+    def stop(self):
+        for server in self._servers:
+            server.stop()
+        self._servers = []
+
+    def __enter__(self) -> "LocalCluster":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def _parse_cluster(value: str) -> List[Tuple[int, int, str, int]]:
+    """--cluster参数：host:port,...（槽位平均分配）或 start-end@host:port,..."""
+    entries = value.split(",")
+    if all("@" in entry for entry in entries):
+        slot_map = []
+        for entry in entries:
+            slots, _, address = entry.partition("@")
+            start, _, end = slots.partition("-")
+            host, _, port = address.rpartition(":")
+            slot_map.append((int(start), int(end), host, int(port)))
+        return slot_map
+    nodes = [entry.rpartition(":") for entry in entries]
+    return [(start, end, host, int(port))
+            for (start, end), (host, _, port) in zip(split_slots(len(nodes)), nodes)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地RESP发布/订阅替身服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6399)
+    parser.add_argument("--cluster", help="作为集群节点启动：host:port,...（平均分配槽位）或 start-end@host:port,...")
+    args = parser.parse_args()
+
+    server = RespServer()
+    if args.cluster:
+        server = RespServer((args.host, args.port), _parse_cluster(args.cluster))
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""
+RedisPubSubDLL基准测试套件
+
+启动本地服务器（本机有redis-server时使用它，否则使用bench/resp_server.py替身服务器），依次测量：
+    publish        publish / publish_many / publish_nowait+flush 的发布吞吐量
+    latency        同一进程内发布到回调收到的端到端延迟（p50/p99/p99.9，微秒）
+    callback       各投递方式的接收吞吐量，以及回调方式下订阅线程每条消息的CPU时间
+    memory         每个已订阅频道占用的内存（进程RSS增量 / 频道数）
+    stream         Streams：stream_publish_many追加的吞吐量，消费者组读取的吞吐量和每次往返读到的条目数
+
+结果打印为表格，--json 同时写出机器可读的结果，便于跨版本比较。
+同一份结果只应与相同服务器类型（meta.server）的结果比较：替身服务器是单线程Python，吞吐量上限远低于Redis。
+
+用法:
+    python bench/run_suite.py --json bench_results.json
+    python bench/run_suite.py --server external --host 127.0.0.1 --port 6379
+    python bench/run_suite.py --only publish latency
+"""
+
+import argparse
+import json
+import os
+import platform
+import struct
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from redis_client import RedisPubSubDLL
+from resp_server import add_server_arguments, bench_server
+
+
+BENCHMARKS = ["publish", "latency", "callback", "memory", "stream"]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """已排序数据的百分位数（最近秩）"""
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def rss_bytes() -> Optional[int]:
+    """当前进程的常驻内存（字节），无法获取时返回None"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def git_revision() -> Optional[str]:
+    try:
+        root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=root,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def new_client(args, host: str, port: int) -> RedisPubSubDLL:
+    client = RedisPubSubDLL(args.dll)
+    if not client.connect(host, port):
+        raise ConnectionError(f"Failed to connect to {host}:{port}")
+    return client
+
+
+def wait_until(predicate: Callable[[], bool], timeout: float) -> bool:
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() >= deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+# ==================== 发布吞吐量 ====================
+
+def bench_publish(args, host: str, port: int) -> Dict[str, Any]:
+    """三种发布方式各发布args.messages条消息（无订阅者），返回消息/秒"""
+    payload = b"x" * args.payload_size
+    channel = "bench:suite:publish"
+    results = {}
+
+    with new_client(args, host, port) as client:
+        start = time.perf_counter()
+        for _ in range(args.messages):
+            client.publish(channel, payload)
+        results["publish_msgs_per_s"] = args.messages / (time.perf_counter() - start)
+
+        batch = [(channel, payload)] * args.batch
+        start = time.perf_counter()
+        for offset in range(0, args.messages, args.batch):
+            client.publish_many(batch[:args.messages - offset])
+        results["publish_many_msgs_per_s"] = args.messages / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(args.messages):
+            client.publish_nowait(channel, payload)
+        client.flush()
+        results["publish_nowait_msgs_per_s"] = args.messages / (time.perf_counter() - start)
+
+    return results
+
+
+# ==================== 端到端延迟 ====================
+
+def bench_latency(args, host: str, port: int) -> Dict[str, Any]:
+    """逐条同步发布带时间戳的消息，在二进制回调中计算延迟"""
+    channel = "bench:suite:latency"
+    latencies: List[float] = []
+    clock = time.perf_counter
+    stamp = struct.Struct("<d")
+    padding = b"x" * max(0, args.payload_size - stamp.size)
+
+    with new_client(args, host, port) as subscriber, new_client(args, host, port) as publisher:
+        def on_message(message):
+            latencies.append(clock() - stamp.unpack_from(message.data)[0])
+
+        subscriber.subscribe(channel, on_message, binary=True)
+
+        count = args.latency_messages
+        for i in range(count):
+            publisher.publish(channel, stamp.pack(clock()) + padding)
+            if args.latency_interval_us:
+                time.sleep(args.latency_interval_us / 1e6)
+        wait_until(lambda: len(latencies) >= count, 10)
+
+    values = sorted(v * 1e6 for v in latencies)
+    return {
+        "messages": count,
+        "received": len(values),
+        "p50_us": percentile(values, 0.50),
+        "p99_us": percentile(values, 0.99),
+        "p999_us": percentile(values, 0.999),
+        "max_us": values[-1] if values else float("nan"),
+        "mean_us": sum(values) / len(values) if values else float("nan"),
+    }
+
+
+# ==================== 回调开销 ====================
+
+def _deliver(args, host: str, port: int, mode: str) -> Dict[str, Any]:
+    """按mode（text/binary/dispatch/queued）订阅并接收args.messages条消息"""
+    channel = f"bench:suite:callback:{mode}"
+    payload = b"x" * args.payload_size
+    count = args.messages
+    state = {"received": 0, "cpu_first": None, "cpu_last": None}
+    done = threading.Event()
+    thread_time = time.thread_time
+
+    def on_message(*_):
+        # 在订阅线程中执行：thread_time只统计该线程的CPU时间（解析+分发+回调），不含等待网络的时间
+        now = thread_time()
+        if state["cpu_first"] is None:
+            state["cpu_first"] = now
+        state["cpu_last"] = now
+        state["received"] += 1
+        if state["received"] >= count:
+            done.set()
+
+    with new_client(args, host, port) as subscriber, new_client(args, host, port) as publisher:
+        if mode == "queued":
+            subscriber.set_queue_capacity(max(count, 16384))
+            subscriber.subscribe(channel)
+        else:
+            subscriber.subscribe(channel, on_message, binary=(mode == "binary"), dispatch=(mode == "dispatch"))
+
+        batch = [(channel, payload)] * args.batch
+        start = time.perf_counter()
+        for offset in range(0, count, args.batch):
+            publisher.publish_many(batch[:count - offset])
+
+        if mode == "queued":
+            deadline = time.perf_counter() + 30
+            while state["received"] < count and time.perf_counter() < deadline:
+                state["received"] += len(subscriber.poll(4096, 0.05))
+        else:
+            done.wait(30)
+        elapsed = time.perf_counter() - start
+
+    result = {
+        "received": state["received"],
+        "msgs_per_s": state["received"] / elapsed if elapsed > 0 else float("inf"),
+    }
+    # dispatch模式的回调在工作线程中执行，thread_time不代表订阅线程
+    if mode in ("text", "binary") and state["received"] > 1:
+        result["reader_cpu_ns_per_msg"] = (state["cpu_last"] - state["cpu_first"]) / (state["received"] - 1) * 1e9
+    return result
+
+
+def bench_callback(args, host: str, port: int) -> Dict[str, Any]:
+    return {mode: _deliver(args, host, port, mode) for mode in ("text", "binary", "dispatch", "queued")}
+
+
+# ==================== 每个频道的内存 ====================
+
+def bench_memory(args, host: str, port: int) -> Dict[str, Any]:
+    """订阅args.channels个频道前后的RSS差值 / 频道数"""
+    results = {}
+    for mode in ("callback", "queued"):
+        with new_client(args, host, port) as client:
+            before = rss_bytes()
+            if before is None:
+                return {"error": "RSS not available on this platform (install psutil)"}
+
+            for i in range(args.channels):
+                name = f"bench:suite:memory:{mode}:{i}"
+                if mode == "queued":
+                    client.subscribe(name)
+                else:
+                    client.subscribe(name, lambda channel, message: None)
+
+            after = rss_bytes()
+            results[mode] = {
+                "channels": args.channels,
+                "rss_delta_bytes": after - before,
+                "bytes_per_channel": (after - before) / args.channels,
+            }
+    return results
+
+
+# ==================== Streams ====================
+
+def bench_stream(args, host: str, port: int) -> Dict[str, Any]:
+    """以batch条一批追加args.messages个条目，再由一个消费者按COUNT=batch读取并确认"""
+    stream = f"bench:suite:stream:{os.getpid()}:{time.monotonic_ns()}"
+    payload = b"x" * args.payload_size
+    count = args.messages
+    received = [0]
+    done = threading.Event()
+
+    def on_entry(_):
+        received[0] += 1
+        if received[0] >= count:
+            done.set()
+
+    with new_client(args, host, port) as consumer_client, new_client(args, host, port) as publisher:
+        publisher.stream_create_group(stream, "bench", "0")
+
+        batch = [(stream, payload)] * args.batch
+        start = time.perf_counter()
+        for offset in range(0, count, args.batch):
+            publisher.stream_publish_many(batch[:count - offset])
+        add_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        consumer = consumer_client.stream_consume(stream, "bench", on_entry, consumer="bench",
+                                                  count=args.batch, block_ms=100)
+        done.wait(60)
+        consume_elapsed = time.perf_counter() - start
+        consumer.stop()
+        stats = consumer.stats()
+
+    return {
+        "add_msgs_per_s": count / add_elapsed,
+        "consume_msgs_per_s": received[0] / consume_elapsed if consume_elapsed > 0 else float("inf"),
+        "entries_per_read": stats["entries"] / stats["reads"] if stats["reads"] else 0.0,
+        "acked": stats["acked"],
+    }
+
+
+# ==================== 输出 ====================
+
+def print_results(results: Dict[str, Any]):
+    meta = results["meta"]
+    print(f"server: {meta['server']}  python: {meta['python']}  revision: {meta['revision']}")
+
+    publish = results.get("publish")
+    if publish:
+        print("\n[publish] msg/s")
+        for name, value in publish.items():
+            print(f"  {name:<28} {value:>14,.0f}")
+
+    latency = results.get("latency")
+    if latency:
+        print(f"\n[latency] {latency['received']}/{latency['messages']} messages (us)")
+        for name in ("p50_us", "p99_us", "p999_us", "max_us", "mean_us"):
+            print(f"  {name:<28} {latency[name]:>14,.1f}")
+
+    callback = results.get("callback")
+    if callback:
+        print(f"\n[callback] {'mode':<10} | {'msg/s':>12} | {'reader cpu ns/msg':>17}")
+        for mode, value in callback.items():
+            cpu = value.get("reader_cpu_ns_per_msg")
+            cpu_text = f"{cpu:>17,.0f}" if cpu is not None else f"{'-':>17}"
+            print(f"           {mode:<10} | {value['msgs_per_s']:>12,.0f} | {cpu_text}")
+
+    memory = results.get("memory")
+    if memory:
+        print("\n[memory]")
+        if "error" in memory:
+            print(f"  {memory['error']}")
+        for mode, value in memory.items():
+            if isinstance(value, dict):
+                print(f"  {mode:<10} {value['channels']:>8,} channels  {value['bytes_per_channel']:>10,.0f} bytes/channel")
+
+    stream = results.get("stream")
+    if stream:
+        print("\n[stream]")
+        for name, value in stream.items():
+            print(f"  {name:<28} {value:>14,.1f}")
+
+
+def run(args, host: str, port: int, server_kind: str) -> Dict[str, Any]:
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "server": server_kind,
+            "params": {
+                "messages": args.messages,
+                "latency_messages": args.latency_messages,
+                "payload_size": args.payload_size,
+                "batch": args.batch,
+                "channels": args.channels,
+            },
+        }
+    }
+
+    benches = {"publish": bench_publish, "latency": bench_latency,
+               "callback": bench_callback, "memory": bench_memory, "stream": bench_stream}
+    for name in args.only or BENCHMARKS:
+        results[name] = benches[name](args, host, port)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RedisPubSubDLL基准测试套件")
+    add_server_arguments(parser)
+    parser.add_argument("--dll", default=None, help="DLL路径，默认自动查找")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="只运行指定的测试")
+    parser.add_argument("--messages", type=int, default=20000, help="吞吐量测试的消息数")
+    parser.add_argument("--latency-messages", type=int, default=5000)
+    parser.add_argument("--latency-interval-us", type=int, default=0, help="延迟测试中两次发布的间隔")
+    parser.add_argument("--payload-size", type=int, default=64)
+    parser.add_argument("--batch", type=int, default=500, help="publish_many每批的消息数")
+    parser.add_argument("--channels", type=int, default=10000, help="内存测试订阅的频道数")
+    parser.add_argument("--json", default=None, help="把结果写入该JSON文件")
+    args = parser.parse_args()
+
+    with bench_server(args) as kind:
+        results = run(args, args.host, args.port, kind)
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
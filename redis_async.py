@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Redis PubSub asyncio客户端
+
+基于RedisPubSubDLL的原生投递队列：事件循环通过add_reader监听唤醒描述符，
+被唤醒后在循环线程内一次取出一批消息，不再需要每条消息一次call_soon_threadsafe
+
+注意：Windows下需要使用SelectorEventLoop（ProactorEventLoop不支持add_reader）:
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+"""
+
+import asyncio
+import collections
+import traceback
+from typing import Deque, Iterable, List, Optional, Set, Tuple, Union
+
+from redis_client import Message, RedisPubSubDLL
+
+
+class _Listener:
+    """listen()内部使用的消息缓冲区"""
+
+    __slots__ = ('channels', 'pending', 'waiter')
+
+    def __init__(self, channels: Set[str]):
+        self.channels = channels
+        self.pending = collections.deque()
+        self.waiter: Optional[asyncio.Future] = None
+
+    def wake(self):
+        """唤醒正在等待消息的协程"""
+        waiter = self.waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+
+class AsyncRedisPubSub:
+    """Redis PubSub asyncio客户端"""
+
+    def __init__(self, dll_path: str = None, batch_size: int = 256, backlog_size: int = 10000):
+        """
+        初始化asyncio客户端
+
+        Args:
+            dll_path: DLL文件路径，默认自动查找
+            batch_size: 每次被唤醒时最多从原生队列取出的消息数
+            backlog_size: 没有listen()在等待的频道最多暂存的消息数，超出时丢弃最早的消息
+        """
+        self._client = RedisPubSubDLL(dll_path)
+        self._batch_size = batch_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup_fd = -1
+        self._listeners: List[_Listener] = []
+        self._subscribed: Set[str] = set()
+        self._backlog: Deque[Message] = collections.deque(maxlen=backlog_size)
+
+    @property
+    def client(self) -> RedisPubSubDLL:
+        """底层的同步客户端"""
+        return self._client
+
+    async def connect(self, hostname: str = "127.0.0.1", port: int = 6379) -> bool:
+        """
+        连接到Redis服务器并把唤醒描述符注册到当前事件循环
+
+        Args:
+            hostname: Redis主机名，默认127.0.0.1
+            port: Redis端口，默认6379
+
+        Returns:
+            True表示连接成功，False表示失败
+        """
+        self._loop = asyncio.get_running_loop()
+        if not await self._loop.run_in_executor(None, self._client.connect, hostname, port):
+            return False
+
+        self._wakeup_fd = self._client.wakeup_fd()
+        try:
+            self._loop.add_reader(self._wakeup_fd, self._on_wakeup)
+        except NotImplementedError:
+            print("[ERROR] Event loop does not support add_reader, use a SelectorEventLoop")
+            await self._loop.run_in_executor(None, self._client.disconnect)
+            self._wakeup_fd = -1
+            return False
+        return True
+
+    async def disconnect(self) -> bool:
+        """
+        注销唤醒描述符并断开连接，正在listen()的协程会正常结束
+
+        Returns:
+            True表示断开成功
+        """
+        if self._loop is not None and self._wakeup_fd >= 0:
+            self._loop.remove_reader(self._wakeup_fd)
+            self._wakeup_fd = -1
+
+        result = await asyncio.get_running_loop().run_in_executor(None, self._client.disconnect)
+        self._subscribed.clear()
+        self._backlog.clear()
+        for listener in self._listeners:
+            listener.wake()
+        return result
+
+    def is_connected(self) -> bool:
+        """检查是否已连接"""
+        return self._client.is_connected()
+
+    async def publish(self, channel: str, message: Union[str, bytes]) -> int:
+        """
+        发布消息（在线程池中执行，不阻塞事件循环）
+
+        Returns:
+            接收消息的订阅者数量，-1表示发送失败
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._client.publish, channel, message)
+
+    async def publish_many(self, messages: Iterable[Tuple[str, Union[str, bytes]]]) -> List[int]:
+        """
+        批量发布消息（管道方式，在线程池中执行）
+
+        Returns:
+            每条消息对应的订阅者数量列表，-1表示该条发送失败
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._client.publish_many, list(messages))
+
+    async def subscribe(self, *channels: str) -> bool:
+        """
+        以队列模式订阅频道，消息通过listen()获取
+
+        订阅后、还没有listen()监听该频道时收到的消息暂存在backlog中（最多backlog_size条），
+        之后第一个监听该频道的listen()先取出这些消息
+
+        Returns:
+            True表示全部订阅成功
+        """
+        loop = asyncio.get_running_loop()
+        ok = True
+        for channel in channels:
+            if channel in self._subscribed:
+                continue
+            if await loop.run_in_executor(None, self._client.subscribe, channel):
+                self._subscribed.add(channel)
+            else:
+                ok = False
+        return ok
+
+    async def listen(self, *channels: str):
+        """
+        异步迭代收到的消息
+
+        用法:
+            async for msg in client.listen("mychannel"):
+                print(msg.channel, msg.text)
+
+        Args:
+            channels: 要监听的频道，会自动订阅；为空时接收所有已订阅频道的消息
+
+        Yields:
+            Message对象
+        """
+        # 先注册再订阅：订阅确认后立即到达的消息不会因为没有匹配的listener而进入backlog
+        listener = _Listener(set(channels))
+        self._listeners.append(listener)
+        try:
+            self._claim_backlog(listener)
+            if channels and not await self.subscribe(*channels):
+                return
+
+            pending = listener.pending
+            while True:
+                if pending:
+                    yield pending.popleft()
+                    continue
+                if not self.is_connected():
+                    return
+                listener.waiter = self._loop.create_future()
+                try:
+                    await listener.waiter
+                finally:
+                    listener.waiter = None
+        finally:
+            self._listeners.remove(listener)
+
+    def _on_wakeup(self):
+        """唤醒描述符可读时在事件循环线程中调用：一次取出一批消息并分发"""
+        try:
+            messages = self._client.poll(self._batch_size, 0)
+        except Exception as e:
+            print(f"[ERROR] Poll error: {e}")
+            traceback.print_exc()
+            return
+
+        if not messages:
+            return
+
+        woken = []
+        listened: Optional[Set[str]] = set()
+        for listener in self._listeners:
+            channels = listener.channels
+            before = len(listener.pending)
+            if channels:
+                listener.pending.extend(msg for msg in messages if msg.channel in channels)
+                if listened is not None:
+                    listened |= channels
+            else:
+                listener.pending.extend(messages)
+                listened = None
+            if len(listener.pending) != before:
+                woken.append(listener)
+
+        # 没有listener监听的频道：暂存到backlog，由之后的listen()取走
+        if listened is not None:
+            self._backlog.extend(msg for msg in messages if msg.channel not in listened)
+
+        for listener in woken:
+            listener.wake()
+
+    def _claim_backlog(self, listener: _Listener):
+        """把backlog中该listener监听的频道的消息按原顺序移到它的缓冲区"""
+        backlog = self._backlog
+        if not backlog:
+            return
+        if not listener.channels:
+            listener.pending.extend(backlog)
+            backlog.clear()
+            return
+
+        channels = listener.channels
+        kept = [msg for msg in backlog if msg.channel not in channels]
+        listener.pending.extend(msg for msg in backlog if msg.channel in channels)
+        backlog.clear()
+        backlog.extend(kept)
+
+    async def __aenter__(self):
+        """异步上下文管理器入口"""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """异步上下文管理器出口"""
+        if self.is_connected():
+            await self.disconnect()
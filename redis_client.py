@@ -6,14 +6,520 @@ Redis PubSub C DLL Python包装类
 提供高级接口封装C DLL的Redis发布/订阅功能
 """
 
+import collections
 import ctypes
+import itertools
+import json
 import os
+import socket
 import sys
 import time
-from ctypes import c_char_p, c_int, CFUNCTYPE
-from threading import Thread, Event, Lock
-from typing import Callable, Dict, Any, Optional
+from ctypes import c_char_p, c_int, c_size_t, c_void_p, POINTER, CFUNCTYPE
+from concurrent.futures import Future
+from threading import Thread, Event, Lock, current_thread
+from typing import Callable, Dict, Any, Iterable, List, Optional, Tuple, Union
 import traceback
+import zlib
+
+from redis_codec import Codec, get_codec
+from redis_compress import MAGIC as _COMPRESSED, Compression
+from redis_dispatch import KeyedDispatcher, LatestValueDispatcher
+from redis_filter import Filter
+from redis_metrics import HISTOGRAM_BUCKETS, summarize
+
+
+_UNSET = object()
+
+
+class Message:
+    """
+    二进制安全的消息对象
+    
+    payload按原样保存为bytes（可包含'\\0'），.text/.json/.value在首次访问时才解码并缓存
+    """
+    
+    __slots__ = ('channel', 'data', 'codec', '_text', '_json', '_value')
+    
+    def __init__(self, channel: str, data: bytes, codec: Optional[Codec] = None):
+        self.channel = channel
+        self.data = data
+        self.codec = codec
+        self._text = _UNSET
+        self._json = _UNSET
+        self._value = _UNSET
+    
+    @property
+    def view(self) -> memoryview:
+        """payload的只读memoryview，切片时不复制数据"""
+        return memoryview(self.data)
+    
+    @property
+    def text(self) -> str:
+        """按UTF-8解码的payload（惰性计算）"""
+        if self._text is _UNSET:
+            self._text = self.data.decode('utf-8')
+        return self._text
+    
+    @property
+    def json(self) -> Any:
+        """按JSON解析的payload（惰性计算）"""
+        if self._json is _UNSET:
+            self._json = json.loads(self.data)
+        return self._json
+    
+    @property
+    def value(self) -> Any:
+        """用订阅时指定的编解码器解码的payload（惰性计算），没有指定编解码器时按JSON解析"""
+        if self._value is _UNSET:
+            self._value = self.codec.decode(self.data) if self.codec is not None else self.json
+        return self._value
+    
+    def __len__(self) -> int:
+        return len(self.data)
+    
+    def __repr__(self) -> str:
+        return f"Message(channel={self.channel!r}, data={self.data[:32]!r}, size={len(self.data)})"
+
+
+class StreamMessage(Message):
+    """从流中读取的一个条目：channel为流名称，id为条目ID"""
+    
+    __slots__ = ('id',)
+    
+    def __init__(self, channel: str, data: bytes, codec: Optional[Codec] = None, id: str = ''):
+        super().__init__(channel, data, codec)
+        self.id = id
+    
+    def __repr__(self) -> str:
+        return f"StreamMessage(stream={self.channel!r}, id={self.id!r}, data={self.data[:32]!r}, size={len(self.data)})"
+
+
+def _to_bytes(payload: Union[str, bytes, bytearray, memoryview]) -> bytes:
+    """将str/类bytes的payload转换为bytes"""
+    if isinstance(payload, str):
+        return payload.encode('utf-8')
+    if isinstance(payload, bytes):
+        return payload
+    return bytes(payload)
+
+
+class _RedisMessage(ctypes.Structure):
+    """对应C结构体RedisMessage"""
+    _fields_ = [
+        ('channel', c_void_p),
+        ('channel_len', c_size_t),
+        ('data', c_void_p),
+        ('data_len', c_size_t),
+    ]
+
+
+class _RedisQueueStats(ctypes.Structure):
+    """对应C结构体RedisQueueStats"""
+    _fields_ = [
+        ('capacity', ctypes.c_longlong),
+        ('depth', ctypes.c_longlong),
+        ('high_watermark', ctypes.c_longlong),
+        ('enqueued', ctypes.c_longlong),
+        ('dequeued', ctypes.c_longlong),
+        ('overflow', ctypes.c_longlong),
+    ]
+
+
+class _RedisPoolStats(ctypes.Structure):
+    """对应C结构体RedisPoolStats"""
+    _fields_ = [
+        ('size', ctypes.c_longlong),
+        ('acquired', ctypes.c_longlong),
+        ('contended', ctypes.c_longlong),
+        ('wait_total_us', ctypes.c_longlong),
+        ('wait_max_us', ctypes.c_longlong),
+    ]
+
+
+class _RedisAsyncStats(ctypes.Structure):
+    """对应C结构体RedisAsyncStats"""
+    _fields_ = [
+        ('submitted', ctypes.c_longlong),
+        ('completed', ctypes.c_longlong),
+        ('failed', ctypes.c_longlong),
+        ('pending', ctypes.c_longlong),
+        ('batches', ctypes.c_longlong),
+    ]
+
+
+class _RedisReconnectStats(ctypes.Structure):
+    """对应C结构体RedisReconnectStats"""
+    _fields_ = [
+        ('reconnects', ctypes.c_longlong),
+        ('failed_attempts', ctypes.c_longlong),
+        ('disconnected', ctypes.c_longlong),
+        ('last_outage_ms', ctypes.c_longlong),
+        ('max_outage_ms', ctypes.c_longlong),
+        ('spool_depth', ctypes.c_longlong),
+        ('spool_max', ctypes.c_longlong),
+        ('spool_dropped', ctypes.c_longlong),
+    ]
+
+
+class _RedisShardStats(ctypes.Structure):
+    """对应C结构体RedisShardStats"""
+    _fields_ = [
+        ('channels', ctypes.c_longlong),
+        ('patterns', ctypes.c_longlong),
+        ('messages', ctypes.c_longlong),
+        ('connected', ctypes.c_longlong),
+    ]
+
+
+class _RedisLocalStats(ctypes.Structure):
+    """对应C结构体RedisLocalStats"""
+    _fields_ = [
+        ('delivered', ctypes.c_longlong),
+        ('echo_suppressed', ctypes.c_longlong),
+        ('echo_expired', ctypes.c_longlong),
+    ]
+
+
+class _RedisHistogram(ctypes.Structure):
+    """对应C结构体RedisHistogram"""
+    _fields_ = [
+        ('count', ctypes.c_longlong),
+        ('sum_ns', ctypes.c_longlong),
+        ('max_ns', ctypes.c_longlong),
+        ('buckets', ctypes.c_longlong * HISTOGRAM_BUCKETS),
+    ]
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {'count': self.count, 'sum_ns': self.sum_ns, 'max_ns': self.max_ns,
+                'buckets': list(self.buckets)}
+
+
+class _RedisStats(ctypes.Structure):
+    """对应C结构体RedisStats"""
+    _fields_ = [
+        ('messages_in', ctypes.c_longlong),
+        ('bytes_in', ctypes.c_longlong),
+        ('messages_out', ctypes.c_longlong),
+        ('bytes_out', ctypes.c_longlong),
+        ('publish_errors', ctypes.c_longlong),
+        ('reconnects', ctypes.c_longlong),
+        ('slow_callbacks', ctypes.c_longlong),
+        ('channels_tracked', ctypes.c_longlong),
+        ('conflated', ctypes.c_longlong),
+        ('filtered', ctypes.c_longlong),
+        ('publish_rtt', _RedisHistogram),
+        ('callback_time', _RedisHistogram),
+    ]
+
+
+class _RedisChannelStats(ctypes.Structure):
+    """对应C结构体RedisChannelStats"""
+    _fields_ = [
+        ('channel', c_void_p),
+        ('channel_len', c_size_t),
+        ('messages_in', ctypes.c_longlong),
+        ('bytes_in', ctypes.c_longlong),
+        ('messages_out', ctypes.c_longlong),
+        ('bytes_out', ctypes.c_longlong),
+        ('conflated', ctypes.c_longlong),
+    ]
+
+
+class _RedisFilter(ctypes.Structure):
+    """对应C结构体RedisFilter"""
+    _fields_ = [
+        ('type', c_int),
+        ('negate', c_int),
+        ('offset', c_size_t),
+        ('field', c_char_p),
+        ('field_len', c_size_t),
+        ('value', c_char_p),
+        ('value_len', c_size_t),
+    ]
+
+
+class _RedisFilterStats(ctypes.Structure):
+    """对应C结构体RedisFilterStats"""
+    _fields_ = [
+        ('passed', ctypes.c_longlong),
+        ('rejected', ctypes.c_longlong),
+    ]
+
+
+# REDIS_FILTER_COMPRESSED：追加在过滤条件之后的标记，原生层跳过压缩头部求值
+_FILTER_COMPRESSED = 4
+
+
+def _filter_list(filters: Optional[Iterable[Filter]]) -> List[Filter]:
+    """检查过滤条件的类型，返回列表"""
+    filters = list(filters or ())
+    for item in filters:
+        if not isinstance(item, Filter):
+            raise TypeError(f"Expected a redis_filter.Filter, not {type(item).__name__}")
+    return filters
+
+
+def _filter_array(filters: List[Filter], framed: bool = False):
+    """
+    Filter列表 -> (条件数, RedisFilter数组)，字符串由Filter对象持有，设置后原生层复制
+
+    framed为True（频道开启了压缩）且有过滤条件时追加REDIS_FILTER_COMPRESSED标记
+    """
+    count = len(filters) + (1 if framed and filters else 0)
+    array = (_RedisFilter * max(count, 1))()
+    for index, item in enumerate(filters):
+        array[index] = _RedisFilter(item.type, int(item.negate), item.offset, item.field, len(item.field),
+                                    item.value, len(item.value))
+    if count > len(filters):
+        array[len(filters)] = _RedisFilter(_FILTER_COMPRESSED, 0, 0, None, 0, None, 0)
+    return count, array
+
+
+class _RedisStreamEntry(ctypes.Structure):
+    """对应C结构体RedisStreamEntry"""
+    _fields_ = [
+        ('stream', c_void_p),
+        ('stream_len', c_size_t),
+        ('id', c_void_p),
+        ('id_len', c_size_t),
+        ('data', c_void_p),
+        ('data_len', c_size_t),
+    ]
+
+
+class _RedisStreamReaderStats(ctypes.Structure):
+    """对应C结构体RedisStreamReaderStats"""
+    _fields_ = [
+        ('reads', ctypes.c_longlong),
+        ('entries', ctypes.c_longlong),
+        ('acked', ctypes.c_longlong),
+        ('pending_acks', ctypes.c_longlong),
+        ('reconnects', ctypes.c_longlong),
+    ]
+
+
+class _RedisClusterSlots(ctypes.Structure):
+    """对应C结构体RedisClusterSlots"""
+    _fields_ = [
+        ('start', c_int),
+        ('end', c_int),
+        ('port', c_int),
+        ('host', ctypes.c_char * 256),
+    ]
+
+
+# 流条目ID的缓冲区长度（对应REDIS_STREAM_ID_MAX）
+_STREAM_ID_MAX = 48
+
+
+class StreamConsumer:
+    """
+    消费者组中的一个消费者：后台线程循环XREADGROUP，每次往返读取最多count条，按subscribe()的方式调用处理函数
+    
+    处理函数签名为 handler(message: StreamMessage) -> None。auto_ack时处理函数正常返回后确认该条目，
+    确认在下一次读取时与XREADGROUP一起写出；处理函数抛出异常的条目不确认，留在待确认列表中。
+    启动时先重读本消费者名下已读取、未确认的条目（进程以相同consumer名称重启时继续处理）。
+    由RedisPubSubDLL.stream_consume()创建
+    """
+    
+    def __init__(self, client: 'RedisPubSubDLL', streams: List[str], group: str, consumer: str,
+                 handler: Callable[['StreamMessage'], None], count: int, block_ms: int,
+                 dispatch: bool, decoder: Optional[Codec], auto_ack: bool):
+        self.streams = list(streams)
+        self.group = group
+        self.consumer = consumer
+        self._client = client
+        self._handler = handler
+        self._count = count
+        self._block_ms = block_ms
+        self._dispatch = dispatch
+        self._decoder = decoder
+        self._auto_ack = auto_ack
+        self._acks = collections.deque()
+        self._reader = None
+        self._running = False
+        self._thread: Optional[Thread] = None
+        self._stats = {'handled': 0, 'errors': 0}
+        self._stats_lock = Lock()     # 也保护读取器的释放（stats()可能在其他线程中调用）
+        self._reader_stats = _RedisStreamReaderStats()
+        self._last_id: Optional[bytes] = None
+    
+    def start(self) -> bool:
+        """连接读取连接并启动读取线程，返回True表示成功"""
+        client = self._client
+        group = self.group.encode('utf-8')
+        consumer = self.consumer.encode('utf-8')
+        self._reader = client._redis_stream_reader_new(client._handle, group, len(group),
+                                                       consumer, len(consumer))
+        if not self._reader:
+            return False
+        
+        self._running = True
+        self._thread = Thread(target=self._run, name=f"redis-stream-{self.consumer}", daemon=True)
+        self._thread.start()
+        return True
+    
+    def stop(self, timeout: Optional[float] = None):
+        """
+        停止读取线程（最多等待一次BLOCK时间），发出已排队的确认后释放读取连接
+        
+        dispatch模式下已交给线程池、尚未处理完的条目不会被确认，重启后重读
+        """
+        self._running = False
+        if self._thread is not None and self._thread is not current_thread():
+            self._thread.join(timeout)
+        if self in self._client._stream_consumers:
+            self._client._stream_consumers.remove(self)
+    
+    def ack(self, message: 'StreamMessage'):
+        """确认一个条目（auto_ack=False时使用），可在任意线程中调用"""
+        self._acks.append((message.channel, message.id))
+    
+    def stats(self) -> Dict[str, int]:
+        """
+        获取消费者统计信息
+        
+        Returns:
+            包含reads/entries/acked/pending_acks/reconnects（原生读取器）和handled/errors（处理函数）的字典
+        """
+        with self._stats_lock:
+            if self._reader:
+                self._client._redis_stream_reader_get_stats(self._reader, ctypes.byref(self._reader_stats))
+            result = {name: getattr(self._reader_stats, name) for name, _ in self._reader_stats._fields_}
+            result.update(self._stats)
+        return result
+    
+    def __enter__(self) -> 'StreamConsumer':
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+    
+    def _handle(self, message: 'StreamMessage'):
+        try:
+            self._handler(message)
+        except Exception as e:
+            with self._stats_lock:
+                self._stats['errors'] += 1
+            print(f"[ERROR] Stream handler error: {e}")
+            traceback.print_exc()
+            return
+        with self._stats_lock:
+            self._stats['handled'] += 1
+        if self._auto_ack:
+            self._acks.append((message.channel, message.id))
+    
+    def _flush_acks(self):
+        """把排队的确认按流合并为XACK，交给读取器随下一次读取写出"""
+        acks = self._acks
+        if not acks:
+            return
+        
+        by_stream: Dict[str, List[bytes]] = {}
+        while acks:
+            stream, entry_id = acks.popleft()
+            by_stream.setdefault(stream, []).append(entry_id.encode('ascii'))
+        
+        ack = self._client._redis_stream_reader_ack
+        for stream, ids in by_stream.items():
+            stream_bytes = stream.encode('utf-8')
+            count = len(ids)
+            ack(self._reader, stream_bytes, len(stream_bytes), count,
+                (c_char_p * count)(*ids), (c_size_t * count)(*map(len, ids)))
+    
+    def _read(self, streams: List[bytes], entry_id: bytes, block_ms: int, buffer) -> List['StreamMessage']:
+        """读取一批条目并构造StreamMessage，错误时返回None；self._last_id为本批最后一条的ID（没有读到时为None）"""
+        count = len(streams)
+        received = self._client._redis_stream_reader_read(
+            self._reader, count, (c_char_p * count)(*streams), (c_size_t * count)(*map(len, streams)),
+            entry_id, self._count, block_ms, buffer, len(buffer)
+        )
+        if received < 0:
+            return None
+        self._last_id = ctypes.string_at(buffer[received - 1].id, buffer[received - 1].id_len) if received else None
+        
+        names = self._client._channel_names
+        decompress = self._client._compression.decompress
+        string_at = ctypes.string_at
+        messages = []
+        for i in range(received):
+            item = buffer[i]
+            stream_raw = string_at(item.stream, item.stream_len)
+            stream = names.get(stream_raw)
+            if stream is None:
+                stream = names[stream_raw] = stream_raw.decode('utf-8', 'replace')
+            message_id = string_at(item.id, item.id_len).decode('ascii')
+            
+            # 条目已被MAXLEN裁剪：没有内容可处理，直接确认
+            if not item.data:
+                self._acks.append((stream, message_id))
+                continue
+            
+            data = string_at(item.data, item.data_len)
+            if data[:3] == _COMPRESSED:
+                data = decompress(stream, data)
+                # 无法解压：不投递也不确认，留在待处理列表中
+                if data is None:
+                    continue
+            messages.append(StreamMessage(stream, data, self._decoder, message_id))
+        return messages
+    
+    def _deliver(self, messages: List['StreamMessage']):
+        if self._dispatch:
+            submit = self._client._dispatcher.submit
+            for message in messages:
+                submit(message.channel, self._handle, message)
+        else:
+            for message in messages:
+                self._handle(message)
+    
+    def _run(self):
+        client = self._client
+        streams = [stream.encode('utf-8') for stream in self.streams]
+        buffer = (_RedisStreamEntry * (self._count * len(streams)))()
+        retry_delay = 0.1
+        replay = list(streams)      # 还需要重读待确认条目的流
+        
+        try:
+            while self._running:
+                self._flush_acks()
+                
+                # 重读待确认条目：每个流单独读取，从上一批最后一条之后继续，直到读完
+                if replay:
+                    self._last_id, batch = b"0", []
+                    while self._running and self._last_id is not None:
+                        batch = self._read(replay[:1], self._last_id, 0, buffer)
+                        if batch is None:
+                            break
+                        self._deliver(batch)
+                        self._flush_acks()
+                    if batch is None:
+                        time.sleep(retry_delay)
+                        continue
+                    replay.pop(0)
+                    continue
+                
+                batch = self._read(streams, b">", self._block_ms, buffer)
+                if batch is None:
+                    # 读取连接断开：原生层按退避重连，重连后重读未确认的条目
+                    time.sleep(retry_delay)
+                    replay = list(streams)
+                    continue
+                self._deliver(batch)
+        except Exception as e:
+            print(f"[ERROR] Stream consumer error: {e}")
+            traceback.print_exc()
+        finally:
+            self._running = False
+            self._flush_acks()
+            with self._stats_lock:
+                client._redis_stream_reader_get_stats(self._reader, ctypes.byref(self._reader_stats))
+                client._redis_stream_reader_free(self._reader)
+                self._reader = None
+    
+    @property
+    def running(self) -> bool:
+        return self._running
 
 
 class RedisPubSubDLL:
@@ -22,6 +528,30 @@ class RedisPubSubDLL:
     # 回调函数类型
     _PubSubCallback = CFUNCTYPE(None, c_char_p, c_char_p)
     
+    # 二进制安全回调函数类型: (channel_ptr, channel_len, data_ptr, data_len)
+    _PubSubBinaryCallback = CFUNCTYPE(None, c_void_p, c_size_t, c_void_p, c_size_t)
+    
+    # 批量回调类型: (userdata, channel_ptr, channel_len, count, data_ptr, lens)
+    _PubSubBatchCallback = CFUNCTYPE(None, c_void_p, c_void_p, c_size_t, c_int, c_void_p, POINTER(c_size_t))
+    
+    # 异步发布完成回调类型: (userdata, subscribers)
+    _PublishCompletion = CFUNCTYPE(None, c_void_p, ctypes.c_longlong)
+    
+    # 慢回调通知类型: (userdata, channel_ptr, channel_len, elapsed_ns)
+    _SlowHandlerHook = CFUNCTYPE(None, c_void_p, c_void_p, c_size_t, ctypes.c_longlong)
+    
+    # 槽位迁移通知类型: (userdata, channel_ptr, channel_len, error)
+    _ClusterMovedHook = CFUNCTYPE(None, c_void_p, c_void_p, c_size_t, c_char_p)
+    
+    # 发布连接池的连接选择方式（对应REDIS_POOL_*）
+    _POOL_MODES = {'round_robin': 0, 'thread_affine': 1}
+    
+    # 连接断开、消息已进入spool等待重连后补发（对应REDIS_PUBLISH_SPOOLED）
+    PUBLISH_SPOOLED = -2
+    
+    # 分片发布时频道的槽位不属于所连节点（对应REDIS_PUBLISH_MOVED）
+    PUBLISH_MOVED = -3
+    
     def __init__(self, dll_path: str = None):
         """
         初始化Redis PubSub客户端
@@ -32,26 +562,68 @@ class RedisPubSubDLL:
         Raises:
             FileNotFoundError: DLL文件不存在
             OSError: DLL加载失败
+            MemoryError: 原生客户端创建失败
         """
         self._dll = None
         self._callbacks: Dict[str, Callable] = {}
-        self._dll_callbacks: Dict[str, self._PubSubCallback] = {}
+        self._dll_callbacks: Dict[str, Any] = {}
+        self._patterns: Dict[str, Callable] = {}
+        self._dll_pattern_callbacks: Dict[str, Any] = {}
+        self._retired_callbacks: List[Any] = []
         self._lock = Lock()
         self._connected = False
+        self._poll_buffer = None
+        self._channel_names: Dict[bytes, str] = {}
+        self._dispatcher: Optional[KeyedDispatcher] = None
+        self._conflater: Optional[LatestValueDispatcher] = None
+        self._codecs: Dict[str, Codec] = {}
+        self._default_codec = get_codec('json')
+        self._compression = Compression()
+        self._stream_consumers: List[StreamConsumer] = []
+        self._consumer_names = itertools.count(1)
+        self._completions: Dict[int, Callable[[int], None]] = {}
+        self._completion_tokens = itertools.count(1)
+        self._dll_completion = self._PublishCompletion(self._on_publish_complete)
+        self._no_completion = self._PublishCompletion()  # NULL函数指针（不需要完成通知）
+        self._slow_hook = None
+        self._no_slow_hook = self._SlowHandlerHook()  # NULL函数指针（只计数）
+        self._moved_hook = None
+        self._handle = None
         self._dll_path = dll_path or self._get_default_dll_path()
         
         self._load_dll()
         self._setup_functions()
+        
+        # 每个实例拥有独立的原生客户端（连接、订阅线程、投递队列互不影响）
+        self._handle = self._redis_client_new()
+        if not self._handle:
+            raise MemoryError("Failed to create native redis client")
+    
+    def __del__(self):
+        """释放原生客户端（会先断开连接）"""
+        handle = getattr(self, '_handle', None)
+        if handle:
+            self._handle = None
+            self._redis_client_free(handle)
     
     def _get_default_dll_path(self) -> str:
-        """获取默认DLL路径 (MSVC编译版本)"""
-        # 优先使用MSVC编译的版本
-        possible_paths = [
-            # Release版本 (MSVC)
-            os.path.join(os.path.dirname(__file__), "build/Release/redis_pubsub.dll"),
-            # 备用路径
-            os.path.join(os.path.dirname(__file__), "build/Release/redis_pubsub.dll"),
-        ]
+        """获取默认库路径：Windows为MSVC编译的DLL，Linux/macOS为CMake生成的共享库"""
+        base_dir = os.path.dirname(__file__)
+        if sys.platform == 'win32':
+            # 优先使用MSVC编译的版本
+            possible_paths = [
+                # Release版本 (MSVC)
+                os.path.join(base_dir, "build/Release/redis_pubsub.dll"),
+                # 单配置生成器（MinGW等）
+                os.path.join(base_dir, "build/redis_pubsub.dll"),
+            ]
+        else:
+            suffix = ".dylib" if sys.platform == 'darwin' else ".so"
+            possible_paths = [
+                os.path.join(base_dir, "build/libredis_pubsub" + suffix),
+                os.path.join(base_dir, "build/Release/libredis_pubsub" + suffix),
+                os.path.join(base_dir, "libredis_pubsub" + suffix),
+            ]
         
         for path in possible_paths:
             abs_path = os.path.abspath(path)
@@ -93,25 +665,315 @@ class RedisPubSubDLL:
         if not self._dll:
             raise RuntimeError("DLL not loaded")
         
-        # redis_init(const char* hostname, int port) -> int
-        self._redis_init = self._dll.redis_init
-        self._redis_init.argtypes = [c_char_p, c_int]
-        self._redis_init.restype = c_int
+        # redis_client_new() -> redis_client*
+        self._redis_client_new = self._dll.redis_client_new
+        self._redis_client_new.argtypes = []
+        self._redis_client_new.restype = c_void_p
+        
+        # redis_client_free(redis_client* client) -> void
+        self._redis_client_free = self._dll.redis_client_free
+        self._redis_client_free.argtypes = [c_void_p]
+        self._redis_client_free.restype = None
         
-        # redis_close() -> int
-        self._redis_close = self._dll.redis_close
-        self._redis_close.argtypes = []
+        # redis_client_connect(redis_client* client, const char* hostname, int port) -> int
+        self._redis_connect = self._dll.redis_client_connect
+        self._redis_connect.argtypes = [c_void_p, c_char_p, c_int]
+        self._redis_connect.restype = c_int
+        
+        # redis_client_close(redis_client* client) -> int
+        self._redis_close = self._dll.redis_client_close
+        self._redis_close.argtypes = [c_void_p]
         self._redis_close.restype = c_int
         
-        # redis_publish(const char* channel, const char* message) -> int
-        self._redis_publish = self._dll.redis_publish
-        self._redis_publish.argtypes = [c_char_p, c_char_p]
+        # redis_client_publish(redis_client* client, const char* channel, const char* message) -> int
+        self._redis_publish = self._dll.redis_client_publish
+        self._redis_publish.argtypes = [c_void_p, c_char_p, c_char_p]
         self._redis_publish.restype = c_int
         
-        # redis_subscribe(const char* channel, PubSubCallback callback) -> int
-        self._redis_subscribe = self._dll.redis_subscribe
-        self._redis_subscribe.argtypes = [c_char_p, self._PubSubCallback]
+        # redis_client_publish_binary(redis_client* client, const char* channel, size_t channel_len,
+        #                             const char* message, size_t message_len) -> int
+        self._redis_publish_binary = self._dll.redis_client_publish_binary
+        self._redis_publish_binary.argtypes = [c_void_p, c_char_p, c_size_t, c_char_p, c_size_t]
+        self._redis_publish_binary.restype = c_int
+        
+        # redis_client_publish_batch(redis_client* client, int count,
+        #                            const char** channels, const size_t* channel_lens,
+        #                            const char** messages, const size_t* message_lens, int* results) -> int
+        self._redis_publish_batch = self._dll.redis_client_publish_batch
+        self._redis_publish_batch.argtypes = [
+            c_void_p, c_int, POINTER(c_char_p), POINTER(c_size_t),
+            POINTER(c_char_p), POINTER(c_size_t), POINTER(c_int)
+        ]
+        self._redis_publish_batch.restype = c_int
+        
+        # redis_client_subscribe(redis_client* client, const char* channel, PubSubCallback callback) -> int
+        self._redis_subscribe = self._dll.redis_client_subscribe
+        self._redis_subscribe.argtypes = [c_void_p, c_char_p, self._PubSubCallback]
         self._redis_subscribe.restype = c_int
+        
+        # redis_client_subscribe_binary(redis_client* client, const char* channel, size_t channel_len,
+        #                               PubSubBinaryCallback callback) -> int
+        self._redis_subscribe_binary = self._dll.redis_client_subscribe_binary
+        self._redis_subscribe_binary.argtypes = [c_void_p, c_char_p, c_size_t, self._PubSubBinaryCallback]
+        self._redis_subscribe_binary.restype = c_int
+        
+        # redis_client_subscribe_batch(redis_client* client, const char* channel, size_t channel_len,
+        #                              int max_batch, int max_delay_ms, size_t record_size,
+        #                              PubSubBatchCallback callback, void* userdata) -> int
+        self._redis_subscribe_batch = self._dll.redis_client_subscribe_batch
+        self._redis_subscribe_batch.argtypes = [c_void_p, c_char_p, c_size_t, c_int, c_int, c_size_t,
+                                                self._PubSubBatchCallback, c_void_p]
+        self._redis_subscribe_batch.restype = c_int
+        
+        # redis_client_subscribe_many(redis_client* client, int count, const char** channels,
+        #                             const size_t* channel_lens, PubSubBinaryCallback callback) -> int
+        self._redis_subscribe_many = self._dll.redis_client_subscribe_many
+        self._redis_subscribe_many.argtypes = [c_void_p, c_int, POINTER(c_char_p), POINTER(c_size_t),
+                                               self._PubSubBinaryCallback]
+        self._redis_subscribe_many.restype = c_int
+        
+        # redis_client_subscribe_many_queued(redis_client* client, int count, const char** channels,
+        #                                    const size_t* channel_lens) -> int
+        self._redis_subscribe_many_queued = self._dll.redis_client_subscribe_many_queued
+        self._redis_subscribe_many_queued.argtypes = [c_void_p, c_int, POINTER(c_char_p), POINTER(c_size_t)]
+        self._redis_subscribe_many_queued.restype = c_int
+        
+        # redis_client_unsubscribe_many(redis_client* client, int count, const char** channels,
+        #                               const size_t* channel_lens) -> int
+        self._redis_unsubscribe_many = self._dll.redis_client_unsubscribe_many
+        self._redis_unsubscribe_many.argtypes = [c_void_p, c_int, POINTER(c_char_p), POINTER(c_size_t)]
+        self._redis_unsubscribe_many.restype = c_int
+        
+        # redis_client_set_conflation(redis_client* client, const char* channel, size_t channel_len,
+        #                             int enabled) -> int
+        self._redis_set_conflation = self._dll.redis_client_set_conflation
+        self._redis_set_conflation.argtypes = [c_void_p, c_char_p, c_size_t, c_int]
+        self._redis_set_conflation.restype = c_int
+        
+        # redis_client_set_filter(redis_client* client, int is_pattern, const char* name, size_t name_len,
+        #                         int count, const RedisFilter* filters) -> int
+        self._redis_set_filter = self._dll.redis_client_set_filter
+        self._redis_set_filter.argtypes = [c_void_p, c_int, c_char_p, c_size_t, c_int, POINTER(_RedisFilter)]
+        self._redis_set_filter.restype = c_int
+        
+        # redis_client_stage_options(redis_client* client, int is_pattern, const char* name, size_t name_len,
+        #                            int conflate, int filter_count, const RedisFilter* filters) -> int
+        self._redis_stage_options = self._dll.redis_client_stage_options
+        self._redis_stage_options.argtypes = [c_void_p, c_int, c_char_p, c_size_t, c_int, c_int,
+                                              POINTER(_RedisFilter)]
+        self._redis_stage_options.restype = c_int
+        
+        # redis_client_discard_options(redis_client* client, int is_pattern, const char* name, size_t name_len) -> int
+        self._redis_discard_options = self._dll.redis_client_discard_options
+        self._redis_discard_options.argtypes = [c_void_p, c_int, c_char_p, c_size_t]
+        self._redis_discard_options.restype = c_int
+        
+        # redis_client_get_filter_stats(redis_client* client, int is_pattern, const char* name, size_t name_len,
+        #                               RedisFilterStats* stats) -> int
+        self._redis_get_filter_stats = self._dll.redis_client_get_filter_stats
+        self._redis_get_filter_stats.argtypes = [c_void_p, c_int, c_char_p, c_size_t, POINTER(_RedisFilterStats)]
+        self._redis_get_filter_stats.restype = c_int
+        
+        # redis_client_psubscribe(redis_client* client, const char* pattern, PubSubCallback callback) -> int
+        self._redis_psubscribe = self._dll.redis_client_psubscribe
+        self._redis_psubscribe.argtypes = [c_void_p, c_char_p, self._PubSubCallback]
+        self._redis_psubscribe.restype = c_int
+        
+        # redis_client_psubscribe_binary(redis_client* client, const char* pattern, size_t pattern_len,
+        #                                PubSubBinaryCallback callback) -> int
+        self._redis_psubscribe_binary = self._dll.redis_client_psubscribe_binary
+        self._redis_psubscribe_binary.argtypes = [c_void_p, c_char_p, c_size_t, self._PubSubBinaryCallback]
+        self._redis_psubscribe_binary.restype = c_int
+        
+        # redis_client_psubscribe_queued(redis_client* client, const char* pattern, size_t pattern_len) -> int
+        self._redis_psubscribe_queued = self._dll.redis_client_psubscribe_queued
+        self._redis_psubscribe_queued.argtypes = [c_void_p, c_char_p, c_size_t]
+        self._redis_psubscribe_queued.restype = c_int
+        
+        # redis_client_punsubscribe(redis_client* client, const char* pattern, size_t pattern_len) -> int
+        self._redis_punsubscribe = self._dll.redis_client_punsubscribe
+        self._redis_punsubscribe.argtypes = [c_void_p, c_char_p, c_size_t]
+        self._redis_punsubscribe.restype = c_int
+        
+        # redis_client_subscribe_queued(redis_client* client, const char* channel, size_t channel_len) -> int
+        self._redis_subscribe_queued = self._dll.redis_client_subscribe_queued
+        self._redis_subscribe_queued.argtypes = [c_void_p, c_char_p, c_size_t]
+        self._redis_subscribe_queued.restype = c_int
+        
+        # redis_client_set_queue_capacity(redis_client* client, int capacity) -> int
+        self._redis_set_queue_capacity = self._dll.redis_client_set_queue_capacity
+        self._redis_set_queue_capacity.argtypes = [c_void_p, c_int]
+        self._redis_set_queue_capacity.restype = c_int
+        
+        # redis_client_poll_messages(redis_client* client, RedisMessage* buffer,
+        #                            int max_count, int timeout_ms) -> int
+        self._redis_poll_messages = self._dll.redis_client_poll_messages
+        self._redis_poll_messages.argtypes = [c_void_p, POINTER(_RedisMessage), c_int, c_int]
+        self._redis_poll_messages.restype = c_int
+        
+        # redis_client_get_queue_stats(redis_client* client, RedisQueueStats* stats) -> int
+        self._redis_get_queue_stats = self._dll.redis_client_get_queue_stats
+        self._redis_get_queue_stats.argtypes = [c_void_p, POINTER(_RedisQueueStats)]
+        self._redis_get_queue_stats.restype = c_int
+        
+        # redis_client_get_wakeup_fd(redis_client* client) -> long long
+        self._redis_get_wakeup_fd = self._dll.redis_client_get_wakeup_fd
+        self._redis_get_wakeup_fd.argtypes = [c_void_p]
+        self._redis_get_wakeup_fd.restype = ctypes.c_longlong
+        
+        # redis_client_publish_nowait(redis_client* client, const char* channel, size_t channel_len,
+        #                             const char* message, size_t message_len,
+        #                             PublishCompletion callback, void* userdata) -> long long
+        self._redis_publish_nowait = self._dll.redis_client_publish_nowait
+        self._redis_publish_nowait.argtypes = [
+            c_void_p, c_char_p, c_size_t, c_char_p, c_size_t,
+            self._PublishCompletion, c_void_p
+        ]
+        self._redis_publish_nowait.restype = ctypes.c_longlong
+        
+        # redis_client_flush(redis_client* client, int timeout_ms) -> int
+        self._redis_flush = self._dll.redis_client_flush
+        self._redis_flush.argtypes = [c_void_p, c_int]
+        self._redis_flush.restype = c_int
+        
+        # redis_client_set_async_publish(redis_client* client, int max_batch,
+        #                                int max_pending, int linger_ms) -> int
+        self._redis_set_async_publish = self._dll.redis_client_set_async_publish
+        self._redis_set_async_publish.argtypes = [c_void_p, c_int, c_int, c_int]
+        self._redis_set_async_publish.restype = c_int
+        
+        # redis_client_get_async_stats(redis_client* client, RedisAsyncStats* stats) -> int
+        self._redis_get_async_stats = self._dll.redis_client_get_async_stats
+        self._redis_get_async_stats.argtypes = [c_void_p, POINTER(_RedisAsyncStats)]
+        self._redis_get_async_stats.restype = c_int
+        
+        # redis_client_set_publish_pool(redis_client* client, int size, int mode) -> int
+        self._redis_set_publish_pool = self._dll.redis_client_set_publish_pool
+        self._redis_set_publish_pool.argtypes = [c_void_p, c_int, c_int]
+        self._redis_set_publish_pool.restype = c_int
+        
+        # redis_client_get_pool_stats(redis_client* client, RedisPoolStats* stats) -> int
+        self._redis_get_pool_stats = self._dll.redis_client_get_pool_stats
+        self._redis_get_pool_stats.argtypes = [c_void_p, POINTER(_RedisPoolStats)]
+        self._redis_get_pool_stats.restype = c_int
+        
+        # redis_client_set_reconnect(redis_client* client, int initial_ms, int max_ms, int spool_max) -> int
+        self._redis_set_reconnect = self._dll.redis_client_set_reconnect
+        self._redis_set_reconnect.argtypes = [c_void_p, c_int, c_int, c_int]
+        self._redis_set_reconnect.restype = c_int
+        
+        # redis_client_get_reconnect_stats(redis_client* client, RedisReconnectStats* stats) -> int
+        self._redis_get_reconnect_stats = self._dll.redis_client_get_reconnect_stats
+        self._redis_get_reconnect_stats.argtypes = [c_void_p, POINTER(_RedisReconnectStats)]
+        self._redis_get_reconnect_stats.restype = c_int
+        
+        # redis_client_set_subscriber_shards(redis_client* client, int count) -> int
+        self._redis_set_subscriber_shards = self._dll.redis_client_set_subscriber_shards
+        self._redis_set_subscriber_shards.argtypes = [c_void_p, c_int]
+        self._redis_set_subscriber_shards.restype = c_int
+        
+        # redis_client_get_shard_stats(redis_client* client, RedisShardStats* stats, int max_count) -> int
+        self._redis_get_shard_stats = self._dll.redis_client_get_shard_stats
+        self._redis_get_shard_stats.argtypes = [c_void_p, POINTER(_RedisShardStats), c_int]
+        self._redis_get_shard_stats.restype = c_int
+        
+        # redis_client_set_local_delivery(redis_client* client, int enabled, int suppress_echo) -> int
+        self._redis_set_local_delivery = self._dll.redis_client_set_local_delivery
+        self._redis_set_local_delivery.argtypes = [c_void_p, c_int, c_int]
+        self._redis_set_local_delivery.restype = c_int
+        
+        # redis_client_get_local_stats(redis_client* client, RedisLocalStats* stats) -> int
+        self._redis_get_local_stats = self._dll.redis_client_get_local_stats
+        self._redis_get_local_stats.argtypes = [c_void_p, POINTER(_RedisLocalStats)]
+        self._redis_get_local_stats.restype = c_int
+        
+        # redis_client_get_stats(redis_client* client, RedisStats* stats) -> int
+        self._redis_get_stats = self._dll.redis_client_get_stats
+        self._redis_get_stats.argtypes = [c_void_p, POINTER(_RedisStats)]
+        self._redis_get_stats.restype = c_int
+        
+        # redis_client_get_channel_stats(redis_client* client, RedisChannelStats* stats, int max_count) -> int
+        self._redis_get_channel_stats = self._dll.redis_client_get_channel_stats
+        self._redis_get_channel_stats.argtypes = [c_void_p, POINTER(_RedisChannelStats), c_int]
+        self._redis_get_channel_stats.restype = c_int
+        
+        # redis_client_set_channel_stats(redis_client* client, int max_channels) -> int
+        self._redis_set_channel_stats = self._dll.redis_client_set_channel_stats
+        self._redis_set_channel_stats.argtypes = [c_void_p, c_int]
+        self._redis_set_channel_stats.restype = c_int
+        
+        # redis_client_set_slow_handler(redis_client* client, long long threshold_us, SlowHandlerHook hook, void* userdata) -> int
+        self._redis_set_slow_handler = self._dll.redis_client_set_slow_handler
+        self._redis_set_slow_handler.argtypes = [c_void_p, ctypes.c_longlong, self._SlowHandlerHook, c_void_p]
+        self._redis_set_slow_handler.restype = c_int
+        
+        # redis_client_set_sharded_pubsub(redis_client* client, int enabled) -> int
+        self._redis_set_sharded_pubsub = self._dll.redis_client_set_sharded_pubsub
+        self._redis_set_sharded_pubsub.argtypes = [c_void_p, c_int]
+        self._redis_set_sharded_pubsub.restype = c_int
+        
+        # redis_client_set_moved_handler(redis_client* client, ClusterMovedHook hook, void* userdata) -> int
+        self._redis_set_moved_handler = self._dll.redis_client_set_moved_handler
+        self._redis_set_moved_handler.argtypes = [c_void_p, self._ClusterMovedHook, c_void_p]
+        self._redis_set_moved_handler.restype = c_int
+        
+        # redis_client_cluster_slots(redis_client* client, RedisClusterSlots* slots, int max_count) -> int
+        self._redis_cluster_slots = self._dll.redis_client_cluster_slots
+        self._redis_cluster_slots.argtypes = [c_void_p, POINTER(_RedisClusterSlots), c_int]
+        self._redis_cluster_slots.restype = c_int
+        
+        # redis_cluster_keyslot(const char* key, size_t key_len) -> int
+        self._redis_cluster_keyslot = self._dll.redis_cluster_keyslot
+        self._redis_cluster_keyslot.argtypes = [c_char_p, c_size_t]
+        self._redis_cluster_keyslot.restype = c_int
+        
+        # redis_client_stream_add(redis_client* client, int count, const char** streams, const size_t* stream_lens,
+        #                         const char** messages, const size_t* message_lens, long long maxlen, char* ids) -> int
+        self._redis_stream_add = self._dll.redis_client_stream_add
+        self._redis_stream_add.argtypes = [
+            c_void_p, c_int, POINTER(c_char_p), POINTER(c_size_t),
+            POINTER(c_char_p), POINTER(c_size_t), ctypes.c_longlong, c_void_p
+        ]
+        self._redis_stream_add.restype = c_int
+        
+        # redis_client_stream_group_create(redis_client* client, const char* stream, size_t stream_len,
+        #                                  const char* group, size_t group_len, const char* start_id) -> int
+        self._redis_stream_group_create = self._dll.redis_client_stream_group_create
+        self._redis_stream_group_create.argtypes = [c_void_p, c_char_p, c_size_t, c_char_p, c_size_t, c_char_p]
+        self._redis_stream_group_create.restype = c_int
+        
+        # redis_client_stream_reader_new(redis_client* client, const char* group, size_t group_len,
+        #                                const char* consumer, size_t consumer_len) -> redis_stream_reader*
+        self._redis_stream_reader_new = self._dll.redis_client_stream_reader_new
+        self._redis_stream_reader_new.argtypes = [c_void_p, c_char_p, c_size_t, c_char_p, c_size_t]
+        self._redis_stream_reader_new.restype = c_void_p
+        
+        # redis_stream_reader_free(redis_stream_reader* reader) -> void
+        self._redis_stream_reader_free = self._dll.redis_stream_reader_free
+        self._redis_stream_reader_free.argtypes = [c_void_p]
+        self._redis_stream_reader_free.restype = None
+        
+        # redis_stream_reader_read(redis_stream_reader* reader, int stream_count, const char** streams,
+        #                          const size_t* stream_lens, const char* id, int count, int block_ms,
+        #                          RedisStreamEntry* buffer, int max_entries) -> int
+        self._redis_stream_reader_read = self._dll.redis_stream_reader_read
+        self._redis_stream_reader_read.argtypes = [
+            c_void_p, c_int, POINTER(c_char_p), POINTER(c_size_t), c_char_p, c_int, c_int,
+            POINTER(_RedisStreamEntry), c_int
+        ]
+        self._redis_stream_reader_read.restype = c_int
+        
+        # redis_stream_reader_ack(redis_stream_reader* reader, const char* stream, size_t stream_len, int count,
+        #                         const char** ids, const size_t* id_lens) -> int
+        self._redis_stream_reader_ack = self._dll.redis_stream_reader_ack
+        self._redis_stream_reader_ack.argtypes = [c_void_p, c_char_p, c_size_t, c_int,
+                                                  POINTER(c_char_p), POINTER(c_size_t)]
+        self._redis_stream_reader_ack.restype = c_int
+        
+        # redis_stream_reader_get_stats(redis_stream_reader* reader, RedisStreamReaderStats* stats) -> int
+        self._redis_stream_reader_get_stats = self._dll.redis_stream_reader_get_stats
+        self._redis_stream_reader_get_stats.argtypes = [c_void_p, POINTER(_RedisStreamReaderStats)]
+        self._redis_stream_reader_get_stats.restype = c_int
     
     def connect(self, hostname: str = "127.0.0.1", port: int = 6379) -> bool:
         """
@@ -126,7 +988,7 @@ class RedisPubSubDLL:
         """
         try:
             with self._lock:
-                result = self._redis_init(hostname.encode('utf-8'), port)
+                result = self._redis_connect(self._handle, hostname.encode('utf-8'), port)
                 if result == 0:
                     self._connected = True
                     # print(f"[OK] Connected to Redis {hostname}:{port}")
@@ -146,112 +1008,1585 @@ class RedisPubSubDLL:
         Returns:
             True表示断开成功
         """
+        # 流消费者的读取线程使用原生客户端，先停止（最多等待一次BLOCK时间）
+        consumers, self._stream_consumers = self._stream_consumers, []
+        for consumer in consumers:
+            consumer.stop()
+        
+        # 先停止线程池，避免订阅线程阻塞在block策略的submit()中导致无法退出
+        dispatcher = self._dispatcher
+        if dispatcher is not None:
+            dispatcher.shutdown(wait=False)
+        conflater = self._conflater
+        if conflater is not None:
+            conflater.shutdown(wait=False, drain=False)
+        
         try:
             with self._lock:
-                result = self._redis_close()
+                result = self._redis_close(self._handle)
                 self._connected = False
                 self._callbacks.clear()
                 self._dll_callbacks.clear()
+                self._patterns.clear()
+                self._dll_pattern_callbacks.clear()
+                self._retired_callbacks.clear()
+                self._dispatcher = None
+                self._conflater = None
                 # print("[OK] Disconnected from Redis")
-                return result == 0
+            
+            if dispatcher is not None:
+                dispatcher.shutdown(wait=True)
+            if conflater is not None:
+                conflater.shutdown(wait=True)
+            return result == 0
         except Exception as e:
             print(f"[ERROR] Disconnection error: {e}")
             return False
     
-    def publish(self, channel: str, message: str) -> int:
+    def publish(self, channel: str, message: Union[str, bytes]) -> int:
         """
-        发布消息到指定频道
+        发布消息到指定频道（二进制安全）
         
         Args:
             channel: 频道名称
-            message: 消息内容
+            message: 消息内容，str按UTF-8编码，bytes原样发送（可包含'\\0'）
         
         Returns:
-            接收消息的订阅者数量，-1表示发送失败
+            接收消息的订阅者数量，-1表示发送失败，
+            PUBLISH_SPOOLED(-2)表示连接断开、消息已进入spool，将在重连后补发；
+            分片模式下PUBLISH_MOVED(-3)表示频道的槽位已迁到其他节点
         """
         if not self._connected:
             print("[ERROR] Not connected to Redis")
             return -1
         
         try:
-            with self._lock:
-                result = self._redis_publish(
-                    channel.encode('utf-8'),
-                    message.encode('utf-8')
-                )
-                # print(f"[PUBLISH] Channel: {channel} | Message: {message}")
-                # print(f"           Subscribers: {result}")
-                return result
+            # 不持有Python锁：原生层从连接池取连接，多个线程可以并行发布
+            channel_bytes = channel.encode('utf-8')
+            payload = _to_bytes(message)
+            if self._compression.enabled:
+                payload = self._compression.compress(channel, payload)
+            result = self._redis_publish_binary(
+                self._handle, channel_bytes, len(channel_bytes),
+                payload, len(payload)
+            )
+            # print(f"[PUBLISH] Channel: {channel} | Message: {message}")
+            # print(f"           Subscribers: {result}")
+            return result
         except Exception as e:
             print(f"[ERROR] Publish error: {e}")
             traceback.print_exc()
             return -1
     
-    def subscribe(self, channel: str, callback: Callable[[str, str], None]) -> bool:
+    def publish_many(self, messages: Iterable[Tuple[str, Union[str, bytes]]]) -> List[int]:
         """
-        订阅频道
+        批量发布消息（管道方式，一次网络往返）
         
         Args:
-            channel: 频道名称
-            callback: 回调函数，签名为 callback(channel: str, message: str) -> None
+            messages: (channel, payload) 元组的可迭代对象，payload可以是str或bytes
         
         Returns:
-            True表示订阅成功
+            每条消息对应的订阅者数量列表，-1表示该条发送失败，PUBLISH_SPOOLED(-2)表示已进入spool
         """
+        channels = []
+        payloads = []
+        compress = self._compression.compress if self._compression.enabled else None
+        for channel, payload in messages:
+            channels.append(channel.encode('utf-8'))
+            payload = _to_bytes(payload)
+            payloads.append(compress(channel, payload) if compress else payload)
+        
+        count = len(channels)
+        if count == 0:
+            return []
+        
         if not self._connected:
             print("[ERROR] Not connected to Redis")
-            return False
+            return [-1] * count
         
-        if not callable(callback):
-            print("[ERROR] Callback must be callable")
+        try:
+            channel_array = (c_char_p * count)(*channels)
+            channel_lens = (c_size_t * count)(*map(len, channels))
+            payload_array = (c_char_p * count)(*payloads)
+            payload_lens = (c_size_t * count)(*map(len, payloads))
+            results = (c_int * count)()
+            
+            published = self._redis_publish_batch(
+                self._handle, count, channel_array, channel_lens,
+                payload_array, payload_lens, results
+            )
+            
+            if published < 0 and self.PUBLISH_SPOOLED not in results:
+                print(f"[ERROR] Batch publish failed with code {published}")
+                return [-1] * count
+            return list(results)
+        except Exception as e:
+            print(f"[ERROR] Batch publish error: {e}")
+            traceback.print_exc()
+            return [-1] * count
+    
+    def set_codec(self, channel: str, codec: Union[str, Codec, None]):
+        """
+        为频道注册编解码器，publish_obj()和该频道的订阅（包括队列模式的poll()）默认使用它
+        
+        Args:
+            channel: 频道名称（psubscribe()时为模式）
+            codec: 编解码器名称（'json'/'binary'/'bytes'/'text'或register_codec()注册的名称）、
+                   编解码器对象，None表示取消注册
+        """
+        if codec is None:
+            self._codecs.pop(channel, None)
+        else:
+            self._codecs[channel] = get_codec(codec)
+    
+    def publish_obj(self, channel: str, obj: Any, codec: Union[str, Codec, None] = None) -> int:
+        """
+        用编解码器编码对象后发布
+        
+        Args:
+            channel: 频道名称
+            obj: 要发布的对象
+            codec: 编解码器名称或对象，None时使用该频道注册的编解码器（没有注册时为JSON）
+        
+        Returns:
+            同publish()
+        """
+        if codec is not None:
+            encoder = get_codec(codec)
+        else:
+            encoder = self._codecs.get(channel) or self._default_codec
+        return self.publish(channel, encoder.encode(obj))
+    
+    def set_compression(self, channel: Optional[str] = None, threshold: int = 1024, level: int = 6,
+                        dictionary: Optional[bytes] = None, enabled: bool = True) -> bool:
+        """
+        开启频道的透明压缩（zlib），不小于阈值的payload压缩后发送，其余payload带未压缩头部发送
+        
+        订阅方也需要对该频道开启压缩，才会识别头部并解压（binary/codec/队列模式的订阅；文本回调按'\\0'截断，
+        收不到带头部的消息），没有开启的频道payload原样投递；使用字典时双方登记同一份字典。
+        带过滤条件的订阅应在订阅前开启压缩，原生层才会跳过头部求值
+        
+        Args:
+            channel: 频道名称，None表示所有没有单独设置的频道
+            threshold: 压缩阈值（字节），较小的payload压缩收益低，不压缩发送
+            level: zlib压缩级别（1~9，-1为默认）
+            dictionary: 可选的预置字典，见redis_compress.train_dictionary()
+            enabled: False表示取消该频道（或默认）的压缩
+        
+        Returns:
+            True表示设置成功
+        """
+        try:
+            self._compression.configure(channel, threshold, level, dictionary, enabled)
+            return True
+        except (TypeError, ValueError, zlib.error) as e:
+            print(f"[ERROR] Invalid compression settings: {e}")
             return False
+    
+    def add_compression_dictionary(self, dictionary: bytes) -> int:
+        """
+        登记用于解压的其他预置字典（例如发布方更换字典期间的旧字典），频道仍需用set_compression()开启
+        
+        Returns:
+            字典的dict_id（adler32）
+        """
+        return self._compression.add_dictionary(dictionary)
+    
+    def stream_publish(self, stream: str, message: Union[str, bytes],
+                       maxlen: Optional[int] = None) -> Optional[str]:
+        """
+        向流追加一个条目（XADD，负载保存在data字段）
+        
+        Args:
+            stream: 流名称
+            message: 消息内容，str按UTF-8编码
+            maxlen: 可选，附带"MAXLEN ~ maxlen"近似裁剪，限制流的长度
+        
+        Returns:
+            条目ID，失败时返回None
+        """
+        return self.stream_publish_many([(stream, message)], maxlen)[0]
+    
+    def stream_publish_many(self, entries: Iterable[Tuple[str, Union[str, bytes]]],
+                            maxlen: Optional[int] = None) -> List[Optional[str]]:
+        """
+        以管道方式批量追加流条目（一次网络往返）
+        
+        Args:
+            entries: (stream, payload) 元组的可迭代对象
+            maxlen: 同stream_publish()
+        
+        Returns:
+            每个条目的ID，失败的条目为None
+        """
+        streams = []
+        payloads = []
+        compress = self._compression.compress if self._compression.enabled else None
+        for stream, payload in entries:
+            streams.append(stream.encode('utf-8'))
+            payload = _to_bytes(payload)
+            payloads.append(compress(stream, payload) if compress else payload)
+        
+        count = len(streams)
+        if count == 0:
+            return []
+        
+        if not self._connected:
+            print("[ERROR] Not connected to Redis")
+            return [None] * count
         
         try:
-            with self._lock:
-                # 创建C回调函数
-                def c_callback(channel_ptr, message_ptr):
-                    try:
-                        channel_str = channel_ptr.decode('utf-8') if isinstance(channel_ptr, bytes) else channel_ptr
-                        message_str = message_ptr.decode('utf-8') if isinstance(message_ptr, bytes) else message_ptr
-                        # print(f"\n[CALLBACK] Received from '{channel_str}':")
-                        # print(f"           Message: {message_str}")
-                        callback(channel_str, message_str)
-                    except Exception as e:
-                        print(f"[ERROR] Callback error: {e}")
-                        traceback.print_exc()
-                
-                # 保存Python回调
-                self._callbacks[channel] = callback
-                
-                # 创建并保存C回调（必须保持引用）
-                dll_callback = self._PubSubCallback(c_callback)
-                self._dll_callbacks[channel] = dll_callback
-                
-                # 调用DLL订阅函数
-                result = self._redis_subscribe(channel.encode('utf-8'), dll_callback)
-                
-                if result == 0:
-                    # print(f"[OK] Subscribed to channel: {channel}")
-                    return True
-                else:
-                    print(f"[ERROR] Subscribe failed with code {result}")
-                    del self._callbacks[channel]
-                    del self._dll_callbacks[channel]
-                    return False
-                    
+            ids = ctypes.create_string_buffer(count * _STREAM_ID_MAX)
+            added = self._redis_stream_add(
+                self._handle, count,
+                (c_char_p * count)(*streams), (c_size_t * count)(*map(len, streams)),
+                (c_char_p * count)(*payloads), (c_size_t * count)(*map(len, payloads)),
+                maxlen or 0, ids
+            )
+            if added < 0:
+                return [None] * count
+            raw = ids.raw
+            return [raw[i * _STREAM_ID_MAX:(i + 1) * _STREAM_ID_MAX].split(b'\0', 1)[0].decode('ascii') or None
+                    for i in range(count)]
         except Exception as e:
-            print(f"[ERROR] Subscribe error: {e}")
+            print(f"[ERROR] Stream publish error: {e}")
             traceback.print_exc()
+            return [None] * count
+    
+    def stream_create_group(self, stream: str, group: str, start_id: str = '$') -> bool:
+        """
+        创建消费者组（流不存在时一并创建），组已存在时也返回True
+        
+        Args:
+            stream: 流名称
+            group: 组名
+            start_id: '$'只消费之后追加的条目，'0'从头消费
+        """
+        if not self._connected:
+            print("[ERROR] Not connected to Redis")
             return False
+        
+        stream_bytes = stream.encode('utf-8')
+        group_bytes = group.encode('utf-8')
+        return self._redis_stream_group_create(self._handle, stream_bytes, len(stream_bytes),
+                                               group_bytes, len(group_bytes), start_id.encode('ascii')) == 0
     
-    def is_connected(self) -> bool:
-        """检查是否已连接"""
-        return self._connected
+    def stream_consume(self, streams: Union[str, Iterable[str]], group: str,
+                       handler: Callable[['StreamMessage'], None], consumer: Optional[str] = None,
+                       count: int = 256, block_ms: int = 1000, dispatch: bool = False,
+                       codec: Union[str, Codec, None] = None, start_id: str = '$',
+                       auto_ack: bool = True) -> Optional[StreamConsumer]:
+        """
+        作为消费者组的一员消费流（XREADGROUP ... COUNT count BLOCK block_ms）
+        
+        同一组的多个消费者（可以在不同进程中）分摊条目，每个条目只交给其中一个；
+        消费者有独立的读取连接和读取线程，一次往返最多读取count条（每个流），
+        确认（XACK）按流合并，随下一次读取一起写出
+        
+        Args:
+            streams: 流名称或名称列表
+            group: 消费者组名，不存在时按start_id创建
+            handler: 处理函数，签名为 handler(message: StreamMessage) -> None，message.channel为流名称
+            consumer: 消费者名称，默认为"主机名-进程号-序号"；需要在重启后继续处理未确认的条目时应使用固定名称
+            count: 每个流每次最多读取的条目数
+            block_ms: 没有新条目时每次最多等待的时间（毫秒），也是stop()最长的等待时间
+            dispatch: 为True时处理函数在处理线程池中执行（按流保序），见enable_dispatch()
+            codec: 编解码器名称或对象，message.value在第一次访问时用它解码（见set_codec()）
+            start_id: 创建消费者组时的起始位置，'$'或'0'
+            auto_ack: 为True时处理函数正常返回后自动确认；为False时调用返回的StreamConsumer.ack(message)
+        
+        Returns:
+            已启动的StreamConsumer，失败时返回None
+        """
+        if not self._connected:
+            print("[ERROR] Not connected to Redis")
+            return None
+        
+        streams = [streams] if isinstance(streams, str) else list(streams)
+        if not streams or not callable(handler) or count <= 0 or block_ms < 0:
+            print("[ERROR] Invalid stream consumer arguments")
+            return None
+        
+        try:
+            decoder = get_codec(codec) if codec is not None else None
+        except (TypeError, ValueError) as e:
+            print(f"[ERROR] {e}")
+            return None
+        
+        if dispatch and self._dispatcher is None and not self.enable_dispatch():
+            return None
+        
+        for stream in streams:
+            if not self.stream_create_group(stream, group, start_id):
+                return None
+        
+        if consumer is None:
+            consumer = f"{socket.gethostname()}-{os.getpid()}-{next(self._consumer_names)}"
+        
+        stream_consumer = StreamConsumer(self, streams, group, consumer, handler, count, block_ms,
+                                         dispatch, decoder, auto_ack)
+        if not stream_consumer.start():
+            return None
+        self._stream_consumers.append(stream_consumer)
+        return stream_consumer
+    
+    def publish_nowait(self, channel: str, message: Union[str, bytes],
+                       callback: Optional[Callable[[int], None]] = None) -> bool:
+        """
+        异步发布消息（不等待Redis回复）
+        
+        消息复制到原生队列后立即返回，由原生事件循环合并为管道批量发送；
+        同一实例的异步消息按调用顺序发送。需要确认送达时调用flush()
+        
+        Args:
+            channel: 频道名称
+            message: 消息内容，str按UTF-8编码，bytes原样发送
+            callback: 可选，callback(subscribers: int)在原生事件循环线程中调用，发送失败时为-1
+        
+        Returns:
+            True表示已进入发送队列
+        """
+        channel_bytes = channel.encode('utf-8')
+        payload = message if type(message) is bytes else _to_bytes(message)
+        if self._compression.enabled:
+            payload = self._compression.compress(channel, payload)
+        
+        if callback is None:
+            return self._redis_publish_nowait(
+                self._handle, channel_bytes, len(channel_bytes),
+                payload, len(payload), self._no_completion, None
+            ) > 0
+        
+        token = next(self._completion_tokens)
+        self._completions[token] = callback
+        if self._redis_publish_nowait(
+            self._handle, channel_bytes, len(channel_bytes),
+            payload, len(payload), self._dll_completion, token
+        ) > 0:
+            return True
+        del self._completions[token]
+        return False
+    
+    def publish_async(self, channel: str, message: Union[str, bytes]) -> Future:
+        """
+        异步发布消息，返回的Future在事件循环收到回复后完成
+        
+        Args:
+            channel: 频道名称
+            message: 消息内容
+        
+        Returns:
+            concurrent.futures.Future，结果为订阅者数量，发送失败为-1
+        """
+        future = Future()
+        if not self.publish_nowait(channel, message, future.set_result):
+            future.set_result(-1)
+        return future
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待此前所有publish_nowait()/publish_async()的消息发送完成，返回True时它们的完成回调都已执行
+        
+        Args:
+            timeout: 最长等待时间（秒），None表示一直等待
+        
+        Returns:
+            True表示全部完成，False表示超时
+        """
+        timeout_ms = -1 if timeout is None else int(timeout * 1000)
+        return self._redis_flush(self._handle, timeout_ms) == 0
+    
+    def set_async_publish(self, max_batch: int = 1024, max_pending: int = 65536,
+                          linger_ms: int = 0) -> bool:
+        """
+        设置异步发布参数，对之后提交的消息生效
+        
+        Args:
+            max_batch: 攒够这么多条立即发送
+            max_pending: 未完成消息数上限，超过时publish_nowait()阻塞等待
+            linger_ms: 不足max_batch时事件循环最多再等待的毫秒数，0表示被唤醒后立即发送
+        
+        Returns:
+            True表示设置成功
+        """
+        return self._redis_set_async_publish(self._handle, max_batch, max_pending, linger_ms) == 0
+    
+    def async_publish_stats(self) -> Dict[str, int]:
+        """
+        获取异步发布统计信息
+        
+        Returns:
+            包含submitted/completed/failed/pending/batches的字典
+        """
+        stats = _RedisAsyncStats()
+        self._redis_get_async_stats(self._handle, ctypes.byref(stats))
+        return {name: getattr(stats, name) for name, _ in stats._fields_}
+    
+    def _on_publish_complete(self, token, subscribers):
+        """事件循环线程中调用：把订阅者数量交给publish_nowait()的callback"""
+        callback = self._completions.pop(token, None)
+        if callback is None:
+            return
+        try:
+            callback(subscribers)
+        except Exception as e:
+            print(f"[ERROR] Publish callback error: {e}")
+            traceback.print_exc()
+    
+    def set_publish_pool(self, size: int, mode: str = 'round_robin') -> bool:
+        """
+        设置发布连接池，只能在connect()之前调用
+        
+        Args:
+            size: 发布连接数（1~64）
+            mode: 'round_robin'轮询空闲连接；'thread_affine'同一线程固定使用同一连接（保持线程内顺序）
+        
+        Returns:
+            True表示设置成功
+        """
+        if mode not in self._POOL_MODES:
+            print(f"[ERROR] Invalid pool mode: {mode}")
+            return False
+        return self._redis_set_publish_pool(self._handle, size, self._POOL_MODES[mode]) == 0
+    
+    def pool_stats(self) -> Dict[str, int]:
+        """
+        获取发布连接池统计信息，用于观察发布线程之间的争用
+        
+        Returns:
+            包含size/acquired/contended/wait_total_us/wait_max_us/wait_avg_us的字典，
+            wait_avg_us为发生等待时的平均等待时间
+        """
+        stats = _RedisPoolStats()
+        self._redis_get_pool_stats(self._handle, ctypes.byref(stats))
+        result = {name: getattr(stats, name) for name, _ in stats._fields_}
+        result['wait_avg_us'] = stats.wait_total_us // stats.contended if stats.contended else 0
+        return result
+    
+    def set_reconnect(self, initial_ms: int = 100, max_ms: int = 5000,
+                      spool_max: int = 10000) -> bool:
+        """
+        设置断线重连（默认已启用，参数同默认值）
+        
+        连接断开后立即重连一次，之后按initial_ms起、每次翻倍、不超过max_ms的退避时间（带随机抖动）重试；
+        订阅连接恢复后自动重新订阅所有频道和模式。断开期间的发布最多积压spool_max条，
+        重连后以管道一次补发，publish()此时返回PUBLISH_SPOOLED
+        
+        Args:
+            initial_ms: 首次退避时间（毫秒），0表示关闭自动重连
+            max_ms: 最长退避时间（毫秒）
+            spool_max: 断开期间最多积压的消息数，超过时发布返回-1
+        
+        Returns:
+            True表示设置成功
+        """
+        return self._redis_set_reconnect(self._handle, initial_ms, max_ms, spool_max) == 0
+    
+    def reconnect_stats(self) -> Dict[str, int]:
+        """
+        获取断线重连统计信息，可用于告警（disconnected > 0、spool_depth持续增长等）
+        
+        Returns:
+            包含reconnects/failed_attempts/disconnected/last_outage_ms/max_outage_ms/
+            spool_depth/spool_max/spool_dropped的字典
+        """
+        stats = _RedisReconnectStats()
+        self._redis_get_reconnect_stats(self._handle, ctypes.byref(stats))
+        return {name: getattr(stats, name) for name, _ in stats._fields_}
+    
+    def set_subscriber_shards(self, count: int) -> bool:
+        """
+        设置订阅分片数，只能在connect()之前调用
+        
+        频道/模式按名称哈希分配到分片，每个分片有独立的订阅连接和原生事件循环线程，
+        RESP解析和查表分发在各分片线程中并行执行（不持有GIL），只有回调本身进入Python。
+        同一频道的消息总在同一个线程中按顺序回调，不同分片的回调可能并发执行
+        
+        Args:
+            count: 分片数（1~64），默认1
+        
+        Returns:
+            True表示设置成功
+        """
+        return self._redis_set_subscriber_shards(self._handle, count) == 0
+    
+    def shard_stats(self) -> List[Dict[str, int]]:
+        """
+        获取各订阅分片的统计信息，用于观察频道分布是否均衡
+        
+        Returns:
+            每个分片一个字典，包含channels/patterns/messages/connected，未连接过时为空列表
+        """
+        stats = (_RedisShardStats * 64)()
+        count = self._redis_get_shard_stats(self._handle, stats, len(stats))
+        return [{name: getattr(stats[i], name) for name, _ in stats[i]._fields_}
+                for i in range(max(count, 0))]
+    
+    def set_sharded_pubsub(self, enabled: bool = True) -> bool:
+        """
+        使用分片发布/订阅（Redis 7 Cluster的SPUBLISH/SSUBSCRIBE），只能在connect()之前调用
+        
+        实例只连接一个节点，只应发布/订阅槽位属于该节点的频道，通常由redis_cluster.RedisClusterPubSub
+        按槽位路由；不支持psubscribe()。槽位不属于该节点时publish()返回PUBLISH_MOVED
+        
+        Returns:
+            True表示设置成功
+        """
+        return self._redis_set_sharded_pubsub(self._handle, 1 if enabled else 0) == 0
+    
+    def set_moved_handler(self, handler: Optional[Callable[[Optional[str], Optional[str]], None]]) -> bool:
+        """
+        设置槽位迁移通知，只能在connect()之前调用
+        
+        Args:
+            handler: 签名为 handler(channel, error) -> None，在订阅线程中调用，不要在其中阻塞：
+                     channel不为None时，服务器因槽位迁出主动取消了该频道的订阅（已从订阅表移除）；
+                     channel为None时，error为订阅命令收到的"MOVED slot host:port"。为None时关闭
+        
+        Returns:
+            True表示设置成功
+        """
+        hook = self._ClusterMovedHook()
+        if handler is not None:
+            def on_moved(userdata, channel_ptr, channel_len, error):
+                try:
+                    channel = (ctypes.string_at(channel_ptr, channel_len).decode('utf-8', 'replace')
+                               if channel_ptr else None)
+                    handler(channel, error.decode('utf-8', 'replace') if error else None)
+                except Exception as e:
+                    print(f"[ERROR] Moved handler error: {e}")
+                    traceback.print_exc()
+            
+            hook = self._ClusterMovedHook(on_moved)
+        
+        if self._redis_set_moved_handler(self._handle, hook, None) != 0:
+            return False
+        self._moved_hook = hook
+        return True
+    
+    def cluster_slots(self) -> List[Tuple[int, int, str, int]]:
+        """
+        查询所连节点的CLUSTER SLOTS
+        
+        Returns:
+            (start, end, host, port)列表（end含，只包含主节点），出错时返回空列表
+        """
+        if not self._connected:
+            print("[ERROR] Not connected to Redis")
+            return []
+        
+        slots = (_RedisClusterSlots * 1024)()
+        count = self._redis_cluster_slots(self._handle, slots, len(slots))
+        return [(slots[i].start, slots[i].end, slots[i].host.decode('utf-8'), slots[i].port)
+                for i in range(max(count, 0))]
+    
+    def keyslot(self, channel: Union[str, bytes]) -> int:
+        """频道名的集群槽位（0~16383，支持{hash tag}），与CLUSTER KEYSLOT相同"""
+        name = channel.encode('utf-8') if isinstance(channel, str) else channel
+        return self._redis_cluster_keyslot(name, len(name))
+    
+    def set_local_delivery(self, enabled: bool = True, suppress_echo: bool = True) -> bool:
+        """
+        设置本地投递（默认关闭，可随时调用）
+        
+        启用后publish()/publish_many()/publish_nowait()照常把消息发送到Redis供其他进程订阅，
+        消息发出（收到回复、进入spool或进入异步发布队列）后在调用线程中直接交给本实例对该频道的订阅
+        （回调、dispatch线程池或投递队列），不再经过订阅连接；发送失败的消息不在本地投递。
+        只匹配subscribe()的频道，psubscribe()仍经过Redis。
+        本地投递的回调在发布线程中执行，可能与订阅线程中的回调并发
+        
+        Args:
+            enabled: 是否启用本地投递
+            suppress_echo: 是否丢弃Redis回传给本实例的副本（按消息内容匹配，10秒内有效）；
+                           为False时本地订阅会收到两次
+        
+        Returns:
+            True表示设置成功
+        """
+        return self._redis_set_local_delivery(self._handle, int(enabled), int(suppress_echo)) == 0
+    
+    def local_stats(self) -> Dict[str, int]:
+        """
+        获取本地投递统计信息
+        
+        Returns:
+            包含delivered/echo_suppressed/echo_expired的字典，
+            echo_expired持续增长说明回传副本没有按时到达（订阅连接断开或消息未送达Redis）
+        """
+        stats = _RedisLocalStats()
+        self._redis_get_local_stats(self._handle, ctypes.byref(stats))
+        return {name: getattr(stats, name) for name, _ in stats._fields_}
+    
+    def stats(self, channels: bool = False) -> Dict[str, Any]:
+        """
+        获取原生层的统计信息（计数器和直方图由原生层用原子操作维护，读取不加锁）
+        
+        Args:
+            channels: 为True时同时返回各频道的收发计数
+        
+        Returns:
+            包含messages_in/bytes_in/messages_out/bytes_out/publish_errors/reconnects/
+            slow_callbacks/channels_tracked/conflated/filtered的字典，publish_rtt/callback_time为直方图
+            （count/sum_ns/max_ns/buckets，另含summarize()换算的mean_us/max_us/p50_us/p90_us/p99_us/p999_us）；
+            channels为 {频道名: {messages_in, bytes_in, messages_out, bytes_out, conflated}}。
+            conflated只统计原生层合并投递覆盖的消息，dispatch/key_fn方式的合并见conflation_stats()；
+            filtered为被过滤条件拒绝的消息数，各订阅的计数见filter_stats()。
+            dispatch=True的订阅只统计交给线程池的时间，不含回调本身。
+            compression为Python层按频道的压缩统计 {频道名: {compressed, skipped, raw_bytes, compressed_bytes,
+            ratio, compress_us_per_msg, decompressed, decompress_us_per_msg, errors, ...}}（CPU时间）
+        """
+        raw = _RedisStats()
+        self._redis_get_stats(self._handle, ctypes.byref(raw))
+        result: Dict[str, Any] = {name: getattr(raw, name) for name, _ in raw._fields_[:10]}
+        for name in ('publish_rtt', 'callback_time'):
+            histogram = getattr(raw, name).to_dict()
+            histogram.update(summarize(histogram))
+            result[name] = histogram
+        result['compression'] = self._compression.stats()
+        
+        if channels:
+            capacity = max(raw.channels_tracked, 1)
+            buffer = (_RedisChannelStats * capacity)()
+            count = self._redis_get_channel_stats(self._handle, buffer, capacity)
+            result['channels'] = {
+                ctypes.string_at(item.channel, item.channel_len).decode('utf-8', 'replace'): {
+                    'messages_in': item.messages_in, 'bytes_in': item.bytes_in,
+                    'messages_out': item.messages_out, 'bytes_out': item.bytes_out,
+                    'conflated': item.conflated,
+                }
+                for item in buffer[:max(count, 0)]
+            }
+        return result
+    
+    def set_channel_stats(self, max_channels: int = 1024) -> bool:
+        """
+        设置最多为多少个频道单独计数，超出的频道只计入总数
+        
+        Args:
+            max_channels: 频道数上限（默认1024），0表示不按频道计数（省去每条消息一次查表）
+        
+        Returns:
+            True表示设置成功
+        """
+        return self._redis_set_channel_stats(self._handle, max_channels) == 0
+    
+    def set_slow_handler(self, threshold_ms: float,
+                         handler: Optional[Callable[[str, float], None]] = None) -> bool:
+        """
+        设置慢回调阈值，执行时间达到threshold_ms的订阅回调计入stats()['slow_callbacks']
+        
+        Args:
+            threshold_ms: 阈值（毫秒），0表示关闭
+            handler: 可选，签名为 handler(channel: str, elapsed_ms: float) -> None，
+                     在执行慢回调的线程中、回调返回后调用
+        
+        Returns:
+            True表示设置成功
+        """
+        hook = self._no_slow_hook
+        if handler is not None:
+            def on_slow(userdata, channel_ptr, channel_len, elapsed_ns):
+                try:
+                    channel = ctypes.string_at(channel_ptr, channel_len).decode('utf-8', 'replace')
+                    handler(channel, elapsed_ns / 1e6)
+                except Exception as e:
+                    print(f"[ERROR] Slow handler error: {e}")
+                    traceback.print_exc()
+            
+            hook = self._SlowHandlerHook(on_slow)
+        
+        result = self._redis_set_slow_handler(self._handle, int(threshold_ms * 1000), hook, None)
+        if result != 0:
+            return False
+        
+        # 正在执行的旧钩子可能还在使用，保留引用
+        if self._slow_hook is not None:
+            self._retired_callbacks.append(self._slow_hook)
+        self._slow_hook = hook
+        return True
+    
+    def enable_dispatch(self, workers: int = 4, queue_size: int = 1024,
+                        overflow: str = 'block') -> bool:
+        """
+        配置处理线程池，供subscribe(..., dispatch=True)使用
+        
+        未调用时，第一次使用dispatch=True会按默认参数创建线程池；断开连接时线程池随之停止
+        
+        Args:
+            workers: 工作线程数，同一频道的消息总是由同一个工作线程按顺序处理
+            queue_size: 每个工作线程的队列上限
+            overflow: 队列满时的处理策略：'block'阻塞订阅线程（背压），
+                      'drop_oldest'丢弃最早的消息，'drop_newest'丢弃新消息
+        
+        Returns:
+            True表示配置成功，线程池已存在时返回False
+        """
+        with self._lock:
+            if self._dispatcher is not None:
+                print("[ERROR] Dispatcher already enabled")
+                return False
+            try:
+                self._dispatcher = KeyedDispatcher(workers, queue_size, overflow)
+            except ValueError as e:
+                print(f"[ERROR] {e}")
+                return False
+            return True
+    
+    def dispatch_stats(self) -> Dict[str, Any]:
+        """
+        获取处理线程池统计信息
+        
+        Returns:
+            包含queued/submitted/processed/dropped/errors等字段的字典，未启用时返回空字典
+        """
+        dispatcher = self._dispatcher
+        return dispatcher.stats() if dispatcher is not None else {}
+    
+    def enable_conflation(self, workers: int = 4) -> bool:
+        """
+        配置只保留最新值的处理线程池，供subscribe(..., conflate=True)与dispatch=True或key_fn同时使用
+        
+        未调用时第一次需要时按默认参数创建；断开连接时线程池随之停止，尚未执行的任务丢弃
+        
+        Args:
+            workers: 工作线程数，同一个key的消息总是由同一个工作线程处理
+        
+        Returns:
+            True表示配置成功，线程池已存在时返回False
+        """
+        with self._lock:
+            if self._conflater is not None:
+                print("[ERROR] Conflation already enabled")
+                return False
+            try:
+                self._conflater = LatestValueDispatcher(workers)
+            except ValueError as e:
+                print(f"[ERROR] {e}")
+                return False
+            return True
+    
+    def conflation_stats(self) -> Dict[str, Any]:
+        """
+        获取合并投递的统计信息
+        
+        Returns:
+            native_conflated为原生层合并掉的消息数（同stats()['conflated']）；
+            使用了合并线程池时另含workers/pending/submitted/processed/conflated/errors
+        """
+        raw = _RedisStats()
+        self._redis_get_stats(self._handle, ctypes.byref(raw))
+        conflater = self._conflater
+        result = conflater.stats() if conflater is not None else {}
+        result['native_conflated'] = raw.conflated
+        return result
+    
+    def subscribe(self, channel: str, callback: Optional[Callable[..., None]] = None,
+                  binary: bool = False, dispatch: bool = False,
+                  codec: Union[str, Codec, None] = None, conflate: bool = False,
+                  key_fn: Optional[Callable[[Any], Any]] = None,
+                  filters: Optional[Iterable[Filter]] = None) -> bool:
+        """
+        订阅频道
+        
+        Args:
+            channel: 频道名称
+            callback: 回调函数，签名为 callback(channel: str, message: str) -> None；
+                      binary=True时签名为 callback(message: Message) -> None；
+                      为None时消息进入原生投递队列，通过poll()/iter_messages()批量获取
+            binary: 是否使用二进制安全模式（按长度传递，不截断'\\0'，不做UTF-8解码）
+            dispatch: 为True时回调在处理线程池中执行（按频道保序），
+                      慢回调不会阻塞订阅线程和其他频道，见enable_dispatch()
+            codec: 编解码器名称或对象（见set_codec()），指定时按binary=True回调，
+                   message.value在第一次访问时才用该编解码器解码
+            conflate: 为True时只投递最新值：回调（或队列）忙时积压的消息只保留最新的一条，
+                      回调次数由回调本身的速度决定而不是发布速率，被覆盖的消息计入stats()['conflated']；
+                      同时指定dispatch=True时改由合并线程池按频道保留最新值（见enable_conflation()）
+            key_fn: 按key而不是按频道合并（隐含conflate=True）：key_fn(message)从回调收到的消息
+                    （binary模式为Message，否则为str）中取出key，每个key保留最新一条，
+                    回调在合并线程池中执行
+            filters: redis_filter中的过滤条件（prefix/contains/at/json_field），全部满足的消息才投递，
+                     在原生层对原始payload求值，被拒绝的消息不进入Python；重复订阅时按本次参数替换
+        
+        Returns:
+            True表示订阅成功
+        """
+        return self._add_subscription(channel, callback, binary, pattern=False, dispatch=dispatch,
+                                      codec=codec, conflate=conflate, key_fn=key_fn, filters=filters)
+    
+    def subscribe_many(self, channels: Union[Iterable[str], Dict[str, Callable[..., None]]],
+                       callback: Optional[Callable[..., None]] = None, binary: bool = False,
+                       dispatch: bool = False, codec: Union[str, Codec, None] = None,
+                       conflate: bool = False, key_fn: Optional[Callable[[Any], Any]] = None,
+                       filters: Optional[Iterable[Filter]] = None) -> bool:
+        """
+        批量订阅频道：每个订阅分片只发送一条SUBSCRIBE，各分片并行等待确认，
+        订阅几千个频道也只需要一个网络往返；所有频道共用一个C回调，按频道名查找处理函数
+        
+        Args:
+            channels: 频道名称的可迭代对象（共用callback），或 {频道: 回调} 字典
+            callback: 同subscribe()，channels为字典时必须为None
+            binary: 同subscribe()
+            dispatch: 同subscribe()
+            codec: 同subscribe()，对所有频道生效
+            conflate: 同subscribe()
+            key_fn: 同subscribe()
+            filters: 同subscribe()，对所有频道生效
+        
+        Returns:
+            True表示全部订阅成功；失败时本次新增的订阅全部取消
+        """
+        if not self._connected:
+            print("[ERROR] Not connected to Redis")
+            return False
+        
+        if isinstance(channels, dict):
+            if callback is not None:
+                print("[ERROR] Callback must be None when channels is a dict")
+                return False
+            handlers = dict(channels)
+        else:
+            handlers = dict.fromkeys(channels, callback)
+        if not handlers:
+            return True
+        
+        queued = all(handler is None for handler in handlers.values())
+        if not queued and not all(handler is not None and callable(handler) for handler in handlers.values()):
+            print("[ERROR] Callback must be callable")
+            return False
+        
+        if dispatch and queued:
+            print("[ERROR] Dispatch mode requires a callback")
+            return False
+        
+        conflate_submit = self._conflation_submit(conflate, dispatch, key_fn, queued)
+        if conflate_submit is False:
+            return False
+        conflate = conflate or key_fn is not None
+        
+        try:
+            filters = _filter_list(filters)
+        except TypeError as e:
+            print(f"[ERROR] {e}")
+            return False
+        
+        decoder = None
+        if codec is not None:
+            try:
+                decoder = get_codec(codec)
+            except (TypeError, ValueError) as e:
+                print(f"[ERROR] {e}")
+                return False
+            binary = True
+        
+        if dispatch and conflate_submit is None and self._dispatcher is None and not self.enable_dispatch():
+            return False
+        
+        names = list(handlers)
+        encoded = [name.encode('utf-8') for name in names]
+        name_array = (c_char_p * len(names))(*encoded)
+        len_array = (c_size_t * len(names))(*[len(name) for name in encoded])
+        native = int(conflate and conflate_submit is None)
+        
+        try:
+            with self._lock:
+                channel_names = self._channel_names
+                for name, name_bytes in zip(names, encoded):
+                    channel_names[name_bytes] = name
+                added = [name for name in names if name not in self._callbacks]
+                
+                if not all(self._stage_options(name, name_bytes, False, native, filters)
+                           for name, name_bytes in zip(names, encoded)):
+                    self._discard_options(encoded, False)
+                    return False
+                previous_codecs = self._register_codecs(names, decoder)
+                
+                if queued:
+                    dll_callback = None
+                    result = self._redis_subscribe_many_queued(self._handle, len(names), name_array, len_array)
+                else:
+                    codecs = self._codecs
+                    routes = {name_bytes: (name, handlers[name], codecs.get(name))
+                              for name, name_bytes in zip(names, encoded)}
+                    decompress = self._compression.decompress
+                    submit = self._dispatcher.submit if dispatch else None
+                    if conflate_submit is not None:
+                        submit = conflate_submit
+                    
+                    # 一个C回调服务本批的全部频道：按频道名bytes查出str、处理函数和编解码器
+                    def c_callback(channel_ptr, channel_len, data_ptr, data_len):
+                        try:
+                            channel, handler, decoder = routes[ctypes.string_at(channel_ptr, channel_len)]
+                            data = ctypes.string_at(data_ptr, data_len)
+                            if binary:
+                                if data[:3] == _COMPRESSED:
+                                    data = decompress(channel, data)
+                                    if data is None:
+                                        return
+                                args = (Message(channel, data, decoder),)
+                            else:
+                                args = (channel, data.decode('utf-8'))
+                            if key_fn is not None:
+                                submit((channel, key_fn(args[-1])), handler, *args)
+                            elif submit is not None:
+                                submit(channel, handler, *args)
+                            else:
+                                handler(*args)
+                        except Exception as e:
+                            print(f"[ERROR] Callback error: {e}")
+                            traceback.print_exc()
+                    
+                    dll_callback = self._PubSubBinaryCallback(c_callback)
+                    result = self._redis_subscribe_many(self._handle, len(names), name_array, len_array,
+                                                        dll_callback)
+                
+                # 被替换的旧回调可能仍在执行，暂不释放；新的C回调由本批每个频道共同引用
+                retired = {}
+                for name in names:
+                    self._callbacks[name] = handlers[name]
+                    previous = self._dll_callbacks.pop(name, None)
+                    if previous is not None:
+                        retired[id(previous)] = previous
+                    if dll_callback is not None:
+                        self._dll_callbacks[name] = dll_callback
+                self._retired_callbacks.extend(retired.values())
+                
+                if result != 0:
+                    print(f"[ERROR] Subscribe failed with code {result}")
+                    self._remove_channels(added)
+                    self._discard_options(encoded, False)
+                    self._restore_codecs({name: previous_codecs[name] for name in added if name in previous_codecs})
+                    return False
+                return True
+        except Exception as e:
+            print(f"[ERROR] Subscribe error: {e}")
+            traceback.print_exc()
+            return False
+    
+    def subscribe_batch(self, channel: str, handler: Callable[[Any], None], max_batch: int = 256,
+                        max_delay_ms: int = 10, dtype: Any = None,
+                        filters: Optional[Iterable[Filter]] = None) -> bool:
+        """
+        批量订阅频道：原生层把消息攒成批，每批只调用一次handler
+        
+        一批在攒够max_batch条，或第一条消息到达后经过max_delay_ms毫秒时投递（0表示每轮读取结束时），
+        每批只有一次ctypes回调和一次数据复制，高频频道的开销从每条消息一次变为每批一次
+        
+        Args:
+            channel: 频道名称
+            handler: dtype为None时签名为 handler(messages: List[Message]) -> None；
+                     指定dtype时签名为 handler(records: numpy.ndarray) -> None
+            max_batch: 每批最多的消息数（1~65536）
+            max_delay_ms: 一批中第一条消息最多等待的毫秒数
+            dtype: NumPy dtype（例如结构化的 [('sensor', '<u4'), ('value', '<f8')]），需要安装numpy；
+                   指定时payload必须是dtype.itemsize字节的定长记录，整批复制到一块连续缓冲区后
+                   以np.frombuffer交给handler（可写，不为每条记录创建Python对象），
+                   长度不符的消息在原生层丢弃并计入stats()['filtered']；不能用于开启了压缩的频道
+            filters: 同subscribe()
+        
+        Returns:
+            True表示订阅成功；重复订阅时按本次参数替换处理方式
+        """
+        if not self._connected:
+            print("[ERROR] Not connected to Redis")
+            return False
+        
+        if not callable(handler):
+            print("[ERROR] Callback must be callable")
+            return False
+        
+        if not 1 <= max_batch <= 65536 or max_delay_ms < 0:
+            print("[ERROR] Invalid batch size or delay")
+            return False
+        
+        record_size = 0
+        if dtype is not None:
+            try:
+                import numpy as np
+            except ImportError:
+                print("[ERROR] subscribe_batch(dtype=...) requires numpy")
+                return False
+            try:
+                dtype = np.dtype(dtype)
+            except TypeError as e:
+                print(f"[ERROR] Invalid dtype: {e}")
+                return False
+            record_size = dtype.itemsize
+            if record_size == 0:
+                print("[ERROR] dtype must have a non-zero itemsize")
+                return False
+            if self._compression.configured(channel):
+                print("[ERROR] subscribe_batch(dtype=...) cannot be used on a compressed channel")
+                return False
+        
+        try:
+            filters = _filter_list(filters)
+        except TypeError as e:
+            print(f"[ERROR] {e}")
+            return False
+        
+        if dtype is not None:
+            frombuffer = np.frombuffer
+            memmove = ctypes.memmove
+            
+            # 定长记录：原生层已保证每条都是record_size字节，整批一次复制到可写的bytearray
+            def c_callback(userdata, channel_ptr, channel_len, count, data_ptr, lens_ptr):
+                try:
+                    size = count * record_size
+                    buffer = bytearray(size)
+                    memmove((ctypes.c_char * size).from_buffer(buffer), data_ptr, size)
+                    handler(frombuffer(buffer, dtype=dtype))
+                except Exception as e:
+                    print(f"[ERROR] Callback error: {e}")
+                    traceback.print_exc()
+        else:
+            decoder = self._codecs.get(channel)
+            decompress = self._compression.decompress
+            string_at = ctypes.string_at
+            
+            # 整批payload复制一次，再按长度切分为Message
+            def c_callback(userdata, channel_ptr, channel_len, count, data_ptr, lens_ptr):
+                try:
+                    lens = lens_ptr[:count]
+                    data = string_at(data_ptr, sum(lens))
+                    messages = []
+                    offset = 0
+                    for length in lens:
+                        payload = data[offset:offset + length]
+                        offset += length
+                        if payload[:3] == _COMPRESSED:
+                            payload = decompress(channel, payload)
+                            if payload is None:
+                                continue
+                        messages.append(Message(channel, payload, decoder))
+                    if messages:
+                        handler(messages)
+                except Exception as e:
+                    print(f"[ERROR] Callback error: {e}")
+                    traceback.print_exc()
+        
+        try:
+            with self._lock:
+                name_bytes = channel.encode('utf-8')
+                dll_callback = self._PubSubBatchCallback(c_callback)
+                
+                if not self._stage_options(channel, name_bytes, False, 0, filters):
+                    return False
+                
+                # 被替换的旧回调可能仍在执行，保留到断开连接
+                self._callbacks[channel] = handler
+                previous = self._dll_callbacks.get(channel)
+                if previous is not None:
+                    self._retired_callbacks.append(previous)
+                self._dll_callbacks[channel] = dll_callback
+                
+                result = self._redis_subscribe_batch(self._handle, name_bytes, len(name_bytes),
+                                                     max_batch, max_delay_ms, record_size, dll_callback, None)
+                if result == 0:
+                    return True
+                print(f"[ERROR] Subscribe failed with code {result}")
+                self._discard_options([name_bytes], False)
+                del self._callbacks[channel]
+                del self._dll_callbacks[channel]
+                return False
+        except Exception as e:
+            print(f"[ERROR] Subscribe error: {e}")
+            traceback.print_exc()
+            return False
+    
+    def unsubscribe(self, channel: str) -> bool:
+        """
+        取消订阅频道
+        
+        Args:
+            channel: subscribe()/subscribe_many()时使用的频道
+        
+        Returns:
+            True表示取消成功
+        """
+        if channel not in self._callbacks:
+            print(f"[ERROR] Channel not subscribed: {channel}")
+            return False
+        return self.unsubscribe_many([channel])
+    
+    def unsubscribe_many(self, channels: Iterable[str]) -> bool:
+        """
+        批量取消订阅：每个订阅分片只发送一条UNSUBSCRIBE，未订阅的频道跳过
+        
+        Args:
+            channels: 频道名称的可迭代对象
+        
+        Returns:
+            True表示取消成功
+        """
+        if not self._connected:
+            print("[ERROR] Not connected to Redis")
+            return False
+        
+        try:
+            with self._lock:
+                result = self._remove_channels([name for name in dict.fromkeys(channels)
+                                                if name in self._callbacks])
+                if result < 0:
+                    print(f"[ERROR] Unsubscribe failed with code {result}")
+                    return False
+                return True
+        except Exception as e:
+            print(f"[ERROR] Unsubscribe error: {e}")
+            traceback.print_exc()
+            return False
+    
+    def _remove_channels(self, names: List[str]) -> int:
+        """取消订阅names并移除其回调（调用时持有self._lock），返回原生层取消的频道数，失败返回-1"""
+        if not names:
+            return 0
+        
+        encoded = [name.encode('utf-8') for name in names]
+        name_array = (c_char_p * len(names))(*encoded)
+        len_array = (c_size_t * len(names))(*[len(name) for name in encoded])
+        result = self._redis_unsubscribe_many(self._handle, len(names), name_array, len_array)
+        
+        # 订阅线程可能正在调用旧回调，C回调对象保留到断开连接时再释放（subscribe_many的回调由多个频道共用）
+        retired = {}
+        for name in names:
+            self._callbacks.pop(name, None)
+            dll_callback = self._dll_callbacks.pop(name, None)
+            if dll_callback is not None:
+                retired[id(dll_callback)] = dll_callback
+        self._retired_callbacks.extend(retired.values())
+        return result
+    
+    def psubscribe(self, pattern: str, callback: Optional[Callable[..., None]] = None,
+                   binary: bool = False, dispatch: bool = False,
+                   codec: Union[str, Codec, None] = None,
+                   filters: Optional[Iterable[Filter]] = None) -> bool:
+        """
+        按glob模式订阅频道（PSUBSCRIBE），可与subscribe()共存
+        
+        原生层按模式查表分发pmessage，不会对每条消息重新匹配glob
+        
+        Args:
+            pattern: 频道模式，如 "news.*"
+            callback: 同subscribe()，收到的channel为实际频道名
+            binary: 是否使用二进制安全模式
+            dispatch: 同subscribe()，按实际频道名保序
+            codec: 同subscribe()（队列模式下poll()只按实际频道名查找编解码器）
+            filters: 同subscribe()，对匹配该模式的所有频道生效
+        
+        Returns:
+            True表示订阅成功
+        """
+        return self._add_subscription(pattern, callback, binary, pattern=True, dispatch=dispatch,
+                                      codec=codec, filters=filters)
+    
+    def punsubscribe(self, pattern: str) -> bool:
+        """
+        取消模式订阅
+        
+        Args:
+            pattern: psubscribe()时使用的模式
+        
+        Returns:
+            True表示取消成功
+        """
+        if not self._connected:
+            print("[ERROR] Not connected to Redis")
+            return False
+        
+        try:
+            with self._lock:
+                if pattern not in self._patterns:
+                    print(f"[ERROR] Pattern not subscribed: {pattern}")
+                    return False
+                
+                pattern_bytes = pattern.encode('utf-8')
+                result = self._redis_punsubscribe(self._handle, pattern_bytes, len(pattern_bytes))
+                
+                # 订阅线程可能正在调用旧回调，C回调对象保留到断开连接时再释放
+                del self._patterns[pattern]
+                dll_callback = self._dll_pattern_callbacks.pop(pattern, None)
+                if dll_callback is not None:
+                    self._retired_callbacks.append(dll_callback)
+                
+                if result != 0:
+                    print(f"[ERROR] Punsubscribe failed with code {result}")
+                    return False
+                return True
+        except Exception as e:
+            print(f"[ERROR] Punsubscribe error: {e}")
+            traceback.print_exc()
+            return False
+    
+    def set_filter(self, name: str, filters: Iterable[Filter], pattern: bool = False) -> bool:
+        """
+        替换已订阅频道（pattern=True时为模式）的过滤条件，filters为空时清除
+        
+        Args:
+            name: 频道名或模式
+            filters: redis_filter中的过滤条件，全部满足的消息才投递
+            pattern: name是否为psubscribe()的模式
+        
+        Returns:
+            True表示设置成功
+        """
+        if not self._connected:
+            print("[ERROR] Not connected to Redis")
+            return False
+        
+        try:
+            count, array = _filter_array(_filter_list(filters), self._framed(name, pattern))
+        except TypeError as e:
+            print(f"[ERROR] {e}")
+            return False
+        name_bytes = name.encode('utf-8')
+        return self._redis_set_filter(self._handle, int(pattern), name_bytes, len(name_bytes), count, array) == 0
+    
+    def filter_stats(self, name: str, pattern: bool = False) -> Dict[str, int]:
+        """
+        获取订阅的过滤统计
+        
+        Returns:
+            包含passed/rejected的字典，没有设置过滤条件时均为0，未订阅时返回空字典
+        """
+        stats = _RedisFilterStats()
+        name_bytes = name.encode('utf-8')
+        if self._redis_get_filter_stats(self._handle, int(pattern), name_bytes, len(name_bytes),
+                                        ctypes.byref(stats)) != 0:
+            return {}
+        return {'passed': stats.passed, 'rejected': stats.rejected}
+    
+    def _framed(self, name: str, pattern: bool) -> bool:
+        """订阅的payload是否带压缩头部：频道开启了压缩；模式可能匹配任何频道，开启过任何压缩即是"""
+        return self._compression.enabled if pattern else self._compression.configured(name)
+    
+    def _stage_options(self, name: str, name_bytes: bytes, pattern: bool, conflate: int,
+                       filters: List[Filter]) -> bool:
+        """
+        订阅前暂存原生层的合并投递和过滤条件，原生层在发送SUBSCRIBE之前装上，第一条消息就按它们投递
+        （重复订阅时按本次参数替换）；订阅失败时调用方用_discard_options丢弃
+        """
+        count, array = _filter_array(filters, self._framed(name, pattern))
+        return self._redis_stage_options(self._handle, int(pattern), name_bytes, len(name_bytes),
+                                         conflate, count, array) == 0
+    
+    def _discard_options(self, encoded: List[bytes], pattern: bool) -> None:
+        """丢弃订阅失败后没有被原生层取用的暂存选项"""
+        for name_bytes in encoded:
+            self._redis_discard_options(self._handle, int(pattern), name_bytes, len(name_bytes))
+    
+    def _register_codecs(self, names: List[str], decoder: Optional[Codec]) -> Dict[str, Optional[Codec]]:
+        """订阅前为names注册编解码器（decoder为None时不注册），返回原先的注册，订阅失败时交给_restore_codecs"""
+        if decoder is None:
+            return {}
+        codecs = self._codecs
+        previous = {name: codecs.get(name) for name in names}
+        for name in names:
+            codecs[name] = decoder
+        return previous
+    
+    def _restore_codecs(self, previous: Dict[str, Optional[Codec]]) -> None:
+        """恢复_register_codecs之前的编解码器注册"""
+        for name, codec in previous.items():
+            if codec is None:
+                self._codecs.pop(name, None)
+            else:
+                self._codecs[name] = codec
+    
+    def _conflation_submit(self, conflate: bool, dispatch: bool,
+                           key_fn: Optional[Callable[[Any], Any]], queued: bool):
+        """
+        conflate/key_fn订阅的消息交给谁：None表示由原生层按频道合并（或不合并），
+        否则为合并线程池的submit（key_fn是Python函数、dispatch需要线程池，原生层无法代劳）；参数无效时返回False
+        """
+        if not conflate and key_fn is None:
+            return None
+        if key_fn is not None and not callable(key_fn):
+            print("[ERROR] key_fn must be callable")
+            return False
+        if not dispatch and key_fn is None:
+            return None
+        if queued:
+            print("[ERROR] Conflation with dispatch or key_fn requires a callback")
+            return False
+        if self._conflater is None and not self.enable_conflation():
+            return False
+        return self._conflater.submit
+    
+    def _add_subscription(self, name: str, callback: Optional[Callable[..., None]],
+                          binary: bool, pattern: bool, dispatch: bool = False,
+                          codec: Union[str, Codec, None] = None, conflate: bool = False,
+                          key_fn: Optional[Callable[[Any], Any]] = None,
+                          filters: Optional[Iterable[Filter]] = None) -> bool:
+        """subscribe()/psubscribe()的公共实现"""
+        if not self._connected:
+            print("[ERROR] Not connected to Redis")
+            return False
+        
+        if codec is not None:
+            try:
+                decoder = get_codec(codec)
+            except (TypeError, ValueError) as e:
+                print(f"[ERROR] {e}")
+                return False
+            binary = True
+        else:
+            decoder = self._codecs.get(name)
+        
+        if callback is not None and not callable(callback):
+            print("[ERROR] Callback must be callable")
+            return False
+        
+        if dispatch and callback is None:
+            print("[ERROR] Dispatch mode requires a callback")
+            return False
+        
+        if pattern and (conflate or key_fn is not None):
+            print("[ERROR] Conflation is not supported for pattern subscriptions")
+            return False
+        
+        conflate_submit = self._conflation_submit(conflate, dispatch, key_fn, callback is None)
+        if conflate_submit is False:
+            return False
+        native_conflate = int((conflate or key_fn is not None) and conflate_submit is None)
+        
+        try:
+            filters = _filter_list(filters)
+        except TypeError as e:
+            print(f"[ERROR] {e}")
+            return False
+        
+        if dispatch and conflate_submit is None and self._dispatcher is None and not self.enable_dispatch():
+            return False
+        
+        # 回调在订阅线程中直接执行，交给线程池按频道保序执行，或交给合并线程池按频道/key保留最新值
+        if key_fn is not None:
+            def deliver(channel, *args):
+                conflate_submit((channel, key_fn(args[-1])), callback, *args)
+        elif conflate_submit is not None:
+            def deliver(channel, *args):
+                conflate_submit(channel, callback, *args)
+        elif dispatch:
+            submit = self._dispatcher.submit
+            
+            def deliver(channel, *args):
+                submit(channel, callback, *args)
+        else:
+            def deliver(channel, *args):
+                callback(*args)
+        
+        if pattern:
+            callbacks, dll_callbacks = self._patterns, self._dll_pattern_callbacks
+            subscribe_text = self._redis_psubscribe
+            subscribe_binary = self._redis_psubscribe_binary
+            subscribe_queued = self._redis_psubscribe_queued
+        else:
+            callbacks, dll_callbacks = self._callbacks, self._dll_callbacks
+            subscribe_text = self._redis_subscribe
+            subscribe_binary = self._redis_subscribe_binary
+            subscribe_queued = self._redis_subscribe_queued
+        
+        try:
+            with self._lock:
+                name_bytes = name.encode('utf-8')
+                if not self._stage_options(name, name_bytes, pattern, native_conflate, filters):
+                    return False
+                previous_codecs = self._register_codecs([name], decoder if codec is not None else None)
+                
+                if callback is None:
+                    # 队列模式：订阅线程只复制消息到环形缓冲区，不进入Python
+                    callbacks[name] = None
+                    result = subscribe_queued(self._handle, name_bytes, len(name_bytes))
+                    if result == 0:
+                        return True
+                    print(f"[ERROR] Subscribe failed with code {result}")
+                    self._discard_options([name_bytes], pattern)
+                    self._restore_codecs(previous_codecs)
+                    del callbacks[name]
+                    return False
+                
+                if binary:
+                    channel_names = self._channel_names
+                    decompress = self._compression.decompress
+                    
+                    # 二进制回调：普通订阅的频道名直接复用订阅时的str，payload只复制一次为bytes
+                    def c_callback(channel_ptr, channel_len, data_ptr, data_len):
+                        try:
+                            if pattern:
+                                channel_raw = ctypes.string_at(channel_ptr, channel_len)
+                                channel = channel_names.get(channel_raw)
+                                if channel is None:
+                                    channel = channel_names[channel_raw] = channel_raw.decode('utf-8', 'replace')
+                            else:
+                                channel = name
+                            data = ctypes.string_at(data_ptr, data_len)
+                            if data[:3] == _COMPRESSED:
+                                data = decompress(channel, data)
+                                if data is None:
+                                    return
+                            deliver(channel, Message(channel, data, decoder))
+                        except Exception as e:
+                            print(f"[ERROR] Callback error: {e}")
+                            traceback.print_exc()
+                    
+                    dll_callback = self._PubSubBinaryCallback(c_callback)
+                else:
+                    # 创建C回调函数
+                    def c_callback(channel_ptr, message_ptr):
+                        try:
+                            channel_str = channel_ptr.decode('utf-8') if isinstance(channel_ptr, bytes) else channel_ptr
+                            message_str = message_ptr.decode('utf-8') if isinstance(message_ptr, bytes) else message_ptr
+                            # print(f"\n[CALLBACK] Received from '{channel_str}':")
+                            # print(f"           Message: {message_str}")
+                            deliver(channel_str, channel_str, message_str)
+                        except Exception as e:
+                            print(f"[ERROR] Callback error: {e}")
+                            traceback.print_exc()
+                    
+                    dll_callback = self._PubSubCallback(c_callback)
+                
+                # 保存Python回调
+                callbacks[name] = callback
+                
+                # 保存C回调（必须保持引用），被替换的旧回调可能仍在执行，暂不释放
+                previous = dll_callbacks.get(name)
+                if previous is not None:
+                    self._retired_callbacks.append(previous)
+                dll_callbacks[name] = dll_callback
+                
+                # 调用DLL订阅函数
+                if binary:
+                    result = subscribe_binary(self._handle, name_bytes, len(name_bytes), dll_callback)
+                else:
+                    result = subscribe_text(self._handle, name_bytes, dll_callback)
+                
+                if result == 0:
+                    # print(f"[OK] Subscribed to channel: {channel}")
+                    return True
+                else:
+                    print(f"[ERROR] Subscribe failed with code {result}")
+                    self._discard_options([name_bytes], pattern)
+                    self._restore_codecs(previous_codecs)
+                    del callbacks[name]
+                    del dll_callbacks[name]
+                    return False
+                    
+        except Exception as e:
+            print(f"[ERROR] Subscribe error: {e}")
+            traceback.print_exc()
+            return False
+    
+    def poll(self, max_messages: int = 256, timeout: Optional[float] = 0.1) -> List[Message]:
+        """
+        从原生投递队列批量取出消息（只对callback=None的订阅有效）
+        
+        一次ctypes调用（期间释放GIL）最多取出max_messages条消息
+        
+        Args:
+            max_messages: 本次最多取出的消息数
+            timeout: 队列为空时的最长等待时间（秒），0表示不等待，None表示一直等待
+        
+        Returns:
+            Message列表，超时或出错时返回空列表
+        """
+        if not self._connected:
+            return []
+        
+        if self._poll_buffer is None or len(self._poll_buffer) < max_messages:
+            self._poll_buffer = (_RedisMessage * max_messages)()
+        
+        timeout_ms = -1 if timeout is None else int(timeout * 1000)
+        count = self._redis_poll_messages(self._handle, self._poll_buffer, max_messages, timeout_ms)
+        if count <= 0:
+            return []
+        
+        messages = []
+        names = self._channel_names
+        codecs = self._codecs
+        decompress = self._compression.decompress
+        string_at = ctypes.string_at
+        for i in range(count):
+            item = self._poll_buffer[i]
+            channel_raw = string_at(item.channel, item.channel_len)
+            channel = names.get(channel_raw)
+            if channel is None:
+                channel = names[channel_raw] = channel_raw.decode('utf-8', 'replace')
+            data = string_at(item.data, item.data_len)
+            if data[:3] == _COMPRESSED:
+                data = decompress(channel, data)
+                if data is None:
+                    continue
+            messages.append(Message(channel, data, codecs.get(channel)))
+        return messages
+    
+    def iter_messages(self, max_messages: int = 256, timeout: Optional[float] = None):
+        """
+        逐条迭代投递队列中的消息，内部按批调用poll()
+        
+        Args:
+            max_messages: 每批最多取出的消息数
+            timeout: 连续空闲超过该时间（秒）后停止迭代，None表示一直迭代直到断开连接
+        
+        Yields:
+            Message对象
+        """
+        idle_since = time.monotonic()
+        while self._connected:
+            wait = 0.1 if timeout is None else min(0.1, timeout)
+            batch = self.poll(max_messages, wait)
+            if batch:
+                yield from batch
+                idle_since = time.monotonic()
+            elif timeout is not None and time.monotonic() - idle_since >= timeout:
+                return
+    
+    def set_queue_capacity(self, capacity: int) -> bool:
+        """
+        设置原生投递队列的容量（槽位数），只能在队列为空时调用
+        
+        Args:
+            capacity: 槽位数
+        
+        Returns:
+            True表示设置成功
+        """
+        return self._redis_set_queue_capacity(self._handle, capacity) == 0
+    
+    def wakeup_fd(self) -> int:
+        """
+        获取投递队列的唤醒描述符（Windows下为socket）
+        
+        队列由空变为非空时变为可读，poll()把队列取空后复位，
+        可用于select或asyncio的loop.add_reader
+        
+        Returns:
+            描述符，未连接时返回-1
+        """
+        if not self._connected:
+            return -1
+        return self._redis_get_wakeup_fd(self._handle)
+    
+    def queue_stats(self) -> Dict[str, int]:
+        """
+        获取原生投递队列统计信息
+        
+        Returns:
+            包含capacity/depth/high_watermark/enqueued/dequeued/overflow的字典
+        """
+        stats = _RedisQueueStats()
+        self._redis_get_queue_stats(self._handle, ctypes.byref(stats))
+        return {name: getattr(stats, name) for name, _ in stats._fields_}
+    
+    def is_connected(self) -> bool:
+        """检查是否已连接"""
+        return self._connected
     
     def get_subscribed_channels(self) -> list:
         """获取已订阅的频道列表"""
         return list(self._callbacks.keys())
     
+    def get_subscribed_patterns(self) -> list:
+        """获取已订阅的模式列表"""
+        return list(self._patterns.keys())
+    
     def wait(self, duration: float = 1.0):
         """
         等待指定时间（用于处理回调）
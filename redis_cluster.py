@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""
+Redis Cluster分片发布/订阅（Redis 7的SPUBLISH/SSUBSCRIBE）
+
+普通PUBLISH在集群中会广播到所有节点，吞吐量受单个节点限制；分片发布/订阅按频道名的槽位
+（CRC16，支持{hash tag}）只发往持有该槽位的主节点，总吞吐量随节点数线性增长。
+
+RedisClusterPubSub为每个主节点维护一个RedisPubSubDLL（各自的发布连接池、订阅连接和事件循环），
+按槽位表把publish/subscribe路由到对应节点：
+    - 发布收到MOVED（PUBLISH_MOVED）时刷新槽位表并重试一次
+    - 槽位迁移后服务器主动取消的订阅、订阅命令收到的MOVED由原生层通知，
+      后台线程刷新槽位表，并把受影响的频道迁到新节点重新订阅
+
+    cluster = RedisClusterPubSub()
+    cluster.connect([("10.0.0.1", 7000), ("10.0.0.2", 7000)])
+    cluster.subscribe("orders:{eu}", handler, binary=True)
+    cluster.publish("orders:{eu}", b"...")
+"""
+
+import queue
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from redis_client import RedisPubSubDLL
+from redis_codec import Codec
+
+CLUSTER_SLOTS = 16384
+
+Address = Tuple[str, int]
+
+
+def _parse_address(node: Union[str, Address]) -> Address:
+    if isinstance(node, str):
+        host, _, port = node.rpartition(':')
+        return host, int(port)
+    return node[0], int(node[1])
+
+
+class RedisClusterPubSub:
+    """
+    Redis Cluster分片发布/订阅客户端
+
+    只支持频道订阅（集群没有分片的模式订阅），回调签名与RedisPubSubDLL.subscribe()相同；
+    每个节点的客户端在连接前交给configure(client)，可用于设置编解码器、压缩、异步发布参数等
+    """
+
+    def __init__(self, dll_path: Optional[str] = None, subscriber_shards: int = 1,
+                 configure: Optional[Callable[[RedisPubSubDLL], None]] = None):
+        self._dll_path = dll_path
+        self._subscriber_shards = subscriber_shards
+        self._configure = configure
+        self._nodes: Dict[Address, RedisPubSubDLL] = {}
+        # 不再持有槽位的节点：其他线程可能仍在使用它发布，保留到disconnect()时再关闭
+        self._retired: Dict[Address, RedisPubSubDLL] = {}
+        self._owners: List[Optional[Address]] = [None] * CLUSTER_SLOTS
+        self._slot_cache: Dict[str, int] = {}
+        # 频道 -> (callback, binary, dispatch, codec)，以及当前订阅所在的节点
+        self._subscriptions: Dict[str, Tuple[Callable, bool, bool, Any]] = {}
+        self._subscribed_on: Dict[str, Address] = {}
+        # 服务器主动取消的频道（str）、订阅命令收到MOVED的槽位（int）：由原生订阅线程放入，
+        # 下次刷新时取出，无论槽位表是否变化都重新订阅（原生线程不能等待self._lock，刷新时持有它等待订阅确认）
+        self._moved: queue.SimpleQueue = queue.SimpleQueue()
+        self._lock = threading.RLock()
+        self._refresh_needed = threading.Event()
+        self._refresher = None
+        self._running = False
+        self.refreshes = 0
+
+    # ==================== 节点和槽位表 ====================
+
+    def _open_node(self, address: Address) -> Optional[RedisPubSubDLL]:
+        client = RedisPubSubDLL(self._dll_path)
+        client.set_sharded_pubsub(True)
+        client.set_subscriber_shards(self._subscriber_shards)
+        client.set_moved_handler(self._on_moved)
+        if self._configure is not None:
+            self._configure(client)
+        if not client.connect(address[0], address[1]):
+            print(f"[ERROR] Failed to connect to cluster node {address[0]}:{address[1]}")
+            return None
+        return client
+
+    def _on_moved(self, channel: Optional[str], error: Optional[str]):
+        """原生订阅线程中调用：只记录并唤醒后台线程"""
+        if channel is not None:
+            self._moved.put(channel)
+        elif error is not None:
+            # "MOVED slot host:port"：该槽位上的订阅在本节点没有生效（订阅时节点的槽位表尚未更新）
+            parts = error.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                self._moved.put(int(parts[1]))
+        self._refresh_needed.set()
+
+    def connect(self, startup_nodes: Sequence[Union[str, Address]]) -> bool:
+        """
+        连接集群：从第一个可用的种子节点读取CLUSTER SLOTS，再连接所有主节点
+
+        Args:
+            startup_nodes: 种子节点，(host, port)或"host:port"
+
+        Returns:
+            True表示连接成功
+        """
+        with self._lock:
+            for node in startup_nodes:
+                address = _parse_address(node)
+                client = self._open_node(address)
+                if client is None:
+                    continue
+                slots = client.cluster_slots()
+                if not slots:
+                    client.disconnect()
+                    continue
+                self._nodes[address] = client
+                self._apply_slots(slots)
+                break
+            else:
+                print("[ERROR] No reachable cluster node")
+                return False
+
+        self._running = True
+        self._refresher = threading.Thread(target=self._refresh_loop, name="redis-cluster-refresh", daemon=True)
+        self._refresher.start()
+        return True
+
+    def refresh(self) -> bool:
+        """
+        重新读取槽位表，连接新的主节点，把槽位已迁移的订阅迁到新节点
+
+        Returns:
+            True表示刷新成功
+        """
+        # CLUSTER SLOTS是网络往返，不持有self._lock，只在应用槽位表时加锁
+        for client in list(self._nodes.values()):
+            slots = client.cluster_slots()
+            if slots:
+                with self._lock:
+                    self._apply_slots(slots)
+                return True
+        print("[ERROR] Failed to refresh cluster slots")
+        return False
+
+    def _apply_slots(self, slots: List[Tuple[int, int, str, int]]):
+        """调用时持有self._lock"""
+        owners: List[Optional[Address]] = [None] * CLUSTER_SLOTS
+        for start, end, host, port in slots:
+            owners[start:end + 1] = [(host, port)] * (end - start + 1)
+        for address in set(owners) - set(self._nodes) - {None}:
+            client = self._retired.pop(address, None) or self._open_node(address)
+            if client is not None:
+                self._nodes[address] = client
+        self._owners = owners
+        self.refreshes += 1
+
+        # 所在节点变了、或被服务器主动取消的订阅：从旧节点取消，按新节点分组重新订阅
+        lost, lost_slots = set(), set()
+        while True:
+            try:
+                item = self._moved.get_nowait()
+            except queue.Empty:
+                break
+            (lost_slots if isinstance(item, int) else lost).add(item)
+        moved = [channel for channel in self._subscriptions
+                 if channel in lost or self.slot_for(channel) in lost_slots or
+                 self._subscribed_on.get(channel) != self._node_address(channel)]
+        by_old: Dict[Address, List[str]] = {}
+        for channel in moved:
+            old = self._subscribed_on.pop(channel, None)
+            if old is not None and old in self._nodes:
+                by_old.setdefault(old, []).append(channel)
+        for address, channels in by_old.items():
+            self._nodes[address].unsubscribe_many(channels)
+        self._subscribe_grouped(moved)
+
+        # 不再持有槽位、也没有订阅的节点
+        for address in set(self._nodes) - set(owners) - set(self._subscribed_on.values()):
+            self._retired[address] = self._nodes.pop(address)
+
+    def _refresh_loop(self):
+        while self._running:
+            self._refresh_needed.wait()
+            if not self._running:
+                break
+            self._refresh_needed.clear()
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[ERROR] Cluster refresh error: {e}")
+                traceback.print_exc()
+            # 迁移期间节点的槽位表可能还没有全部更新，避免连续刷新
+            time.sleep(0.1)
+
+    def slot_for(self, channel: str) -> int:
+        """频道名的槽位（按频道缓存）"""
+        slot = self._slot_cache.get(channel)
+        if slot is None:
+            client = next(iter(self._nodes.values()), None)
+            if client is None:
+                return -1
+            slot = self._slot_cache[channel] = client.keyslot(channel)
+        return slot
+
+    def _node_address(self, channel: str) -> Optional[Address]:
+        slot = self.slot_for(channel)
+        return self._owners[slot] if slot >= 0 else None
+
+    def node_for(self, channel: str) -> Optional[RedisPubSubDLL]:
+        """持有频道槽位的节点的客户端，槽位未分配时返回None"""
+        address = self._node_address(channel)
+        return self._nodes.get(address) if address is not None else None
+
+    def nodes(self) -> List[Address]:
+        return sorted(self._nodes)
+
+    # ==================== 发布 ====================
+
+    def publish(self, channel: str, message: Union[str, bytes]) -> int:
+        """
+        发布到持有频道槽位的节点（SPUBLISH），收到MOVED时刷新槽位表并重试一次
+
+        Returns:
+            该节点上接收消息的订阅者数量，-1表示发送失败，PUBLISH_SPOOLED(-2)同RedisPubSubDLL.publish()
+        """
+        client = self.node_for(channel)
+        if client is None:
+            print(f"[ERROR] No cluster node for channel: {channel}")
+            return -1
+
+        result = client.publish(channel, message)
+        if result == RedisPubSubDLL.PUBLISH_MOVED and self.refresh():
+            client = self.node_for(channel)
+            result = client.publish(channel, message) if client is not None else -1
+        return result
+
+    def publish_many(self, messages: Iterable[Tuple[str, Union[str, bytes]]]) -> List[int]:
+        """
+        批量发布：按节点分组，每个节点一次管道往返；收到MOVED的消息在刷新槽位表后重发一次
+
+        Returns:
+            每条消息对应的结果，含义同publish()
+        """
+        messages = list(messages)
+        results = [-1] * len(messages)
+        pending = list(range(len(messages)))
+
+        for attempt in range(2):
+            groups: Dict[RedisPubSubDLL, List[int]] = {}
+            for index in pending:
+                client = self.node_for(messages[index][0])
+                if client is not None:
+                    groups.setdefault(client, []).append(index)
+
+            pending = []
+            for client, indexes in groups.items():
+                batch = client.publish_many([messages[index] for index in indexes])
+                for index, result in zip(indexes, batch):
+                    results[index] = result
+                    if result == RedisPubSubDLL.PUBLISH_MOVED:
+                        pending.append(index)
+
+            if not pending or attempt == 1 or not self.refresh():
+                break
+        return results
+
+    def publish_nowait(self, channel: str, message: Union[str, bytes],
+                       callback: Optional[Callable[[int], None]] = None) -> bool:
+        """
+        异步发布到持有频道槽位的节点；收到MOVED时callback得到PUBLISH_MOVED，
+        并在后台刷新槽位表（之后的消息发往新节点，这一条不重发）
+        """
+        client = self.node_for(channel)
+        if client is None:
+            print(f"[ERROR] No cluster node for channel: {channel}")
+            return False
+
+        refresh_needed = self._refresh_needed
+
+        def on_complete(result: int):
+            if result == RedisPubSubDLL.PUBLISH_MOVED:
+                refresh_needed.set()
+            if callback is not None:
+                callback(result)
+
+        return client.publish_nowait(channel, message, on_complete)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待所有节点上此前的publish_nowait()完成"""
+        return all([client.flush(timeout) for client in list(self._nodes.values())])
+
+    # ==================== 订阅 ====================
+
+    def subscribe(self, channel: str, callback: Callable[..., None], binary: bool = False,
+                  dispatch: bool = False, codec: Union[str, Codec, None] = None) -> bool:
+        """
+        在持有频道槽位的节点上订阅（SSUBSCRIBE），参数同RedisPubSubDLL.subscribe()（callback必须提供）
+
+        Returns:
+            True表示订阅成功
+        """
+        return self.subscribe_many([channel], callback, binary, dispatch, codec)
+
+    def subscribe_many(self, channels: Union[Iterable[str], Dict[str, Callable[..., None]]],
+                       callback: Optional[Callable[..., None]] = None, binary: bool = False,
+                       dispatch: bool = False, codec: Union[str, Codec, None] = None) -> bool:
+        """
+        批量订阅：按节点分组，每个节点调用一次RedisPubSubDLL.subscribe_many()，各节点的命令以管道发送
+
+        Args:
+            channels: 频道名称的可迭代对象（共用callback），或 {频道: 回调} 字典
+            其余参数同RedisPubSubDLL.subscribe_many()，callback不能为None
+
+        Returns:
+            True表示全部订阅成功
+        """
+        handlers = dict(channels) if isinstance(channels, dict) else dict.fromkeys(channels, callback)
+        if any(handler is None for handler in handlers.values()):
+            print("[ERROR] Cluster subscriptions require a callback")
+            return False
+
+        with self._lock:
+            for channel, handler in handlers.items():
+                self._subscriptions[channel] = (handler, binary, dispatch, codec)
+            return self._subscribe_grouped(list(handlers))
+
+    def _subscribe_grouped(self, channels: List[str]) -> bool:
+        """按(节点, 处理方式)分组订阅channels（调用时持有self._lock）"""
+        groups: Dict[Tuple[Address, bool, bool, Any], Dict[str, Callable]] = {}
+        ok = True
+        for channel in channels:
+            address = self._node_address(channel)
+            if address is None or address not in self._nodes:
+                print(f"[ERROR] No cluster node for channel: {channel}")
+                ok = False
+                continue
+            handler, binary, dispatch, codec = self._subscriptions[channel]
+            groups.setdefault((address, binary, dispatch, codec), {})[channel] = handler
+
+        for (address, binary, dispatch, codec), handlers in groups.items():
+            if self._nodes[address].subscribe_many(handlers, binary=binary, dispatch=dispatch, codec=codec):
+                for channel in handlers:
+                    self._subscribed_on[channel] = address
+            else:
+                ok = False
+        return ok
+
+    def unsubscribe(self, channel: str) -> bool:
+        if channel not in self._subscriptions:
+            print(f"[ERROR] Channel not subscribed: {channel}")
+            return False
+        return self.unsubscribe_many([channel])
+
+    def unsubscribe_many(self, channels: Iterable[str]) -> bool:
+        """按节点分组取消订阅（SUNSUBSCRIBE），未订阅的频道跳过"""
+        with self._lock:
+            by_node: Dict[Address, List[str]] = {}
+            for channel in dict.fromkeys(channels):
+                if self._subscriptions.pop(channel, None) is None:
+                    continue
+                address = self._subscribed_on.pop(channel, None)
+                if address is not None and address in self._nodes:
+                    by_node.setdefault(address, []).append(channel)
+            return all([self._nodes[address].unsubscribe_many(names) for address, names in by_node.items()])
+
+    def get_subscribed_channels(self) -> List[str]:
+        return list(self._subscriptions)
+
+    # ==================== 统计和生命周期 ====================
+
+    def stats(self, channels: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        各节点的RedisPubSubDLL.stats()，键为"host:port"
+
+        包括槽位迁走后保留到disconnect()的节点，迁移前在这些节点上收发的消息仍计入
+        """
+        with self._lock:
+            clients = dict(self._retired)
+            clients.update(self._nodes)
+        return {f"{host}:{port}": client.stats(channels) for (host, port), client in sorted(clients.items())}
+
+    def disconnect(self):
+        self._running = False
+        self._refresh_needed.set()
+        if self._refresher is not None:
+            self._refresher.join()
+            self._refresher = None
+        with self._lock:
+            for client in list(self._nodes.values()) + list(self._retired.values()):
+                client.disconnect()
+            self._nodes.clear()
+            self._retired.clear()
+            self._subscribed_on.clear()
+
+    def __enter__(self) -> 'RedisClusterPubSub':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.disconnect()
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+消息负载编解码器
+
+RedisPubSubDLL.publish_obj()用编解码器把对象编码为bytes，subscribe(..., codec=...)收到的Message
+在处理函数第一次访问message.value时才解码（不访问就不解码）。编解码器按频道注册，
+编码器/解码器对象在编解码器创建时构造一次并重复使用。
+
+内置编解码器:
+    json     JsonCodec，紧凑分隔符，UTF-8
+    binary   BinaryCodec，带类型标记、长度前缀的紧凑二进制格式
+    bytes    BytesCodec，原样传递bytes
+    text     TextCodec，UTF-8字符串
+    StructCodec(fmt, fields)  struct固定布局，需要按格式创建实例
+
+    client.publish_obj("prices", {"sym": "AAPL", "px": 187.2}, codec="binary")
+    client.subscribe("prices", lambda message: print(message.value), codec="binary")
+"""
+
+import json
+import struct
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+
+class Codec:
+    """编解码器接口：encode(obj) -> bytes，decode(bytes) -> obj"""
+
+    name = 'codec'
+
+    def encode(self, obj: Any) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}()"
+
+
+class BytesCodec(Codec):
+    """原样传递bytes（str按UTF-8编码）"""
+
+    name = 'bytes'
+
+    def encode(self, obj: Any) -> bytes:
+        if isinstance(obj, str):
+            return obj.encode('utf-8')
+        return bytes(obj)
+
+    def decode(self, data: bytes) -> bytes:
+        return data
+
+
+class TextCodec(Codec):
+    """UTF-8字符串"""
+
+    name = 'text'
+
+    def encode(self, obj: Any) -> bytes:
+        return obj.encode('utf-8')
+
+    def decode(self, data: bytes) -> str:
+        return data.decode('utf-8')
+
+
+class JsonCodec(Codec):
+    """JSON（紧凑分隔符，默认不转义非ASCII字符），编码器/解码器对象只创建一次"""
+
+    name = 'json'
+
+    def __init__(self, ensure_ascii: bool = False, sort_keys: bool = False, default=None):
+        self._encoder = json.JSONEncoder(ensure_ascii=ensure_ascii, sort_keys=sort_keys,
+                                         separators=(',', ':'), default=default)
+        self._decoder = json.JSONDecoder()
+
+    def encode(self, obj: Any) -> bytes:
+        return self._encoder.encode(obj).encode('utf-8')
+
+    def decode(self, data: bytes) -> Any:
+        return self._decoder.decode(data.decode('utf-8'))
+
+
+class StructCodec(Codec):
+    """
+    struct固定布局（格式预编译一次）
+
+    fields为None时编码/解码tuple；提供字段名时编码dict（或有这些属性的对象），解码为dict
+    """
+
+    name = 'struct'
+
+    def __init__(self, fmt: str, fields: Optional[Sequence[str]] = None):
+        self._struct = struct.Struct(fmt)
+        self.fields = tuple(fields) if fields is not None else None
+        if self.fields is not None and len(self.fields) != len(self._struct.unpack(bytes(self._struct.size))):
+            raise ValueError(f"{len(self.fields)} field names for format {fmt!r}")
+
+    @property
+    def size(self) -> int:
+        return self._struct.size
+
+    def encode(self, obj: Any) -> bytes:
+        if self.fields is None:
+            return self._struct.pack(*obj)
+        if isinstance(obj, dict):
+            return self._struct.pack(*[obj[field] for field in self.fields])
+        return self._struct.pack(*[getattr(obj, field) for field in self.fields])
+
+    def decode(self, data: bytes) -> Union[tuple, Dict[str, Any]]:
+        values = self._struct.unpack(data)
+        if self.fields is None:
+            return values
+        return dict(zip(self.fields, values))
+
+    def __repr__(self) -> str:
+        return f"StructCodec({self._struct.format!r}, fields={self.fields!r})"
+
+
+# BinaryCodec的类型标记
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _BYTES, _STR, _LIST, _DICT = range(9)
+_DOUBLE = struct.Struct('<d')
+
+
+class BinaryCodec(Codec):
+    """
+    紧凑二进制格式：每个值以1字节类型标记开头
+
+        None/False/True  只有标记
+        int              zigzag变长整数（任意大小）
+        float            8字节小端double
+        bytes/str        变长整数长度 + 内容（str为UTF-8）
+        list/tuple       变长整数元素个数 + 各元素（解码为list）
+        dict             变长整数键值对个数 + 依次的键、值
+    """
+
+    name = 'binary'
+
+    def encode(self, obj: Any) -> bytes:
+        out = bytearray()
+        self._encode(obj, out)
+        return bytes(out)
+
+    def decode(self, data: bytes) -> Any:
+        data = bytes(data)
+        value, offset = self._decode(data, 0)
+        if offset != len(data):
+            raise ValueError(f"{len(data) - offset} trailing bytes")
+        return value
+
+    @staticmethod
+    def _write_varint(value: int, out: bytearray):
+        while value > 0x7F:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+
+    def _encode(self, obj: Any, out: bytearray):
+        write_varint = self._write_varint
+        if obj is None:
+            out.append(_NONE)
+        elif obj is True or obj is False:
+            out.append(_TRUE if obj else _FALSE)
+        elif isinstance(obj, int):
+            out.append(_INT)
+            write_varint(obj * 2 if obj >= 0 else -obj * 2 - 1, out)
+        elif isinstance(obj, float):
+            out.append(_FLOAT)
+            out += _DOUBLE.pack(obj)
+        elif isinstance(obj, str):
+            data = obj.encode('utf-8')
+            out.append(_STR)
+            write_varint(len(data), out)
+            out += data
+        elif isinstance(obj, (bytes, bytearray, memoryview)):
+            out.append(_BYTES)
+            write_varint(len(obj), out)
+            out += obj
+        elif isinstance(obj, (list, tuple)):
+            out.append(_LIST)
+            write_varint(len(obj), out)
+            for item in obj:
+                self._encode(item, out)
+        elif isinstance(obj, dict):
+            out.append(_DICT)
+            write_varint(len(obj), out)
+            for key, value in obj.items():
+                self._encode(key, out)
+                self._encode(value, out)
+        else:
+            raise TypeError(f"Cannot encode {type(obj).__name__}")
+
+    @staticmethod
+    def _read_varint(data: bytes, offset: int):
+        byte = data[offset]
+        if byte < 0x80:
+            return byte, offset + 1
+
+        result = byte & 0x7F
+        shift = 7
+        offset += 1
+        while True:
+            byte = data[offset]
+            offset += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result, offset
+            shift += 7
+
+    def _decode(self, data: bytes, offset: int):
+        tag = data[offset]
+        offset += 1
+        if tag == _STR or tag == _BYTES:
+            length, offset = self._read_varint(data, offset)
+            end = offset + length
+            if end > len(data):
+                raise ValueError("Truncated payload")
+            return (data[offset:end].decode('utf-8') if tag == _STR else data[offset:end]), end
+        if tag == _INT:
+            value, offset = self._read_varint(data, offset)
+            return (value >> 1) ^ -(value & 1), offset
+        if tag == _FLOAT:
+            return _DOUBLE.unpack_from(data, offset)[0], offset + 8
+        if tag == _LIST:
+            count, offset = self._read_varint(data, offset)
+            items = []
+            decode = self._decode
+            for _ in range(count):
+                item, offset = decode(data, offset)
+                items.append(item)
+            return items, offset
+        if tag == _DICT:
+            count, offset = self._read_varint(data, offset)
+            result = {}
+            decode = self._decode
+            for _ in range(count):
+                key, offset = decode(data, offset)
+                result[key], offset = decode(data, offset)
+            return result, offset
+        if tag == _NONE:
+            return None, offset
+        if tag == _FALSE or tag == _TRUE:
+            return tag == _TRUE, offset
+        raise ValueError(f"Unknown type tag {tag}")
+
+
+_REGISTRY: Dict[str, Codec] = {
+    'json': JsonCodec(),
+    'binary': BinaryCodec(),
+    'bytes': BytesCodec(),
+    'text': TextCodec(),
+}
+
+
+def register_codec(name: str, codec: Codec):
+    """按名称注册编解码器，之后可以用名称传给publish_obj()/subscribe()"""
+    if not hasattr(codec, 'encode') or not hasattr(codec, 'decode'):
+        raise TypeError("Codec must provide encode() and decode()")
+    _REGISTRY[name] = codec
+
+
+def get_codec(codec: Union[str, Codec]) -> Codec:
+    """按名称查找已注册的编解码器，传入编解码器对象时原样返回"""
+    if isinstance(codec, str):
+        try:
+            return _REGISTRY[codec]
+        except KeyError:
+            raise ValueError(f"Unknown codec: {codec}") from None
+    if not hasattr(codec, 'encode') or not hasattr(codec, 'decode'):
+        raise TypeError("Codec must provide encode() and decode()")
+    return codec
+
+
+def codec_names() -> List[str]:
+    return sorted(_REGISTRY)
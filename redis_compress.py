@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+消息负载压缩
+
+按频道开启（或对所有频道开启）：payload不小于阈值时用zlib（raw deflate）压缩，
+可选使用从样本消息训练出的预置字典。开启压缩的频道上发布的每条payload都带有一个小的头部，
+低于阈值或压缩后没有变小的payload也带头部（flags标记为未压缩），因此任意二进制payload都不会被误认。
+
+订阅方只对同样配置了压缩的频道识别头部并解压，其他频道的payload（即使以魔数开头）原样投递；
+开启压缩的频道上不带头部的payload（来自没有配置压缩的发布方）照常投递，
+但以魔数开头的原始payload会被当作头部解析，因此这类频道的所有发布方都应开启压缩。
+
+头部格式:
+    b'\\x00RZ'      魔数（3字节）
+    flags          1字节，bit0表示使用了预置字典，bit1表示payload未压缩（其后直接是原始payload）
+    dict_id        4字节大端，字典的adler32（仅在使用字典时存在）
+    ...            raw deflate数据
+
+发布方和订阅方都对该频道调用set_compression()，并使用同一份字典（按dict_id查找），
+字典由调用方分发，例如随配置一起下发：
+
+    dictionary = train_dictionary(samples)
+    client.set_compression("snapshots", threshold=4096, dictionary=dictionary)
+"""
+
+import heapq
+import struct
+import time
+import zlib
+from collections import Counter
+from threading import Lock
+from typing import Any, Dict, Iterable, Optional
+
+MAGIC = b'\x00RZ'
+
+_FLAG_DICT = 0x01
+_FLAG_RAW = 0x02
+_RAW_HEADER = MAGIC + bytes([_FLAG_RAW])
+_DICT_ID = struct.Struct('>I')
+_WBITS = -15  # raw deflate：不带zlib头和校验和，头部由本模块提供
+
+
+def is_compressed(data: bytes) -> bool:
+    """payload是否带有压缩头部（包括标记为未压缩的头部）"""
+    return data[:3] == MAGIC
+
+
+def dictionary_id(dictionary: bytes) -> int:
+    """字典的标识（adler32，与zlib流头部中的DICTID相同）"""
+    return zlib.adler32(dictionary) & 0xFFFFFFFF
+
+
+def train_dictionary(samples: Iterable[bytes], size: int = 32768,
+                     segment_size: int = 64, k: int = 8) -> bytes:
+    """
+    从样本消息训练预置字典
+
+    统计每个k字节片段出现在多少条样本中，把样本切成segment_size字节的候选段，
+    按段内尚未被字典覆盖的片段的出现次数之和贪心选择，直到字典达到size字节。
+    得分最高的段放在字典末尾（deflate引用距离越近越省）。
+
+    Args:
+        samples: 样本消息（应能代表该频道的典型负载，几十条即可）
+        size: 字典大小上限（deflate最多使用末尾32KB）
+        segment_size: 候选段长度
+        k: 片段长度
+
+    Returns:
+        字典bytes，样本不足时可能为空
+    """
+    samples = [bytes(sample) for sample in samples if len(sample) >= segment_size]
+    if not samples:
+        return b''
+
+    size = min(size, 32768)
+    frequency = Counter()
+    for sample in samples:
+        frequency.update({sample[i:i + k] for i in range(len(sample) - k + 1)})
+
+    def segment_kmers(sample: bytes, start: int):
+        return {sample[i:i + k] for i in range(start, start + segment_size - k + 1)}
+
+    # 只在一条样本中出现的片段对其他消息没有帮助
+    def score(kmers, covered):
+        return sum(frequency[kmer] for kmer in kmers if kmer not in covered and frequency[kmer] > 1)
+
+    covered = set()
+    heap = []
+    step = max(1, segment_size // 2)
+    for index, sample in enumerate(samples):
+        for start in range(0, len(sample) - segment_size + 1, step):
+            value = score(segment_kmers(sample, start), covered)
+            if value:
+                heap.append((-value, index, start))
+    heapq.heapify(heap)
+
+    # 得分只会随覆盖增加而下降：弹出后重新计算，仍不低于堆顶时才选中
+    chosen = []
+    total = 0
+    while heap and total + segment_size <= size:
+        _, index, start = heapq.heappop(heap)
+        kmers = segment_kmers(samples[index], start)
+        value = score(kmers, covered)
+        if value == 0:
+            continue
+        if heap and value < -heap[0][0]:
+            heapq.heappush(heap, (-value, index, start))
+            continue
+        chosen.append(samples[index][start:start + segment_size])
+        covered |= kmers
+        total += segment_size
+
+    return b''.join(reversed(chosen))
+
+
+class _ChannelConfig:
+    """一个频道（或默认）的压缩参数，压缩/解压对象以预置字典初始化一次，之后每条消息copy()"""
+
+    __slots__ = ('threshold', 'level', 'dictionary', 'dict_id', 'header', '_compressor')
+
+    def __init__(self, threshold: int, level: int, dictionary: Optional[bytes]):
+        self.threshold = threshold
+        self.level = level
+        self.dictionary = dictionary or None
+        if self.dictionary is not None:
+            self.dict_id = dictionary_id(self.dictionary)
+            self.header = MAGIC + bytes([_FLAG_DICT]) + _DICT_ID.pack(self.dict_id)
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, _WBITS, zdict=self.dictionary)
+        else:
+            self.dict_id = None
+            self.header = MAGIC + b'\x00'
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, _WBITS)
+
+    def compress(self, payload: bytes) -> bytes:
+        compressor = self._compressor.copy()
+        return self.header + compressor.compress(payload) + compressor.flush()
+
+
+class _ChannelStats:
+    __slots__ = ('compressed', 'skipped', 'raw_bytes', 'compressed_bytes', 'compress_ns',
+                 'decompressed', 'decompressed_bytes', 'decompress_ns', 'errors')
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {name: getattr(self, name) for name in self.__slots__}
+        result['ratio'] = self.raw_bytes / self.compressed_bytes if self.compressed_bytes else 0.0
+        result['compress_us_per_msg'] = self.compress_ns / self.compressed / 1000 if self.compressed else 0.0
+        result['decompress_us_per_msg'] = (self.decompress_ns / self.decompressed / 1000
+                                           if self.decompressed else 0.0)
+        return result
+
+
+class Compression:
+    """
+    一个客户端的压缩配置、已知字典和按频道的统计
+
+    compress()在发布路径上调用，没有配置的频道只付出一次字典查找；
+    decompress()在接收路径上调用，调用方先比较前缀，只有带魔数的payload才进入
+    """
+
+    def __init__(self):
+        self._channels: Dict[str, _ChannelConfig] = {}
+        self._default: Optional[_ChannelConfig] = None
+        self._decompressors: Dict[int, Any] = {}
+        self._plain_decompressor = zlib.decompressobj(_WBITS)
+        self._stats: Dict[str, _ChannelStats] = {}
+        self._lock = Lock()
+        self.enabled = False
+
+    def configure(self, channel: Optional[str], threshold: int = 1024, level: int = 6,
+                  dictionary: Optional[bytes] = None, enabled: bool = True):
+        """设置频道（channel为None时为默认）的压缩参数，enabled=False时取消"""
+        if enabled:
+            if threshold < 0:
+                raise ValueError("threshold must be >= 0")
+            if not -1 <= level <= 9:
+                raise ValueError("level must be between -1 and 9")
+            config = _ChannelConfig(threshold, level, dictionary)
+            if config.dictionary is not None:
+                self.add_dictionary(config.dictionary)
+        else:
+            config = None
+
+        with self._lock:
+            if channel is None:
+                self._default = config
+            elif config is None:
+                self._channels.pop(channel, None)
+            else:
+                self._channels[channel] = config
+            self.enabled = self._default is not None or bool(self._channels)
+
+    def add_dictionary(self, dictionary: bytes) -> int:
+        """登记用于解压的字典（只订阅不发布的一方使用），返回dict_id"""
+        dictionary = bytes(dictionary)
+        dict_id = dictionary_id(dictionary)
+        self._decompressors[dict_id] = zlib.decompressobj(_WBITS, zdict=dictionary)
+        return dict_id
+
+    def configured(self, channel: str) -> bool:
+        """channel是否开启了压缩（频道配置或默认配置）"""
+        return self._channels.get(channel, self._default) is not None
+
+    def _channel_stats(self, channel: str) -> _ChannelStats:
+        stats = self._stats.get(channel)
+        if stats is None:
+            stats = self._stats.setdefault(channel, _ChannelStats())
+        return stats
+
+    def compress(self, channel: str, payload: bytes) -> bytes:
+        """按频道配置压缩payload，没有配置时原样返回；低于阈值或压缩后没有变小时加上未压缩头部返回"""
+        config = self._channels.get(channel, self._default)
+        if config is None:
+            return payload
+
+        if len(payload) < config.threshold:
+            return _RAW_HEADER + payload
+
+        start = time.thread_time_ns()
+        compressed = config.compress(payload)
+        elapsed = time.thread_time_ns() - start
+
+        stats = self._channel_stats(channel)
+        with self._lock:
+            stats.compress_ns += elapsed
+            if len(compressed) >= len(payload):
+                stats.skipped += 1
+                return _RAW_HEADER + payload
+            stats.compressed += 1
+            stats.raw_bytes += len(payload)
+            stats.compressed_bytes += len(compressed)
+        return compressed
+
+    def decompress(self, channel: str, data: bytes) -> Optional[bytes]:
+        """
+        去掉头部并解压channel上的payload
+
+        只有开启了压缩的频道才识别头部，其他频道的payload和不带头部的payload原样返回；
+        头部损坏或解压失败时打印错误并返回None，调用方应丢弃该消息
+        """
+        if data[:3] != MAGIC or self._channels.get(channel, self._default) is None:
+            return data
+
+        start = time.thread_time_ns()
+        try:
+            flags = data[3]
+            if flags & _FLAG_RAW:
+                return data[4:]
+            if flags & _FLAG_DICT:
+                dict_id = _DICT_ID.unpack_from(data, 4)[0]
+                template = self._decompressors.get(dict_id)
+                if template is None:
+                    raise ValueError(f"Unknown compression dictionary 0x{dict_id:08x}")
+                offset = 8
+            else:
+                template = self._plain_decompressor
+                offset = 4
+            decompressor = template.copy()
+            result = decompressor.decompress(data[offset:]) + decompressor.flush()
+        except (IndexError, ValueError, struct.error, zlib.error) as e:
+            print(f"[ERROR] Decompress error on '{channel}': {e}")
+            with self._lock:
+                self._channel_stats(channel).errors += 1
+            return None
+        elapsed = time.thread_time_ns() - start
+
+        stats = self._channel_stats(channel)
+        with self._lock:
+            stats.decompressed += 1
+            stats.decompressed_bytes += len(result)
+            stats.decompress_ns += elapsed
+        return result
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {channel: stats.to_dict() for channel, stats in self._stats.items()}
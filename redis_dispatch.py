@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""
+按频道保序的处理线程池
+
+订阅线程只负责把消息交给线程池，用户回调在工作线程中执行：
+同一个key（频道）的消息总是交给同一个工作线程，因此保持顺序，不同频道可以并行处理。
+
+每个工作线程的队列有上限，队列满时按overflow策略处理:
+    block        阻塞提交方（即原生订阅线程），背压传递到Redis连接
+    drop_oldest  丢弃该队列中最早的消息
+    drop_newest  丢弃新到的消息
+
+LatestValueDispatcher是只保留最新值的变体：每个key最多一条待处理任务，新任务覆盖尚未执行的旧任务，
+处理函数的负载由其自身速度决定，而不是由发布速率决定（行情、状态类频道）。
+"""
+
+import collections
+import threading
+import traceback
+from typing import Any, Callable, Dict, Hashable
+
+
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'drop_newest')
+
+
+class _Worker:
+    """一个工作线程及其有界队列，计数器只在持有cond时修改"""
+
+    __slots__ = ('queue', 'cond', 'thread', 'submitted', 'processed', 'dropped',
+                 'errors', 'high_watermark')
+
+    def __init__(self):
+        self.queue = collections.deque()
+        self.cond = threading.Condition()
+        self.thread = None
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.high_watermark = 0
+
+
+class KeyedDispatcher:
+    """按key分配工作线程的有界线程池"""
+
+    def __init__(self, workers: int = 4, queue_size: int = 1024, overflow: str = 'block',
+                 name: str = 'redis-dispatch'):
+        """
+        创建线程池并启动工作线程
+
+        Args:
+            workers: 工作线程数
+            queue_size: 每个工作线程的队列上限
+            overflow: 队列满时的处理策略，见OVERFLOW_POLICIES
+            name: 工作线程名前缀
+
+        Raises:
+            ValueError: 参数无效
+        """
+        if workers <= 0 or queue_size <= 0:
+            raise ValueError("workers and queue_size must be positive")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Invalid overflow policy: {overflow}")
+
+        self._queue_size = queue_size
+        self._overflow = overflow
+        self._running = True
+        self._workers = [_Worker() for _ in range(workers)]
+
+        for index, worker in enumerate(self._workers):
+            worker.thread = threading.Thread(target=self._run, args=(worker,),
+                                             name=f"{name}-{index}", daemon=True)
+            worker.thread.start()
+
+    @property
+    def overflow(self) -> str:
+        """队列满时的处理策略"""
+        return self._overflow
+
+    def submit(self, key: Hashable, fn: Callable[..., None], *args: Any) -> bool:
+        """
+        提交一个任务，同一key的任务按提交顺序执行
+
+        Args:
+            key: 分配工作线程的依据（通常为频道名）
+            fn: 要执行的函数
+            args: 传给fn的参数
+
+        Returns:
+            True表示已入队，False表示被丢弃或线程池已停止
+        """
+        worker = self._workers[hash(key) % len(self._workers)]
+        queue = worker.queue
+
+        with worker.cond:
+            if not self._running:
+                return False
+
+            if len(queue) >= self._queue_size:
+                if self._overflow == 'drop_newest':
+                    worker.dropped += 1
+                    return False
+                if self._overflow == 'drop_oldest':
+                    queue.popleft()
+                    worker.dropped += 1
+                else:
+                    while self._running and len(queue) >= self._queue_size:
+                        worker.cond.wait()
+                    if not self._running:
+                        return False
+
+            queue.append((fn, args))
+            worker.submitted += 1
+            if len(queue) > worker.high_watermark:
+                worker.high_watermark = len(queue)
+            worker.cond.notify_all()
+        return True
+
+    def shutdown(self, wait: bool = True, drain: bool = True):
+        """
+        停止线程池
+
+        Args:
+            wait: 是否等待工作线程退出（在工作线程内调用时不会等待自己）
+            drain: True表示先执行完已入队的任务，False表示丢弃它们
+        """
+        for worker in self._workers:
+            with worker.cond:
+                self._running = False
+                if not drain:
+                    worker.dropped += len(worker.queue)
+                    worker.queue.clear()
+                worker.cond.notify_all()
+
+        if not wait:
+            return
+
+        current = threading.current_thread()
+        for worker in self._workers:
+            if worker.thread is not current:
+                worker.thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取线程池统计信息
+
+        Returns:
+            包含workers/queue_size/overflow/queued/high_watermark/submitted/processed/dropped/errors的字典
+        """
+        result = {
+            'workers': len(self._workers),
+            'queue_size': self._queue_size,
+            'overflow': self._overflow,
+            'queued': 0,
+            'high_watermark': 0,
+            'submitted': 0,
+            'processed': 0,
+            'dropped': 0,
+            'errors': 0,
+        }
+        for worker in self._workers:
+            with worker.cond:
+                result['queued'] += len(worker.queue)
+                result['high_watermark'] = max(result['high_watermark'], worker.high_watermark)
+                result['submitted'] += worker.submitted
+                result['processed'] += worker.processed
+                result['dropped'] += worker.dropped
+                result['errors'] += worker.errors
+        return result
+
+    def _run(self, worker: _Worker):
+        """工作线程主循环：停止后仍会执行完队列中剩余的任务"""
+        queue = worker.queue
+        cond = worker.cond
+
+        while True:
+            with cond:
+                while not queue and self._running:
+                    cond.wait()
+                if not queue:
+                    return
+                fn, args = queue.popleft()
+                cond.notify_all()
+
+            failed = False
+            try:
+                fn(*args)
+            except Exception as e:
+                failed = True
+                print(f"[ERROR] Handler error: {e}")
+                traceback.print_exc()
+
+            with cond:
+                worker.processed += 1
+                if failed:
+                    worker.errors += 1
+
+
+class _LatestWorker:
+    """LatestValueDispatcher的一个工作线程：key -> 最新任务，按key第一次待处理的顺序执行"""
+
+    __slots__ = ('pending', 'cond', 'thread', 'submitted', 'processed', 'conflated', 'errors')
+
+    def __init__(self):
+        self.pending = collections.OrderedDict()
+        self.cond = threading.Condition()
+        self.thread = None
+        self.submitted = 0
+        self.processed = 0
+        self.conflated = 0
+        self.errors = 0
+
+
+class LatestValueDispatcher:
+    """按key只保留最新一条待处理任务的线程池，接口与KeyedDispatcher相同"""
+
+    def __init__(self, workers: int = 1, name: str = 'redis-conflate'):
+        """
+        创建线程池并启动工作线程
+
+        Args:
+            workers: 工作线程数，同一key总是由同一个工作线程处理
+            name: 工作线程名前缀
+
+        Raises:
+            ValueError: 参数无效
+        """
+        if workers <= 0:
+            raise ValueError("workers must be positive")
+
+        self._running = True
+        self._workers = [_LatestWorker() for _ in range(workers)]
+
+        for index, worker in enumerate(self._workers):
+            worker.thread = threading.Thread(target=self._run, args=(worker,),
+                                             name=f"{name}-{index}", daemon=True)
+            worker.thread.start()
+
+    def submit(self, key: Hashable, fn: Callable[..., None], *args: Any) -> bool:
+        """
+        提交一个任务：该key已有尚未执行的任务时替换它（计入conflated），位置不变
+
+        Returns:
+            True表示已入队，False表示线程池已停止
+        """
+        worker = self._workers[hash(key) % len(self._workers)]
+
+        with worker.cond:
+            if not self._running:
+                return False
+            worker.submitted += 1
+            if key in worker.pending:
+                worker.conflated += 1
+            else:
+                worker.cond.notify()
+            worker.pending[key] = (fn, args)
+        return True
+
+    def shutdown(self, wait: bool = True, drain: bool = True):
+        """停止线程池，参数同KeyedDispatcher.shutdown()"""
+        for worker in self._workers:
+            with worker.cond:
+                self._running = False
+                if not drain:
+                    worker.pending.clear()
+                worker.cond.notify_all()
+
+        if not wait:
+            return
+
+        current = threading.current_thread()
+        for worker in self._workers:
+            if worker.thread is not current:
+                worker.thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取线程池统计信息
+
+        Returns:
+            包含workers/pending/submitted/processed/conflated/errors的字典
+        """
+        result = {'workers': len(self._workers), 'pending': 0, 'submitted': 0,
+                  'processed': 0, 'conflated': 0, 'errors': 0}
+        for worker in self._workers:
+            with worker.cond:
+                result['pending'] += len(worker.pending)
+                result['submitted'] += worker.submitted
+                result['processed'] += worker.processed
+                result['conflated'] += worker.conflated
+                result['errors'] += worker.errors
+        return result
+
+    def _run(self, worker: _LatestWorker):
+        """工作线程主循环：停止后仍会执行完剩余的任务（drain=False时已清空）"""
+        pending = worker.pending
+        cond = worker.cond
+
+        while True:
+            with cond:
+                while not pending and self._running:
+                    cond.wait()
+                if not pending:
+                    return
+                _, (fn, args) = pending.popitem(last=False)
+
+            failed = False
+            try:
+                fn(*args)
+            except Exception as e:
+                failed = True
+                print(f"[ERROR] Handler error: {e}")
+                traceback.print_exc()
+
+            with cond:
+                worker.processed += 1
+                if failed:
+                    worker.errors += 1
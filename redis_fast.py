@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+CPython扩展模块_redis_pubsub的Python入口
+
+扩展模块与RedisPubSubDLL使用同一个原生库，但publish/subscribe的调用边界不经过ctypes：
+发布是一次METH_FASTCALL调用，订阅回调由事件循环线程直接vectorcall处理函数。
+只提供connect/publish/publish_many/subscribe/psubscribe/unsubscribe/punsubscribe/disconnect
+和set_compression，其余功能（codec、dispatch、过滤条件、统计等）仍使用RedisPubSubDLL。
+
+    from redis_fast import create_client
+
+    client = create_client()       # 扩展模块已编译时为RedisPubSubExt，否则为RedisPubSubDLL
+    client.connect("127.0.0.1", 6379)
+    client.subscribe("events", on_message, binary=True)
+
+扩展模块由CMake的_redis_pubsub目标编译（需要Python开发头文件），
+输出在build目录中，不需要安装到site-packages。
+"""
+
+import importlib.machinery
+import importlib.util
+import os
+import sys
+import zlib
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from redis_client import Message, RedisPubSubDLL, _to_bytes
+from redis_compress import Compression
+
+
+def _load_extension():
+    """导入_redis_pubsub：先按sys.path查找，再查找build目录（与RedisPubSubDLL查找库文件的位置相同）"""
+    try:
+        import _redis_pubsub
+        return _redis_pubsub
+    except ImportError:
+        pass
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for directory in ("build", os.path.join("build", "Release"), ""):
+        for suffix in importlib.machinery.EXTENSION_SUFFIXES:
+            path = os.path.join(base_dir, directory, "_redis_pubsub" + suffix)
+            if not os.path.exists(path):
+                continue
+            spec = importlib.util.spec_from_file_location("_redis_pubsub", path)
+            module = importlib.util.module_from_spec(spec)
+            try:
+                spec.loader.exec_module(module)
+            except ImportError as e:
+                print(f"[WARNING] Failed to load {path}: {e}")
+                continue
+            sys.modules["_redis_pubsub"] = module
+            return module
+    return None
+
+
+_ext = _load_extension()
+
+# 扩展模块是否可用
+HAVE_EXTENSION = _ext is not None
+
+
+class RedisPubSubExt:
+    """
+    基于扩展模块的客户端，方法的参数和返回值与RedisPubSubDLL的同名方法相同
+
+    publish()/publish_many()只在Python层检查连接状态、按set_compression()压缩，其余直接交给扩展模块；
+    订阅前开启了压缩的频道，binary=True的订阅会解压，与RedisPubSubDLL互通。
+    """
+
+    PUBLISH_SPOOLED = RedisPubSubDLL.PUBLISH_SPOOLED
+    PUBLISH_MOVED = RedisPubSubDLL.PUBLISH_MOVED
+
+    def __init__(self):
+        """
+        Raises:
+            ImportError: 扩展模块未编译
+            MemoryError: 原生客户端创建失败
+        """
+        if _ext is None:
+            raise ImportError("_redis_pubsub extension is not built")
+        self._client = _ext.Client()
+        self._lock = Lock()
+        self._connected = False
+        self._callbacks: Dict[str, Callable] = {}
+        self._patterns: Dict[str, Callable] = {}
+        self._compression = Compression()
+
+    def connect(self, hostname: str = "127.0.0.1", port: int = 6379) -> bool:
+        """连接到Redis服务器，True表示连接成功"""
+        with self._lock:
+            result = self._client.connect(hostname, port)
+            if result != 0:
+                print(f"[ERROR] Connection failed with code {result}")
+                return False
+            self._connected = True
+            return True
+
+    def disconnect(self) -> bool:
+        """断开连接，等待事件循环线程退出（不能在回调中调用）"""
+        with self._lock:
+            result = self._client.disconnect()
+            self._connected = False
+            self._callbacks.clear()
+            self._patterns.clear()
+            return result == 0
+
+    def subscribe(self, channel: str, callback: Callable[..., None], binary: bool = False) -> bool:
+        """
+        订阅频道
+
+        Args:
+            channel: 频道名称
+            callback: 回调函数，签名为 callback(channel: str, message: str) -> None；
+                      binary=True时签名为 callback(message: Message) -> None
+            binary: 是否使用二进制安全模式
+
+        Returns:
+            True表示订阅成功
+        """
+        return self._add_subscription(channel, callback, binary, pattern=False)
+
+    def psubscribe(self, pattern: str, callback: Callable[..., None], binary: bool = False) -> bool:
+        """模式订阅（glob风格），回调收到的是实际频道名，其余与subscribe()相同"""
+        return self._add_subscription(pattern, callback, binary, pattern=True)
+
+    def unsubscribe(self, channel: str) -> bool:
+        """取消订阅频道"""
+        return self._remove_subscription(channel, pattern=False)
+
+    def punsubscribe(self, pattern: str) -> bool:
+        """取消模式订阅"""
+        return self._remove_subscription(pattern, pattern=True)
+
+    def publish(self, channel: str, message: Union[str, bytes]) -> int:
+        """发布消息，返回接收消息的订阅者数量，-1表示发送失败（其余同RedisPubSubDLL.publish()）"""
+        if not self._connected:
+            print("[ERROR] Not connected to Redis")
+            return -1
+        if self._compression.enabled:
+            message = self._compression.compress(channel, _to_bytes(message))
+        return self._client.publish(channel, message)
+
+    def publish_many(self, messages: Iterable[Tuple[str, Union[str, bytes]]]) -> List[int]:
+        """批量发布（管道方式），返回每条消息的订阅者数量列表（同RedisPubSubDLL.publish_many()）"""
+        messages = list(messages)
+        if not self._connected:
+            if messages:
+                print("[ERROR] Not connected to Redis")
+            return [-1] * len(messages)
+        if self._compression.enabled:
+            compress = self._compression.compress
+            messages = [(channel, compress(channel, _to_bytes(payload))) for channel, payload in messages]
+        return self._client.publish_many(messages)
+
+    def set_compression(self, channel: Optional[str] = None, threshold: int = 1024, level: int = 6,
+                        dictionary: Optional[bytes] = None, enabled: bool = True) -> bool:
+        """
+        开启频道（channel为None时为所有频道）的透明压缩，参数同RedisPubSubDLL.set_compression()；
+        订阅方的解压只对之后的binary=True订阅生效
+
+        Returns:
+            True表示设置成功
+        """
+        try:
+            self._compression.configure(channel, threshold, level, dictionary, enabled)
+            return True
+        except (TypeError, ValueError, zlib.error) as e:
+            print(f"[ERROR] Invalid compression settings: {e}")
+            return False
+
+    def set_subscriber_shards(self, count: int) -> bool:
+        """设置订阅分片数，只能在connect()之前调用"""
+        return self._client.set_subscriber_shards(count) == 0
+
+    def _add_subscription(self, name: str, callback: Callable[..., None], binary: bool, pattern: bool) -> bool:
+        """subscribe()/psubscribe()的公共实现"""
+        if not self._connected:
+            print("[ERROR] Not connected to Redis")
+            return False
+        if not callable(callback):
+            print("[ERROR] Callback must be callable")
+            return False
+
+        callbacks = self._patterns if pattern else self._callbacks
+        subscribe = self._client.psubscribe if pattern else self._client.subscribe
+        message_type = Message if binary else None
+        with self._lock:
+            framed = self._compression.enabled if pattern else self._compression.configured(name)
+            decompress = self._compression.decompress if binary and framed else None
+            result = subscribe(name, callback, message_type, not binary, decompress)
+            if result != 0:
+                print(f"[ERROR] Subscribe failed with code {result}")
+                return False
+            callbacks[name] = callback
+            return True
+
+    def _remove_subscription(self, name: str, pattern: bool) -> bool:
+        """unsubscribe()/punsubscribe()的公共实现"""
+        callbacks = self._patterns if pattern else self._callbacks
+        unsubscribe = self._client.punsubscribe if pattern else self._client.unsubscribe
+        with self._lock:
+            if name not in callbacks:
+                print(f"[ERROR] Not subscribed to {'pattern' if pattern else 'channel'}: {name}")
+                return False
+            result = unsubscribe(name)
+            # 原生层在发送UNSUBSCRIBE之前已从订阅表删除记录，发送失败时订阅同样不再存在（与RedisPubSubDLL相同）
+            del callbacks[name]
+            if result != 0:
+                print(f"[ERROR] Unsubscribe failed with code {result}")
+                return False
+            return True
+
+    def is_connected(self) -> bool:
+        """检查是否已连接"""
+        return self._connected
+
+    def get_subscribed_channels(self) -> list:
+        """获取已订阅的频道列表"""
+        return list(self._callbacks.keys())
+
+    def get_subscribed_patterns(self) -> list:
+        """获取已订阅的模式列表"""
+        return list(self._patterns.keys())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._connected:
+            self.disconnect()
+
+
+def create_client(dll_path: Optional[str] = None,
+                  extension: Optional[bool] = None) -> Union[RedisPubSubExt, RedisPubSubDLL]:
+    """
+    创建客户端：扩展模块可用时返回RedisPubSubExt，否则回退到RedisPubSubDLL
+
+    Args:
+        dll_path: 回退到ctypes包装时使用的库路径，默认自动查找
+        extension: None自动选择；True要求使用扩展模块（未编译时抛出ImportError）；False总是使用ctypes包装
+    """
+    if extension is None:
+        extension = HAVE_EXTENSION
+    if extension:
+        return RedisPubSubExt()
+    return RedisPubSubDLL(dll_path)
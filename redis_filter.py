@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+订阅的原生过滤条件
+
+条件在订阅分片的事件循环线程中对原始payload求值，被拒绝的消息不进入Python
+（不调用ctypes回调、不获取GIL、不创建bytes），适合大部分消息都会被丢弃的订阅：
+
+    client.subscribe("events", handler, binary=True,
+                     filters=[prefix(b"tenant-42|"), ~json_field("type", "heartbeat")])
+
+一个订阅的多个条件全部满足才投递，~f表示取反。
+频道开启了压缩（见redis_compress，应在订阅前开启）时，未压缩的payload跳过头部求值，
+压缩过的payload原生层无法求值，总是通过，由处理函数自行判断。
+"""
+
+import json
+from typing import Any, Union
+
+PREFIX = 0
+CONTAINS = 1
+BYTES = 2
+JSON_FIELD = 3
+
+_TYPE_NAMES = {PREFIX: 'prefix', CONTAINS: 'contains', BYTES: 'at', JSON_FIELD: 'json_field'}
+
+# 与redis_codec的json编解码器相同的格式（紧凑分隔符，不转义非ASCII字符）
+_JSON = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+BytesLike = Union[str, bytes, bytearray, memoryview]
+
+
+def _to_bytes(value: BytesLike) -> bytes:
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value)
+    raise TypeError(f"Filter value must be str or bytes, not {type(value).__name__}")
+
+
+class Filter:
+    """一个过滤条件，由prefix()/contains()/at()/json_field()创建，创建后不可修改"""
+
+    __slots__ = ('type', 'value', 'offset', 'field', 'negate')
+
+    def __init__(self, type: int, value: bytes, offset: int = 0, field: bytes = b'', negate: bool = False):
+        if type not in _TYPE_NAMES:
+            raise ValueError(f"Invalid filter type: {type}")
+        if offset < 0:
+            raise ValueError("offset must be >= 0")
+        self.type = type
+        self.value = value
+        self.offset = offset
+        self.field = field
+        self.negate = negate
+
+    def __invert__(self) -> 'Filter':
+        return Filter(self.type, self.value, self.offset, self.field, not self.negate)
+
+    def __repr__(self) -> str:
+        name = _TYPE_NAMES[self.type]
+        if self.type == BYTES:
+            text = f"{name}({self.offset}, {self.value!r})"
+        elif self.type == JSON_FIELD:
+            text = f"{name}({self.field!r}, {self.value!r})"
+        else:
+            text = f"{name}({self.value!r})"
+        return f"~{text}" if self.negate else text
+
+
+def prefix(value: BytesLike) -> Filter:
+    """payload以value开头"""
+    return Filter(PREFIX, _to_bytes(value))
+
+
+def contains(value: BytesLike) -> Filter:
+    """payload包含value"""
+    return Filter(CONTAINS, _to_bytes(value))
+
+
+def at(offset: int, value: BytesLike) -> Filter:
+    """payload从offset起的字节等于value（定长二进制头部，例如StructCodec编码的类型字段）"""
+    return Filter(BYTES, _to_bytes(value), offset=offset)
+
+
+def json_field(name: str, value: Any) -> Filter:
+    """
+    payload是JSON对象，且顶层字段name的值等于value
+
+    比较的是JSON文本：value按redis_codec的json格式序列化（"eu" -> b'"eu"'，42 -> b'42'），
+    发布方使用其他格式（例如42.0、带转义的非ASCII字符串、嵌套对象内有空格）时不会匹配
+    """
+    return Filter(JSON_FIELD, _JSON.encode(value).encode('utf-8'), field=_to_bytes(name))
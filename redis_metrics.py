@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+统计信息的汇总与导出
+
+原生层的直方图按对数-线性方式分桶（见redis_pubsub.h中的RedisHistogram），本模块负责：
+    summarize()       把直方图换算为count/mean/max/p50/p90/p99/p999（微秒）
+    to_prometheus()   把RedisPubSubDLL.stats()的结果格式化为Prometheus文本格式
+    MetricsServer     在后台线程中提供 GET /metrics，供Prometheus抓取
+
+    server = MetricsServer(client, port=9108)
+    server.start()
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional
+
+
+HISTOGRAM_BUCKETS = 312
+
+# Prometheus导出的桶边界：2^10 ~ 2^34纳秒（约1微秒 ~ 17秒），与原生分桶的边界对齐
+_PROMETHEUS_BOUNDS_NS = [1 << k for k in range(10, 35)]
+
+
+def bucket_lower_ns(index: int) -> int:
+    """直方图桶index的下界（纳秒，含）"""
+    if index < 8:
+        return index
+    k, sub = (index - 8) // 8 + 3, (index - 8) % 8
+    return (8 + sub) << (k - 3)
+
+
+def bucket_upper_ns(index: int) -> int:
+    """直方图桶index的上界（纳秒，不含）"""
+    if index < 8:
+        return index + 1
+    k, sub = (index - 8) // 8 + 3, (index - 8) % 8
+    return (9 + sub) << (k - 3)
+
+
+def percentile_ns(buckets: List[int], fraction: float) -> float:
+    """按桶估算百分位数（取所在桶的中点），没有数据时返回0"""
+    total = sum(buckets)
+    if total == 0:
+        return 0.0
+
+    rank = fraction * total
+    seen = 0
+    for index, count in enumerate(buckets):
+        seen += count
+        if count and seen >= rank:
+            return (bucket_lower_ns(index) + bucket_upper_ns(index)) / 2
+    return float(bucket_upper_ns(len(buckets) - 1))
+
+
+def summarize(histogram: Dict[str, Any]) -> Dict[str, float]:
+    """
+    汇总一个直方图
+
+    Args:
+        histogram: 包含count/sum_ns/max_ns/buckets的字典
+
+    Returns:
+        包含count/mean_us/max_us/p50_us/p90_us/p99_us/p999_us的字典
+    """
+    count = histogram['count']
+    buckets = histogram['buckets']
+    result = {
+        'count': count,
+        'mean_us': histogram['sum_ns'] / count / 1000 if count else 0.0,
+        'max_us': histogram['max_ns'] / 1000,
+    }
+    for name, fraction in (('p50_us', 0.5), ('p90_us', 0.9), ('p99_us', 0.99), ('p999_us', 0.999)):
+        result[name] = percentile_ns(buckets, fraction) / 1000
+    return result
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _histogram_lines(name: str, histogram: Dict[str, Any], labels: Dict[str, str]) -> Iterable[str]:
+    """原生直方图 -> Prometheus histogram（单位秒，累计桶）"""
+    buckets = histogram['buckets']
+    yield f'# TYPE {name} histogram'
+
+    cumulative = 0
+    index = 0
+    for bound in _PROMETHEUS_BOUNDS_NS:
+        while index < len(buckets) and bucket_upper_ns(index) <= bound:
+            cumulative += buckets[index]
+            index += 1
+        yield f'{name}_bucket{_labels(dict(labels, le=repr(bound / 1e9)))} {cumulative}'
+
+    yield f'{name}_bucket{_labels(dict(labels, le="+Inf"))} {histogram["count"]}'
+    yield f'{name}_sum{_labels(labels)} {histogram["sum_ns"] / 1e9!r}'
+    yield f'{name}_count{_labels(labels)} {histogram["count"]}'
+
+
+def to_prometheus(stats: Dict[str, Any], prefix: str = 'redis_pubsub',
+                  labels: Optional[Dict[str, str]] = None) -> str:
+    """
+    把RedisPubSubDLL.stats()的结果格式化为Prometheus文本格式（0.0.4）
+
+    Args:
+        stats: RedisPubSubDLL.stats()的返回值（包含channels时同时导出各频道计数）
+        prefix: 指标名前缀
+        labels: 附加到每个指标的标签，例如 {'instance': 'worker-1'}
+
+    Returns:
+        文本格式的指标
+    """
+    labels = dict(labels or {})
+    lines = []
+
+    counters = [
+        ('messages_received_total', 'messages_in', 'Messages received on subscriber connections'),
+        ('received_bytes_total', 'bytes_in', 'Payload bytes received'),
+        ('messages_published_total', 'messages_out', 'Messages published or queued for publishing'),
+        ('published_bytes_total', 'bytes_out', 'Payload bytes published'),
+        ('publish_errors_total', 'publish_errors', 'Failed publishes'),
+        ('reconnects_total', 'reconnects', 'Successful reconnects'),
+        ('slow_callbacks_total', 'slow_callbacks', 'Callbacks exceeding the slow handler threshold'),
+        ('conflated_total', 'conflated', 'Messages superseded by a newer one on conflated channels'),
+        ('filtered_total', 'filtered', 'Messages rejected by native subscription filters'),
+    ]
+    for name, key, help_text in counters:
+        lines.append(f'# HELP {prefix}_{name} {help_text}')
+        lines.append(f'# TYPE {prefix}_{name} counter')
+        lines.append(f'{prefix}_{name}{_labels(labels)} {stats[key]}')
+
+    lines.append(f'# TYPE {prefix}_channels_tracked gauge')
+    lines.append(f'{prefix}_channels_tracked{_labels(labels)} {stats["channels_tracked"]}')
+
+    channels = stats.get('channels')
+    if channels:
+        for name, key in (('channel_messages_received_total', 'messages_in'),
+                          ('channel_received_bytes_total', 'bytes_in'),
+                          ('channel_messages_published_total', 'messages_out'),
+                          ('channel_published_bytes_total', 'bytes_out'),
+                          ('channel_conflated_total', 'conflated')):
+            lines.append(f'# TYPE {prefix}_{name} counter')
+            for channel, values in sorted(channels.items()):
+                lines.append(f'{prefix}_{name}{_labels(dict(labels, channel=channel))} {values[key]}')
+
+    compression = stats.get('compression')
+    if compression:
+        for name, key, scale in (('compressed_messages_total', 'compressed', 1),
+                                 ('compression_raw_bytes_total', 'raw_bytes', 1),
+                                 ('compression_compressed_bytes_total', 'compressed_bytes', 1),
+                                 ('compression_cpu_seconds_total', 'compress_ns', 1e-9),
+                                 ('decompressed_messages_total', 'decompressed', 1),
+                                 ('decompression_cpu_seconds_total', 'decompress_ns', 1e-9)):
+            lines.append(f'# TYPE {prefix}_{name} counter')
+            for channel, values in sorted(compression.items()):
+                value = values[key] * scale if scale != 1 else values[key]
+                lines.append(f'{prefix}_{name}{_labels(dict(labels, channel=channel))} {value!r}')
+
+    lines.extend(_histogram_lines(f'{prefix}_publish_rtt_seconds', stats['publish_rtt'], labels))
+    lines.extend(_histogram_lines(f'{prefix}_callback_duration_seconds', stats['callback_time'], labels))
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """
+    在后台线程中提供 GET /metrics（Prometheus文本格式）
+
+    每次抓取时调用client.stats(channels=...)，不额外保存状态
+    """
+
+    def __init__(self, client, host: str = '127.0.0.1', port: int = 9108,
+                 prefix: str = 'redis_pubsub', labels: Optional[Dict[str, str]] = None,
+                 channels: bool = True):
+        self.client = client
+        self.host = host
+        self.port = port
+        self.prefix = prefix
+        self.labels = labels
+        self.channels = channels
+        self._server = None
+        self._thread = None
+
+    def render(self) -> str:
+        return to_prometheus(self.client.stats(channels=self.channels), self.prefix, self.labels)
+
+    def start(self) -> 'MetricsServer':
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
+
+    def __enter__(self) -> 'MetricsServer':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,366 @@
+#ifndef REDIS_PLATFORM_H
+#define REDIS_PLATFORM_H
+
+/* 平台抽象层：锁、条件变量、线程、原子操作、时钟和socket
+ * Windows使用Win32/Winsock，其他平台使用pthread和POSIX socket
+ * 只供redis_pubsub.c内部使用，不属于对外接口 */
+
+#ifdef _WIN32
+#if !defined(_WIN32_WINNT) || _WIN32_WINNT < 0x0600
+#undef _WIN32_WINNT
+#define _WIN32_WINNT 0x0600     /* WSAPoll */
+#endif
+#else
+#include "hiredis/fmacros.h"    /* 与hiredis使用相同的特性宏，必须在系统头文件之前 */
+#endif
+
+#include <stdint.h>
+#include <string.h>
+
+#ifdef _WIN32
+
+#include <winsock2.h>
+#include <ws2tcpip.h>
+#include <windows.h>
+#include <process.h>
+
+typedef CRITICAL_SECTION rp_mutex;
+typedef CONDITION_VARIABLE rp_cond;
+typedef HANDLE rp_thread;
+typedef DWORD rp_thread_id;
+typedef SOCKET rp_socket;
+typedef WSAPOLLFD rp_pollfd;
+
+#define RP_INVALID_SOCKET INVALID_SOCKET
+#define RP_THREAD_FUNC unsigned int __stdcall
+#define RP_THREAD_RESULT 0
+
+typedef unsigned int (__stdcall *rp_thread_func)(void *arg);
+
+static inline void rp_mutex_init(rp_mutex *m) { InitializeCriticalSection(m); }
+static inline void rp_mutex_destroy(rp_mutex *m) { DeleteCriticalSection(m); }
+static inline void rp_mutex_lock(rp_mutex *m) { EnterCriticalSection(m); }
+static inline void rp_mutex_unlock(rp_mutex *m) { LeaveCriticalSection(m); }
+static inline int rp_mutex_trylock(rp_mutex *m) { return TryEnterCriticalSection(m) ? 1 : 0; }
+
+static inline void rp_cond_init(rp_cond *c) { InitializeConditionVariable(c); }
+static inline void rp_cond_destroy(rp_cond *c) { (void)c; }
+static inline void rp_cond_signal(rp_cond *c) { WakeConditionVariable(c); }
+static inline void rp_cond_broadcast(rp_cond *c) { WakeAllConditionVariable(c); }
+
+/* 等待条件变量，timeout_ms<0表示一直等待 */
+static inline void rp_cond_wait(rp_cond *c, rp_mutex *m, int timeout_ms) {
+    SleepConditionVariableCS(c, m, timeout_ms < 0 ? INFINITE : (DWORD)timeout_ms);
+}
+
+static inline int rp_thread_create(rp_thread *thread, rp_thread_id *id, rp_thread_func func, void *arg) {
+    unsigned int tid = 0;
+    *thread = (HANDLE)_beginthreadex(NULL, 0, func, arg, 0, &tid);
+    if (!*thread) {
+        return -1;
+    }
+    *id = (DWORD)tid;
+    return 0;
+}
+
+static inline void rp_thread_join(rp_thread thread) {
+    WaitForSingleObject(thread, INFINITE);
+    CloseHandle(thread);
+}
+
+static inline rp_thread_id rp_thread_self(void) { return GetCurrentThreadId(); }
+static inline int rp_thread_equal(rp_thread_id a, rp_thread_id b) { return a == b; }
+
+static inline long long rp_atomic_inc64(volatile long long *p) {
+    return InterlockedIncrement64((volatile LONGLONG*)p);
+}
+
+static inline long long rp_atomic_add64(volatile long long *p, long long value) {
+    return InterlockedExchangeAdd64((volatile LONGLONG*)p, value) + value;
+}
+
+/* 比较并交换，返回原值 */
+static inline long long rp_atomic_cas64(volatile long long *p, long long expected, long long desired) {
+    return InterlockedCompareExchange64((volatile LONGLONG*)p, desired, expected);
+}
+
+static inline long rp_atomic_inc32(volatile long *p) { return InterlockedIncrement(p); }
+
+static inline long rp_atomic_swap32(volatile long *p, long value) { return InterlockedExchange(p, value); }
+
+/* 单调时钟（毫秒/微秒/纳秒） */
+static inline long long rp_now_ms(void) { return (long long)GetTickCount64(); }
+
+static inline long long rp_now_us(void) {
+    static LONGLONG frequency = 0;
+    LARGE_INTEGER now;
+    if (frequency == 0) {
+        LARGE_INTEGER f;
+        QueryPerformanceFrequency(&f);
+        frequency = f.QuadPart;
+    }
+    QueryPerformanceCounter(&now);
+    return (long long)(now.QuadPart / frequency * 1000000 + now.QuadPart % frequency * 1000000 / frequency);
+}
+
+static inline long long rp_now_ns(void) {
+    static LONGLONG frequency = 0;
+    LARGE_INTEGER now;
+    if (frequency == 0) {
+        LARGE_INTEGER f;
+        QueryPerformanceFrequency(&f);
+        frequency = f.QuadPart;
+    }
+    QueryPerformanceCounter(&now);
+    return (long long)(now.QuadPart / frequency * 1000000000 + now.QuadPart % frequency * 1000000000 / frequency);
+}
+
+static inline int rp_net_init(void) {
+    WSADATA wsadata;
+    return WSAStartup(MAKEWORD(2, 2), &wsadata) == 0 ? 0 : -1;
+}
+
+static inline void rp_net_cleanup(void) { WSACleanup(); }
+
+static inline void rp_socket_close(rp_socket s) { closesocket(s); }
+
+static inline void rp_socket_shutdown(rp_socket s) { shutdown(s, SD_BOTH); }
+
+static inline int rp_socket_set_nonblocking(rp_socket s) {
+    u_long nonblocking = 1;
+    return ioctlsocket(s, FIONBIO, &nonblocking) == 0 ? 0 : -1;
+}
+
+static inline int rp_send(rp_socket s, const char *buf, int len) { return send(s, buf, len, 0); }
+static inline int rp_recv(rp_socket s, char *buf, int len) { return recv(s, buf, len, 0); }
+
+static inline int rp_poll(rp_pollfd *fds, int count, int timeout_ms) {
+    return WSAPoll(fds, (ULONG)count, timeout_ms);
+}
+
+/* 用回环TCP连接模拟socketpair（Windows没有pipe可供select/poll监听）
+ * 两端都设为非阻塞，调用方需先调用rp_net_init */
+static inline int rp_socket_pair(rp_socket pair[2]) {
+    SOCKET listener = socket(AF_INET, SOCK_STREAM, IPPROTO_TCP);
+    if (listener == INVALID_SOCKET) {
+        return -1;
+    }
+    
+    struct sockaddr_in addr;
+    int addr_len = sizeof(addr);
+    memset(&addr, 0, sizeof(addr));
+    addr.sin_family = AF_INET;
+    addr.sin_addr.s_addr = htonl(INADDR_LOOPBACK);
+    addr.sin_port = 0;
+    
+    if (bind(listener, (struct sockaddr*)&addr, sizeof(addr)) != 0 ||
+        listen(listener, 1) != 0 ||
+        getsockname(listener, (struct sockaddr*)&addr, &addr_len) != 0) {
+        closesocket(listener);
+        return -1;
+    }
+    
+    pair[1] = socket(AF_INET, SOCK_STREAM, IPPROTO_TCP);
+    if (pair[1] == INVALID_SOCKET ||
+        connect(pair[1], (struct sockaddr*)&addr, sizeof(addr)) != 0) {
+        if (pair[1] != INVALID_SOCKET) {
+            closesocket(pair[1]);
+        }
+        closesocket(listener);
+        return -1;
+    }
+    
+    pair[0] = accept(listener, NULL, NULL);
+    closesocket(listener);
+    if (pair[0] == INVALID_SOCKET) {
+        closesocket(pair[1]);
+        return -1;
+    }
+    
+    int nodelay = 1;
+    rp_socket_set_nonblocking(pair[0]);
+    rp_socket_set_nonblocking(pair[1]);
+    setsockopt(pair[1], IPPROTO_TCP, TCP_NODELAY, (const char*)&nodelay, sizeof(nodelay));
+    return 0;
+}
+
+#else /* POSIX */
+
+#include <pthread.h>
+#include <poll.h>
+#include <time.h>
+#include <errno.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/types.h>
+#include <sys/socket.h>
+
+typedef pthread_mutex_t rp_mutex;
+typedef pthread_cond_t rp_cond;
+typedef pthread_t rp_thread;
+typedef pthread_t rp_thread_id;
+typedef int rp_socket;
+typedef struct pollfd rp_pollfd;
+
+#define RP_INVALID_SOCKET (-1)
+#define RP_THREAD_FUNC void*
+#define RP_THREAD_RESULT NULL
+
+typedef void* (*rp_thread_func)(void *arg);
+
+/* 写入已关闭的socket时不产生SIGPIPE */
+#ifdef MSG_NOSIGNAL
+#define RP_SEND_FLAGS MSG_NOSIGNAL
+#else
+#define RP_SEND_FLAGS 0
+#endif
+
+static inline void rp_mutex_init(rp_mutex *m) { pthread_mutex_init(m, NULL); }
+static inline void rp_mutex_destroy(rp_mutex *m) { pthread_mutex_destroy(m); }
+static inline void rp_mutex_lock(rp_mutex *m) { pthread_mutex_lock(m); }
+static inline void rp_mutex_unlock(rp_mutex *m) { pthread_mutex_unlock(m); }
+static inline int rp_mutex_trylock(rp_mutex *m) { return pthread_mutex_trylock(m) == 0 ? 1 : 0; }
+
+/* 条件变量使用单调时钟（macOS不支持，退回系统时间） */
+static inline void rp_cond_init(rp_cond *c) {
+#ifdef __APPLE__
+    pthread_cond_init(c, NULL);
+#else
+    pthread_condattr_t attr;
+    pthread_condattr_init(&attr);
+    pthread_condattr_setclock(&attr, CLOCK_MONOTONIC);
+    pthread_cond_init(c, &attr);
+    pthread_condattr_destroy(&attr);
+#endif
+}
+
+static inline void rp_cond_destroy(rp_cond *c) { pthread_cond_destroy(c); }
+static inline void rp_cond_signal(rp_cond *c) { pthread_cond_signal(c); }
+static inline void rp_cond_broadcast(rp_cond *c) { pthread_cond_broadcast(c); }
+
+/* 等待条件变量，timeout_ms<0表示一直等待 */
+static inline void rp_cond_wait(rp_cond *c, rp_mutex *m, int timeout_ms) {
+    if (timeout_ms < 0) {
+        pthread_cond_wait(c, m);
+        return;
+    }
+    
+    struct timespec deadline;
+#ifdef __APPLE__
+    clock_gettime(CLOCK_REALTIME, &deadline);
+#else
+    clock_gettime(CLOCK_MONOTONIC, &deadline);
+#endif
+    deadline.tv_sec += timeout_ms / 1000;
+    deadline.tv_nsec += (long)(timeout_ms % 1000) * 1000000L;
+    if (deadline.tv_nsec >= 1000000000L) {
+        deadline.tv_sec++;
+        deadline.tv_nsec -= 1000000000L;
+    }
+    pthread_cond_timedwait(c, m, &deadline);
+}
+
+static inline int rp_thread_create(rp_thread *thread, rp_thread_id *id, rp_thread_func func, void *arg) {
+    if (pthread_create(thread, NULL, func, arg) != 0) {
+        return -1;
+    }
+    *id = *thread;
+    return 0;
+}
+
+static inline void rp_thread_join(rp_thread thread) { pthread_join(thread, NULL); }
+
+static inline rp_thread_id rp_thread_self(void) { return pthread_self(); }
+static inline int rp_thread_equal(rp_thread_id a, rp_thread_id b) { return pthread_equal(a, b) != 0; }
+
+static inline long long rp_atomic_inc64(volatile long long *p) {
+    return __atomic_add_fetch(p, 1, __ATOMIC_SEQ_CST);
+}
+
+static inline long long rp_atomic_add64(volatile long long *p, long long value) {
+    return __atomic_add_fetch(p, value, __ATOMIC_SEQ_CST);
+}
+
+/* 比较并交换，返回原值 */
+static inline long long rp_atomic_cas64(volatile long long *p, long long expected, long long desired) {
+    __atomic_compare_exchange_n(p, &expected, desired, 0, __ATOMIC_SEQ_CST, __ATOMIC_SEQ_CST);
+    return expected;
+}
+
+static inline long rp_atomic_inc32(volatile long *p) { return __atomic_add_fetch(p, 1, __ATOMIC_SEQ_CST); }
+
+static inline long rp_atomic_swap32(volatile long *p, long value) {
+    return __atomic_exchange_n(p, value, __ATOMIC_SEQ_CST);
+}
+
+/* 单调时钟（毫秒/微秒/纳秒） */
+static inline long long rp_now_ms(void) {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (long long)ts.tv_sec * 1000 + ts.tv_nsec / 1000000;
+}
+
+static inline long long rp_now_us(void) {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (long long)ts.tv_sec * 1000000 + ts.tv_nsec / 1000;
+}
+
+static inline long long rp_now_ns(void) {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (long long)ts.tv_sec * 1000000000 + ts.tv_nsec;
+}
+
+static inline int rp_net_init(void) { return 0; }
+static inline void rp_net_cleanup(void) { }
+
+static inline void rp_socket_close(rp_socket s) { close(s); }
+
+static inline void rp_socket_shutdown(rp_socket s) { shutdown(s, SHUT_RDWR); }
+
+static inline int rp_socket_set_nonblocking(rp_socket s) {
+    int flags = fcntl(s, F_GETFL, 0);
+    if (flags < 0) {
+        return -1;
+    }
+    return fcntl(s, F_SETFL, flags | O_NONBLOCK) == 0 ? 0 : -1;
+}
+
+static inline int rp_send(rp_socket s, const char *buf, int len) {
+    return (int)send(s, buf, (size_t)len, RP_SEND_FLAGS);
+}
+
+static inline int rp_recv(rp_socket s, char *buf, int len) { return (int)recv(s, buf, (size_t)len, 0); }
+
+static inline int rp_poll(rp_pollfd *fds, int count, int timeout_ms) {
+    int n = poll(fds, (nfds_t)count, timeout_ms);
+    return n < 0 && errno == EINTR ? 0 : n;
+}
+
+/* 本地socket对，两端都设为非阻塞 */
+static inline int rp_socket_pair(rp_socket pair[2]) {
+    if (socketpair(AF_UNIX, SOCK_STREAM, 0, pair) != 0) {
+        return -1;
+    }
+    rp_socket_set_nonblocking(pair[0]);
+    rp_socket_set_nonblocking(pair[1]);
+    return 0;
+}
+
+#endif /* _WIN32 */
+
+/* 当前线程的散列值（发布连接池的线程亲和模式使用） */
+static inline unsigned long long rp_thread_hash(void) {
+#ifdef _WIN32
+    unsigned long long x = (unsigned long long)GetCurrentThreadId();
+#else
+    unsigned long long x = (unsigned long long)(uintptr_t)pthread_self();
+#endif
+    x ^= x >> 33;
+    x *= 0xff51afd7ed558ccdULL;
+    x ^= x >> 33;
+    return x;
+}
+
+#endif /* REDIS_PLATFORM_H */
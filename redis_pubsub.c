@@ -1,74 +1,686 @@
 #include "redis_pubsub.h"
+#include "redis_platform.h"
+#include "hiredis/dict.c"   /* dict.c只有static函数，与hiredis的async.c一样直接包含 */
 #include "hiredis/hiredis.h"
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
-#include <windows.h>
-#include <process.h>
-
-/* 全局变量 */
-static redisContext *g_context = NULL;
-static redisContext *g_sub_context = NULL;
-static HANDLE g_thread = NULL;
-static int g_running = 0;
-static PubSubCallback g_callbacks[100];  /* 最多支持100个频道 */
-static char g_channels[100][256];
-static int g_callback_count = 0;
-static CRITICAL_SECTION g_lock;
+
+/* ==================== 订阅表（频道 -> 处理方式） ==================== */
+
+/* 二进制安全的频道名，作为哈希表的键 */
+typedef struct ChannelKey {
+    const char *name;
+    size_t len;
+} ChannelKey;
+
+/* 一个过滤条件（见RedisFilter），字符串指向所属FilterSet的同一块内存 */
+typedef struct FilterRule {
+    int type;
+    int negate;
+    size_t offset;
+    const char *field;
+    size_t field_len;
+    const char *value;
+    size_t value_len;
+} FilterRule;
+
+/* redis_compress的payload头部：魔数 + flags（未压缩的头部只有这4字节） */
+#define COMPRESS_MAGIC      "\0RZ"
+#define COMPRESS_MAGIC_LEN  3
+#define COMPRESS_HEADER_LEN 4
+#define COMPRESS_FLAG_RAW   0x02
+
+/* 一个订阅的全部过滤条件（全部满足才投递），与条件中的字符串一次分配；计数器由分片锁保护 */
+typedef struct FilterSet {
+    int count;
+    int framed;                 /* 1表示payload带压缩头部（REDIS_FILTER_COMPRESSED） */
+    long long passed;
+    long long rejected;
+    FilterRule *rules;
+} FilterSet;
+
+/* 一个频道的订阅信息，key必须是第一个成员（哈希表的键指向它） */
+/* 订阅的处理方式：文本回调、二进制回调、带userdata的回调、批量回调四者之一，或进入投递队列
+ * 投递时在锁内复制一份，锁外调用 */
+typedef struct Handler {
+    PubSubCallback callback;
+    PubSubBinaryCallback binary_callback;
+    PubSubDataCallback data_callback;
+    void *userdata;
+    int queued;                 /* 1表示该频道消息进入投递队列 */
+    PubSubBatchCallback batch_callback;
+    int max_batch;              /* 批量投递：每批最多的消息数 */
+    int max_delay_ms;           /* 批量投递：第一条消息最多等待的毫秒数 */
+    size_t record_size;         /* 批量投递：不为0时只接受该长度的消息 */
+} Handler;
+
+typedef struct Subscription {
+    ChannelKey key;
+    Handler handler;
+    int conflate;               /* 1表示合并投递：一次读取中只投递该频道最新的一条消息 */
+    FilterSet *filter;          /* 过滤条件，未设置时为NULL */
+    struct EchoWindow *echo;    /* 已在本地投递、等待Redis回传的消息（启用本地投递后按需分配） */
+} Subscription;
+
+static unsigned int channel_key_hash(const void *key);
+static int channel_key_compare(void *privdata, const void *key1, const void *key2);
+static void subscription_destructor(void *privdata, void *val);
+
+static dictType g_subscription_dict_type = {
+    channel_key_hash,           /* hashFunction */
+    NULL,                       /* keyDup */
+    NULL,                       /* valDup */
+    channel_key_compare,        /* keyCompare */
+    NULL,                       /* keyDestructor（键内嵌在Subscription中） */
+    subscription_destructor     /* valDestructor */
+};
+
+/* ==================== 投递队列（环形缓冲区） ==================== */
+
+#define REDIS_QUEUE_DEFAULT_CAPACITY 16384
+
+/* 队列槽位：buf预分配并重复使用，只在消息变大时才扩容 */
+typedef struct QueueSlot {
+    char *buf;              /* channel + '\0' + data + '\0' */
+    size_t buf_size;
+    size_t channel_len;
+    size_t data_len;
+} QueueSlot;
+
+typedef struct MessageQueue {
+    QueueSlot *slots;
+    int capacity;
+    int config_capacity;
+    int head;               /* 下一个写入位置 */
+    int tail;               /* 最早未释放的位置 */
+    int count;              /* 已占用的槽位数（含已交给调用方的） */
+    int inflight;           /* 上一次poll交给调用方、尚未释放的槽位数 */
+    long long high_watermark;
+    long long enqueued;
+    long long dequeued;
+    long long overflow;
+    rp_mutex lock;
+    rp_cond cond;
+    
+    /* 唤醒socket对：写端由事件循环写入，读端交给调用方的事件循环监听 */
+    rp_socket wakeup_read;
+    rp_socket wakeup_write;
+} MessageQueue;
+
+/* ==================== 断线重连 ==================== */
+
+#define REDIS_RECONNECT_DEFAULT_INITIAL_MS 100
+#define REDIS_RECONNECT_DEFAULT_MAX_MS     5000
+#define REDIS_SPOOL_DEFAULT_MAX            10000
+#define REDIS_CONNECT_TIMEOUT_MS           1000
+
+/* 一个连接的退避状态，只由持有该连接的线程访问
+ * 断开后立即尝试一次，之后每次失败退避时间翻倍（不超过max_ms），实际等待时间在[delay/2, delay]内随机，
+ * 避免大量客户端在Redis重启后同时重连 */
+typedef struct Backoff {
+    long long down_since;           /* 断开时刻（毫秒），0表示连接正常 */
+    long long next_attempt;         /* 下一次允许尝试重连的时刻 */
+    int delay_ms;                   /* 当前退避时间（不含抖动） */
+    unsigned int seed;              /* 抖动用的随机数状态 */
+} Backoff;
+
+/* 重连配置和统计（所有连接共用） */
+typedef struct ReconnectState {
+    int initial_ms;                 /* 首次退避时间，0表示不自动重连 */
+    int max_ms;                     /* 最长退避时间 */
+    volatile long long reconnects;
+    volatile long long failed_attempts;
+    volatile long long disconnected;
+    volatile long long last_outage_ms;
+    volatile long long max_outage_ms;
+} ReconnectState;
+
+/* ==================== 发布连接池 ==================== */
+
+#define REDIS_PUBLISH_POOL_MAX 64
+
+/* 一个发布连接，各连接独立加锁，不同线程的发布互不阻塞 */
+typedef struct PublishConnection {
+    redisContext *context;
+    Backoff backoff;                /* 受lock保护 */
+    rp_mutex lock;
+} PublishConnection;
+
+typedef struct PublishPool {
+    PublishConnection *conns;   /* 连接数组及其锁在redis_client_free之前一直有效 */
+    int size;
+    int config_size;
+    int mode;                   /* REDIS_POOL_ROUND_ROBIN或REDIS_POOL_THREAD_AFFINE */
+    volatile long next;         /* 轮询计数 */
+    volatile long long acquired;
+    volatile long long contended;
+    volatile long long wait_total_us;
+    volatile long long wait_max_us;
+} PublishPool;
+
+/* ==================== 异步发布 ==================== */
+
+#define REDIS_ASYNC_DEFAULT_MAX_BATCH   1024
+#define REDIS_ASYNC_DEFAULT_MAX_PENDING 65536
+
+/* 一条待发送的消息，channel和message连续存放在所属批次的data中 */
+typedef struct PendingPublish {
+    size_t offset;
+    size_t channel_len;
+    size_t message_len;
+    PublishCompletion callback;
+    void *userdata;
+    long long submitted_ns;         /* 提交时间，用于统计发布往返时间 */
+} PendingPublish;
+
+/* 一批待发送的消息：entries和data重复使用，只在变大时扩容 */
+typedef struct PublishBatch {
+    PendingPublish *entries;
+    int count;
+    int capacity;
+    char *data;
+    size_t data_len;
+    size_t data_capacity;
+} PublishBatch;
+
+/* 已写出、等待回复的一条消息（回复按发送顺序到达） */
+typedef struct InflightPublish {
+    PublishCompletion callback;
+    void *userdata;
+    long long submitted_ns;
+} InflightPublish;
+
+/* 等待回复的消息（环形FIFO，只在事件循环线程中访问） */
+typedef struct InflightRing {
+    InflightPublish *items;
+    int capacity;
+    int head;                       /* 最早发出的消息 */
+    int count;
+} InflightRing;
+
+/* 双缓冲：调用方写入pending，事件循环取走另一个批次后在锁外追加到连接 */
+typedef struct AsyncPublisher {
+    redisContext *context;          /* 专用非阻塞连接，不占用发布连接池（事件循环线程） */
+    int want_write;                 /* 输出缓冲区还有未写出的数据（事件循环线程） */
+    Backoff backoff;                /* 连接的退避状态（事件循环线程） */
+    volatile int disconnected;      /* 连接断开、等待重连：新消息积压在pending中（spool） */
+    int spool_max;                  /* 断开期间最多积压的消息数，超过时拒绝 */
+    long long spooled;              /* 积压在pending中、等待重连后补发的消息数（spool_depth） */
+    long long spool_dropped;
+    InflightRing inflight;          /* 已写出、等待回复的消息（事件循环线程） */
+    int max_batch;                  /* 攒够这么多条立即唤醒事件循环 */
+    int max_pending;                /* 未完成消息数上限，超过时调用方等待 */
+    int linger_ms;                  /* 不足max_batch时最多再等待的时间 */
+    int flush_waiters;
+    long long batch_started;        /* pending中第一条消息的提交时间（毫秒） */
+    PublishBatch batches[2];
+    PublishBatch *pending;
+    rp_mutex lock;
+    rp_cond done_cond;              /* 收到回复 -> flush/等待空间的调用方 */
+    long long submitted;
+    long long completed;
+    long long failed;
+    long long batch_count;
+} AsyncPublisher;
+
+/* ==================== 事件循环 ==================== */
+
+/* 每个订阅分片一个事件循环线程，用poll驱动该分片的订阅连接（0号分片同时驱动异步发布连接）：
+ * 订阅/取消订阅命令由调用方格式化后放入commands，异步消息放入AsyncPublisher，
+ * 再通过唤醒socket通知循环线程写出，不再为每类连接各占一个阻塞线程 */
+typedef struct EventLoop {
+    rp_thread thread;
+    rp_thread_id thread_id;
+    int started;
+    volatile int running;
+    rp_socket wakeup_read;          /* 其他线程写入一个字节唤醒poll */
+    rp_socket wakeup_write;
+    volatile long wakeup_pending;   /* 已写入唤醒字节、循环尚未读走 */
+    rp_mutex lock;                  /* 保护commands和命令序号 */
+    rp_cond cond;                   /* 收到确认或订阅连接断开 -> 等待的调用方 */
+    char *commands;                 /* 待写入订阅连接的命令（RESP格式） */
+    size_t commands_len;
+    size_t commands_capacity;
+    long long submitted;            /* 已提交命令预期的确认回复总数（每个频道/模式一条） */
+    long long confirmed;            /* 已收到的确认回复数 */
+    int sub_failed;                 /* 订阅连接已断开 */
+    int sub_want_write;             /* 订阅连接还有未写出的数据（事件循环线程） */
+} EventLoop;
+
+/* ==================== 合并投递 ==================== */
+
+#define REDIS_CONFLATE_MAX_READS 64     /* 有待投递的合并消息时，每轮最多再读取的次数（每次最多16KB） */
+
+/* 一个合并频道最新的待投递消息，key必须是第一个成员（key.name指向buf中的频道名）
+ * buf重复使用，只在消息变大时才扩容；只在所属分片的事件循环线程中访问 */
+typedef struct ConflatedMessage {
+    ChannelKey key;
+    char *buf;              /* channel + '\0' + data + '\0' */
+    size_t buf_size;
+    size_t data_len;
+    int pending;            /* 1表示已加入待投递列表 */
+} ConflatedMessage;
+
+static void conflated_destructor(void *privdata, void *val);
+
+static dictType g_conflated_dict_type = {
+    channel_key_hash,           /* hashFunction */
+    NULL,                       /* keyDup */
+    NULL,                       /* valDup */
+    channel_key_compare,        /* keyCompare */
+    NULL,                       /* keyDestructor（键内嵌在ConflatedMessage中） */
+    conflated_destructor        /* valDestructor */
+};
+
+#define REDIS_BATCH_MAX 65536          /* 批量订阅每批最多的消息数 */
+
+/* 批量订阅正在积累的一批消息，key必须是第一个成员（key.name指向name）
+ * 缓冲区重复使用，只在一批更大时才扩容；只在所属分片的事件循环线程中访问 */
+typedef struct BatchBuffer {
+    ChannelKey key;
+    char *name;
+    char *data;             /* count条payload首尾相接 */
+    size_t data_len;
+    size_t data_capacity;
+    size_t *lens;
+    int count;
+    int capacity;           /* lens的容量 */
+    long long deadline;     /* 本批第一条消息到达时间 + max_delay_ms（rp_now_ns） */
+} BatchBuffer;
+
+static void batch_destructor(void *privdata, void *val);
+
+static dictType g_batch_dict_type = {
+    channel_key_hash,           /* hashFunction */
+    NULL,                       /* keyDup */
+    NULL,                       /* valDup */
+    channel_key_compare,        /* keyCompare */
+    NULL,                       /* keyDestructor（键内嵌在BatchBuffer中） */
+    batch_destructor            /* valDestructor */
+};
+
+/* ==================== 订阅分片 ==================== */
+
+#define REDIS_SUBSCRIBER_SHARDS_MAX 64
+
+/* 一个订阅分片：独立的订阅连接、事件循环线程和订阅表
+ * 频道按名称哈希分配到分片，多个分片的RESP解析和分发在各自线程中并行进行 */
+typedef struct SubscriberShard {
+    redis_client *client;
+    redisContext *context;          /* 订阅连接（非阻塞，只在本分片的事件循环线程中读写） */
+    Backoff backoff;                /* 订阅连接的退避状态（事件循环线程） */
+    EventLoop loop;
+    rp_mutex lock;                  /* 保护本分片的订阅表 */
+    dict *subscriptions;            /* 频道 -> 订阅，数量不设上限 */
+    dict *patterns;                 /* 模式 -> 订阅（PSUBSCRIBE） */
+    dict *staged;                   /* 频道 -> 暂存的订阅选项（只用conflate/filter），下一次订阅时生效 */
+    dict *staged_patterns;          /* 模式 -> 暂存的订阅选项 */
+    volatile long long messages;    /* 本分片收到的消息数 */
+    dict *conflated;                /* 频道 -> ConflatedMessage（事件循环线程，按需创建） */
+    ConflatedMessage **pending;     /* 本轮读取中待投递的合并消息，按第一次到达的顺序 */
+    int pending_count;
+    int pending_capacity;
+    dict *batches;                  /* 频道 -> BatchBuffer（事件循环线程，按需创建） */
+    long long batch_deadline;       /* 最早的未投递批次的截止时间，0表示没有 */
+} SubscriberShard;
+
+/* ==================== 本地投递 ==================== */
+
+#define REDIS_ECHO_WINDOW     256       /* 每个频道最多记录的等待回传消息数 */
+#define REDIS_ECHO_TIMEOUT_MS 10000     /* 超过该时间仍未回传的记录视为丢失 */
+
+/* 本地投递过的一条消息的指纹（消息内容的FNV-1a哈希和长度） */
+typedef struct EchoEntry {
+    unsigned long long hash;
+    size_t len;
+    long long expires;
+} EchoEntry;
+
+/* 一个频道等待Redis回传的消息指纹（环形，head为最早的记录），由分片锁保护 */
+typedef struct EchoWindow {
+    EchoEntry entries[REDIS_ECHO_WINDOW];
+    int head;
+    int count;
+} EchoWindow;
+
+typedef struct LocalDelivery {
+    volatile int enabled;
+    volatile int suppress_echo;
+    volatile long long delivered;       /* 在发布线程中直接投递的消息数 */
+    volatile long long echo_suppressed; /* 丢弃的Redis回传副本数 */
+    volatile long long echo_expired;    /* 超时或窗口已满、未等到回传就丢弃的记录数 */
+} LocalDelivery;
+
+/* ==================== 统计 ==================== */
+
+#define REDIS_CHANNEL_STATS_DEFAULT_MAX 1024
+#define REDIS_STATS_STRIPES             16
+
+/* 一个频道的收发计数器，key必须是第一个成员；创建后一直保留到redis_client_free */
+typedef struct ChannelCounters {
+    ChannelKey key;
+    volatile long long messages_in;
+    volatile long long bytes_in;
+    volatile long long messages_out;
+    volatile long long bytes_out;
+    volatile long long conflated;
+} ChannelCounters;
+
+/* 频道计数器表按频道名哈希分段，各段独立加锁且只在查找/创建时持锁，计数本身用原子操作 */
+typedef struct CountersStripe {
+    rp_mutex lock;
+    dict *channels;
+} CountersStripe;
+
+typedef struct Metrics {
+    volatile long long messages_in;
+    volatile long long bytes_in;
+    volatile long long messages_out;
+    volatile long long bytes_out;
+    volatile long long publish_errors;      /* 同步发布失败数（异步失败数在AsyncPublisher中） */
+    volatile long long slow_callbacks;
+    volatile long long conflated;           /* 合并投递时被覆盖的消息数 */
+    volatile long long filtered;            /* 被过滤条件拒绝的消息数 */
+    RedisHistogram publish_rtt;
+    RedisHistogram callback_time;
+    CountersStripe stripes[REDIS_STATS_STRIPES];
+    volatile long long channels_tracked;
+    volatile int max_channels;
+    volatile long long slow_threshold_ns;   /* 0表示不检测慢回调 */
+    rp_mutex lock;                          /* 保护slow_hook和slow_userdata */
+    SlowHandlerHook slow_hook;
+    void *slow_userdata;
+} Metrics;
+
+static void counters_destructor(void *privdata, void *val);
+
+static dictType g_counters_dict_type = {
+    channel_key_hash,           /* hashFunction */
+    NULL,                       /* keyDup */
+    NULL,                       /* valDup */
+    channel_key_compare,        /* keyCompare */
+    NULL,                       /* keyDestructor（键内嵌在ChannelCounters中） */
+    counters_destructor         /* valDestructor */
+};
+
+/* ==================== 客户端实例 ==================== */
+
+struct redis_client {
+    char *hostname;                 /* 最近一次连接的地址（异步发布连接重连时使用） */
+    int port;
+    int net_ready;                  /* 已调用rp_net_init */
+    PublishPool pool;               /* 发布连接池 */
+    AsyncPublisher async;           /* 异步发布（由0号分片的事件循环驱动） */
+    SubscriberShard *shards;        /* 分片数组及其锁在redis_client_free之前一直有效 */
+    int shard_count;
+    int config_shards;
+    int sharded;                    /* 1表示分片发布/订阅（SPUBLISH/SSUBSCRIBE，Redis Cluster） */
+    ClusterMovedHook moved_hook;    /* 分片频道的槽位迁移通知 */
+    void *moved_userdata;
+    ReconnectState reconnect;
+    LocalDelivery local;
+    Metrics metrics;
+    volatile int running;
+    MessageQueue queue;
+};
+
+/* 旧接口（redis_init/redis_publish等）使用的默认实例 */
+static redis_client *g_default_client = NULL;
+
+/* 发布/订阅命令名：分片模式使用SPUBLISH/SSUBSCRIBE/SUNSUBSCRIBE */
+#define PUBLISH_COMMAND(client)     ((client)->sharded ? "SPUBLISH" : "PUBLISH")
+#define SUBSCRIBE_COMMAND(client)   ((client)->sharded ? "SSUBSCRIBE" : "SUBSCRIBE")
+#define UNSUBSCRIBE_COMMAND(client) ((client)->sharded ? "SUNSUBSCRIBE" : "UNSUBSCRIBE")
 
 /* 前向声明 */
-static unsigned int __stdcall subscription_thread(void *arg);
+static int add_subscription(redis_client* client, int is_pattern,
+                            const char* name, size_t name_len, const Handler *handler);
+static int add_subscriptions(redis_client* client, int is_pattern, int count,
+                             const char** names, const size_t* name_lens, const Handler *handler);
+static int remove_subscriptions(redis_client* client, int is_pattern, int count,
+                                const char** names, const size_t* name_lens);
+static void apply_staged_options(SubscriberShard *shard, int is_pattern, Subscription *sub);
+static int queue_alloc(MessageQueue *q, int capacity);
+static void queue_free(MessageQueue *q);
+static void queue_push(MessageQueue *q, const char* channel, size_t channel_len,
+                       const char* message, size_t message_len);
+static void queue_wait(redis_client* client, int timeout_ms);
+static void wakeup_close(rp_socket *read_end, rp_socket *write_end);
+static void wakeup_drain(rp_socket read_end);
+static int pool_open(PublishPool *pool, const char* hostname, int port);
+static void pool_close(PublishPool *pool);
+static void pool_free(PublishPool *pool);
+static PublishConnection* pool_acquire(PublishPool *pool);
+static int pool_reconnect(redis_client* client, PublishConnection *conn);
+static void pool_discard(redis_client* client, PublishConnection *conn);
+static int publish_remote(redis_client* client, const char* channel, size_t channel_len,
+                          const char* message, size_t message_len);
+static int publish_batch_remote(redis_client* client, int count,
+                                const char** channels, const size_t* channel_lens,
+                                const char** messages, const size_t* message_lens,
+                                int* results);
+static int publish_batch_spool(redis_client* client, int count,
+                               const char** channels, const size_t* channel_lens,
+                               const char** messages, const size_t* message_lens,
+                               int* results);
+static SubscriberShard* shard_for(redis_client* client, const char* name, size_t name_len);
+static int shards_open(redis_client* client);
+static void shards_close(redis_client* client);
+static void shards_free(redis_client* client);
+static redisContext* loop_connect(redis_client* client, const char* role);
+static int loop_start(SubscriberShard *shard);
+static void loop_stop(SubscriberShard *shard);
+static void loop_wakeup(EventLoop *loop);
+static int on_loop_thread(redis_client* client);
+static int spool_publish(redis_client* client, const char* channel, size_t channel_len,
+                         const char* message, size_t message_len);
+static void backoff_reset(Backoff *b);
+static void backoff_lost(redis_client* client, Backoff *b);
+static void backoff_failed(redis_client* client, Backoff *b);
+static void backoff_recovered(redis_client* client, Backoff *b);
+static int backoff_remaining(Backoff *b);
+static void async_set_disconnected(AsyncPublisher *ap, int disconnected);
+static int loop_send_command(SubscriberShard *shard, int argc, const char** argv, const size_t* argvlen);
+static long long loop_submit_command(SubscriberShard *shard, int argc, const char** argv, const size_t* argvlen);
+static int loop_wait_confirmed(SubscriberShard *shard, long long target, const char* command);
+static void deliver_message(redis_client* client, const Handler *handler,
+                            const char* channel, size_t channel_len,
+                            const char* message, size_t message_len);
+static int sub_unsolicited(SubscriberShard *shard, const char* channel, size_t channel_len);
+static void sub_moved(SubscriberShard *shard, const char* channel, size_t channel_len, const char* error);
+static int local_reserve(redis_client* client, const char* channel, size_t channel_len,
+                         const char* message, size_t message_len);
+static void local_deliver(redis_client* client, const char* channel, size_t channel_len,
+                          const char* message, size_t message_len);
+static void local_forget(redis_client* client, const char* channel, size_t channel_len,
+                         const char* message, size_t message_len);
+static int echo_consume(redis_client* client, Subscription *sub,
+                        const char* message, size_t message_len);
+static void metrics_init(Metrics *m);
+static void metrics_free(Metrics *m);
+static void histogram_record(RedisHistogram *h, long long ns);
+static void metrics_in(redis_client* client, const char* channel, size_t channel_len, size_t bytes);
+static void metrics_out(redis_client* client, const char* channel, size_t channel_len, size_t bytes);
+static void metrics_callback(redis_client* client, const char* channel, size_t channel_len,
+                             long long elapsed_ns);
+static void metrics_conflated(redis_client* client, const char* channel, size_t channel_len);
+static int conflate_store(SubscriberShard *shard, const char* channel, size_t channel_len,
+                          const char* message, size_t message_len);
+static int filter_accept(FilterSet *filter, const char* data, size_t len);
+static int batch_store(SubscriberShard *shard, const Handler *handler, const char* channel, size_t channel_len,
+                       const char* message, size_t message_len);
+static int batch_flush_due(SubscriberShard *shard, int all);
+
+/* ==================== 创建和销毁 ==================== */
+
+REDIS_PUBSUB_API redis_client* redis_client_new(void) {
+    redis_client *client = (redis_client*)calloc(1, sizeof(redis_client));
+    if (!client) {
+        fprintf(stderr, "[ERROR] Out of memory\n");
+        return NULL;
+    }
+    
+    rp_mutex_init(&client->queue.lock);
+    rp_cond_init(&client->queue.cond);
+    client->queue.config_capacity = REDIS_QUEUE_DEFAULT_CAPACITY;
+    client->queue.wakeup_read = RP_INVALID_SOCKET;
+    client->queue.wakeup_write = RP_INVALID_SOCKET;
+    client->pool.config_size = 1;
+    client->pool.mode = REDIS_POOL_ROUND_ROBIN;
+    
+    metrics_init(&client->metrics);
+    rp_mutex_init(&client->async.lock);
+    rp_cond_init(&client->async.done_cond);
+    client->async.max_batch = REDIS_ASYNC_DEFAULT_MAX_BATCH;
+    client->async.max_pending = REDIS_ASYNC_DEFAULT_MAX_PENDING;
+    client->async.pending = &client->async.batches[0];
+    client->async.spool_max = REDIS_SPOOL_DEFAULT_MAX;
+    client->config_shards = 1;
+    client->reconnect.initial_ms = REDIS_RECONNECT_DEFAULT_INITIAL_MS;
+    client->reconnect.max_ms = REDIS_RECONNECT_DEFAULT_MAX_MS;
+    return client;
+}
+
+REDIS_PUBSUB_API void redis_client_free(redis_client* client) {
+    if (!client) {
+        return;
+    }
+    
+    if (redis_client_close(client) != 0) {
+        return;
+    }
+    pool_free(&client->pool);
+    shards_free(client);
+    for (int i = 0; i < 2; i++) {
+        free(client->async.batches[i].entries);
+        free(client->async.batches[i].data);
+    }
+    free(client->async.inflight.items);
+    free(client->hostname);
+    metrics_free(&client->metrics);
+    rp_cond_destroy(&client->async.done_cond);
+    rp_mutex_destroy(&client->async.lock);
+    rp_cond_destroy(&client->queue.cond);
+    rp_mutex_destroy(&client->queue.lock);
+    
+    if (client == g_default_client) {
+        g_default_client = NULL;
+    }
+    free(client);
+}
 
 /* ==================== 初始化和关闭 ==================== */
 
-REDIS_PUBSUB_API int redis_init(const char* hostname, int port) {
-    InitializeCriticalSection(&g_lock);
+REDIS_PUBSUB_API int redis_client_connect(redis_client* client, const char* hostname, int port) {
+    if (!client || !hostname) {
+        fprintf(stderr, "[ERROR] Invalid client or hostname\n");
+        return -1;
+    }
+    
+    if (client->running) {
+        fprintf(stderr, "[ERROR] Client already connected\n");
+        return -1;
+    }
+    
+    size_t host_len = strlen(hostname);
+    char *host_copy = (char*)malloc(host_len + 1);
+    if (!host_copy) {
+        fprintf(stderr, "[ERROR] Out of memory\n");
+        return -1;
+    }
+    memcpy(host_copy, hostname, host_len + 1);
+    free(client->hostname);
+    client->hostname = host_copy;
+    client->port = port;
+    
+    if (rp_net_init() != 0) {
+        fprintf(stderr, "[ERROR] Failed to initialize network\n");
+        return -1;
+    }
+    client->net_ready = 1;
+    
+    if (queue_alloc(&client->queue, client->queue.config_capacity) != 0) {
+        fprintf(stderr, "[ERROR] Failed to allocate message queue\n");
+        redis_client_close(client);
+        return -1;
+    }
     
-    /* 创建发布连接 */
-    g_context = redisConnect(hostname, port);
-    if (g_context == NULL || g_context->err) {
-        fprintf(stderr, "[ERROR] Failed to connect to Redis (publish): %s\n", 
-                g_context ? g_context->errstr : "malloc failure");
-        if (g_context) redisFree(g_context);
+    rp_socket pair[2];
+    if (rp_socket_pair(pair) != 0) {
+        fprintf(stderr, "[ERROR] Failed to create wakeup socket\n");
+        redis_client_close(client);
         return -1;
     }
+    client->queue.wakeup_read = pair[0];
+    client->queue.wakeup_write = pair[1];
     
-    /* 创建订阅连接 */
-    g_sub_context = redisConnect(hostname, port);
-    if (g_sub_context == NULL || g_sub_context->err) {
-        fprintf(stderr, "[ERROR] Failed to connect to Redis (subscribe): %s\n",
-                g_sub_context ? g_sub_context->errstr : "malloc failure");
-        if (g_sub_context) redisFree(g_sub_context);
-        redisFree(g_context);
+    client->reconnect.disconnected = 0;
+    backoff_reset(&client->async.backoff);
+    client->async.disconnected = 0;
+    client->async.spooled = 0;
+    
+    /* 创建发布连接池 */
+    if (pool_open(&client->pool, hostname, port) != 0) {
+        redis_client_close(client);
+        return -1;
+    }
+    
+    /* 创建订阅分片（订阅连接和事件循环） */
+    if (shards_open(client) != 0) {
+        redis_client_close(client);
         return -1;
     }
     
-    g_running = 1;
-    g_callback_count = 0;
+    client->running = 1;
     
     // fprintf(stdout, "[INFO] Redis connected: %s:%d\n", hostname, port);
     return 0;
 }
 
-REDIS_PUBSUB_API int redis_close() {
-    EnterCriticalSection(&g_lock);
-    
-    g_running = 0;
+REDIS_PUBSUB_API int redis_client_close(redis_client* client) {
+    if (!client) {
+        return -1;
+    }
     
-    if (g_sub_context) {
-        redisFree(g_sub_context);
-        g_sub_context = NULL;
+    if (on_loop_thread(client)) {
+        fprintf(stderr, "[ERROR] Cannot close client from its own callback\n");
+        return -1;
     }
     
-    if (g_context) {
-        redisFree(g_context);
-        g_context = NULL;
+    client->running = 0;
+    
+    /* 1. 唤醒正在poll和等待异步发布空间的线程 */
+    rp_mutex_lock(&client->queue.lock);
+    rp_cond_broadcast(&client->queue.cond);
+    rp_mutex_unlock(&client->queue.lock);
+    
+    rp_mutex_lock(&client->async.lock);
+    rp_cond_broadcast(&client->async.done_cond);
+    rp_mutex_unlock(&client->async.lock);
+    
+    /* 2. 停止各分片的事件循环（已提交的异步消息会先发送完或失败），释放订阅连接和订阅表 */
+    shards_close(client);
+    
+    /* 3. 事件循环已退出，释放异步发布连接 */
+    if (client->async.context) {
+        redisFree(client->async.context);
+        client->async.context = NULL;
     }
     
-    g_callback_count = 0;
+    /* 4. 逐个关闭发布连接（正在发布的线程完成后才会关闭对应连接） */
+    pool_close(&client->pool);
+    
+    /* 5. 释放队列 */
+    rp_mutex_lock(&client->queue.lock);
+    queue_free(&client->queue);
+    wakeup_close(&client->queue.wakeup_read, &client->queue.wakeup_write);
+    rp_mutex_unlock(&client->queue.lock);
     
-    LeaveCriticalSection(&g_lock);
-    DeleteCriticalSection(&g_lock);
+    if (client->net_ready) {
+        rp_net_cleanup();
+        client->net_ready = 0;
+    }
     
     // fprintf(stdout, "[INFO] Redis disconnected\n");
     return 0;
@@ -76,144 +688,4690 @@ REDIS_PUBSUB_API int redis_close() {
 
 /* ==================== 发布消息 ==================== */
 
-REDIS_PUBSUB_API int redis_publish(const char* channel, const char* message) {
-    if (!g_context) {
+REDIS_PUBSUB_API int redis_client_publish(redis_client* client, const char* channel, const char* message) {
+    if (!channel || !message) {
+        fprintf(stderr, "[ERROR] Invalid channel or message\n");
+        return -1;
+    }
+    
+    return redis_client_publish_binary(client, channel, strlen(channel), message, strlen(message));
+}
+
+REDIS_PUBSUB_API int redis_client_publish_binary(redis_client* client,
+                                                 const char* channel, size_t channel_len,
+                                                 const char* message, size_t message_len) {
+    if (!client || !client->running) {
         fprintf(stderr, "[ERROR] Redis not initialized\n");
         return -1;
     }
     
-    if (!channel || !message) {
+    if (!channel || (!message && message_len > 0)) {
         fprintf(stderr, "[ERROR] Invalid channel or message\n");
         return -1;
     }
     
-    EnterCriticalSection(&g_lock);
+    /* 发送前记录回传指纹；消息发出（或进入spool）后本地订阅在调用线程中收到消息 */
+    int local = local_reserve(client, channel, channel_len, message, message_len);
+    int result = publish_remote(client, channel, channel_len, message, message_len);
+    if (result == -1 || result == REDIS_PUBLISH_MOVED) {
+        rp_atomic_inc64(&client->metrics.publish_errors);
+        if (local) {
+            local_forget(client, channel, channel_len, message, message_len);
+        }
+    } else {
+        metrics_out(client, channel, channel_len, message_len);
+        if (local) {
+            local_deliver(client, channel, channel_len, message, message_len);
+        }
+    }
+    return result;
+}
+
+/* PUBLISH/SPUBLISH回复 -> 订阅者数量；分片模式下槽位不属于该节点时为REDIS_PUBLISH_MOVED，其他错误为-1 */
+static int publish_reply_result(redisReply *reply) {
+    if (reply->type == REDIS_REPLY_INTEGER) {
+        return (int)reply->integer;
+    }
+    if (reply->type == REDIS_REPLY_ERROR && strncmp(reply->str, "MOVED ", 6) == 0) {
+        return REDIS_PUBLISH_MOVED;
+    }
+    return -1;
+}
+
+/* 通过发布连接池发送一条PUBLISH，返回订阅者数量、REDIS_PUBLISH_SPOOLED、REDIS_PUBLISH_MOVED或-1 */
+static int publish_remote(redis_client* client, const char* channel, size_t channel_len,
+                          const char* message, size_t message_len) {
+    PublishConnection *conn = pool_acquire(&client->pool);
+    if (!conn) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        return -1;
+    }
     
-    redisReply *reply = redisCommand(g_context, "PUBLISH %s %s", channel, message);
+    /* 连接已断开且暂时无法重连：消息进入spool，重连后由事件循环补发 */
+    if (conn->context->err && pool_reconnect(client, conn) != 0) {
+        rp_mutex_unlock(&conn->lock);
+        return spool_publish(client, channel, channel_len, message, message_len);
+    }
+    
+    const char *command = PUBLISH_COMMAND(client);
+    long long start = rp_now_ns();
+    redisReply *reply = redisCommand(conn->context, "%s %b %b", command,
+                                     channel, channel_len,
+                                     message ? message : "", message_len);
+    
+    /* 连接在本次发布时断开：立即重连并重试一次（Redis重启后的第一条消息） */
+    if (!reply && pool_reconnect(client, conn) == 0) {
+        start = rp_now_ns();
+        reply = redisCommand(conn->context, "%s %b %b", command,
+                             channel, channel_len,
+                             message ? message : "", message_len);
+    }
     
     if (!reply) {
-        fprintf(stderr, "[ERROR] Failed to publish: %s\n", g_context->errstr);
-        LeaveCriticalSection(&g_lock);
-        return -1;
+        fprintf(stderr, "[ERROR] Failed to publish: %s\n", conn->context->errstr);
+        rp_mutex_unlock(&conn->lock);
+        return spool_publish(client, channel, channel_len, message, message_len);
     }
+    histogram_record(&client->metrics.publish_rtt, rp_now_ns() - start);
     
-    long long subscribers = reply->integer;
+    long long subscribers = publish_reply_result(reply);
     freeReplyObject(reply);
     
-    // fprintf(stdout, "[PUBLISH] Channel: %s | Message: %s | Subscribers: %lld\n", 
+    // fprintf(stdout, "[PUBLISH] Channel: %s | Message: %s | Subscribers: %lld\n",
             // channel, message, subscribers);
     
-    LeaveCriticalSection(&g_lock);
+    rp_mutex_unlock(&conn->lock);
     return (int)subscribers;
 }
 
-/* ==================== 订阅消息 ==================== */
-
-REDIS_PUBSUB_API int redis_subscribe(const char* channel, PubSubCallback callback) {
-    if (!g_context || !g_sub_context) {
+REDIS_PUBSUB_API int redis_client_publish_batch(redis_client* client, int count,
+                                                const char** channels, const size_t* channel_lens,
+                                                const char** messages, const size_t* message_lens,
+                                                int* results) {
+    if (!client || !client->running) {
         fprintf(stderr, "[ERROR] Redis not initialized\n");
         return -1;
     }
     
-    if (!channel || !callback) {
-        fprintf(stderr, "[ERROR] Invalid channel or callback\n");
+    if (count < 0 || (count > 0 && (!channels || !messages))) {
+        fprintf(stderr, "[ERROR] Invalid batch arguments\n");
         return -1;
     }
     
-    EnterCriticalSection(&g_lock);
+    if (count == 0) {
+        return 0;
+    }
     
-    if (g_callback_count >= 100) {
-        fprintf(stderr, "[ERROR] Max channels (100) exceeded\n");
-        LeaveCriticalSection(&g_lock);
+    /* local：该条已记录回传指纹，发出后在本地投递；调用方没有提供results时用outcome统计每条消息的结果 */
+    int *scratch = (int*)calloc((size_t)count * 2, sizeof(int));
+    if (!scratch) {
+        fprintf(stderr, "[ERROR] Out of memory\n");
         return -1;
     }
+    int *local = scratch;
+    int *outcome = results ? results : scratch + count;
+    for (int i = 0; i < count; i++) {
+        outcome[i] = -1;
+        if (channels[i] && messages[i]) {
+            local[i] = local_reserve(client, channels[i],
+                                     channel_lens ? channel_lens[i] : strlen(channels[i]),
+                                     messages[i],
+                                     message_lens ? message_lens[i] : strlen(messages[i]));
+        }
+    }
     
-    /* 保存回调函数 */
-    strcpy_s(g_channels[g_callback_count], sizeof(g_channels[g_callback_count]), channel);
-    g_callbacks[g_callback_count] = callback;
-    g_callback_count++;
-    
-    /* 执行SUBSCRIBE命令 */
-    if (redisCommand(g_sub_context, "SUBSCRIBE %s", channel) == NULL) {
-        fprintf(stderr, "[ERROR] Failed to subscribe: %s\n", g_sub_context->errstr);
-        g_callback_count--;
-        LeaveCriticalSection(&g_lock);
+    /* 连接错误时只有已收到回复或已进入spool的消息算作发出，其余按失败处理 */
+    int published = publish_batch_remote(client, count, channels, channel_lens,
+                                         messages, message_lens, outcome);
+    for (int i = 0; i < count; i++) {
+        if (!channels[i] || !messages[i]) {
+            rp_atomic_inc64(&client->metrics.publish_errors);
+            continue;
+        }
+        size_t channel_len = channel_lens ? channel_lens[i] : strlen(channels[i]);
+        size_t message_len = message_lens ? message_lens[i] : strlen(messages[i]);
+        if (outcome[i] == -1 || outcome[i] == REDIS_PUBLISH_MOVED) {
+            rp_atomic_inc64(&client->metrics.publish_errors);
+            if (local[i]) {
+                local_forget(client, channels[i], channel_len, messages[i], message_len);
+            }
+        } else {
+            metrics_out(client, channels[i], channel_len, message_len);
+            if (local[i]) {
+                local_deliver(client, channels[i], channel_len, messages[i], message_len);
+            }
+        }
+    }
+    free(scratch);
+    return published;
+}
+
+/* 通过发布连接池以管道发送一批PUBLISH，返回成功发布的消息数，连接错误返回-1 */
+static int publish_batch_remote(redis_client* client, int count,
+                                const char** channels, const size_t* channel_lens,
+                                const char** messages, const size_t* message_lens,
+                                int* results) {
+    PublishConnection *conn = pool_acquire(&client->pool);
+    if (!conn) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
         return -1;
     }
     
-    // fprintf(stdout, "[SUBSCRIBE] Subscribed to channel: %s\n", channel);
+    /* 连接已断开且暂时无法重连：整批进入spool */
+    if (conn->context->err && pool_reconnect(client, conn) != 0) {
+        rp_mutex_unlock(&conn->lock);
+        return publish_batch_spool(client, count, channels, channel_lens,
+                                   messages, message_lens, results);
+    }
     
-    /* 如果是第一个订阅，启动处理线程 */
-    if (g_callback_count == 1) {
-        g_thread = (HANDLE)_beginthreadex(NULL, 0, subscription_thread, NULL, 0, NULL);
-        if (!g_thread) {
-            fprintf(stderr, "[ERROR] Failed to create subscription thread\n");
-            g_callback_count--;
-            LeaveCriticalSection(&g_lock);
+    /* 1. 把所有PUBLISH命令追加到输出缓冲区，无效的条目跳过并记为失败 */
+    int appended = 0;
+    for (int i = 0; i < count; i++) {
+        const char *argv[3];
+        size_t argvlen[3];
+        
+        if (!channels[i] || !messages[i]) {
+            fprintf(stderr, "[ERROR] Invalid channel or message at index %d\n", i);
+            if (results) {
+                results[i] = -1;
+            }
+            continue;
+        }
+        
+        argv[0] = PUBLISH_COMMAND(client);
+        argvlen[0] = strlen(argv[0]);
+        argv[1] = channels[i];
+        argvlen[1] = channel_lens ? channel_lens[i] : strlen(channels[i]);
+        argv[2] = messages[i];
+        argvlen[2] = message_lens ? message_lens[i] : strlen(messages[i]);
+        
+        if (redisAppendCommandArgv(conn->context, 3, argv, argvlen) != REDIS_OK) {
+            fprintf(stderr, "[ERROR] Failed to append publish: %s\n", conn->context->errstr);
+            pool_discard(client, conn);
+            rp_mutex_unlock(&conn->lock);
             return -1;
         }
+        appended++;
     }
     
-    LeaveCriticalSection(&g_lock);
-    return 0;
-}
-
-/* ==================== 订阅处理线程 ==================== */
-
-static unsigned int __stdcall subscription_thread(void *arg) {
-    // fprintf(stdout, "[INFO] Subscription thread started\n");
+    if (appended == 0) {
+        rp_mutex_unlock(&conn->lock);
+        return 0;
+    }
     
-    while (g_running && g_sub_context) {
-        redisReply *reply = NULL;
-        
-        if (redisGetReply(g_sub_context, (void**)&reply) != REDIS_OK) {
-            if (g_running) {
-                fprintf(stderr, "[ERROR] Connection lost in subscription thread\n");
-            }
-            break;
+    /* 2. 一次性写出全部命令 */
+    long long start = rp_now_ns();
+    int done = 0;
+    do {
+        if (redisBufferWrite(conn->context, &done) != REDIS_OK) {
+            fprintf(stderr, "[ERROR] Failed to flush batch: %s\n", conn->context->errstr);
+            pool_reconnect(client, conn);
+            rp_mutex_unlock(&conn->lock);
+            return -1;
         }
+    } while (!done);
+    
+    /* 3. 按顺序收齐已追加命令的回复 */
+    int published = 0;
+    for (int i = 0; i < count; i++) {
+        redisReply *reply = NULL;
         
-        if (!reply) {
+        if (!channels[i] || !messages[i]) {
             continue;
         }
         
-        /* 处理消息回复 */
-        if (reply->type == REDIS_REPLY_ARRAY && reply->elements == 3) {
-            if (strcmp(reply->element[0]->str, "message") == 0) {
-                const char *channel = reply->element[1]->str;
-                const char *message = reply->element[2]->str;
-                
-                // fprintf(stdout, "[MESSAGE] Channel: %s | Message: %s\n", channel, message);
-                
-                /* 查找并调用对应的回调函数 */
-                EnterCriticalSection(&g_lock);
-                for (int i = 0; i < g_callback_count; i++) {
-                    if (strcmp(g_channels[i], channel) == 0 && g_callbacks[i]) {
-                        g_callbacks[i](channel, message);
-                        break;
-                    }
-                }
-                LeaveCriticalSection(&g_lock);
-            }
+        if (redisGetReply(conn->context, (void**)&reply) != REDIS_OK || !reply) {
+            fprintf(stderr, "[ERROR] Failed to read batch reply: %s\n", conn->context->errstr);
+            pool_reconnect(client, conn);
+            rp_mutex_unlock(&conn->lock);
+            return -1;
         }
         
+        int subscribers = publish_reply_result(reply);
+        if (subscribers >= 0) {
+            published++;
+        }
+        if (results) {
+            results[i] = subscribers;
+        }
         freeReplyObject(reply);
     }
+    histogram_record(&client->metrics.publish_rtt, rp_now_ns() - start);
+    
+    rp_mutex_unlock(&conn->lock);
+    return published;
+}
+
+/* 连接断开期间的批量发布：逐条放入spool，results中为REDIS_PUBLISH_SPOOLED或-1
+ * 返回0（没有消息在本次调用中送达），spool已满时返回-1 */
+static int publish_batch_spool(redis_client* client, int count,
+                               const char** channels, const size_t* channel_lens,
+                               const char** messages, const size_t* message_lens,
+                               int* results) {
+    int rejected = 0;
+    
+    for (int i = 0; i < count; i++) {
+        int result = -1;
+        if (channels[i] && messages[i]) {
+            result = spool_publish(client, channels[i],
+                                   channel_lens ? channel_lens[i] : strlen(channels[i]),
+                                   messages[i],
+                                   message_lens ? message_lens[i] : strlen(messages[i]));
+        }
+        if (result != REDIS_PUBLISH_SPOOLED) {
+            rejected++;
+        }
+        if (results) {
+            results[i] = result;
+        }
+    }
+    return rejected ? -1 : 0;
+}
+
+/* ==================== 发布连接池 ==================== */
+
+REDIS_PUBSUB_API int redis_client_set_publish_pool(redis_client* client, int size, int mode) {
+    if (!client || size <= 0 || size > REDIS_PUBLISH_POOL_MAX) {
+        fprintf(stderr, "[ERROR] Invalid publish pool size\n");
+        return -1;
+    }
+    
+    if (mode != REDIS_POOL_ROUND_ROBIN && mode != REDIS_POOL_THREAD_AFFINE) {
+        fprintf(stderr, "[ERROR] Invalid publish pool mode\n");
+        return -1;
+    }
+    
+    /* 连接数在redis_client_connect时生效 */
+    if (client->running) {
+        fprintf(stderr, "[ERROR] Cannot resize publish pool while connected\n");
+        return -1;
+    }
     
-    // fprintf(stdout, "[INFO] Subscription thread ended\n");
+    client->pool.config_size = size;
+    client->pool.mode = mode;
     return 0;
 }
 
-/* ==================== 处理消息（可选） ==================== */
+REDIS_PUBSUB_API int redis_client_get_pool_stats(redis_client* client, RedisPoolStats* stats) {
+    if (!client || !stats) {
+        return -1;
+    }
+    
+    PublishPool *pool = &client->pool;
+    stats->size = pool->conns ? pool->size : pool->config_size;
+    stats->acquired = pool->acquired;
+    stats->contended = pool->contended;
+    stats->wait_total_us = pool->wait_total_us;
+    stats->wait_max_us = pool->wait_max_us;
+    return 0;
+}
 
-REDIS_PUBSUB_API int redis_process_messages(int timeout_ms) {
-    if (!g_sub_context) {
-        fprintf(stderr, "[ERROR] Redis not initialized\n");
+/* 建立config_size个发布连接，失败时由调用方执行pool_close */
+static int pool_open(PublishPool *pool, const char* hostname, int port) {
+    if (pool->conns && pool->size != pool->config_size) {
+        pool_free(pool);
+    }
+    
+    if (!pool->conns) {
+        pool->conns = (PublishConnection*)calloc((size_t)pool->config_size, sizeof(PublishConnection));
+        if (!pool->conns) {
+            fprintf(stderr, "[ERROR] Out of memory\n");
+            return -1;
+        }
+        pool->size = pool->config_size;
+        for (int i = 0; i < pool->size; i++) {
+            rp_mutex_init(&pool->conns[i].lock);
+        }
+    }
+    
+    pool->next = 0;
+    pool->acquired = 0;
+    pool->contended = 0;
+    pool->wait_total_us = 0;
+    pool->wait_max_us = 0;
+    
+    for (int i = 0; i < pool->size; i++) {
+        redisContext *c = redisConnect(hostname, port);
+        if (c == NULL || c->err) {
+            fprintf(stderr, "[ERROR] Failed to connect to Redis (publish): %s\n",
+                    c ? c->errstr : "malloc failure");
+            if (c) {
+                redisFree(c);
+            }
+            return -1;
+        }
+        
+        rp_mutex_lock(&pool->conns[i].lock);
+        pool->conns[i].context = c;
+        backoff_reset(&pool->conns[i].backoff);
+        rp_mutex_unlock(&pool->conns[i].lock);
+    }
+    return 0;
+}
+
+/* 关闭所有发布连接，连接数组和锁保留到pool_free */
+static void pool_close(PublishPool *pool) {
+    for (int i = 0; pool->conns && i < pool->size; i++) {
+        PublishConnection *conn = &pool->conns[i];
+        rp_mutex_lock(&conn->lock);
+        if (conn->context) {
+            redisFree(conn->context);
+            conn->context = NULL;
+        }
+        rp_mutex_unlock(&conn->lock);
+    }
+}
+
+static void pool_free(PublishPool *pool) {
+    if (!pool->conns) {
+        return;
+    }
+    
+    pool_close(pool);
+    for (int i = 0; i < pool->size; i++) {
+        rp_mutex_destroy(&pool->conns[i].lock);
+    }
+    free(pool->conns);
+    pool->conns = NULL;
+    pool->size = 0;
+}
+
+/* 重新建立已断开的发布连接（调用时持有conn->lock）
+ * 断开后第一次调用立即尝试，之后按退避时间节流；返回0表示连接可用 */
+static int pool_reconnect(redis_client* client, PublishConnection *conn) {
+    if (client->reconnect.initial_ms <= 0 || !conn->context) {
+        return -1;
+    }
+    
+    if (conn->backoff.down_since == 0) {
+        backoff_lost(client, &conn->backoff);
+    }
+    if (backoff_remaining(&conn->backoff) > 0) {
         return -1;
     }
     
-    /* 这个函数可以用于非阻塞式处理 */
-    /* 当前实现使用独立线程处理 */
-    Sleep(timeout_ms);
+    if (redisReconnect(conn->context) != REDIS_OK) {
+        backoff_failed(client, &conn->backoff);
+        return -1;
+    }
+    backoff_recovered(client, &conn->backoff);
     return 0;
 }
+
+/* 丢弃已追加到输出缓冲区但还没有写出的管道命令（调用时持有conn->lock）
+ * 重连会清空输出缓冲区；无法立即重连时直接截断，避免下一条命令读到这些命令的回复 */
+static void pool_discard(redis_client* client, PublishConnection *conn) {
+    if (pool_reconnect(client, conn) != 0 && conn->context) {
+        sdsclear(conn->context->obuf);
+    }
+}
+
+/* 记录一次等待连接的耗时 */
+static void pool_record_wait(PublishPool *pool, long long us) {
+    rp_atomic_inc64(&pool->contended);
+    rp_atomic_add64(&pool->wait_total_us, us);
+    
+    long long max = pool->wait_max_us;
+    while (us > max) {
+        long long previous = rp_atomic_cas64(&pool->wait_max_us, max, us);
+        if (previous == max) {
+            break;
+        }
+        max = previous;
+    }
+}
+
+/* 获取一个发布连接并加锁，返回NULL表示连接已关闭
+ * 轮询模式：从下一个位置开始找空闲连接，全部繁忙时在起始连接上等待
+ * 线程亲和模式：同一线程固定使用同一个连接（保持单线程内的发布顺序） */
+static PublishConnection* pool_acquire(PublishPool *pool) {
+    int size = pool->size;
+    if (!pool->conns || size <= 0) {
+        return NULL;
+    }
+    
+    int start;
+    if (pool->mode == REDIS_POOL_THREAD_AFFINE) {
+        start = (int)(rp_thread_hash() % (unsigned long long)size);
+    } else {
+        start = (int)((unsigned long)rp_atomic_inc32(&pool->next) % (unsigned long)size);
+    }
+    
+    rp_atomic_inc64(&pool->acquired);
+    PublishConnection *conn = NULL;
+    
+    if (pool->mode == REDIS_POOL_ROUND_ROBIN) {
+        for (int i = 0; i < size && !conn; i++) {
+            PublishConnection *candidate = &pool->conns[(start + i) % size];
+            if (rp_mutex_trylock(&candidate->lock)) {
+                conn = candidate;
+            }
+        }
+    } else if (rp_mutex_trylock(&pool->conns[start].lock)) {
+        conn = &pool->conns[start];
+    }
+    
+    /* 没有空闲连接：等待并统计等待时间 */
+    if (!conn) {
+        conn = &pool->conns[start];
+        long long begin = rp_now_us();
+        rp_mutex_lock(&conn->lock);
+        pool_record_wait(pool, rp_now_us() - begin);
+    }
+    
+    if (!conn->context) {
+        rp_mutex_unlock(&conn->lock);
+        return NULL;
+    }
+    return conn;
+}
+
+/* ==================== 异步发布 ==================== */
+
+REDIS_PUBSUB_API int redis_client_set_async_publish(redis_client* client, int max_batch,
+                                                    int max_pending, int linger_ms) {
+    if (!client || max_batch <= 0 || max_pending <= 0 || linger_ms < 0) {
+        fprintf(stderr, "[ERROR] Invalid async publish settings\n");
+        return -1;
+    }
+    
+    AsyncPublisher *ap = &client->async;
+    rp_mutex_lock(&ap->lock);
+    ap->max_batch = max_batch;
+    ap->max_pending = max_pending;
+    ap->linger_ms = linger_ms;
+    rp_cond_broadcast(&ap->done_cond);
+    rp_mutex_unlock(&ap->lock);
+    return 0;
+}
+
+/* 把一条消息复制到批次末尾，必要时扩容 */
+static int batch_append(PublishBatch *batch, const char* channel, size_t channel_len,
+                        const char* message, size_t message_len,
+                        PublishCompletion callback, void* userdata) {
+    if (batch->count >= batch->capacity) {
+        int capacity = batch->capacity ? batch->capacity * 2 : 256;
+        PendingPublish *entries = (PendingPublish*)realloc(batch->entries,
+                                                           (size_t)capacity * sizeof(PendingPublish));
+        if (!entries) {
+            return -1;
+        }
+        batch->entries = entries;
+        batch->capacity = capacity;
+    }
+    
+    size_t needed = batch->data_len + channel_len + message_len;
+    if (needed > batch->data_capacity) {
+        size_t capacity = batch->data_capacity ? batch->data_capacity : 65536;
+        while (capacity < needed) {
+            capacity *= 2;
+        }
+        char *data = (char*)realloc(batch->data, capacity);
+        if (!data) {
+            return -1;
+        }
+        batch->data = data;
+        batch->data_capacity = capacity;
+    }
+    
+    PendingPublish *entry = &batch->entries[batch->count++];
+    entry->offset = batch->data_len;
+    entry->channel_len = channel_len;
+    entry->message_len = message_len;
+    entry->callback = callback;
+    entry->userdata = userdata;
+    entry->submitted_ns = rp_now_ns();
+    
+    memcpy(batch->data + batch->data_len, channel, channel_len);
+    memcpy(batch->data + batch->data_len + channel_len, message, message_len);
+    batch->data_len = needed;
+    return 0;
+}
+
+/* 把一条消息提交给事件循环发送，返回消息序号，失败返回-1
+ * 连接断开期间（或spool为1时）不等待空间：积压超过spool_max时直接拒绝 */
+static long long async_submit(redis_client* client, const char* channel, size_t channel_len,
+                              const char* message, size_t message_len,
+                              PublishCompletion callback, void* userdata, int spool) {
+    AsyncPublisher *ap = &client->async;
+    int in_loop = on_loop_thread(client);
+    rp_mutex_lock(&ap->lock);
+    
+    /* 未完成的消息过多：等待事件循环收到回复（背压）
+     * 在完成回调中（即事件循环线程内）提交时不能等待，直接追加 */
+    while (!in_loop && !spool && !ap->disconnected && client->running &&
+           ap->submitted - ap->completed - ap->failed >= ap->max_pending) {
+        rp_cond_wait(&ap->done_cond, &ap->lock, -1);
+    }
+    
+    if (!client->running) {
+        fprintf(stderr, "[ERROR] Async publisher stopped\n");
+        rp_mutex_unlock(&ap->lock);
+        return -1;
+    }
+    
+    /* 同步发布的连接已断开（spool为1）时，异步发布连接可能还没有发现，同样按积压计数 */
+    int spooled = spool || ap->disconnected;
+    if (spooled && ap->spooled >= ap->spool_max) {
+        fprintf(stderr, "[ERROR] Publish spool full\n");
+        ap->spool_dropped++;
+        rp_mutex_unlock(&ap->lock);
+        return -1;
+    }
+    
+    PublishBatch *batch = ap->pending;
+    if (batch_append(batch, channel, channel_len, message ? message : "", message_len,
+                     callback, userdata) != 0) {
+        fprintf(stderr, "[ERROR] Out of memory\n");
+        rp_mutex_unlock(&ap->lock);
+        return -1;
+    }
+    long long seq = ++ap->submitted;
+    if (spooled) {
+        ap->spooled++;
+    }
+    
+    /* 批次由空变为非空（开始计算linger）或攒够max_batch时唤醒事件循环 */
+    int wake = batch->count == 1 || batch->count == ap->max_batch;
+    if (batch->count == 1) {
+        ap->batch_started = rp_now_ms();
+    }
+    
+    rp_mutex_unlock(&ap->lock);
+    
+    if (wake) {
+        loop_wakeup(&client->shards[0].loop);
+    }
+    return seq;
+}
+
+REDIS_PUBSUB_API long long redis_client_publish_nowait(redis_client* client,
+                                                       const char* channel, size_t channel_len,
+                                                       const char* message, size_t message_len,
+                                                       PublishCompletion callback, void* userdata) {
+    if (!client || !client->running) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        return -1;
+    }
+    
+    if (!channel || (!message && message_len > 0)) {
+        fprintf(stderr, "[ERROR] Invalid channel or message\n");
+        return -1;
+    }
+    
+    int local = local_reserve(client, channel, channel_len, message, message_len);
+    long long seq = async_submit(client, channel, channel_len, message, message_len, callback, userdata, 0);
+    if (seq < 0) {
+        rp_atomic_inc64(&client->metrics.publish_errors);
+        if (local) {
+            local_forget(client, channel, channel_len, message, message_len);
+        }
+    } else {
+        metrics_out(client, channel, channel_len, message_len);
+        if (local) {
+            local_deliver(client, channel, channel_len, message, message_len);
+        }
+    }
+    return seq;
+}
+
+/* 同步发布连接断开时把消息放入spool（异步发布队列），由事件循环在重连后以管道补发
+ * 返回REDIS_PUBLISH_SPOOLED；未启用自动重连或spool已满时返回-1 */
+static int spool_publish(redis_client* client, const char* channel, size_t channel_len,
+                         const char* message, size_t message_len) {
+    if (client->reconnect.initial_ms <= 0 || !client->running) {
+        return -1;
+    }
+    
+    if (async_submit(client, channel, channel_len, message, message_len, NULL, NULL, 1) < 0) {
+        return -1;
+    }
+    return REDIS_PUBLISH_SPOOLED;
+}
+
+REDIS_PUBSUB_API int redis_client_flush(redis_client* client, int timeout_ms) {
+    if (!client) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        return -1;
+    }
+    
+    AsyncPublisher *ap = &client->async;
+    rp_mutex_lock(&ap->lock);
+    
+    long long target = ap->submitted;
+    long long deadline = rp_now_ms() + (timeout_ms > 0 ? timeout_ms : 0);
+    EventLoop *loop = client->shards ? &client->shards[0].loop : NULL;
+    
+    ap->flush_waiters++;
+    if (loop && loop->started) {
+        loop_wakeup(loop);
+    }
+    
+    while (loop && loop->started && ap->completed + ap->failed < target) {
+        int wait_ms = -1;
+        if (timeout_ms >= 0) {
+            long long now = rp_now_ms();
+            if (now >= deadline) {
+                break;
+            }
+            wait_ms = (int)(deadline - now);
+        }
+        rp_cond_wait(&ap->done_cond, &ap->lock, wait_ms);
+    }
+    
+    ap->flush_waiters--;
+    int result = ap->completed + ap->failed >= target ? 0 : -1;
+    
+    rp_mutex_unlock(&ap->lock);
+    return result;
+}
+
+REDIS_PUBSUB_API int redis_client_get_async_stats(redis_client* client, RedisAsyncStats* stats) {
+    if (!client || !stats) {
+        return -1;
+    }
+    
+    AsyncPublisher *ap = &client->async;
+    rp_mutex_lock(&ap->lock);
+    stats->submitted = ap->submitted;
+    stats->completed = ap->completed;
+    stats->failed = ap->failed;
+    stats->pending = ap->submitted - ap->completed - ap->failed;
+    stats->batches = ap->batch_count;
+    rp_mutex_unlock(&ap->lock);
+    return 0;
+}
+
+/* ==================== 断线重连 ==================== */
+
+REDIS_PUBSUB_API int redis_client_set_reconnect(redis_client* client, int initial_ms, int max_ms,
+                                                int spool_max) {
+    if (!client || initial_ms < 0 || (initial_ms > 0 && max_ms < initial_ms) || spool_max < 0) {
+        fprintf(stderr, "[ERROR] Invalid reconnect settings\n");
+        return -1;
+    }
+    
+    client->reconnect.initial_ms = initial_ms;
+    client->reconnect.max_ms = max_ms;
+    
+    rp_mutex_lock(&client->async.lock);
+    client->async.spool_max = spool_max;
+    rp_cond_broadcast(&client->async.done_cond);
+    rp_mutex_unlock(&client->async.lock);
+    return 0;
+}
+
+REDIS_PUBSUB_API int redis_client_get_reconnect_stats(redis_client* client, RedisReconnectStats* stats) {
+    if (!client || !stats) {
+        return -1;
+    }
+    
+    ReconnectState *rs = &client->reconnect;
+    stats->reconnects = rs->reconnects;
+    stats->failed_attempts = rs->failed_attempts;
+    stats->disconnected = rs->disconnected;
+    stats->last_outage_ms = rs->last_outage_ms;
+    stats->max_outage_ms = rs->max_outage_ms;
+    
+    AsyncPublisher *ap = &client->async;
+    rp_mutex_lock(&ap->lock);
+    stats->spool_depth = ap->spooled;
+    stats->spool_max = ap->spool_max;
+    stats->spool_dropped = ap->spool_dropped;
+    rp_mutex_unlock(&ap->lock);
+    return 0;
+}
+
+static void backoff_reset(Backoff *b) {
+    b->down_since = 0;
+    b->next_attempt = 0;
+    b->delay_ms = 0;
+}
+
+/* 连接刚断开：计入断开连接数，允许立即尝试一次重连 */
+static void backoff_lost(redis_client* client, Backoff *b) {
+    if (b->down_since != 0) {
+        return;
+    }
+    b->down_since = rp_now_ms();
+    b->next_attempt = b->down_since;
+    b->delay_ms = 0;
+    rp_atomic_add64(&client->reconnect.disconnected, 1);
+}
+
+/* 一次重连失败：退避时间翻倍并加入抖动 */
+static void backoff_failed(redis_client* client, Backoff *b) {
+    ReconnectState *rs = &client->reconnect;
+    
+    backoff_lost(client, b);
+    rp_atomic_inc64(&rs->failed_attempts);
+    
+    if (b->delay_ms <= 0) {
+        b->delay_ms = rs->initial_ms > 0 ? rs->initial_ms : REDIS_RECONNECT_DEFAULT_INITIAL_MS;
+    } else {
+        b->delay_ms = b->delay_ms > rs->max_ms / 2 ? rs->max_ms : b->delay_ms * 2;
+    }
+    
+    if (b->seed == 0) {
+        b->seed = (unsigned int)rp_now_us() ^ (unsigned int)(size_t)b;
+    }
+    b->seed = b->seed * 1103515245u + 12345u;
+    int half = b->delay_ms / 2;
+    int jitter = (int)((b->seed >> 8) % (unsigned int)(half + 1));
+    b->next_attempt = rp_now_ms() + half + jitter;
+}
+
+/* 重连成功：记录断开时长 */
+static void backoff_recovered(redis_client* client, Backoff *b) {
+    ReconnectState *rs = &client->reconnect;
+    
+    if (b->down_since == 0) {
+        return;
+    }
+    
+    long long outage = rp_now_ms() - b->down_since;
+    rs->last_outage_ms = outage;
+    long long max = rs->max_outage_ms;
+    while (outage > max) {
+        long long previous = rp_atomic_cas64(&rs->max_outage_ms, max, outage);
+        if (previous == max) {
+            break;
+        }
+        max = previous;
+    }
+    
+    rp_atomic_inc64(&rs->reconnects);
+    rp_atomic_add64(&rs->disconnected, -1);
+    backoff_reset(b);
+}
+
+/* 距离允许下一次重连还有多少毫秒（0表示现在可以尝试） */
+static int backoff_remaining(Backoff *b) {
+    long long remaining = b->next_attempt - rp_now_ms();
+    return remaining > 0 ? (int)remaining : 0;
+}
+
+/* 确保环形FIFO还能放下extra条，按需扩容并整理为从0开始 */
+static int inflight_reserve(InflightRing *ring, int extra) {
+    if (ring->count + extra <= ring->capacity) {
+        return 0;
+    }
+    
+    int capacity = ring->capacity ? ring->capacity : 1024;
+    while (capacity < ring->count + extra) {
+        capacity *= 2;
+    }
+    
+    InflightPublish *items = (InflightPublish*)malloc((size_t)capacity * sizeof(InflightPublish));
+    if (!items) {
+        return -1;
+    }
+    for (int i = 0; i < ring->count; i++) {
+        items[i] = ring->items[(ring->head + i) % ring->capacity];
+    }
+    free(ring->items);
+    ring->items = items;
+    ring->capacity = capacity;
+    ring->head = 0;
+    return 0;
+}
+
+/* 记录收到回复（或失败）的消息数，唤醒flush和等待空间的调用方 */
+static void async_record(AsyncPublisher *ap, int published, int failed) {
+    rp_mutex_lock(&ap->lock);
+    ap->completed += published;
+    ap->failed += failed;
+    rp_cond_broadcast(&ap->done_cond);
+    rp_mutex_unlock(&ap->lock);
+}
+
+/* 异步发布连接断开：等待回复的消息全部按失败通知，下一批发送前重新连接 */
+static void async_connection_lost(redis_client* client) {
+    AsyncPublisher *ap = &client->async;
+    InflightRing *ring = &ap->inflight;
+    int failed = ring->count;
+    
+    fprintf(stderr, "[ERROR] Async publish failed: %s\n",
+            ap->context ? ap->context->errstr : "not connected");
+    
+    while (ring->count > 0) {
+        InflightPublish item = ring->items[ring->head];
+        ring->head = (ring->head + 1) % ring->capacity;
+        ring->count--;
+        if (item.callback) {
+            item.callback(item.userdata, -1);
+        }
+    }
+    
+    if (ap->context) {
+        redisFree(ap->context);
+        ap->context = NULL;
+    }
+    ap->want_write = 0;
+    async_record(ap, 0, failed);
+    
+    /* 自动重连：之后提交的消息积压在pending中，重连后一次性以管道发出 */
+    if (client->reconnect.initial_ms > 0 && client->running) {
+        backoff_lost(client, &ap->backoff);
+        async_set_disconnected(ap, 1);
+    }
+}
+
+static void async_set_disconnected(AsyncPublisher *ap, int disconnected) {
+    rp_mutex_lock(&ap->lock);
+    ap->disconnected = disconnected;
+    /* 断开时pending中已有的消息同样要等到重连后才能发出 */
+    if (disconnected) {
+        ap->spooled = ap->pending->count;
+    }
+    rp_cond_broadcast(&ap->done_cond);
+    rp_mutex_unlock(&ap->lock);
+}
+
+/* 重新建立异步发布连接，返回-1表示已连接，否则返回距离下一次尝试的毫秒数 */
+static int async_reconnect(redis_client* client) {
+    AsyncPublisher *ap = &client->async;
+    
+    int remaining = backoff_remaining(&ap->backoff);
+    if (ap->backoff.down_since != 0 && remaining > 0) {
+        return remaining;
+    }
+    
+    ap->context = loop_connect(client, "async publish");
+    if (!ap->context) {
+        backoff_failed(client, &ap->backoff);
+        async_set_disconnected(ap, 1);
+        return backoff_remaining(&ap->backoff);
+    }
+    
+    backoff_recovered(client, &ap->backoff);
+    async_set_disconnected(ap, 0);
+    return -1;
+}
+
+/* 尽量写出异步发布连接的输出缓冲区，写不完时等待POLLOUT */
+static void async_write(redis_client* client) {
+    AsyncPublisher *ap = &client->async;
+    int done = 0;
+    
+    if (redisBufferWrite(ap->context, &done) != REDIS_OK) {
+        async_connection_lost(client);
+        return;
+    }
+    ap->want_write = !done;
+}
+
+/* 读取异步发布连接上已到达的回复，按发送顺序交给完成回调 */
+static void async_read(redis_client* client) {
+    AsyncPublisher *ap = &client->async;
+    InflightRing *ring = &ap->inflight;
+    int published = 0;
+    int replied = 0;
+    
+    if (redisBufferRead(ap->context) != REDIS_OK) {
+        async_connection_lost(client);
+        return;
+    }
+    
+    while (ring->count > 0) {
+        redisReply *reply = NULL;
+        if (redisGetReplyFromReader(ap->context, (void**)&reply) != REDIS_OK) {
+            async_record(ap, published, replied - published);
+            async_connection_lost(client);
+            return;
+        }
+        if (!reply) {
+            break;
+        }
+        
+        long long subscribers = publish_reply_result(reply);
+        freeReplyObject(reply);
+        
+        InflightPublish item = ring->items[ring->head];
+        ring->head = (ring->head + 1) % ring->capacity;
+        ring->count--;
+        replied++;
+        if (subscribers >= 0) {
+            published++;
+            histogram_record(&client->metrics.publish_rtt, rp_now_ns() - item.submitted_ns);
+        }
+        if (item.callback) {
+            item.callback(item.userdata, subscribers);
+        }
+    }
+    
+    if (replied > 0) {
+        async_record(ap, published, replied - published);
+    }
+}
+
+/* 把一批消息追加到异步发布连接（管道），失败的消息立即通知-1 */
+static void async_send_batch(redis_client* client, PublishBatch *batch) {
+    AsyncPublisher *ap = &client->async;
+    int sent = 0;
+    
+    if (!ap->context) {
+        ap->context = loop_connect(client, "async publish");
+    }
+    
+    if (ap->context && inflight_reserve(&ap->inflight, batch->count) == 0) {
+        InflightRing *ring = &ap->inflight;
+        for (; sent < batch->count; sent++) {
+            PendingPublish *entry = &batch->entries[sent];
+            const char *argv[3] = { PUBLISH_COMMAND(client), batch->data + entry->offset,
+                                    batch->data + entry->offset + entry->channel_len };
+            size_t argvlen[3] = { strlen(argv[0]), entry->channel_len, entry->message_len };
+            
+            if (redisAppendCommandArgv(ap->context, 3, argv, argvlen) != REDIS_OK) {
+                break;
+            }
+            
+            InflightPublish *item = &ring->items[(ring->head + ring->count) % ring->capacity];
+            item->callback = entry->callback;
+            item->userdata = entry->userdata;
+            item->submitted_ns = entry->submitted_ns;
+            ring->count++;
+        }
+    }
+    
+    /* 无法连接或内存不足：剩余消息按失败通知 */
+    if (sent < batch->count) {
+        fprintf(stderr, "[ERROR] Async publish failed: %s\n",
+                ap->context ? ap->context->errstr : "not connected");
+        for (int i = sent; i < batch->count; i++) {
+            PendingPublish *entry = &batch->entries[i];
+            if (entry->callback) {
+                entry->callback(entry->userdata, -1);
+            }
+        }
+        async_record(ap, 0, batch->count - sent);
+    }
+    
+    if (sent > 0) {
+        async_write(client);
+    }
+}
+
+/* 取走待发送的批次并追加到连接，返回距离linger到期或下一次重连的毫秒数（无需定时返回-1）
+ * draining为1时（正在关闭）忽略linger立即发送 */
+static int async_collect(redis_client* client, int draining) {
+    AsyncPublisher *ap = &client->async;
+    
+    /* 连接断开（或尚未建立）时先按退避节奏重连，连上之前消息留在pending中 */
+    if (!ap->context && !draining && client->reconnect.initial_ms > 0) {
+        rp_mutex_lock(&ap->lock);
+        int pending = ap->pending->count;
+        rp_mutex_unlock(&ap->lock);
+        
+        if (pending > 0 || ap->backoff.down_since != 0) {
+            int wait_ms = async_reconnect(client);
+            if (wait_ms >= 0) {
+                return wait_ms;
+            }
+        }
+    }
+    
+    rp_mutex_lock(&ap->lock);
+    
+    PublishBatch *batch = ap->pending;
+    if (batch->count == 0) {
+        rp_mutex_unlock(&ap->lock);
+        return -1;
+    }
+    
+    /* 攒批：不足max_batch且没有flush请求时，最多再等linger_ms */
+    if (!draining && ap->linger_ms > 0 && ap->flush_waiters == 0 &&
+        batch->count < ap->max_batch) {
+        long long remaining = ap->batch_started + ap->linger_ms - rp_now_ms();
+        if (remaining > 0) {
+            rp_mutex_unlock(&ap->lock);
+            return (int)remaining;
+        }
+    }
+    
+    /* 交换缓冲区，调用方继续写入另一个批次；积压的消息随本批交给连接 */
+    ap->pending = batch == &ap->batches[0] ? &ap->batches[1] : &ap->batches[0];
+    ap->batch_count++;
+    ap->spooled = 0;
+    rp_mutex_unlock(&ap->lock);
+    
+    async_send_batch(client, batch);
+    batch->count = 0;
+    batch->data_len = 0;
+    return -1;
+}
+
+/* 是否还有未发送或未收到回复的异步消息 */
+static int async_busy(redis_client* client) {
+    AsyncPublisher *ap = &client->async;
+    
+    if (ap->inflight.count > 0 && ap->context) {
+        return 1;
+    }
+    
+    rp_mutex_lock(&ap->lock);
+    int pending = ap->pending->count;
+    rp_mutex_unlock(&ap->lock);
+    return pending > 0;
+}
+
+/* ==================== 订阅消息 ==================== */
+
+REDIS_PUBSUB_API int redis_client_subscribe(redis_client* client, const char* channel,
+                                            PubSubCallback callback) {
+    if (!channel || !callback) {
+        fprintf(stderr, "[ERROR] Invalid channel or callback\n");
+        return -1;
+    }
+    
+    Handler handler = { callback, NULL, NULL, NULL, 0, NULL, 0, 0, 0 };
+    return add_subscription(client, 0, channel, strlen(channel), &handler);
+}
+
+REDIS_PUBSUB_API int redis_client_subscribe_binary(redis_client* client,
+                                                   const char* channel, size_t channel_len,
+                                                   PubSubBinaryCallback callback) {
+    if (!channel || !callback) {
+        fprintf(stderr, "[ERROR] Invalid channel or callback\n");
+        return -1;
+    }
+    
+    Handler handler = { NULL, callback, NULL, NULL, 0, NULL, 0, 0, 0 };
+    return add_subscription(client, 0, channel, channel_len, &handler);
+}
+
+REDIS_PUBSUB_API int redis_client_subscribe_queued(redis_client* client,
+                                                   const char* channel, size_t channel_len) {
+    if (!channel) {
+        fprintf(stderr, "[ERROR] Invalid channel\n");
+        return -1;
+    }
+    
+    Handler handler = { NULL, NULL, NULL, NULL, 1, NULL, 0, 0, 0 };
+    return add_subscription(client, 0, channel, channel_len, &handler);
+}
+
+/* 校验一批名称参数 */
+static int check_names(int count, const char** names, const size_t* name_lens) {
+    if (count < 0 || (count > 0 && (!names || !name_lens))) {
+        return -1;
+    }
+    for (int i = 0; i < count; i++) {
+        if (!names[i]) {
+            return -1;
+        }
+    }
+    return 0;
+}
+
+REDIS_PUBSUB_API int redis_client_subscribe_many(redis_client* client, int count,
+                                                 const char** channels, const size_t* channel_lens,
+                                                 PubSubBinaryCallback callback) {
+    if (check_names(count, channels, channel_lens) != 0 || !callback) {
+        fprintf(stderr, "[ERROR] Invalid channels or callback\n");
+        return -1;
+    }
+    
+    Handler handler = { NULL, callback, NULL, NULL, 0, NULL, 0, 0, 0 };
+    return count > 0 ? add_subscriptions(client, 0, count, channels, channel_lens, &handler) : 0;
+}
+
+REDIS_PUBSUB_API int redis_client_subscribe_many_queued(redis_client* client, int count,
+                                                        const char** channels, const size_t* channel_lens) {
+    if (check_names(count, channels, channel_lens) != 0) {
+        fprintf(stderr, "[ERROR] Invalid channels\n");
+        return -1;
+    }
+    
+    Handler handler = { NULL, NULL, NULL, NULL, 1, NULL, 0, 0, 0 };
+    return count > 0 ? add_subscriptions(client, 0, count, channels, channel_lens, &handler) : 0;
+}
+
+REDIS_PUBSUB_API int redis_client_unsubscribe(redis_client* client,
+                                              const char* channel, size_t channel_len) {
+    if (!channel) {
+        fprintf(stderr, "[ERROR] Invalid channel\n");
+        return -1;
+    }
+    
+    int removed = remove_subscriptions(client, 0, 1, &channel, &channel_len);
+    if (removed == 0) {
+        fprintf(stderr, "[ERROR] Channel not subscribed\n");
+        return -1;
+    }
+    return removed > 0 ? 0 : -1;
+}
+
+REDIS_PUBSUB_API int redis_client_unsubscribe_many(redis_client* client, int count,
+                                                   const char** channels, const size_t* channel_lens) {
+    if (check_names(count, channels, channel_lens) != 0) {
+        fprintf(stderr, "[ERROR] Invalid channels\n");
+        return -1;
+    }
+    
+    return count > 0 ? remove_subscriptions(client, 0, count, channels, channel_lens) : 0;
+}
+
+REDIS_PUBSUB_API int redis_client_set_conflation(redis_client* client,
+                                                 const char* channel, size_t channel_len, int enabled) {
+    if (!client || !client->running || !client->shards) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        return -1;
+    }
+    
+    if (!channel) {
+        fprintf(stderr, "[ERROR] Invalid channel\n");
+        return -1;
+    }
+    
+    SubscriberShard *shard = shard_for(client, channel, channel_len);
+    ChannelKey lookup = { channel, channel_len };
+    
+    rp_mutex_lock(&shard->lock);
+    dictEntry *entry = shard->subscriptions ? dictFind(shard->subscriptions, &lookup) : NULL;
+    if (entry) {
+        ((Subscription*)dictGetEntryVal(entry))->conflate = enabled ? 1 : 0;
+    }
+    rp_mutex_unlock(&shard->lock);
+    
+    if (!entry) {
+        fprintf(stderr, "[ERROR] Channel not subscribed\n");
+        return -1;
+    }
+    return 0;
+}
+
+/* ==================== 模式订阅 ==================== */
+
+REDIS_PUBSUB_API int redis_client_psubscribe(redis_client* client, const char* pattern,
+                                             PubSubCallback callback) {
+    if (!pattern || !callback) {
+        fprintf(stderr, "[ERROR] Invalid pattern or callback\n");
+        return -1;
+    }
+    
+    Handler handler = { callback, NULL, NULL, NULL, 0, NULL, 0, 0, 0 };
+    return add_subscription(client, 1, pattern, strlen(pattern), &handler);
+}
+
+REDIS_PUBSUB_API int redis_client_psubscribe_binary(redis_client* client,
+                                                    const char* pattern, size_t pattern_len,
+                                                    PubSubBinaryCallback callback) {
+    if (!pattern || !callback) {
+        fprintf(stderr, "[ERROR] Invalid pattern or callback\n");
+        return -1;
+    }
+    
+    Handler handler = { NULL, callback, NULL, NULL, 0, NULL, 0, 0, 0 };
+    return add_subscription(client, 1, pattern, pattern_len, &handler);
+}
+
+REDIS_PUBSUB_API int redis_client_psubscribe_queued(redis_client* client,
+                                                    const char* pattern, size_t pattern_len) {
+    if (!pattern) {
+        fprintf(stderr, "[ERROR] Invalid pattern\n");
+        return -1;
+    }
+    
+    Handler handler = { NULL, NULL, NULL, NULL, 1, NULL, 0, 0, 0 };
+    return add_subscription(client, 1, pattern, pattern_len, &handler);
+}
+
+REDIS_PUBSUB_API int redis_client_punsubscribe(redis_client* client,
+                                               const char* pattern, size_t pattern_len) {
+    if (!pattern) {
+        fprintf(stderr, "[ERROR] Invalid pattern\n");
+        return -1;
+    }
+    
+    int removed = remove_subscriptions(client, 1, 1, &pattern, &pattern_len);
+    if (removed == 0) {
+        fprintf(stderr, "[ERROR] Pattern not subscribed\n");
+        return -1;
+    }
+    return removed > 0 ? 0 : -1;
+}
+
+/* ==================== 带userdata的订阅 ==================== */
+
+REDIS_PUBSUB_API int redis_client_subscribe_data(redis_client* client,
+                                                 const char* channel, size_t channel_len,
+                                                 PubSubDataCallback callback, void* userdata) {
+    if (!channel || !callback) {
+        fprintf(stderr, "[ERROR] Invalid channel or callback\n");
+        return -1;
+    }
+    
+    Handler handler = { NULL, NULL, callback, userdata, 0, NULL, 0, 0, 0 };
+    return add_subscription(client, 0, channel, channel_len, &handler);
+}
+
+REDIS_PUBSUB_API int redis_client_psubscribe_data(redis_client* client,
+                                                  const char* pattern, size_t pattern_len,
+                                                  PubSubDataCallback callback, void* userdata) {
+    if (!pattern || !callback) {
+        fprintf(stderr, "[ERROR] Invalid pattern or callback\n");
+        return -1;
+    }
+    
+    Handler handler = { NULL, NULL, callback, userdata, 0, NULL, 0, 0, 0 };
+    return add_subscription(client, 1, pattern, pattern_len, &handler);
+}
+
+/* ==================== 批量订阅 ==================== */
+
+REDIS_PUBSUB_API int redis_client_subscribe_batch(redis_client* client,
+                                                  const char* channel, size_t channel_len,
+                                                  int max_batch, int max_delay_ms, size_t record_size,
+                                                  PubSubBatchCallback callback, void* userdata) {
+    if (!channel || !callback) {
+        fprintf(stderr, "[ERROR] Invalid channel or callback\n");
+        return -1;
+    }
+    
+    if (max_batch < 1 || max_batch > REDIS_BATCH_MAX || max_delay_ms < 0) {
+        fprintf(stderr, "[ERROR] Invalid batch size or delay\n");
+        return -1;
+    }
+    
+    Handler handler = { NULL, NULL, NULL, userdata, 0, callback, max_batch, max_delay_ms, record_size };
+    return add_subscription(client, 0, channel, channel_len, &handler);
+}
+
+/* 注册一个订阅并通过所属分片的事件循环发送SUBSCRIBE（is_pattern为1时发送PSUBSCRIBE）
+ * 频道/模式按名称哈希固定分配到一个分片，调用方负责参数校验 */
+static int add_subscription(redis_client* client, int is_pattern,
+                            const char* name, size_t name_len, const Handler *handler) {
+    if (!client || !client->running || !client->shards) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        return -1;
+    }
+    
+    if (is_pattern && client->sharded) {
+        fprintf(stderr, "[ERROR] Pattern subscriptions are not supported with sharded pub/sub\n");
+        return -1;
+    }
+    
+    SubscriberShard *shard = shard_for(client, name, name_len);
+    const char *command = is_pattern ? "PSUBSCRIBE" : SUBSCRIBE_COMMAND(client);
+    rp_mutex_lock(&shard->lock);
+    
+    dict *table = is_pattern ? shard->patterns : shard->subscriptions;
+    if (!table) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        rp_mutex_unlock(&shard->lock);
+        return -1;
+    }
+    
+    /* 已订阅的频道/模式只替换处理方式，不重复发送命令 */
+    ChannelKey lookup = { name, name_len };
+    dictEntry *entry = dictFind(table, &lookup);
+    if (entry) {
+        Subscription *existing = (Subscription*)dictGetEntryVal(entry);
+        existing->handler = *handler;
+        apply_staged_options(shard, is_pattern, existing);
+        rp_mutex_unlock(&shard->lock);
+        return 0;
+    }
+    
+    /* 保存回调函数（名称复制一份，末尾补'\0'） */
+    Subscription *sub = (Subscription*)calloc(1, sizeof(Subscription));
+    char *copy = (char*)malloc(name_len + 1);
+    if (!sub || !copy) {
+        fprintf(stderr, "[ERROR] Out of memory\n");
+        free(sub);
+        free(copy);
+        rp_mutex_unlock(&shard->lock);
+        return -1;
+    }
+    memcpy(copy, name, name_len);
+    copy[name_len] = '\0';
+    sub->key.name = copy;
+    sub->key.len = name_len;
+    sub->handler = *handler;
+    apply_staged_options(shard, is_pattern, sub);
+    
+    if (dictAdd(table, &sub->key, sub) != DICT_OK) {
+        fprintf(stderr, "[ERROR] Failed to register subscription\n");
+        subscription_destructor(NULL, sub);
+        rp_mutex_unlock(&shard->lock);
+        return -1;
+    }
+    
+    rp_mutex_unlock(&shard->lock);
+    
+    /* 执行SUBSCRIBE/PSUBSCRIBE命令（不持有shard->lock，事件循环分发消息时需要它） */
+    const char *argv[2] = { command, name };
+    size_t argvlen[2] = { strlen(command), name_len };
+    if (loop_send_command(shard, 2, argv, argvlen) != 0) {
+        rp_mutex_lock(&shard->lock);
+        dictDelete(table, &lookup);
+        rp_mutex_unlock(&shard->lock);
+        return -1;
+    }
+    
+    // fprintf(stdout, "[SUBSCRIBE] Subscribed to channel: %s\n", channel);
+    return 0;
+}
+
+/* ==================== 批量订阅 ==================== */
+
+/* 按分片分组的一批名称：每个分片一段argv（命令名 + 属于该分片的名称），
+ * 各分片的命令先全部提交再逐个等待确认，N个名称只需要一个网络往返 */
+typedef struct SubscribeBatch {
+    int shard_count;
+    int *shard_of;          /* 每个名称所属的分片 */
+    int *offsets;           /* 各分片的段在argv中的起始位置 */
+    int *argc;              /* 各分片已填入的参数数（含命令名） */
+    long long *targets;     /* 各分片等待的确认序号 */
+    const char **argv;
+    size_t *argvlen;
+} SubscribeBatch;
+
+static void subscribe_batch_free(SubscribeBatch *batch) {
+    free(batch->shard_of);
+    free(batch->offsets);
+    free(batch->argc);
+    free(batch->targets);
+    free((void*)batch->argv);
+    free(batch->argvlen);
+}
+
+static int subscribe_batch_init(SubscribeBatch *batch, redis_client* client, const char* command,
+                                int count, const char** names, const size_t* name_lens) {
+    int shards = client->shard_count;
+    
+    memset(batch, 0, sizeof(*batch));
+    batch->shard_count = shards;
+    batch->shard_of = (int*)malloc((size_t)count * sizeof(int));
+    batch->offsets = (int*)calloc((size_t)shards, sizeof(int));
+    batch->argc = (int*)calloc((size_t)shards, sizeof(int));
+    batch->targets = (long long*)calloc((size_t)shards, sizeof(long long));
+    batch->argv = (const char**)malloc((size_t)(count + shards) * sizeof(char*));
+    batch->argvlen = (size_t*)malloc((size_t)(count + shards) * sizeof(size_t));
+    if (!batch->shard_of || !batch->offsets || !batch->argc || !batch->targets ||
+        !batch->argv || !batch->argvlen) {
+        fprintf(stderr, "[ERROR] Out of memory\n");
+        subscribe_batch_free(batch);
+        return -1;
+    }
+    
+    /* 先统计各分片的名称数，确定每段的起始位置 */
+    for (int i = 0; i < count; i++) {
+        int index = (int)(shard_for(client, names[i], name_lens[i]) - client->shards);
+        batch->shard_of[i] = index;
+        batch->argc[index]++;
+    }
+    int offset = 0;
+    for (int s = 0; s < shards; s++) {
+        batch->offsets[s] = offset;
+        offset += batch->argc[s] + 1;
+        batch->argv[batch->offsets[s]] = command;
+        batch->argvlen[batch->offsets[s]] = strlen(command);
+        batch->argc[s] = 1;
+    }
+    return 0;
+}
+
+static void subscribe_batch_add(SubscribeBatch *batch, int shard, const char* name, size_t name_len) {
+    int position = batch->offsets[shard] + batch->argc[shard]++;
+    batch->argv[position] = name;
+    batch->argvlen[position] = name_len;
+}
+
+/* 提交分片s的命令；分片模式下一条SSUBSCRIBE/SUNSUBSCRIBE的频道必须属于同一槽位，
+ * 因此每个频道一条命令（仍在同一次写出中以管道发送），返回最后一条命令的确认序号 */
+static long long subscribe_batch_submit(SubscribeBatch *batch, redis_client* client, int s) {
+    SubscriberShard *shard = &client->shards[s];
+    const char **argv = batch->argv + batch->offsets[s];
+    size_t *argvlen = batch->argvlen + batch->offsets[s];
+    
+    if (!client->sharded) {
+        return loop_submit_command(shard, batch->argc[s], argv, argvlen);
+    }
+    
+    long long target = 0;
+    for (int a = 1; a < batch->argc[s] && target >= 0; a++) {
+        const char *single[2] = { argv[0], argv[a] };
+        size_t single_len[2] = { argvlen[0], argvlen[a] };
+        target = loop_submit_command(shard, 2, single, single_len);
+    }
+    return target;
+}
+
+/* 提交所有非空分片的命令后逐个等待确认；失败的分片把argc置为负数（调用方据此回滚），返回失败的分片数 */
+static int subscribe_batch_send(SubscribeBatch *batch, redis_client* client) {
+    int failed = 0;
+    
+    for (int s = 0; s < batch->shard_count; s++) {
+        if (batch->argc[s] > 1) {
+            batch->targets[s] = subscribe_batch_submit(batch, client, s);
+        }
+    }
+    for (int s = 0; s < batch->shard_count; s++) {
+        if (batch->argc[s] <= 1) {
+            continue;
+        }
+        if (batch->targets[s] < 0 ||
+            loop_wait_confirmed(&client->shards[s], batch->targets[s], batch->argv[batch->offsets[s]]) != 0) {
+            batch->argc[s] = -batch->argc[s];
+            failed++;
+        }
+    }
+    return failed;
+}
+
+/* 批量注册订阅：每个分片的新名称合并为一条SUBSCRIBE（is_pattern为1时PSUBSCRIBE），
+ * 已订阅的名称只替换处理方式；某个分片发送失败时回滚该分片新注册的名称。调用方负责参数校验 */
+static int add_subscriptions(redis_client* client, int is_pattern, int count,
+                             const char** names, const size_t* name_lens, const Handler *handler) {
+    if (!client || !client->running || !client->shards) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        return -1;
+    }
+    
+    if (is_pattern && client->sharded) {
+        fprintf(stderr, "[ERROR] Pattern subscriptions are not supported with sharded pub/sub\n");
+        return -1;
+    }
+    
+    SubscribeBatch batch;
+    if (subscribe_batch_init(&batch, client, is_pattern ? "PSUBSCRIBE" : SUBSCRIBE_COMMAND(client),
+                             count, names, name_lens) != 0) {
+        return -1;
+    }
+    
+    int result = 0;
+    for (int i = 0; i < count && result == 0; i++) {
+        SubscriberShard *shard = &client->shards[batch.shard_of[i]];
+        rp_mutex_lock(&shard->lock);
+        
+        dict *table = is_pattern ? shard->patterns : shard->subscriptions;
+        ChannelKey lookup = { names[i], name_lens[i] };
+        dictEntry *entry = table ? dictFind(table, &lookup) : NULL;
+        if (entry) {
+            Subscription *existing = (Subscription*)dictGetEntryVal(entry);
+            existing->handler = *handler;
+            apply_staged_options(shard, is_pattern, existing);
+            rp_mutex_unlock(&shard->lock);
+            continue;
+        }
+        
+        if (!table) {
+            fprintf(stderr, "[ERROR] Redis not initialized\n");
+            rp_mutex_unlock(&shard->lock);
+            result = -1;
+            break;
+        }
+        
+        Subscription *sub = (Subscription*)calloc(1, sizeof(Subscription));
+        char *copy = (char*)malloc(name_lens[i] + 1);
+        if (!sub || !copy) {
+            fprintf(stderr, "[ERROR] Out of memory\n");
+            free(sub);
+            free(copy);
+            rp_mutex_unlock(&shard->lock);
+            result = -1;
+            break;
+        }
+        memcpy(copy, names[i], name_lens[i]);
+        copy[name_lens[i]] = '\0';
+        sub->key.name = copy;
+        sub->key.len = name_lens[i];
+        sub->handler = *handler;
+        apply_staged_options(shard, is_pattern, sub);
+        
+        if (dictAdd(table, &sub->key, sub) != DICT_OK) {
+            fprintf(stderr, "[ERROR] Failed to register subscription\n");
+            subscription_destructor(NULL, sub);
+            result = -1;
+        } else {
+            subscribe_batch_add(&batch, batch.shard_of[i], names[i], name_lens[i]);
+        }
+        rp_mutex_unlock(&shard->lock);
+    }
+    
+    /* 注册失败时不发送，回滚所有分片已注册的名称 */
+    if (result != 0) {
+        for (int s = 0; s < batch.shard_count; s++) {
+            batch.argc[s] = -batch.argc[s];
+        }
+    } else if (subscribe_batch_send(&batch, client) > 0) {
+        result = -1;
+    }
+    
+    for (int s = 0; s < batch.shard_count; s++) {
+        if (batch.argc[s] >= 0) {
+            continue;
+        }
+        SubscriberShard *shard = &client->shards[s];
+        dict *table = is_pattern ? shard->patterns : shard->subscriptions;
+        rp_mutex_lock(&shard->lock);
+        for (int a = 1; a < -batch.argc[s]; a++) {
+            ChannelKey lookup = { batch.argv[batch.offsets[s] + a], batch.argvlen[batch.offsets[s] + a] };
+            dictDelete(table, &lookup);
+        }
+        rp_mutex_unlock(&shard->lock);
+    }
+    
+    subscribe_batch_free(&batch);
+    return result;
+}
+
+/* 批量取消订阅：从订阅表删除后每个分片发送一条UNSUBSCRIBE（is_pattern为1时PUNSUBSCRIBE），
+ * 之后到达的消息找不到订阅，直接丢弃。未订阅的名称跳过，返回取消的名称数，失败返回-1 */
+static int remove_subscriptions(redis_client* client, int is_pattern, int count,
+                                const char** names, const size_t* name_lens) {
+    if (!client || !client->running || !client->shards) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        return -1;
+    }
+    
+    SubscribeBatch batch;
+    if (subscribe_batch_init(&batch, client, is_pattern ? "PUNSUBSCRIBE" : UNSUBSCRIBE_COMMAND(client),
+                             count, names, name_lens) != 0) {
+        return -1;
+    }
+    
+    int removed = 0;
+    for (int i = 0; i < count; i++) {
+        SubscriberShard *shard = &client->shards[batch.shard_of[i]];
+        dict *table = is_pattern ? shard->patterns : shard->subscriptions;
+        ChannelKey lookup = { names[i], name_lens[i] };
+        
+        rp_mutex_lock(&shard->lock);
+        if (table && dictDelete(table, &lookup) == DICT_OK) {
+            subscribe_batch_add(&batch, batch.shard_of[i], names[i], name_lens[i]);
+            removed++;
+        }
+        rp_mutex_unlock(&shard->lock);
+    }
+    
+    if (removed > 0 && subscribe_batch_send(&batch, client) > 0) {
+        removed = -1;
+    }
+    subscribe_batch_free(&batch);
+    return removed;
+}
+
+/* ==================== 订阅表 ==================== */
+
+static unsigned int channel_key_hash(const void *key) {
+    const ChannelKey *k = (const ChannelKey*)key;
+    return dictGenHashFunction((const unsigned char*)k->name, (int)k->len);
+}
+
+static int channel_key_compare(void *privdata, const void *key1, const void *key2) {
+    const ChannelKey *k1 = (const ChannelKey*)key1;
+    const ChannelKey *k2 = (const ChannelKey*)key2;
+    DICT_NOTUSED(privdata);
+    
+    return k1->len == k2->len && memcmp(k1->name, k2->name, k1->len) == 0;
+}
+
+static void subscription_destructor(void *privdata, void *val) {
+    Subscription *sub = (Subscription*)val;
+    DICT_NOTUSED(privdata);
+    
+    free((char*)sub->key.name);
+    free(sub->echo);
+    free(sub->filter);
+    free(sub);
+}
+
+/* ==================== 过滤条件 ==================== */
+
+/* 在data中查找needle（二进制安全），返回1表示找到 */
+static int bytes_contains(const char *data, size_t len, const char *needle, size_t needle_len) {
+    if (needle_len == 0) {
+        return 1;
+    }
+    
+    const char *p = data;
+    const char *last = data + len;
+    while ((size_t)(last - p) >= needle_len) {
+        p = (const char*)memchr(p, needle[0], (size_t)(last - p) - needle_len + 1);
+        if (!p) {
+            return 0;
+        }
+        if (memcmp(p, needle, needle_len) == 0) {
+            return 1;
+        }
+        p++;
+    }
+    return 0;
+}
+
+static const char* json_skip_ws(const char *p, const char *end) {
+    while (p < end && (*p == ' ' || *p == '\t' || *p == '\r' || *p == '\n')) {
+        p++;
+    }
+    return p;
+}
+
+/* p指向'"'，返回结束引号之后的位置，字符串未结束返回NULL */
+static const char* json_skip_string(const char *p, const char *end) {
+    for (p++; p < end; p++) {
+        if (*p == '\\') {
+            p++;
+        } else if (*p == '"') {
+            return p + 1;
+        }
+    }
+    return NULL;
+}
+
+/* 跳过p处的一个JSON值（不校验内部格式），返回值之后的位置，格式错误返回NULL */
+static const char* json_skip_value(const char *p, const char *end) {
+    if (p >= end) {
+        return NULL;
+    }
+    if (*p == '"') {
+        return json_skip_string(p, end);
+    }
+    
+    if (*p == '{' || *p == '[') {
+        int depth = 0;
+        while (p < end) {
+            if (*p == '"') {
+                p = json_skip_string(p, end);
+                if (!p) {
+                    return NULL;
+                }
+                continue;
+            }
+            if (*p == '{' || *p == '[') {
+                depth++;
+            } else if ((*p == '}' || *p == ']') && --depth == 0) {
+                return p + 1;
+            }
+            p++;
+        }
+        return NULL;
+    }
+    
+    /* 数字、true/false/null */
+    const char *start = p;
+    while (p < end && *p != ',' && *p != '}' && *p != ']' &&
+           *p != ' ' && *p != '\t' && *p != '\r' && *p != '\n') {
+        p++;
+    }
+    return p > start ? p : NULL;
+}
+
+/* payload是JSON对象且顶层字段rule->field的值（原始JSON文本）等于rule->value */
+static int json_field_equals(const FilterRule *rule, const char *data, size_t len) {
+    const char *end = data + len;
+    const char *p = json_skip_ws(data, end);
+    if (p >= end || *p != '{') {
+        return 0;
+    }
+    p++;
+    
+    for (;;) {
+        p = json_skip_ws(p, end);
+        if (p >= end || *p != '"') {
+            return 0;
+        }
+        const char *key = p + 1;
+        p = json_skip_string(p, end);
+        if (!p) {
+            return 0;
+        }
+        size_t key_len = (size_t)(p - 1 - key);
+        
+        p = json_skip_ws(p, end);
+        if (p >= end || *p != ':') {
+            return 0;
+        }
+        p = json_skip_ws(p + 1, end);
+        const char *value = p;
+        p = json_skip_value(p, end);
+        if (!p) {
+            return 0;
+        }
+        
+        if (key_len == rule->field_len && memcmp(key, rule->field, key_len) == 0) {
+            return (size_t)(p - value) == rule->value_len && memcmp(value, rule->value, rule->value_len) == 0;
+        }
+        
+        p = json_skip_ws(p, end);
+        if (p >= end || *p != ',') {
+            return 0;
+        }
+        p++;
+    }
+}
+
+static int filter_rule_match(const FilterRule *rule, const char *data, size_t len) {
+    int matched = 0;
+    switch (rule->type) {
+        case REDIS_FILTER_PREFIX:
+            matched = len >= rule->value_len && memcmp(data, rule->value, rule->value_len) == 0;
+            break;
+        case REDIS_FILTER_CONTAINS:
+            matched = bytes_contains(data, len, rule->value, rule->value_len);
+            break;
+        case REDIS_FILTER_BYTES:
+            matched = rule->offset <= len && len - rule->offset >= rule->value_len &&
+                      memcmp(data + rule->offset, rule->value, rule->value_len) == 0;
+            break;
+        case REDIS_FILTER_JSON_FIELD:
+            matched = json_field_equals(rule, data, len);
+            break;
+    }
+    return matched != rule->negate;
+}
+
+/* 对payload求值并计数（调用时持有分片锁），返回1表示通过
+ * framed的订阅：未压缩头部之后的原始payload照常求值，压缩过的payload由Python层解压，原生层无法判断，直接通过 */
+static int filter_accept(FilterSet *filter, const char* data, size_t len) {
+    int accepted = 1;
+    int evaluate = 1;
+    if (filter->framed && len >= COMPRESS_HEADER_LEN && memcmp(data, COMPRESS_MAGIC, COMPRESS_MAGIC_LEN) == 0) {
+        evaluate = (data[COMPRESS_MAGIC_LEN] & COMPRESS_FLAG_RAW) != 0;
+        data += COMPRESS_HEADER_LEN;
+        len -= COMPRESS_HEADER_LEN;
+    }
+    for (int i = 0; i < filter->count && accepted && evaluate; i++) {
+        accepted = filter_rule_match(&filter->rules[i], data, len);
+    }
+    
+    if (accepted) {
+        filter->passed++;
+    } else {
+        filter->rejected++;
+    }
+    return accepted;
+}
+
+/* 校验并复制一组过滤条件（条件和字符串一次分配），失败返回NULL */
+static FilterSet* filter_compile(int count, const RedisFilter* filters) {
+    size_t size = sizeof(FilterSet) + (size_t)count * sizeof(FilterRule);
+    for (int i = 0; i < count; i++) {
+        const RedisFilter *f = &filters[i];
+        if (f->type == REDIS_FILTER_COMPRESSED) {
+            continue;
+        }
+        if (f->type < REDIS_FILTER_PREFIX || f->type > REDIS_FILTER_JSON_FIELD ||
+            (!f->value && f->value_len > 0) ||
+            (f->type == REDIS_FILTER_JSON_FIELD && (!f->field || f->value_len == 0))) {
+            fprintf(stderr, "[ERROR] Invalid filter at index %d\n", i);
+            return NULL;
+        }
+        size += f->value_len + (f->type == REDIS_FILTER_JSON_FIELD ? f->field_len : 0);
+    }
+    
+    FilterSet *set = (FilterSet*)calloc(1, size);
+    if (!set) {
+        fprintf(stderr, "[ERROR] Out of memory\n");
+        return NULL;
+    }
+    set->rules = (FilterRule*)(set + 1);
+    
+    char *strings = (char*)(set->rules + count);
+    for (int i = 0; i < count; i++) {
+        const RedisFilter *f = &filters[i];
+        if (f->type == REDIS_FILTER_COMPRESSED) {
+            set->framed = 1;
+            continue;
+        }
+        FilterRule *rule = &set->rules[set->count++];
+        rule->type = f->type;
+        rule->negate = f->negate ? 1 : 0;
+        rule->offset = f->offset;
+        if (f->value_len > 0) {
+            memcpy(strings, f->value, f->value_len);
+        }
+        rule->value = strings;
+        rule->value_len = f->value_len;
+        strings += f->value_len;
+        if (f->type == REDIS_FILTER_JSON_FIELD) {
+            if (f->field_len > 0) {
+                memcpy(strings, f->field, f->field_len);
+            }
+            rule->field = strings;
+            rule->field_len = f->field_len;
+            strings += f->field_len;
+        }
+    }
+    return set;
+}
+
+/* 查找订阅（调用时持有分片锁），不存在时返回NULL */
+static Subscription* find_subscription(SubscriberShard *shard, int is_pattern, const char* name, size_t name_len) {
+    dict *table = is_pattern ? shard->patterns : shard->subscriptions;
+    ChannelKey lookup = { name, name_len };
+    dictEntry *entry = table ? dictFind(table, &lookup) : NULL;
+    return entry ? (Subscription*)dictGetEntryVal(entry) : NULL;
+}
+
+REDIS_PUBSUB_API int redis_client_set_filter(redis_client* client, int is_pattern,
+                                             const char* name, size_t name_len,
+                                             int count, const RedisFilter* filters) {
+    if (!client || !client->running || !client->shards) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        return -1;
+    }
+    
+    if (!name || count < 0 || (count > 0 && !filters)) {
+        fprintf(stderr, "[ERROR] Invalid filter arguments\n");
+        return -1;
+    }
+    
+    FilterSet *filter = NULL;
+    if (count > 0) {
+        filter = filter_compile(count, filters);
+        if (!filter) {
+            return -1;
+        }
+    }
+    
+    SubscriberShard *shard = shard_for(client, name, name_len);
+    rp_mutex_lock(&shard->lock);
+    Subscription *sub = find_subscription(shard, is_pattern, name, name_len);
+    FilterSet *previous = NULL;
+    if (sub) {
+        previous = sub->filter;
+        sub->filter = filter;
+    }
+    rp_mutex_unlock(&shard->lock);
+    
+    if (!sub) {
+        fprintf(stderr, "[ERROR] %s not subscribed\n", is_pattern ? "Pattern" : "Channel");
+        free(filter);
+        return -1;
+    }
+    free(previous);
+    return 0;
+}
+
+/* 取出名称的暂存选项（调用时持有分片锁）：替换sub的合并投递和过滤条件，没有暂存时不变 */
+static void apply_staged_options(SubscriberShard *shard, int is_pattern, Subscription *sub) {
+    dict *staged = is_pattern ? shard->staged_patterns : shard->staged;
+    dictEntry *entry = staged ? dictFind(staged, &sub->key) : NULL;
+    if (!entry) {
+        return;
+    }
+    
+    Subscription *options = (Subscription*)dictGetEntryVal(entry);
+    sub->conflate = options->conflate;
+    free(sub->filter);
+    sub->filter = options->filter;
+    options->filter = NULL;
+    dictDelete(staged, &sub->key);
+}
+
+REDIS_PUBSUB_API int redis_client_stage_options(redis_client* client, int is_pattern,
+                                                const char* name, size_t name_len, int conflate,
+                                                int filter_count, const RedisFilter* filters) {
+    if (!client || !client->running || !client->shards) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        return -1;
+    }
+    
+    if (!name || filter_count < 0 || (filter_count > 0 && !filters)) {
+        fprintf(stderr, "[ERROR] Invalid subscribe options\n");
+        return -1;
+    }
+    
+    Subscription *options = (Subscription*)calloc(1, sizeof(Subscription));
+    char *copy = (char*)malloc(name_len + 1);
+    if (!options || !copy) {
+        fprintf(stderr, "[ERROR] Out of memory\n");
+        free(options);
+        free(copy);
+        return -1;
+    }
+    memcpy(copy, name, name_len);
+    copy[name_len] = '\0';
+    options->key.name = copy;
+    options->key.len = name_len;
+    options->conflate = conflate ? 1 : 0;
+    if (filter_count > 0) {
+        options->filter = filter_compile(filter_count, filters);
+        if (!options->filter) {
+            subscription_destructor(NULL, options);
+            return -1;
+        }
+    }
+    
+    SubscriberShard *shard = shard_for(client, name, name_len);
+    rp_mutex_lock(&shard->lock);
+    dict **staged = is_pattern ? &shard->staged_patterns : &shard->staged;
+    if (!*staged) {
+        *staged = dictCreate(&g_subscription_dict_type, NULL);
+    }
+    /* 键内嵌在值中，先删除旧的暂存（不能用dictReplace，它保留旧键） */
+    int result = -1;
+    if (*staged) {
+        dictDelete(*staged, &options->key);
+        result = dictAdd(*staged, &options->key, options) == DICT_OK ? 0 : -1;
+    }
+    rp_mutex_unlock(&shard->lock);
+    
+    if (result < 0) {
+        fprintf(stderr, "[ERROR] Failed to stage subscribe options\n");
+        subscription_destructor(NULL, options);
+        return -1;
+    }
+    return 0;
+}
+
+REDIS_PUBSUB_API int redis_client_discard_options(redis_client* client, int is_pattern,
+                                                  const char* name, size_t name_len) {
+    if (!client || !client->shards || !name) {
+        return -1;
+    }
+    
+    SubscriberShard *shard = shard_for(client, name, name_len);
+    ChannelKey lookup = { name, name_len };
+    rp_mutex_lock(&shard->lock);
+    dict *staged = is_pattern ? shard->staged_patterns : shard->staged;
+    if (staged) {
+        dictDelete(staged, &lookup);
+    }
+    rp_mutex_unlock(&shard->lock);
+    return 0;
+}
+
+REDIS_PUBSUB_API int redis_client_get_filter_stats(redis_client* client, int is_pattern,
+                                                   const char* name, size_t name_len,
+                                                   RedisFilterStats* stats) {
+    if (!client || !client->shards || !name || !stats) {
+        return -1;
+    }
+    
+    SubscriberShard *shard = shard_for(client, name, name_len);
+    rp_mutex_lock(&shard->lock);
+    Subscription *sub = find_subscription(shard, is_pattern, name, name_len);
+    stats->passed = sub && sub->filter ? sub->filter->passed : 0;
+    stats->rejected = sub && sub->filter ? sub->filter->rejected : 0;
+    rp_mutex_unlock(&shard->lock);
+    return sub ? 0 : -1;
+}
+
+/* ==================== 本地投递 ==================== */
+
+REDIS_PUBSUB_API int redis_client_set_local_delivery(redis_client* client, int enabled, int suppress_echo) {
+    if (!client) {
+        fprintf(stderr, "[ERROR] Invalid local delivery arguments\n");
+        return -1;
+    }
+    
+    client->local.suppress_echo = suppress_echo ? 1 : 0;
+    client->local.enabled = enabled ? 1 : 0;
+    return 0;
+}
+
+REDIS_PUBSUB_API int redis_client_get_local_stats(redis_client* client, RedisLocalStats* stats) {
+    if (!client || !stats) {
+        return -1;
+    }
+    
+    stats->delivered = client->local.delivered;
+    stats->echo_suppressed = client->local.echo_suppressed;
+    stats->echo_expired = client->local.echo_expired;
+    return 0;
+}
+
+/* 消息内容指纹（64位FNV-1a），与长度一起比较 */
+static unsigned long long echo_hash(const char* message, size_t message_len) {
+    unsigned long long hash = 14695981039346656037ULL;
+    for (size_t i = 0; i < message_len; i++) {
+        hash ^= (unsigned char)message[i];
+        hash *= 1099511628211ULL;
+    }
+    return hash;
+}
+
+/* 在窗口中查找指纹，newest_first为1时从最近的记录开始找，返回槽位下标或-1 */
+static int echo_find(EchoWindow *w, unsigned long long hash, size_t len, int newest_first) {
+    for (int i = 0; i < w->count; i++) {
+        int index = (w->head + (newest_first ? w->count - 1 - i : i)) % REDIS_ECHO_WINDOW;
+        if (w->entries[index].hash == hash && w->entries[index].len == len) {
+            return index;
+        }
+    }
+    return -1;
+}
+
+/* 移除一条记录：用最早的记录填补空位（只有head处的过期检查依赖顺序） */
+static void echo_remove_at(EchoWindow *w, int index) {
+    w->entries[index] = w->entries[w->head];
+    w->head = (w->head + 1) % REDIS_ECHO_WINDOW;
+    w->count--;
+}
+
+/* 记录一条等待回传的消息，窗口已满时丢弃最早的记录（调用时持有分片锁） */
+static void echo_record(redis_client* client, Subscription *sub,
+                        const char* message, size_t message_len) {
+    if (!sub->echo) {
+        sub->echo = (EchoWindow*)calloc(1, sizeof(EchoWindow));
+        if (!sub->echo) {
+            fprintf(stderr, "[ERROR] Out of memory\n");
+            return;
+        }
+    }
+    
+    EchoWindow *w = sub->echo;
+    if (w->count == REDIS_ECHO_WINDOW) {
+        echo_remove_at(w, w->head);
+        rp_atomic_inc64(&client->local.echo_expired);
+    }
+    
+    EchoEntry *entry = &w->entries[(w->head + w->count) % REDIS_ECHO_WINDOW];
+    entry->hash = echo_hash(message, message_len);
+    entry->len = message_len;
+    entry->expires = rp_now_ms() + REDIS_ECHO_TIMEOUT_MS;
+    w->count++;
+}
+
+/* 收到的消息是否是本进程已在本地投递过的回传副本，是则移除记录并返回1（调用时持有分片锁） */
+static int echo_consume(redis_client* client, Subscription *sub,
+                        const char* message, size_t message_len) {
+    EchoWindow *w = sub->echo;
+    long long now = rp_now_ms();
+    
+    while (w->count > 0 && w->entries[w->head].expires <= now) {
+        echo_remove_at(w, w->head);
+        rp_atomic_inc64(&client->local.echo_expired);
+    }
+    
+    int index = w->count > 0 ? echo_find(w, echo_hash(message, message_len), message_len, 0) : -1;
+    if (index < 0) {
+        return 0;
+    }
+    echo_remove_at(w, index);
+    rp_atomic_inc64(&client->local.echo_suppressed);
+    return 1;
+}
+
+/* 启用本地投递时，在发送前查找本实例对该频道的订阅（只匹配普通订阅）
+ * 需要丢弃回传副本时先记录消息指纹，保证Redis回传的副本到达时已能识别；返回1表示发出后应在本地投递 */
+static int local_reserve(redis_client* client, const char* channel, size_t channel_len,
+                         const char* message, size_t message_len) {
+    if (!client->local.enabled || !client->shards) {
+        return 0;
+    }
+    
+    SubscriberShard *shard = shard_for(client, channel, channel_len);
+    ChannelKey lookup = { channel, channel_len };
+    
+    rp_mutex_lock(&shard->lock);
+    dictEntry *entry = shard->subscriptions ? dictFind(shard->subscriptions, &lookup) : NULL;
+    /* 会被过滤掉的消息同样记录指纹，Redis回传的副本直接丢弃，不再重复求值 */
+    if (entry && client->local.suppress_echo) {
+        echo_record(client, (Subscription*)dictGetEntryVal(entry), message ? message : "", message_len);
+    }
+    rp_mutex_unlock(&shard->lock);
+    return entry != NULL;
+}
+
+/* 消息已发出（或进入spool）后，在发布线程中把它直接投递给本实例对该频道的订阅 */
+static void local_deliver(redis_client* client, const char* channel, size_t channel_len,
+                          const char* message, size_t message_len) {
+    if (!message) {
+        message = "";
+    }
+    
+    Handler handler;
+    SubscriberShard *shard = shard_for(client, channel, channel_len);
+    ChannelKey lookup = { channel, channel_len };
+    
+    rp_mutex_lock(&shard->lock);
+    dictEntry *entry = shard->subscriptions ? dictFind(shard->subscriptions, &lookup) : NULL;
+    if (!entry) {
+        rp_mutex_unlock(&shard->lock);
+        return;
+    }
+    Subscription *sub = (Subscription*)dictGetEntryVal(entry);
+    handler = sub->handler;
+    int rejected = (handler.record_size && message_len != handler.record_size) ||
+                   (sub->filter && !filter_accept(sub->filter, message, message_len));
+    rp_mutex_unlock(&shard->lock);
+    
+    if (rejected) {
+        rp_atomic_inc64(&client->metrics.filtered);
+        return;
+    }
+    rp_atomic_inc64(&client->local.delivered);
+    
+    if (!handler.callback) {
+        deliver_message(client, &handler, channel, channel_len, message, message_len);
+        return;
+    }
+    
+    /* 文本回调需要以'\0'结尾的字符串，调用方的缓冲区不一定满足 */
+    char stack[512];
+    size_t size = channel_len + message_len + 2;
+    char *buf = size <= sizeof(stack) ? stack : (char*)malloc(size);
+    if (!buf) {
+        fprintf(stderr, "[ERROR] Out of memory\n");
+        return;
+    }
+    memcpy(buf, channel, channel_len);
+    buf[channel_len] = '\0';
+    memcpy(buf + channel_len + 1, message, message_len);
+    buf[size - 1] = '\0';
+    deliver_message(client, &handler, buf, channel_len, buf + channel_len + 1, message_len);
+    if (buf != stack) {
+        free(buf);
+    }
+}
+
+/* 记录过指纹的消息没有发送到Redis：移除最近一条对应的指纹，避免误丢之后内容相同的消息 */
+static void local_forget(redis_client* client, const char* channel, size_t channel_len,
+                         const char* message, size_t message_len) {
+    if (!client->shards) {
+        return;
+    }
+    
+    SubscriberShard *shard = shard_for(client, channel, channel_len);
+    ChannelKey lookup = { channel, channel_len };
+    
+    rp_mutex_lock(&shard->lock);
+    dictEntry *entry = shard->subscriptions ? dictFind(shard->subscriptions, &lookup) : NULL;
+    EchoWindow *w = entry ? ((Subscription*)dictGetEntryVal(entry))->echo : NULL;
+    if (w) {
+        int index = echo_find(w, echo_hash(message ? message : "", message_len), message_len, 1);
+        if (index >= 0) {
+            echo_remove_at(w, index);
+        }
+    }
+    rp_mutex_unlock(&shard->lock);
+}
+
+/* ==================== 统计 ==================== */
+
+REDIS_PUBSUB_API int redis_client_get_stats(redis_client* client, RedisStats* stats) {
+    if (!client || !stats) {
+        return -1;
+    }
+    
+    Metrics *m = &client->metrics;
+    stats->messages_in = m->messages_in;
+    stats->bytes_in = m->bytes_in;
+    stats->messages_out = m->messages_out;
+    stats->bytes_out = m->bytes_out;
+    stats->publish_errors = m->publish_errors + client->async.failed;
+    stats->reconnects = client->reconnect.reconnects;
+    stats->slow_callbacks = m->slow_callbacks;
+    stats->channels_tracked = m->channels_tracked;
+    stats->conflated = m->conflated;
+    stats->filtered = m->filtered;
+    memcpy(&stats->publish_rtt, &m->publish_rtt, sizeof(RedisHistogram));
+    memcpy(&stats->callback_time, &m->callback_time, sizeof(RedisHistogram));
+    return 0;
+}
+
+REDIS_PUBSUB_API int redis_client_get_channel_stats(redis_client* client, RedisChannelStats* stats,
+                                                    int max_count) {
+    if (!client || !stats || max_count < 0) {
+        return -1;
+    }
+    
+    int count = 0;
+    for (int i = 0; i < REDIS_STATS_STRIPES && count < max_count; i++) {
+        CountersStripe *stripe = &client->metrics.stripes[i];
+        dictIterator it;
+        dictEntry *entry;
+        
+        rp_mutex_lock(&stripe->lock);
+        dictInitIterator(&it, stripe->channels);
+        while (count < max_count && (entry = dictNext(&it)) != NULL) {
+            ChannelCounters *c = (ChannelCounters*)dictGetEntryVal(entry);
+            RedisChannelStats *out = &stats[count++];
+            out->channel = c->key.name;
+            out->channel_len = c->key.len;
+            out->messages_in = c->messages_in;
+            out->bytes_in = c->bytes_in;
+            out->messages_out = c->messages_out;
+            out->bytes_out = c->bytes_out;
+            out->conflated = c->conflated;
+        }
+        rp_mutex_unlock(&stripe->lock);
+    }
+    return count;
+}
+
+REDIS_PUBSUB_API int redis_client_set_channel_stats(redis_client* client, int max_channels) {
+    if (!client || max_channels < 0) {
+        fprintf(stderr, "[ERROR] Invalid channel stats limit\n");
+        return -1;
+    }
+    
+    client->metrics.max_channels = max_channels;
+    return 0;
+}
+
+REDIS_PUBSUB_API int redis_client_set_slow_handler(redis_client* client, long long threshold_us,
+                                                   SlowHandlerHook hook, void* userdata) {
+    if (!client || threshold_us < 0) {
+        fprintf(stderr, "[ERROR] Invalid slow handler threshold\n");
+        return -1;
+    }
+    
+    Metrics *m = &client->metrics;
+    rp_mutex_lock(&m->lock);
+    m->slow_hook = hook;
+    m->slow_userdata = userdata;
+    m->slow_threshold_ns = threshold_us * 1000;
+    rp_mutex_unlock(&m->lock);
+    return 0;
+}
+
+static void metrics_init(Metrics *m) {
+    rp_mutex_init(&m->lock);
+    m->max_channels = REDIS_CHANNEL_STATS_DEFAULT_MAX;
+    for (int i = 0; i < REDIS_STATS_STRIPES; i++) {
+        rp_mutex_init(&m->stripes[i].lock);
+        m->stripes[i].channels = dictCreate(&g_counters_dict_type, NULL);
+    }
+}
+
+static void metrics_free(Metrics *m) {
+    for (int i = 0; i < REDIS_STATS_STRIPES; i++) {
+        if (m->stripes[i].channels) {
+            dictRelease(m->stripes[i].channels);
+            m->stripes[i].channels = NULL;
+        }
+        rp_mutex_destroy(&m->stripes[i].lock);
+    }
+    rp_mutex_destroy(&m->lock);
+}
+
+static void counters_destructor(void *privdata, void *val) {
+    ChannelCounters *c = (ChannelCounters*)val;
+    DICT_NOTUSED(privdata);
+    
+    free((char*)c->key.name);
+    free(c);
+}
+
+/* 纳秒值所在的直方图桶（分桶方式见RedisHistogram） */
+static int histogram_index(long long ns) {
+    if (ns < 8) {
+        return ns < 0 ? 0 : (int)ns;
+    }
+    
+    int k = 3;
+    while (k < 62 && (ns >> (k + 1)) != 0) {
+        k++;
+    }
+    int index = 8 + (k - 3) * 8 + (int)((ns >> (k - 3)) & 7);
+    return index < REDIS_HISTOGRAM_BUCKETS ? index : REDIS_HISTOGRAM_BUCKETS - 1;
+}
+
+static void histogram_record(RedisHistogram *h, long long ns) {
+    if (ns < 0) {
+        ns = 0;
+    }
+    
+    rp_atomic_inc64(&h->buckets[histogram_index(ns)]);
+    rp_atomic_inc64(&h->count);
+    rp_atomic_add64(&h->sum_ns, ns);
+    
+    long long max = h->max_ns;
+    while (ns > max) {
+        long long previous = rp_atomic_cas64(&h->max_ns, max, ns);
+        if (previous == max) {
+            break;
+        }
+        max = previous;
+    }
+}
+
+/* 查找或创建频道的计数器，已达到max_channels时返回NULL（只计入总数） */
+static ChannelCounters* channel_counters(Metrics *m, const char* channel, size_t channel_len) {
+    if (m->max_channels <= 0) {
+        return NULL;
+    }
+    
+    unsigned int hash = dictGenHashFunction((const unsigned char*)channel, (int)channel_len);
+    CountersStripe *stripe = &m->stripes[hash % REDIS_STATS_STRIPES];
+    ChannelKey lookup = { channel, channel_len };
+    
+    rp_mutex_lock(&stripe->lock);
+    dictEntry *entry = stripe->channels ? dictFind(stripe->channels, &lookup) : NULL;
+    if (entry || !stripe->channels || m->channels_tracked >= m->max_channels) {
+        rp_mutex_unlock(&stripe->lock);
+        return entry ? (ChannelCounters*)dictGetEntryVal(entry) : NULL;
+    }
+    
+    ChannelCounters *c = (ChannelCounters*)calloc(1, sizeof(ChannelCounters));
+    char *copy = (char*)malloc(channel_len + 1);
+    if (!c || !copy) {
+        free(c);
+        free(copy);
+        rp_mutex_unlock(&stripe->lock);
+        return NULL;
+    }
+    memcpy(copy, channel, channel_len);
+    copy[channel_len] = '\0';
+    c->key.name = copy;
+    c->key.len = channel_len;
+    
+    if (dictAdd(stripe->channels, &c->key, c) != DICT_OK) {
+        counters_destructor(NULL, c);
+        c = NULL;
+    } else {
+        rp_atomic_inc64(&m->channels_tracked);
+    }
+    rp_mutex_unlock(&stripe->lock);
+    return c;
+}
+
+/* 订阅连接收到一条消息 */
+static void metrics_in(redis_client* client, const char* channel, size_t channel_len, size_t bytes) {
+    Metrics *m = &client->metrics;
+    rp_atomic_inc64(&m->messages_in);
+    rp_atomic_add64(&m->bytes_in, (long long)bytes);
+    
+    ChannelCounters *c = channel_counters(m, channel, channel_len);
+    if (c) {
+        rp_atomic_inc64(&c->messages_in);
+        rp_atomic_add64(&c->bytes_in, (long long)bytes);
+    }
+}
+
+/* 一条消息已发布（收到回复、进入异步发送队列或spool） */
+static void metrics_out(redis_client* client, const char* channel, size_t channel_len, size_t bytes) {
+    Metrics *m = &client->metrics;
+    rp_atomic_inc64(&m->messages_out);
+    rp_atomic_add64(&m->bytes_out, (long long)bytes);
+    
+    ChannelCounters *c = channel_counters(m, channel, channel_len);
+    if (c) {
+        rp_atomic_inc64(&c->messages_out);
+        rp_atomic_add64(&c->bytes_out, (long long)bytes);
+    }
+}
+
+/* 合并投递的频道上一条待投递的消息被更新的消息覆盖 */
+static void metrics_conflated(redis_client* client, const char* channel, size_t channel_len) {
+    Metrics *m = &client->metrics;
+    rp_atomic_inc64(&m->conflated);
+    
+    ChannelCounters *c = channel_counters(m, channel, channel_len);
+    if (c) {
+        rp_atomic_inc64(&c->conflated);
+    }
+}
+
+/* 记录一次回调的执行时间，超过阈值时通知慢回调钩子 */
+static void metrics_callback(redis_client* client, const char* channel, size_t channel_len,
+                             long long elapsed_ns) {
+    Metrics *m = &client->metrics;
+    histogram_record(&m->callback_time, elapsed_ns);
+    
+    long long threshold = m->slow_threshold_ns;
+    if (threshold <= 0 || elapsed_ns < threshold) {
+        return;
+    }
+    rp_atomic_inc64(&m->slow_callbacks);
+    
+    rp_mutex_lock(&m->lock);
+    SlowHandlerHook hook = m->slow_hook;
+    void *userdata = m->slow_userdata;
+    rp_mutex_unlock(&m->lock);
+    
+    if (hook) {
+        hook(userdata, channel, channel_len, elapsed_ns);
+    }
+}
+
+/* ==================== Streams ==================== */
+
+#define REDIS_STREAM_TIMEOUT_MARGIN_MS 5000     /* 读超时 = BLOCK时间 + 余量，防止连接无声断开时永久阻塞 */
+
+struct redis_stream_reader {
+    redis_client *client;
+    redisContext *context;          /* 读取器专用的阻塞连接 */
+    Backoff backoff;
+    char *group;
+    size_t group_len;
+    char *consumer;
+    size_t consumer_len;
+    redisReply *reply;              /* 上一次读取的回复，交给调用方的条目指向其中 */
+    int pending_acks;               /* 已追加到输出缓冲区、尚未发出的XACK命令数 */
+    int timeout_ms;                 /* 当前连接的读超时，-1表示未设置 */
+    long long reads;
+    long long entries;
+    long long acked;
+    long long reconnects;
+};
+
+/* 把整数格式化为十进制字符串（命令参数），返回长度 */
+static size_t format_count(char *buf, size_t size, long long value) {
+    int n = snprintf(buf, size, "%lld", value);
+    return n > 0 ? (size_t)n : 0;
+}
+
+REDIS_PUBSUB_API int redis_client_stream_add(redis_client* client, int count,
+                                             const char** streams, const size_t* stream_lens,
+                                             const char** messages, const size_t* message_lens,
+                                             long long maxlen, char* ids) {
+    if (!client || !client->running) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        return -1;
+    }
+    
+    if (count < 0 || (count > 0 && (!streams || !messages))) {
+        fprintf(stderr, "[ERROR] Invalid stream arguments\n");
+        return -1;
+    }
+    
+    for (int i = 0; i < count; i++) {
+        if (!streams[i] || (!messages[i] && message_lens && message_lens[i] > 0)) {
+            fprintf(stderr, "[ERROR] Invalid stream or message at index %d\n", i);
+            return -1;
+        }
+        if (ids) {
+            ids[(size_t)i * REDIS_STREAM_ID_MAX] = '\0';
+        }
+    }
+    
+    if (count == 0) {
+        return 0;
+    }
+    
+    PublishConnection *conn = pool_acquire(&client->pool);
+    if (!conn) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        return -1;
+    }
+    
+    /* 流条目要求送达，连接断开时不进入spool，直接返回错误由调用方重试 */
+    if (conn->context->err && pool_reconnect(client, conn) != 0) {
+        fprintf(stderr, "[ERROR] Failed to add stream entries: %s\n", conn->context->errstr);
+        rp_mutex_unlock(&conn->lock);
+        return -1;
+    }
+    
+    /* 1. 追加全部XADD：XADD stream [MAXLEN ~ n] * data payload */
+    char maxlen_buf[24];
+    size_t maxlen_len = format_count(maxlen_buf, sizeof(maxlen_buf), maxlen);
+    for (int i = 0; i < count; i++) {
+        const char *argv[8];
+        size_t argvlen[8];
+        int argc = 0;
+        
+        argv[argc] = "XADD";
+        argvlen[argc++] = 4;
+        argv[argc] = streams[i];
+        argvlen[argc++] = stream_lens ? stream_lens[i] : strlen(streams[i]);
+        if (maxlen > 0) {
+            argv[argc] = "MAXLEN";
+            argvlen[argc++] = 6;
+            argv[argc] = "~";
+            argvlen[argc++] = 1;
+            argv[argc] = maxlen_buf;
+            argvlen[argc++] = maxlen_len;
+        }
+        argv[argc] = "*";
+        argvlen[argc++] = 1;
+        argv[argc] = REDIS_STREAM_FIELD;
+        argvlen[argc++] = sizeof(REDIS_STREAM_FIELD) - 1;
+        argv[argc] = messages[i] ? messages[i] : "";
+        argvlen[argc] = message_lens ? message_lens[i] : strlen(argv[argc]);
+        argc++;
+        
+        if (redisAppendCommandArgv(conn->context, argc, argv, argvlen) != REDIS_OK) {
+            fprintf(stderr, "[ERROR] Failed to append XADD: %s\n", conn->context->errstr);
+            pool_discard(client, conn);
+            rp_mutex_unlock(&conn->lock);
+            return -1;
+        }
+    }
+    
+    /* 2. 一次性写出 */
+    long long start = rp_now_ns();
+    int done = 0;
+    do {
+        if (redisBufferWrite(conn->context, &done) != REDIS_OK) {
+            fprintf(stderr, "[ERROR] Failed to flush XADD batch: %s\n", conn->context->errstr);
+            pool_reconnect(client, conn);
+            rp_mutex_unlock(&conn->lock);
+            return -1;
+        }
+    } while (!done);
+    
+    /* 3. 按顺序收齐回复（条目ID） */
+    int added = 0;
+    for (int i = 0; i < count; i++) {
+        redisReply *reply = NULL;
+        
+        if (redisGetReply(conn->context, (void**)&reply) != REDIS_OK || !reply) {
+            fprintf(stderr, "[ERROR] Failed to read XADD reply: %s\n", conn->context->errstr);
+            pool_reconnect(client, conn);
+            rp_mutex_unlock(&conn->lock);
+            return -1;
+        }
+        
+        size_t stream_len = stream_lens ? stream_lens[i] : strlen(streams[i]);
+        if (reply->type == REDIS_REPLY_STRING || reply->type == REDIS_REPLY_STATUS) {
+            added++;
+            if (ids) {
+                size_t len = reply->len < REDIS_STREAM_ID_MAX - 1 ? reply->len : REDIS_STREAM_ID_MAX - 1;
+                memcpy(ids + (size_t)i * REDIS_STREAM_ID_MAX, reply->str, len);
+                ids[(size_t)i * REDIS_STREAM_ID_MAX + len] = '\0';
+            }
+            metrics_out(client, streams[i], stream_len,
+                        message_lens ? message_lens[i] : strlen(messages[i] ? messages[i] : ""));
+        } else {
+            if (reply->type == REDIS_REPLY_ERROR) {
+                fprintf(stderr, "[ERROR] XADD failed: %s\n", reply->str);
+            }
+            rp_atomic_inc64(&client->metrics.publish_errors);
+        }
+        freeReplyObject(reply);
+    }
+    histogram_record(&client->metrics.publish_rtt, rp_now_ns() - start);
+    
+    rp_mutex_unlock(&conn->lock);
+    return added;
+}
+
+REDIS_PUBSUB_API int redis_client_stream_group_create(redis_client* client,
+                                                      const char* stream, size_t stream_len,
+                                                      const char* group, size_t group_len,
+                                                      const char* start_id) {
+    if (!client || !client->running) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        return -1;
+    }
+    
+    if (!stream || !group) {
+        fprintf(stderr, "[ERROR] Invalid stream or group\n");
+        return -1;
+    }
+    
+    PublishConnection *conn = pool_acquire(&client->pool);
+    if (!conn) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        return -1;
+    }
+    
+    if (conn->context->err && pool_reconnect(client, conn) != 0) {
+        fprintf(stderr, "[ERROR] Failed to create group: %s\n", conn->context->errstr);
+        rp_mutex_unlock(&conn->lock);
+        return -1;
+    }
+    
+    redisReply *reply = redisCommand(conn->context, "XGROUP CREATE %b %b %s MKSTREAM",
+                                     stream, stream_len, group, group_len,
+                                     start_id ? start_id : "$");
+    if (!reply) {
+        fprintf(stderr, "[ERROR] Failed to create group: %s\n", conn->context->errstr);
+        pool_reconnect(client, conn);
+        rp_mutex_unlock(&conn->lock);
+        return -1;
+    }
+    
+    /* 组已存在（BUSYGROUP）不算错误：多个消费者实例启动时都会尝试创建 */
+    int result = 0;
+    if (reply->type == REDIS_REPLY_ERROR && strncmp(reply->str, "BUSYGROUP", 9) != 0) {
+        fprintf(stderr, "[ERROR] XGROUP CREATE failed: %s\n", reply->str);
+        result = -1;
+    }
+    freeReplyObject(reply);
+    rp_mutex_unlock(&conn->lock);
+    return result;
+}
+
+REDIS_PUBSUB_API redis_stream_reader* redis_client_stream_reader_new(redis_client* client,
+                                                                     const char* group, size_t group_len,
+                                                                     const char* consumer, size_t consumer_len) {
+    if (!client || !client->running || !client->hostname) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        return NULL;
+    }
+    
+    if (!group || !consumer) {
+        fprintf(stderr, "[ERROR] Invalid group or consumer\n");
+        return NULL;
+    }
+    
+    redis_stream_reader *reader = (redis_stream_reader*)calloc(1, sizeof(redis_stream_reader));
+    if (!reader) {
+        fprintf(stderr, "[ERROR] Out of memory\n");
+        return NULL;
+    }
+    reader->client = client;
+    reader->timeout_ms = -1;
+    reader->group = (char*)malloc(group_len + 1);
+    reader->consumer = (char*)malloc(consumer_len + 1);
+    if (!reader->group || !reader->consumer) {
+        fprintf(stderr, "[ERROR] Out of memory\n");
+        redis_stream_reader_free(reader);
+        return NULL;
+    }
+    memcpy(reader->group, group, group_len);
+    reader->group[group_len] = '\0';
+    reader->group_len = group_len;
+    memcpy(reader->consumer, consumer, consumer_len);
+    reader->consumer[consumer_len] = '\0';
+    reader->consumer_len = consumer_len;
+    
+    struct timeval timeout = { REDIS_CONNECT_TIMEOUT_MS / 1000, (REDIS_CONNECT_TIMEOUT_MS % 1000) * 1000 };
+    reader->context = redisConnectWithTimeout(client->hostname, client->port, timeout);
+    if (reader->context == NULL || reader->context->err) {
+        fprintf(stderr, "[ERROR] Failed to connect to Redis (stream): %s\n",
+                reader->context ? reader->context->errstr : "malloc failure");
+        redis_stream_reader_free(reader);
+        return NULL;
+    }
+    return reader;
+}
+
+REDIS_PUBSUB_API void redis_stream_reader_free(redis_stream_reader* reader) {
+    if (!reader) {
+        return;
+    }
+    
+    if (reader->context && !reader->context->err && reader->pending_acks > 0) {
+        redis_stream_reader_flush(reader);
+    }
+    if (reader->reply) {
+        freeReplyObject(reader->reply);
+    }
+    if (reader->context) {
+        redisFree(reader->context);
+    }
+    free(reader->group);
+    free(reader->consumer);
+    free(reader);
+}
+
+/* 读取连接断开时按退避重连，未发出的XACK随输出缓冲区一起丢弃（条目仍在待确认列表中，可用id "0"重读） */
+static int stream_reader_ready(redis_stream_reader* reader) {
+    redis_client *client = reader->client;
+    if (!client->running) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        return -1;
+    }
+    if (!reader->context->err) {
+        return 0;
+    }
+    
+    if (client->reconnect.initial_ms <= 0) {
+        return -1;
+    }
+    if (reader->backoff.down_since == 0) {
+        backoff_lost(client, &reader->backoff);
+    }
+    if (backoff_remaining(&reader->backoff) > 0) {
+        return -1;
+    }
+    if (redisReconnect(reader->context) != REDIS_OK) {
+        backoff_failed(client, &reader->backoff);
+        return -1;
+    }
+    backoff_recovered(client, &reader->backoff);
+    reader->pending_acks = 0;
+    reader->timeout_ms = -1;
+    reader->reconnects++;
+    return 0;
+}
+
+/* 写出输出缓冲区并收齐已排队XACK的回复 */
+static int stream_reader_send(redis_stream_reader* reader) {
+    redisContext *c = reader->context;
+    int done = 0;
+    do {
+        if (redisBufferWrite(c, &done) != REDIS_OK) {
+            fprintf(stderr, "[ERROR] Failed to write stream commands: %s\n", c->errstr);
+            return -1;
+        }
+    } while (!done);
+    
+    while (reader->pending_acks > 0) {
+        redisReply *reply = NULL;
+        if (redisGetReply(c, (void**)&reply) != REDIS_OK || !reply) {
+            fprintf(stderr, "[ERROR] Failed to read XACK reply: %s\n", c->errstr);
+            return -1;
+        }
+        if (reply->type == REDIS_REPLY_INTEGER) {
+            reader->acked += reply->integer;
+        } else if (reply->type == REDIS_REPLY_ERROR) {
+            fprintf(stderr, "[ERROR] XACK failed: %s\n", reply->str);
+        }
+        freeReplyObject(reply);
+        reader->pending_acks--;
+    }
+    return 0;
+}
+
+/* 条目的字段数组中取REDIS_STREAM_FIELD的值，没有时取第一个字段的值 */
+static redisReply* stream_entry_data(redisReply *fields) {
+    if (!fields || fields->type != REDIS_REPLY_ARRAY || fields->elements < 2) {
+        return NULL;
+    }
+    for (size_t i = 0; i + 1 < fields->elements; i += 2) {
+        redisReply *name = fields->element[i];
+        if (name->type == REDIS_REPLY_STRING && name->len == sizeof(REDIS_STREAM_FIELD) - 1 &&
+            memcmp(name->str, REDIS_STREAM_FIELD, name->len) == 0) {
+            return fields->element[i + 1];
+        }
+    }
+    return fields->element[1];
+}
+
+REDIS_PUBSUB_API int redis_stream_reader_read(redis_stream_reader* reader, int stream_count,
+                                              const char** streams, const size_t* stream_lens,
+                                              const char* id, int count, int block_ms,
+                                              RedisStreamEntry* buffer, int max_entries) {
+    if (!reader || stream_count <= 0 || !streams || count <= 0 || block_ms < 0 || !buffer ||
+        max_entries < count * stream_count) {
+        fprintf(stderr, "[ERROR] Invalid stream read arguments\n");
+        return -1;
+    }
+    
+    /* 上一批条目的指针到此失效 */
+    if (reader->reply) {
+        freeReplyObject(reader->reply);
+        reader->reply = NULL;
+    }
+    
+    if (stream_reader_ready(reader) != 0) {
+        return -1;
+    }
+    redisContext *c = reader->context;
+    
+    /* 读超时跟随BLOCK时间，只在变化时重新设置 */
+    int timeout_ms = block_ms + REDIS_STREAM_TIMEOUT_MARGIN_MS;
+    if (reader->timeout_ms != timeout_ms) {
+        struct timeval tv = { timeout_ms / 1000, (timeout_ms % 1000) * 1000 };
+        if (redisSetTimeout(c, tv) == REDIS_OK) {
+            reader->timeout_ms = timeout_ms;
+        }
+    }
+    
+    /* XREADGROUP GROUP g c COUNT n [BLOCK ms] STREAMS s1..sn id..id（BLOCK 0表示永远等待，不等待时省略） */
+    int argc_max = 9 + stream_count * 2;
+    const char **argv = (const char**)malloc(sizeof(char*) * (size_t)argc_max);
+    size_t *argvlen = (size_t*)malloc(sizeof(size_t) * (size_t)argc_max);
+    if (!argv || !argvlen) {
+        fprintf(stderr, "[ERROR] Out of memory\n");
+        free(argv);
+        free(argvlen);
+        return -1;
+    }
+    
+    char count_buf[24];
+    char block_buf[24];
+    const char *start_id = id ? id : ">";
+    int argc = 0;
+    argv[argc] = "XREADGROUP";
+    argvlen[argc++] = 10;
+    argv[argc] = "GROUP";
+    argvlen[argc++] = 5;
+    argv[argc] = reader->group;
+    argvlen[argc++] = reader->group_len;
+    argv[argc] = reader->consumer;
+    argvlen[argc++] = reader->consumer_len;
+    argv[argc] = "COUNT";
+    argvlen[argc++] = 5;
+    argv[argc] = count_buf;
+    argvlen[argc++] = format_count(count_buf, sizeof(count_buf), count);
+    if (block_ms > 0) {
+        argv[argc] = "BLOCK";
+        argvlen[argc++] = 5;
+        argv[argc] = block_buf;
+        argvlen[argc++] = format_count(block_buf, sizeof(block_buf), block_ms);
+    }
+    argv[argc] = "STREAMS";
+    argvlen[argc++] = 7;
+    for (int i = 0; i < stream_count; i++) {
+        argv[argc] = streams[i];
+        argvlen[argc++] = stream_lens ? stream_lens[i] : strlen(streams[i]);
+    }
+    for (int i = 0; i < stream_count; i++) {
+        argv[argc] = start_id;
+        argvlen[argc++] = strlen(start_id);
+    }
+    
+    int appended = redisAppendCommandArgv(c, argc, argv, argvlen);
+    free(argv);
+    free(argvlen);
+    if (appended != REDIS_OK) {
+        fprintf(stderr, "[ERROR] Failed to append XREADGROUP: %s\n", c->errstr);
+        return -1;
+    }
+    
+    /* 已排队的XACK和本次XREADGROUP一起写出 */
+    redisReply *reply = NULL;
+    if (stream_reader_send(reader) != 0 || redisGetReply(c, (void**)&reply) != REDIS_OK || !reply) {
+        if (!reply) {
+            fprintf(stderr, "[ERROR] Failed to read XREADGROUP reply: %s\n", c->errstr);
+        }
+        return -1;
+    }
+    reader->reads++;
+    
+    if (reply->type == REDIS_REPLY_ERROR) {
+        fprintf(stderr, "[ERROR] XREADGROUP failed: %s\n", reply->str);
+        freeReplyObject(reply);
+        return -1;
+    }
+    if (reply->type != REDIS_REPLY_ARRAY) {
+        freeReplyObject(reply);     /* 超时：nil */
+        return 0;
+    }
+    
+    /* [[stream, [[id, [field, value, ...]], ...]], ...] */
+    int filled = 0;
+    for (size_t s = 0; s < reply->elements; s++) {
+        redisReply *item = reply->element[s];
+        if (item->type != REDIS_REPLY_ARRAY || item->elements != 2 ||
+            item->element[1]->type != REDIS_REPLY_ARRAY) {
+            continue;
+        }
+        redisReply *name = item->element[0];
+        redisReply *entries = item->element[1];
+        for (size_t e = 0; e < entries->elements && filled < max_entries; e++) {
+            redisReply *entry = entries->element[e];
+            if (entry->type != REDIS_REPLY_ARRAY || entry->elements != 2) {
+                continue;
+            }
+            /* 重读待确认条目时，已被裁剪掉的条目字段为nil：仍交给调用方以便确认 */
+            redisReply *data = stream_entry_data(entry->element[1]);
+            RedisStreamEntry *out = &buffer[filled++];
+            out->stream = name->str;
+            out->stream_len = name->len;
+            out->id = entry->element[0]->str;
+            out->id_len = entry->element[0]->len;
+            out->data = data && data->type == REDIS_REPLY_STRING ? data->str : NULL;
+            out->data_len = data && data->type == REDIS_REPLY_STRING ? data->len : 0;
+            metrics_in(reader->client, name->str, name->len, out->data_len);
+        }
+    }
+    
+    reader->entries += filled;
+    reader->reply = reply;
+    return filled;
+}
+
+REDIS_PUBSUB_API int redis_stream_reader_ack(redis_stream_reader* reader,
+                                             const char* stream, size_t stream_len, int count,
+                                             const char** ids, const size_t* id_lens) {
+    if (!reader || !stream || count < 0 || (count > 0 && !ids)) {
+        fprintf(stderr, "[ERROR] Invalid stream ack arguments\n");
+        return -1;
+    }
+    
+    if (count == 0) {
+        return 0;
+    }
+    
+    /* 连接已断开：这些条目留在待确认列表中，重连后可用id "0"重读 */
+    if (reader->context->err) {
+        return -1;
+    }
+    
+    int argc = 3 + count;
+    const char **argv = (const char**)malloc(sizeof(char*) * (size_t)argc);
+    size_t *argvlen = (size_t*)malloc(sizeof(size_t) * (size_t)argc);
+    if (!argv || !argvlen) {
+        fprintf(stderr, "[ERROR] Out of memory\n");
+        free(argv);
+        free(argvlen);
+        return -1;
+    }
+    
+    argv[0] = "XACK";
+    argvlen[0] = 4;
+    argv[1] = stream;
+    argvlen[1] = stream_len;
+    argv[2] = reader->group;
+    argvlen[2] = reader->group_len;
+    for (int i = 0; i < count; i++) {
+        argv[3 + i] = ids[i];
+        argvlen[3 + i] = id_lens ? id_lens[i] : strlen(ids[i]);
+    }
+    
+    int appended = redisAppendCommandArgv(reader->context, argc, argv, argvlen);
+    free(argv);
+    free(argvlen);
+    if (appended != REDIS_OK) {
+        fprintf(stderr, "[ERROR] Failed to append XACK: %s\n", reader->context->errstr);
+        return -1;
+    }
+    reader->pending_acks++;
+    return 0;
+}
+
+REDIS_PUBSUB_API int redis_stream_reader_flush(redis_stream_reader* reader) {
+    if (!reader) {
+        return -1;
+    }
+    
+    if (reader->pending_acks == 0) {
+        return 0;
+    }
+    
+    if (reader->context->err) {
+        return -1;
+    }
+    
+    long long before = reader->acked;
+    if (stream_reader_send(reader) != 0) {
+        return -1;
+    }
+    return (int)(reader->acked - before);
+}
+
+REDIS_PUBSUB_API int redis_stream_reader_get_stats(redis_stream_reader* reader, RedisStreamReaderStats* stats) {
+    if (!reader || !stats) {
+        return -1;
+    }
+    
+    stats->reads = reader->reads;
+    stats->entries = reader->entries;
+    stats->acked = reader->acked;
+    stats->pending_acks = reader->pending_acks;
+    stats->reconnects = reader->reconnects;
+    return 0;
+}
+
+/* ==================== 订阅消息分发 ==================== */
+
+/* 在table中按key（频道名或模式）查找订阅并投递消息
+ * 普通订阅上本进程已在本地投递过的消息（Redis回传的副本）在这里丢弃 */
+static void dispatch_message(SubscriberShard *shard, dict *table, const char* key, size_t key_len,
+                             const char* channel, size_t channel_len,
+                             const char* message, size_t message_len) {
+    /* 哈希查找对应的回调函数（O(1)，二进制安全） */
+    Handler handler = { NULL, NULL, NULL, NULL, 0, NULL, 0, 0, 0 };
+    int conflate = 0;
+    int echo = 0;
+    int rejected = 0;
+    ChannelKey lookup = { key, key_len };
+    
+    rp_mutex_lock(&shard->lock);
+    dictEntry *entry = table ? dictFind(table, &lookup) : NULL;
+    if (entry) {
+        Subscription *sub = (Subscription*)dictGetEntryVal(entry);
+        handler = sub->handler;
+        conflate = sub->conflate;
+        /* 本地投递时已求值过过滤条件，回传的副本不再重复计数 */
+        echo = sub->echo && sub->echo->count > 0 &&
+               echo_consume(shard->client, sub, message, message_len);
+        rejected = !echo && ((handler.record_size && message_len != handler.record_size) ||
+                             (sub->filter && !filter_accept(sub->filter, message, message_len)));
+    }
+    rp_mutex_unlock(&shard->lock);
+    shard->messages++;
+    metrics_in(shard->client, channel, channel_len, message_len);
+    
+    if (echo) {
+        return;
+    }
+    if (rejected) {
+        rp_atomic_inc64(&shard->client->metrics.filtered);
+        return;
+    }
+    /* 合并频道的消息暂存，本轮读取结束后由conflate_flush投递最新的一条（内存不足时直接投递） */
+    if (conflate && conflate_store(shard, channel, channel_len, message, message_len) == 0) {
+        return;
+    }
+    /* 批量订阅的消息追加到该频道的缓冲区，攒够或到期后一次投递（内存不足时直接以1条的批次投递） */
+    if (handler.batch_callback && batch_store(shard, &handler, channel, channel_len, message, message_len) == 0) {
+        return;
+    }
+    deliver_message(shard->client, &handler, channel, channel_len, message, message_len);
+}
+
+static void conflated_destructor(void *privdata, void *val) {
+    ConflatedMessage *m = (ConflatedMessage*)val;
+    DICT_NOTUSED(privdata);
+    
+    free(m->buf);
+    free(m);
+}
+
+/* 保存合并频道的最新消息：已有待投递的消息时覆盖它（计入conflated），否则加入待投递列表
+ * 只在事件循环线程中调用，成功返回0，内存不足返回-1 */
+static int conflate_store(SubscriberShard *shard, const char* channel, size_t channel_len,
+                          const char* message, size_t message_len) {
+    if (!shard->conflated) {
+        shard->conflated = dictCreate(&g_conflated_dict_type, NULL);
+        if (!shard->conflated) {
+            return -1;
+        }
+    }
+    
+    ChannelKey lookup = { channel, channel_len };
+    dictEntry *entry = dictFind(shard->conflated, &lookup);
+    ConflatedMessage *m = entry ? (ConflatedMessage*)dictGetEntryVal(entry) : NULL;
+    size_t size = channel_len + message_len + 2;
+    
+    if (!m || !m->pending) {
+        if (shard->pending_count == shard->pending_capacity) {
+            int capacity = shard->pending_capacity ? shard->pending_capacity * 2 : 64;
+            ConflatedMessage **pending = (ConflatedMessage**)realloc(shard->pending,
+                                                                      (size_t)capacity * sizeof(ConflatedMessage*));
+            if (!pending) {
+                return -1;
+            }
+            shard->pending = pending;
+            shard->pending_capacity = capacity;
+        }
+    }
+    
+    if (!m) {
+        m = (ConflatedMessage*)calloc(1, sizeof(ConflatedMessage));
+        char *buf = (char*)malloc(size);
+        if (!m || !buf) {
+            free(m);
+            free(buf);
+            return -1;
+        }
+        memcpy(buf, channel, channel_len);
+        buf[channel_len] = '\0';
+        m->buf = buf;
+        m->buf_size = size;
+        m->key.name = buf;
+        m->key.len = channel_len;
+        if (dictAdd(shard->conflated, &m->key, m) != DICT_OK) {
+            conflated_destructor(NULL, m);
+            return -1;
+        }
+    } else if (m->buf_size < size) {
+        char *buf = (char*)realloc(m->buf, size);
+        if (!buf) {
+            return -1;
+        }
+        /* 哈希表按内容比较键，只需更新指针 */
+        m->buf = buf;
+        m->buf_size = size;
+        m->key.name = buf;
+    }
+    
+    if (m->pending) {
+        metrics_conflated(shard->client, channel, channel_len);
+    } else {
+        m->pending = 1;
+        shard->pending[shard->pending_count++] = m;
+    }
+    memcpy(m->buf + channel_len + 1, message, message_len);
+    m->buf[channel_len + 1 + message_len] = '\0';
+    m->data_len = message_len;
+    return 0;
+}
+
+/* 投递本轮读取中各合并频道最新的一条消息（事件循环线程）
+ * 投递前重新查找订阅：期间已取消订阅的频道不再投递，并释放其缓冲区 */
+static void conflate_flush(SubscriberShard *shard) {
+    for (int i = 0; i < shard->pending_count; i++) {
+        ConflatedMessage *m = shard->pending[i];
+        Handler handler;
+        
+        m->pending = 0;
+        rp_mutex_lock(&shard->lock);
+        dictEntry *entry = shard->subscriptions ? dictFind(shard->subscriptions, &m->key) : NULL;
+        if (entry) {
+            handler = ((Subscription*)dictGetEntryVal(entry))->handler;
+        }
+        rp_mutex_unlock(&shard->lock);
+        
+        if (!entry) {
+            dictDelete(shard->conflated, &m->key);
+            continue;
+        }
+        deliver_message(shard->client, &handler,
+                        m->key.name, m->key.len, m->buf + m->key.len + 1, m->data_len);
+    }
+    shard->pending_count = 0;
+}
+
+/* 按订阅的处理方式投递一条消息，调用时不持有任何锁（慢回调不会阻塞publish和subscribe）
+ * channel和message以'\0'结尾（来自hiredis的回复或local_deliver的副本） */
+static void deliver_message(redis_client* client, const Handler *handler,
+                            const char* channel, size_t channel_len,
+                            const char* message, size_t message_len) {
+    if (handler->queued) {
+        queue_push(&client->queue, channel, channel_len, message, message_len);
+        return;
+    }
+    if (!handler->batch_callback && !handler->data_callback && !handler->binary_callback && !handler->callback) {
+        return;
+    }
+    
+    long long start = rp_now_ns();
+    if (handler->batch_callback) {
+        handler->batch_callback(handler->userdata, channel, channel_len, 1, message, &message_len);
+    } else if (handler->data_callback) {
+        handler->data_callback(handler->userdata, channel, channel_len, message, message_len);
+    } else if (handler->binary_callback) {
+        handler->binary_callback(channel, channel_len, message, message_len);
+    } else {
+        handler->callback(channel, message);
+    }
+    metrics_callback(client, channel, channel_len, rp_now_ns() - start);
+}
+
+/* ==================== 批量投递 ==================== */
+
+static void batch_destructor(void *privdata, void *val) {
+    BatchBuffer *b = (BatchBuffer*)val;
+    DICT_NOTUSED(privdata);
+    
+    free(b->name);
+    free(b->data);
+    free(b->lens);
+    free(b);
+}
+
+/* 投递一批消息（事件循环线程，不持有锁）
+ * 投递前重新查找订阅：已取消订阅的频道丢弃这批消息并释放缓冲区，
+ * 重新订阅为其他处理方式时逐条按新的处理方式投递 */
+static void batch_deliver(SubscriberShard *shard, BatchBuffer *b) {
+    redis_client *client = shard->client;
+    Handler handler;
+    
+    rp_mutex_lock(&shard->lock);
+    dictEntry *entry = shard->subscriptions ? dictFind(shard->subscriptions, &b->key) : NULL;
+    if (entry) {
+        handler = ((Subscription*)dictGetEntryVal(entry))->handler;
+    }
+    rp_mutex_unlock(&shard->lock);
+    
+    if (!entry) {
+        dictDelete(shard->batches, &b->key);
+        return;
+    }
+    
+    int count = b->count;
+    b->count = 0;
+    b->data_len = 0;
+    if (handler.batch_callback) {
+        long long start = rp_now_ns();
+        handler.batch_callback(handler.userdata, b->key.name, b->key.len, count, b->data, b->lens);
+        metrics_callback(client, b->key.name, b->key.len, rp_now_ns() - start);
+        return;
+    }
+    
+    /* deliver_message要求payload以'\0'结尾，逐条复制（只在处理方式被替换后发生一次） */
+    const char *data = b->data;
+    for (int i = 0; i < count; i++) {
+        char *copy = (char*)malloc(b->lens[i] + 1);
+        if (!copy) {
+            fprintf(stderr, "[ERROR] Out of memory\n");
+            break;
+        }
+        memcpy(copy, data, b->lens[i]);
+        copy[b->lens[i]] = '\0';
+        deliver_message(client, &handler, b->key.name, b->key.len, copy, b->lens[i]);
+        free(copy);
+        data += b->lens[i];
+    }
+}
+
+/* 把一条消息追加到频道的批次中，攒够max_batch条时立即投递
+ * 只在事件循环线程中调用，成功返回0，内存不足返回-1 */
+static int batch_store(SubscriberShard *shard, const Handler *handler, const char* channel, size_t channel_len,
+                       const char* message, size_t message_len) {
+    if (!shard->batches) {
+        shard->batches = dictCreate(&g_batch_dict_type, NULL);
+        if (!shard->batches) {
+            return -1;
+        }
+    }
+    
+    ChannelKey lookup = { channel, channel_len };
+    dictEntry *entry = dictFind(shard->batches, &lookup);
+    BatchBuffer *b = entry ? (BatchBuffer*)dictGetEntryVal(entry) : NULL;
+    if (!b) {
+        b = (BatchBuffer*)calloc(1, sizeof(BatchBuffer));
+        char *name = (char*)malloc(channel_len + 1);
+        if (!b || !name) {
+            free(b);
+            free(name);
+            return -1;
+        }
+        memcpy(name, channel, channel_len);
+        name[channel_len] = '\0';
+        b->name = name;
+        b->key.name = name;
+        b->key.len = channel_len;
+        if (dictAdd(shard->batches, &b->key, b) != DICT_OK) {
+            batch_destructor(NULL, b);
+            return -1;
+        }
+    }
+    
+    if (b->count == b->capacity) {
+        int capacity = b->capacity ? b->capacity * 2 : handler->max_batch;
+        size_t *lens = (size_t*)realloc(b->lens, (size_t)capacity * sizeof(size_t));
+        if (!lens) {
+            return -1;
+        }
+        b->lens = lens;
+        b->capacity = capacity;
+    }
+    if (b->data_len + message_len > b->data_capacity) {
+        size_t capacity = b->data_capacity ? b->data_capacity : 4096;
+        while (capacity < b->data_len + message_len) {
+            capacity *= 2;
+        }
+        char *data = (char*)realloc(b->data, capacity);
+        if (!data) {
+            return -1;
+        }
+        b->data = data;
+        b->data_capacity = capacity;
+    }
+    
+    if (b->count == 0) {
+        b->deadline = rp_now_ns() + (long long)handler->max_delay_ms * 1000000LL;
+        if (shard->batch_deadline == 0 || b->deadline < shard->batch_deadline) {
+            shard->batch_deadline = b->deadline;
+        }
+    }
+    memcpy(b->data + b->data_len, message, message_len);
+    b->data_len += message_len;
+    b->lens[b->count++] = message_len;
+    
+    if (b->count >= handler->max_batch) {
+        batch_deliver(shard, b);
+    }
+    return 0;
+}
+
+/* 投递已到期的批次（all为1时投递全部未投递的批次）
+ * 返回距离下一个批次到期的毫秒数，没有未投递的批次时返回-1 */
+static int batch_flush_due(SubscriberShard *shard, int all) {
+    if (shard->batch_deadline == 0) {
+        return -1;
+    }
+    
+    long long now = rp_now_ns();
+    if (!all && now < shard->batch_deadline) {
+        return (int)((shard->batch_deadline - now + 999999) / 1000000);
+    }
+    
+    /* 投递时可能删除已取消订阅的频道，dictNext已预先保存下一个条目 */
+    long long next = 0;
+    dictIterator iter;
+    dictEntry *entry;
+    dictInitIterator(&iter, shard->batches);
+    while ((entry = dictNext(&iter)) != NULL) {
+        BatchBuffer *b = (BatchBuffer*)dictGetEntryVal(entry);
+        if (b->count == 0) {
+            continue;
+        }
+        if (all || b->deadline <= now) {
+            batch_deliver(shard, b);
+        } else if (next == 0 || b->deadline < next) {
+            next = b->deadline;
+        }
+    }
+    
+    shard->batch_deadline = next;
+    return next ? (int)((next - now + 999999) / 1000000) : -1;
+}
+
+/* 收到一条订阅命令的确认（或错误）回复，唤醒等待的调用方 */
+static void sub_confirm(SubscriberShard *shard) {
+    EventLoop *loop = &shard->loop;
+    
+    rp_mutex_lock(&loop->lock);
+    loop->confirmed++;
+    rp_cond_broadcast(&loop->cond);
+    rp_mutex_unlock(&loop->lock);
+}
+
+/* 处理订阅连接上的一条回复：
+ *   ["message"/"smessage", channel, data]
+ *   ["pmessage", pattern, channel, data]（按模式查表，不再逐条匹配glob）
+ *   ["subscribe"/"psubscribe"/"punsubscribe"..., name, count]（命令确认）
+ *   ["sunsubscribe", channel, count]且频道仍在订阅表中（槽位迁移，服务器主动取消）
+ * 其他回复直接忽略 */
+static void sub_handle_reply(SubscriberShard *shard, redisReply *reply) {
+    /* 命令被拒绝（例如ACL、集群重定向）也算作一次确认，避免调用方一直等待 */
+    if (reply->type == REDIS_REPLY_ERROR) {
+        /* 设置了moved_hook时重定向由调用方处理（重新订阅到新节点），不算错误 */
+        if (strncmp(reply->str, "MOVED ", 6) == 0 && shard->client->moved_hook) {
+            sub_moved(shard, NULL, 0, reply->str);
+        } else {
+            fprintf(stderr, "[ERROR] Subscribe command failed: %s\n", reply->str);
+        }
+        sub_confirm(shard);
+        return;
+    }
+    
+    if (reply->type != REDIS_REPLY_ARRAY || reply->elements < 3 ||
+        reply->element[0]->type != REDIS_REPLY_STRING) {
+        return;
+    }
+    
+    redisReply **el = reply->element;
+    if (reply->elements == 3 && (strcmp(el[0]->str, "message") == 0 || strcmp(el[0]->str, "smessage") == 0)) {
+        // fprintf(stdout, "[MESSAGE] Channel: %s | Message: %s\n", channel, message);
+        dispatch_message(shard, shard->subscriptions, el[1]->str, el[1]->len,
+                         el[1]->str, el[1]->len, el[2]->str, el[2]->len);
+    } else if (reply->elements == 4 && strcmp(el[0]->str, "pmessage") == 0) {
+        dispatch_message(shard, shard->patterns, el[1]->str, el[1]->len,
+                         el[2]->str, el[2]->len, el[3]->str, el[3]->len);
+    } else if (strcmp(el[0]->str, "sunsubscribe") == 0 && el[1]->type == REDIS_REPLY_STRING &&
+               sub_unsolicited(shard, el[1]->str, el[1]->len)) {
+        /* 槽位迁移后服务器主动取消的订阅不对应任何已提交的命令，不计入确认 */
+        sub_moved(shard, el[1]->str, el[1]->len, NULL);
+    } else if (el[0]->len >= 9 && memcmp(el[0]->str + el[0]->len - 9, "subscribe", 9) == 0) {
+        sub_confirm(shard);
+    }
+}
+
+/* 收到sunsubscribe时频道仍在订阅表中：不是本实例发出的SUNSUBSCRIBE（取消订阅先删除再发送），
+ * 而是槽位迁移后服务器主动取消，从订阅表移除（重连时不再重新订阅），返回1 */
+static int sub_unsolicited(SubscriberShard *shard, const char* channel, size_t channel_len) {
+    ChannelKey lookup = { channel, channel_len };
+    
+    rp_mutex_lock(&shard->lock);
+    int removed = shard->subscriptions && dictDelete(shard->subscriptions, &lookup) == DICT_OK;
+    rp_mutex_unlock(&shard->lock);
+    return removed;
+}
+
+/* 通知槽位迁移（事件循环线程） */
+static void sub_moved(SubscriberShard *shard, const char* channel, size_t channel_len, const char* error) {
+    redis_client *client = shard->client;
+    if (client->moved_hook) {
+        client->moved_hook(client->moved_userdata, channel, channel_len, error);
+    }
+}
+
+/* 订阅连接断开：停止监听该连接，唤醒等待命令写出的调用方
+ * 启用自动重连时，订阅表中的频道/模式会在重连后重新订阅，等待中的命令视为已完成 */
+static void sub_connection_lost(SubscriberShard *shard) {
+    EventLoop *loop = &shard->loop;
+    redis_client *client = shard->client;
+    
+    if (loop->running) {
+        fprintf(stderr, "[ERROR] Subscription connection lost: %s\n",
+                shard->context->errstr);
+    }
+    
+    rp_mutex_lock(&loop->lock);
+    loop->sub_failed = 1;
+    loop->commands_len = 0;
+    if (client->reconnect.initial_ms > 0) {
+        loop->confirmed = loop->submitted;
+    }
+    rp_cond_broadcast(&loop->cond);
+    rp_mutex_unlock(&loop->lock);
+    
+    if (client->reconnect.initial_ms > 0 && loop->running) {
+        backoff_lost(client, &shard->backoff);
+    }
+}
+
+/* 尽量写出订阅连接的输出缓冲区，写不完时等待POLLOUT */
+static void sub_write(SubscriberShard *shard) {
+    EventLoop *loop = &shard->loop;
+    int done = 0;
+    
+    if (redisBufferWrite(shard->context, &done) != REDIS_OK) {
+        sub_connection_lost(shard);
+        return;
+    }
+    loop->sub_want_write = !done;
+}
+
+/* 读取一次订阅连接上已到达的数据并逐条分发回复
+ * 返回1表示读到了新数据，0表示暂时没有数据，-1表示连接断开 */
+static int sub_read_once(SubscriberShard *shard) {
+    redisContext *c = shard->context;
+    size_t buffered = c->reader->len;
+    
+    if (redisBufferRead(c) != REDIS_OK) {
+        return -1;
+    }
+    int received = c->reader->len > buffered;
+    
+    for (;;) {
+        redisReply *reply = NULL;
+        if (redisGetReplyFromReader(c, (void**)&reply) != REDIS_OK) {
+            return -1;
+        }
+        if (!reply) {
+            break;
+        }
+        sub_handle_reply(shard, reply);
+        freeReplyObject(reply);
+    }
+    return received;
+}
+
+/* 读取订阅连接上已到达的回复并逐条分发
+ * 有待投递的合并消息时继续读取直到没有新数据（回调执行期间积压的消息只投递每个频道最新的一条），
+ * 再统一投递合并消息 */
+static void sub_read(SubscriberShard *shard) {
+    int result = sub_read_once(shard);
+    for (int reads = 1; result > 0 && shard->pending_count > 0 && reads < REDIS_CONFLATE_MAX_READS; reads++) {
+        result = sub_read_once(shard);
+    }
+    
+    conflate_flush(shard);
+    if (result < 0) {
+        sub_connection_lost(shard);
+    }
+}
+
+/* 把调用方提交的订阅命令追加到订阅连接并尝试写出 */
+static void sub_collect(SubscriberShard *shard) {
+    EventLoop *loop = &shard->loop;
+    
+    rp_mutex_lock(&loop->lock);
+    if (loop->commands_len == 0 || loop->sub_failed) {
+        rp_mutex_unlock(&loop->lock);
+        return;
+    }
+    
+    if (redisAppendFormattedCommand(shard->context, loop->commands,
+                                    loop->commands_len) != REDIS_OK) {
+        rp_mutex_unlock(&loop->lock);
+        sub_connection_lost(shard);
+        return;
+    }
+    loop->commands_len = 0;
+    rp_mutex_unlock(&loop->lock);
+    
+    sub_write(shard);
+}
+
+/* 把table中的全部名称合并为一条command（SUBSCRIBE/PSUBSCRIBE）追加到订阅连接，
+ * 分片模式下每个频道一条SSUBSCRIBE（一条命令的频道必须属于同一槽位）
+ * 调用时持有shard->lock，返回预期的确认回复数，失败返回-1 */
+static int sub_append_table(SubscriberShard *shard, dict *table, const char* command) {
+    int count = table ? (int)dictSize(table) : 0;
+    if (count == 0) {
+        return 0;
+    }
+    
+    if (shard->client->sharded) {
+        dictIterator it;
+        dictEntry *entry;
+        dictInitIterator(&it, table);
+        while ((entry = dictNext(&it)) != NULL) {
+            Subscription *sub = (Subscription*)dictGetEntryVal(entry);
+            const char *argv[2] = { command, sub->key.name };
+            size_t argvlen[2] = { strlen(command), sub->key.len };
+            if (redisAppendCommandArgv(shard->context, 2, argv, argvlen) != REDIS_OK) {
+                return -1;
+            }
+        }
+        return count;
+    }
+    
+    const char **argv = (const char**)malloc((size_t)(count + 1) * sizeof(char*));
+    size_t *argvlen = (size_t*)malloc((size_t)(count + 1) * sizeof(size_t));
+    if (!argv || !argvlen) {
+        free(argv);
+        free(argvlen);
+        return -1;
+    }
+    
+    argv[0] = command;
+    argvlen[0] = strlen(command);
+    int argc = 1;
+    dictIterator it;
+    dictEntry *entry;
+    dictInitIterator(&it, table);
+    while ((entry = dictNext(&it)) != NULL && argc <= count) {
+        Subscription *sub = (Subscription*)dictGetEntryVal(entry);
+        argv[argc] = sub->key.name;
+        argvlen[argc] = sub->key.len;
+        argc++;
+    }
+    
+    int result = redisAppendCommandArgv(shard->context, argc, argv, argvlen) == REDIS_OK ? argc - 1 : -1;
+    free(argv);
+    free(argvlen);
+    return result;
+}
+
+/* 重新建立订阅连接并重新订阅订阅表中的所有频道和模式（事件循环线程）
+ * 返回-1表示已恢复，否则返回距离下一次尝试的毫秒数 */
+static int sub_reconnect(SubscriberShard *shard) {
+    redis_client *client = shard->client;
+    EventLoop *loop = &shard->loop;
+    
+    int remaining = backoff_remaining(&shard->backoff);
+    if (remaining > 0) {
+        return remaining;
+    }
+    
+    redisContext *c = loop_connect(client, "subscribe");
+    if (!c) {
+        backoff_failed(client, &shard->backoff);
+        return backoff_remaining(&shard->backoff);
+    }
+    
+    if (shard->context) {
+        redisFree(shard->context);
+    }
+    shard->context = c;
+    
+    /* 先恢复命令通道，之后新增的订阅走正常路径，不会漏掉快照之后加入的频道 */
+    rp_mutex_lock(&loop->lock);
+    loop->sub_failed = 0;
+    loop->sub_want_write = 0;
+    rp_mutex_unlock(&loop->lock);
+    
+    rp_mutex_lock(&shard->lock);
+    int channels = sub_append_table(shard, shard->subscriptions, SUBSCRIBE_COMMAND(client));
+    int patterns = sub_append_table(shard, shard->patterns, "PSUBSCRIBE");
+    rp_mutex_unlock(&shard->lock);
+    
+    if (channels < 0 || patterns < 0) {
+        fprintf(stderr, "[ERROR] Out of memory\n");
+        sub_connection_lost(shard);
+        backoff_failed(client, &shard->backoff);
+        return backoff_remaining(&shard->backoff);
+    }
+    
+    rp_mutex_lock(&loop->lock);
+    loop->submitted += channels + patterns;
+    rp_mutex_unlock(&loop->lock);
+    
+    backoff_recovered(client, &shard->backoff);
+    sub_write(shard);
+    return -1;
+}
+
+/* ==================== 事件循环 ==================== */
+
+/* 建立由事件循环驱动的连接：先阻塞连接（带超时，重连时不会长时间卡住循环），成功后切换为非阻塞 */
+static redisContext* loop_connect(redis_client* client, const char* role) {
+    struct timeval timeout = { REDIS_CONNECT_TIMEOUT_MS / 1000, (REDIS_CONNECT_TIMEOUT_MS % 1000) * 1000 };
+    redisContext *c = redisConnectWithTimeout(client->hostname, client->port, timeout);
+    if (c == NULL || c->err) {
+        fprintf(stderr, "[ERROR] Failed to connect to Redis (%s): %s\n",
+                role, c ? c->errstr : "malloc failure");
+        if (c) {
+            redisFree(c);
+        }
+        return NULL;
+    }
+    
+    if (rp_socket_set_nonblocking((rp_socket)c->fd) != 0) {
+        fprintf(stderr, "[ERROR] Failed to set non-blocking mode (%s)\n", role);
+        redisFree(c);
+        return NULL;
+    }
+    c->flags &= ~REDIS_BLOCK;
+    return c;
+}
+
+/* 唤醒事件循环；已有未处理的唤醒字节时不再重复写入 */
+static void loop_wakeup(EventLoop *loop) {
+    if (loop->wakeup_write == RP_INVALID_SOCKET) {
+        return;
+    }
+    if (rp_atomic_swap32(&loop->wakeup_pending, 1) == 0) {
+        rp_send(loop->wakeup_write, "x", 1);
+    }
+}
+
+/* 把一条命令交给事件循环写入订阅连接，等待Redis确认后返回
+ * 命令的每个频道/模式参数各对应一条确认回复；在事件循环线程内（回调中）调用时只提交，不等待 */
+static int loop_send_command(SubscriberShard *shard, int argc, const char** argv, const size_t* argvlen) {
+    long long target = loop_submit_command(shard, argc, argv, argvlen);
+    if (target < 0) {
+        return -1;
+    }
+    return loop_wait_confirmed(shard, target, argv[0]);
+}
+
+/* 把一条命令追加到事件循环的待写缓冲区并唤醒事件循环，不等待确认
+ * 返回需要等待的确认序号（传给loop_wait_confirmed）；不需要等待时返回0，失败返回-1
+ * 多个分片可以先全部提交再逐个等待，这样各分片的命令在同一个网络往返内完成 */
+static long long loop_submit_command(SubscriberShard *shard, int argc, const char** argv, const size_t* argvlen) {
+    EventLoop *loop = &shard->loop;
+    char *cmd = NULL;
+    
+    long long len = redisFormatCommandArgv(&cmd, argc, argv, argvlen);
+    if (len < 0) {
+        fprintf(stderr, "[ERROR] Out of memory\n");
+        return -1;
+    }
+    
+    rp_mutex_lock(&loop->lock);
+    
+    /* 连接断开、正在重连：订阅表已更新，重连后会按订阅表重新订阅，不需要再发送 */
+    if (loop->running && loop->sub_failed && shard->client->reconnect.initial_ms > 0) {
+        rp_mutex_unlock(&loop->lock);
+        redisFreeCommand(cmd);
+        return 0;
+    }
+    
+    if (!loop->running || loop->sub_failed) {
+        fprintf(stderr, "[ERROR] Failed to send %s: subscription connection lost\n", argv[0]);
+        rp_mutex_unlock(&loop->lock);
+        redisFreeCommand(cmd);
+        return -1;
+    }
+    
+    size_t needed = loop->commands_len + (size_t)len;
+    if (needed > loop->commands_capacity) {
+        size_t capacity = loop->commands_capacity ? loop->commands_capacity : 4096;
+        while (capacity < needed) {
+            capacity *= 2;
+        }
+        char *commands = (char*)realloc(loop->commands, capacity);
+        if (!commands) {
+            fprintf(stderr, "[ERROR] Out of memory\n");
+            rp_mutex_unlock(&loop->lock);
+            redisFreeCommand(cmd);
+            return -1;
+        }
+        loop->commands = commands;
+        loop->commands_capacity = capacity;
+    }
+    memcpy(loop->commands + loop->commands_len, cmd, (size_t)len);
+    loop->commands_len = needed;
+    loop->submitted += argc - 1;
+    long long target = loop->submitted;
+    redisFreeCommand(cmd);
+    
+    loop_wakeup(loop);
+    rp_mutex_unlock(&loop->lock);
+    
+    /* 在任一分片的回调中都不等待：两个分片互相等待对方确认会死锁 */
+    return on_loop_thread(shard->client) ? 0 : target;
+}
+
+/* 等待订阅连接的确认序号到达target（loop_submit_command的返回值），target为0时直接返回 */
+static int loop_wait_confirmed(SubscriberShard *shard, long long target, const char* command) {
+    EventLoop *loop = &shard->loop;
+    if (target <= 0) {
+        return 0;
+    }
+    
+    rp_mutex_lock(&loop->lock);
+    while (loop->running && !loop->sub_failed && loop->confirmed < target) {
+        rp_cond_wait(&loop->cond, &loop->lock, -1);
+    }
+    int result = loop->confirmed >= target ? 0 : -1;
+    rp_mutex_unlock(&loop->lock);
+    
+    if (result != 0) {
+        fprintf(stderr, "[ERROR] Failed to send %s: subscription connection lost\n", command);
+    }
+    return result;
+}
+
+static RP_THREAD_FUNC loop_thread(void *arg) {
+    SubscriberShard *shard = (SubscriberShard*)arg;
+    redis_client *client = shard->client;
+    EventLoop *loop = &shard->loop;
+    AsyncPublisher *ap = &client->async;
+    int drives_async = shard == &client->shards[0];
+    
+    // fprintf(stdout, "[INFO] Event loop started\n");
+    
+    for (;;) {
+        int draining = !loop->running;
+        int timeout_ms = -1;
+        
+        /* 1. 订阅连接断开时按退避节奏重连；把新提交的订阅命令和异步消息追加到各自连接 */
+        if (!draining && loop->sub_failed && client->reconnect.initial_ms > 0) {
+            timeout_ms = sub_reconnect(shard);
+        }
+        if (!draining) {
+            sub_collect(shard);
+        }
+        if (drives_async) {
+            int async_timeout = async_collect(client, draining);
+            if (async_timeout >= 0 && (timeout_ms < 0 || async_timeout < timeout_ms)) {
+                timeout_ms = async_timeout;
+            }
+        }
+        
+        /* 投递到期的批次（停止时投递全部），poll最多等到下一个批次到期 */
+        int batch_timeout = batch_flush_due(shard, draining);
+        if (batch_timeout >= 0 && (timeout_ms < 0 || batch_timeout < timeout_ms)) {
+            timeout_ms = batch_timeout;
+        }
+        
+        /* 已停止：异步消息全部收到回复（或连接失败）后退出 */
+        if (draining && (!drives_async || !async_busy(client))) {
+            break;
+        }
+        
+        /* 2. 等待唤醒socket和各连接的读写事件 */
+        rp_pollfd fds[3];
+        int nfds = 0;
+        int sub_index = -1;
+        int async_index = -1;
+        
+        fds[nfds].fd = loop->wakeup_read;
+        fds[nfds].events = POLLIN;
+        fds[nfds].revents = 0;
+        nfds++;
+        
+        if (!draining && !loop->sub_failed) {
+            sub_index = nfds;
+            fds[nfds].fd = (rp_socket)shard->context->fd;
+            fds[nfds].events = POLLIN | (loop->sub_want_write ? POLLOUT : 0);
+            fds[nfds].revents = 0;
+            nfds++;
+        }
+        
+        if (drives_async && ap->context) {
+            async_index = nfds;
+            fds[nfds].fd = (rp_socket)ap->context->fd;
+            fds[nfds].events = POLLIN | (ap->want_write ? POLLOUT : 0);
+            fds[nfds].revents = 0;
+            nfds++;
+        }
+        
+        if (rp_poll(fds, nfds, timeout_ms) < 0) {
+            fprintf(stderr, "[ERROR] Event loop poll failed\n");
+            break;
+        }
+        
+        /* 3. 先清除唤醒标志再读走字节，之后提交的工作会在下一轮收集 */
+        if (fds[0].revents) {
+            loop->wakeup_pending = 0;
+            wakeup_drain(loop->wakeup_read);
+        }
+        
+        if (sub_index >= 0 && fds[sub_index].revents) {
+            if (fds[sub_index].revents & POLLOUT) {
+                sub_write(shard);
+            }
+            if (!loop->sub_failed && (fds[sub_index].revents & ~POLLOUT)) {
+                sub_read(shard);
+            }
+        }
+        
+        if (async_index >= 0 && fds[async_index].revents) {
+            if (fds[async_index].revents & POLLOUT) {
+                async_write(client);
+            }
+            if (ap->context && (fds[async_index].revents & ~POLLOUT)) {
+                async_read(client);
+            }
+        }
+    }
+    
+    /* 异常退出时仍在等待回复的消息按失败通知 */
+    if (drives_async && ap->inflight.count > 0) {
+        async_connection_lost(client);
+    }
+    
+    // fprintf(stdout, "[INFO] Event loop ended\n");
+    return RP_THREAD_RESULT;
+}
+
+/* 创建唤醒socket并启动分片的事件循环线程 */
+static int loop_start(SubscriberShard *shard) {
+    EventLoop *loop = &shard->loop;
+    rp_socket pair[2];
+    
+    if (rp_socket_pair(pair) != 0) {
+        fprintf(stderr, "[ERROR] Failed to create wakeup socket\n");
+        return -1;
+    }
+    loop->wakeup_read = pair[0];
+    loop->wakeup_write = pair[1];
+    loop->wakeup_pending = 0;
+    loop->commands_len = 0;
+    loop->submitted = 0;
+    loop->confirmed = 0;
+    loop->sub_failed = 0;
+    loop->sub_want_write = 0;
+    loop->running = 1;
+    
+    if (rp_thread_create(&loop->thread, &loop->thread_id, loop_thread, shard) != 0) {
+        fprintf(stderr, "[ERROR] Failed to create event loop thread\n");
+        loop->running = 0;
+        wakeup_close(&loop->wakeup_read, &loop->wakeup_write);
+        return -1;
+    }
+    loop->started = 1;
+    return 0;
+}
+
+/* 停止分片的事件循环并等待线程退出，唤醒所有等待中的调用方 */
+static void loop_stop(SubscriberShard *shard) {
+    EventLoop *loop = &shard->loop;
+    redis_client *client = shard->client;
+    
+    rp_mutex_lock(&loop->lock);
+    loop->running = 0;
+    rp_cond_broadcast(&loop->cond);
+    rp_mutex_unlock(&loop->lock);
+    
+    if (loop->started) {
+        loop_wakeup(loop);
+        rp_thread_join(loop->thread);
+        loop->started = 0;
+        memset(&loop->thread_id, 0, sizeof(loop->thread_id));
+    }
+    wakeup_close(&loop->wakeup_read, &loop->wakeup_write);
+    
+    rp_mutex_lock(&client->async.lock);
+    rp_cond_broadcast(&client->async.done_cond);
+    rp_mutex_unlock(&client->async.lock);
+}
+
+/* 当前线程是否为该实例某个分片的事件循环线程（即正在回调中） */
+static int on_loop_thread(redis_client* client) {
+    rp_thread_id self = rp_thread_self();
+    
+    for (int i = 0; client->shards && i < client->shard_count; i++) {
+        EventLoop *loop = &client->shards[i].loop;
+        if (loop->started && rp_thread_equal(self, loop->thread_id)) {
+            return 1;
+        }
+    }
+    return 0;
+}
+
+/* ==================== 订阅分片 ==================== */
+
+REDIS_PUBSUB_API int redis_client_set_subscriber_shards(redis_client* client, int count) {
+    if (!client || count <= 0 || count > REDIS_SUBSCRIBER_SHARDS_MAX) {
+        fprintf(stderr, "[ERROR] Invalid subscriber shard count\n");
+        return -1;
+    }
+    
+    /* 分片数在redis_client_connect时生效 */
+    if (client->running) {
+        fprintf(stderr, "[ERROR] Cannot change subscriber shards while connected\n");
+        return -1;
+    }
+    
+    client->config_shards = count;
+    return 0;
+}
+
+REDIS_PUBSUB_API int redis_client_get_shard_stats(redis_client* client, RedisShardStats* stats,
+                                                  int max_count) {
+    if (!client || !stats || max_count <= 0) {
+        return -1;
+    }
+    
+    int count = 0;
+    for (; client->shards && count < client->shard_count && count < max_count; count++) {
+        SubscriberShard *shard = &client->shards[count];
+        rp_mutex_lock(&shard->lock);
+        stats[count].channels = shard->subscriptions ? (long long)dictSize(shard->subscriptions) : 0;
+        stats[count].patterns = shard->patterns ? (long long)dictSize(shard->patterns) : 0;
+        rp_mutex_unlock(&shard->lock);
+        stats[count].messages = shard->messages;
+        stats[count].connected = shard->context && !shard->loop.sub_failed;
+    }
+    return count;
+}
+
+/* ==================== 集群（分片发布/订阅） ==================== */
+
+REDIS_PUBSUB_API int redis_client_set_sharded_pubsub(redis_client* client, int enabled) {
+    if (!client) {
+        fprintf(stderr, "[ERROR] Invalid client\n");
+        return -1;
+    }
+    
+    /* 订阅连接和事件循环在redis_client_connect时按此设置选择命令 */
+    if (client->running) {
+        fprintf(stderr, "[ERROR] Cannot change sharded pub/sub while connected\n");
+        return -1;
+    }
+    
+    client->sharded = enabled ? 1 : 0;
+    return 0;
+}
+
+REDIS_PUBSUB_API int redis_client_set_moved_handler(redis_client* client, ClusterMovedHook hook, void* userdata) {
+    if (!client) {
+        fprintf(stderr, "[ERROR] Invalid client\n");
+        return -1;
+    }
+    
+    /* 事件循环线程不加锁读取，只能在连接前设置 */
+    if (client->running) {
+        fprintf(stderr, "[ERROR] Cannot change moved handler while connected\n");
+        return -1;
+    }
+    
+    client->moved_hook = hook;
+    client->moved_userdata = userdata;
+    return 0;
+}
+
+REDIS_PUBSUB_API int redis_client_cluster_slots(redis_client* client, RedisClusterSlots* slots, int max_count) {
+    if (!client || !client->running) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        return -1;
+    }
+    
+    if (!slots || max_count <= 0) {
+        fprintf(stderr, "[ERROR] Invalid slots buffer\n");
+        return -1;
+    }
+    
+    PublishConnection *conn = pool_acquire(&client->pool);
+    if (!conn) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        return -1;
+    }
+    
+    if (conn->context->err && pool_reconnect(client, conn) != 0) {
+        fprintf(stderr, "[ERROR] Failed to query cluster slots: connection lost\n");
+        rp_mutex_unlock(&conn->lock);
+        return -1;
+    }
+    
+    redisReply *reply = redisCommand(conn->context, "CLUSTER SLOTS");
+    if (!reply) {
+        fprintf(stderr, "[ERROR] Failed to query cluster slots: %s\n", conn->context->errstr);
+        pool_reconnect(client, conn);
+        rp_mutex_unlock(&conn->lock);
+        return -1;
+    }
+    rp_mutex_unlock(&conn->lock);
+    
+    if (reply->type != REDIS_REPLY_ARRAY) {
+        fprintf(stderr, "[ERROR] Failed to query cluster slots: %s\n",
+                reply->type == REDIS_REPLY_ERROR ? reply->str : "unexpected reply");
+        freeReplyObject(reply);
+        return -1;
+    }
+    
+    /* 每段为[start, end, [host, port, id...], 副本...]，只取主节点；
+     * host为空（节点不知道自己的地址）时使用当前连接的地址 */
+    int count = 0;
+    for (size_t i = 0; i < reply->elements && count < max_count; i++) {
+        redisReply *range = reply->element[i];
+        if (range->type != REDIS_REPLY_ARRAY || range->elements < 3 ||
+            range->element[0]->type != REDIS_REPLY_INTEGER || range->element[1]->type != REDIS_REPLY_INTEGER ||
+            range->element[2]->type != REDIS_REPLY_ARRAY || range->element[2]->elements < 2) {
+            continue;
+        }
+        
+        redisReply *host = range->element[2]->element[0];
+        redisReply *port = range->element[2]->element[1];
+        if (host->type != REDIS_REPLY_STRING || port->type != REDIS_REPLY_INTEGER) {
+            continue;
+        }
+        
+        RedisClusterSlots *out = &slots[count++];
+        out->start = (int)range->element[0]->integer;
+        out->end = (int)range->element[1]->integer;
+        out->port = (int)port->integer;
+        snprintf(out->host, sizeof(out->host), "%s",
+                 host->len > 0 && strcmp(host->str, "?") != 0 ? host->str : client->hostname);
+    }
+    
+    freeReplyObject(reply);
+    return count;
+}
+
+/* CRC16-CCITT（XMODEM），与Redis Cluster的槽位计算相同 */
+static unsigned int crc16_xmodem(const char* buf, size_t len) {
+    unsigned int crc = 0;
+    
+    for (size_t i = 0; i < len; i++) {
+        crc ^= (unsigned int)(unsigned char)buf[i] << 8;
+        for (int bit = 0; bit < 8; bit++) {
+            crc = (crc & 0x8000) ? ((crc << 1) ^ 0x1021) : (crc << 1);
+        }
+        crc &= 0xFFFF;
+    }
+    return crc;
+}
+
+REDIS_PUBSUB_API int redis_cluster_keyslot(const char* key, size_t key_len) {
+    if (!key) {
+        return 0;
+    }
+    
+    /* 有非空的"{...}"时只对其中的内容取槽位（hash tag），使相关频道落在同一节点 */
+    const char *left = (const char*)memchr(key, '{', key_len);
+    if (left) {
+        size_t start = (size_t)(left - key) + 1;
+        const char *right = (const char*)memchr(left + 1, '}', key_len - start);
+        if (right && right > left + 1) {
+            return (int)(crc16_xmodem(left + 1, (size_t)(right - left - 1)) & (REDIS_CLUSTER_SLOTS - 1));
+        }
+    }
+    return (int)(crc16_xmodem(key, key_len) & (REDIS_CLUSTER_SLOTS - 1));
+}
+
+/* 频道/模式名称所属的分片（同一名称总是落在同一个分片，pmessage也从该分片的连接到达） */
+static SubscriberShard* shard_for(redis_client* client, const char* name, size_t name_len) {
+    if (client->shard_count == 1) {
+        return &client->shards[0];
+    }
+    
+    unsigned int hash = dictGenHashFunction((const unsigned char*)name, (int)name_len);
+    return &client->shards[hash % (unsigned int)client->shard_count];
+}
+
+/* 为每个分片建立订阅连接和订阅表并启动事件循环，失败时由调用方执行shards_close */
+static int shards_open(redis_client* client) {
+    if (client->shards && client->shard_count != client->config_shards) {
+        shards_free(client);
+    }
+    
+    if (!client->shards) {
+        client->shards = (SubscriberShard*)calloc((size_t)client->config_shards, sizeof(SubscriberShard));
+        if (!client->shards) {
+            fprintf(stderr, "[ERROR] Out of memory\n");
+            return -1;
+        }
+        client->shard_count = client->config_shards;
+        for (int i = 0; i < client->shard_count; i++) {
+            SubscriberShard *shard = &client->shards[i];
+            shard->client = client;
+            rp_mutex_init(&shard->lock);
+            rp_mutex_init(&shard->loop.lock);
+            rp_cond_init(&shard->loop.cond);
+            shard->loop.wakeup_read = RP_INVALID_SOCKET;
+            shard->loop.wakeup_write = RP_INVALID_SOCKET;
+        }
+    }
+    
+    for (int i = 0; i < client->shard_count; i++) {
+        SubscriberShard *shard = &client->shards[i];
+        shard->messages = 0;
+        backoff_reset(&shard->backoff);
+        
+        rp_mutex_lock(&shard->lock);
+        shard->subscriptions = dictCreate(&g_subscription_dict_type, NULL);
+        shard->patterns = dictCreate(&g_subscription_dict_type, NULL);
+        rp_mutex_unlock(&shard->lock);
+        if (!shard->subscriptions || !shard->patterns) {
+            fprintf(stderr, "[ERROR] Failed to allocate subscription table\n");
+            return -1;
+        }
+        
+        /* 订阅连接交给分片的事件循环驱动 */
+        shard->context = loop_connect(client, "subscribe");
+        if (!shard->context) {
+            return -1;
+        }
+        
+        if (loop_start(shard) != 0) {
+            return -1;
+        }
+    }
+    return 0;
+}
+
+/* 停止所有分片的事件循环，释放订阅连接和订阅表；分片数组和锁保留到shards_free */
+static void shards_close(redis_client* client) {
+    for (int i = 0; client->shards && i < client->shard_count; i++) {
+        SubscriberShard *shard = &client->shards[i];
+        loop_stop(shard);
+        
+        rp_mutex_lock(&shard->lock);
+        
+        if (shard->context) {
+            redisFree(shard->context);
+            shard->context = NULL;
+        }
+        
+        if (shard->subscriptions) {
+            dictRelease(shard->subscriptions);
+            shard->subscriptions = NULL;
+        }
+        
+        if (shard->patterns) {
+            dictRelease(shard->patterns);
+            shard->patterns = NULL;
+        }
+        
+        if (shard->staged) {
+            dictRelease(shard->staged);
+            shard->staged = NULL;
+        }
+        
+        if (shard->staged_patterns) {
+            dictRelease(shard->staged_patterns);
+            shard->staged_patterns = NULL;
+        }
+        
+        rp_mutex_unlock(&shard->lock);
+        
+        /* 事件循环已停止，合并投递的状态不再被访问 */
+        if (shard->conflated) {
+            dictRelease(shard->conflated);
+            shard->conflated = NULL;
+        }
+        free(shard->pending);
+        shard->pending = NULL;
+        shard->pending_count = 0;
+        shard->pending_capacity = 0;
+        if (shard->batches) {
+            dictRelease(shard->batches);
+            shard->batches = NULL;
+        }
+        shard->batch_deadline = 0;
+    }
+}
+
+static void shards_free(redis_client* client) {
+    if (!client->shards) {
+        return;
+    }
+    
+    shards_close(client);
+    for (int i = 0; i < client->shard_count; i++) {
+        SubscriberShard *shard = &client->shards[i];
+        free(shard->loop.commands);
+        rp_cond_destroy(&shard->loop.cond);
+        rp_mutex_destroy(&shard->loop.lock);
+        rp_mutex_destroy(&shard->lock);
+    }
+    free(client->shards);
+    client->shards = NULL;
+    client->shard_count = 0;
+}
+
+/* ==================== 投递队列 ==================== */
+
+static int queue_alloc(MessageQueue *q, int capacity) {
+    QueueSlot *slots = (QueueSlot*)calloc((size_t)capacity, sizeof(QueueSlot));
+    if (!slots) {
+        return -1;
+    }
+    
+    q->slots = slots;
+    q->capacity = capacity;
+    q->head = 0;
+    q->tail = 0;
+    q->count = 0;
+    q->inflight = 0;
+    q->high_watermark = 0;
+    q->enqueued = 0;
+    q->dequeued = 0;
+    q->overflow = 0;
+    return 0;
+}
+
+static void queue_free(MessageQueue *q) {
+    if (!q->slots) {
+        return;
+    }
+    
+    for (int i = 0; i < q->capacity; i++) {
+        free(q->slots[i].buf);
+    }
+    free(q->slots);
+    q->slots = NULL;
+    q->capacity = 0;
+    q->count = 0;
+    q->inflight = 0;
+}
+
+/* 在事件循环线程中调用：复制消息到下一个空槽位，队列满时丢弃最新消息 */
+static void queue_push(MessageQueue *q, const char* channel, size_t channel_len,
+                       const char* message, size_t message_len) {
+    rp_mutex_lock(&q->lock);
+    
+    if (!q->slots || q->count >= q->capacity) {
+        q->overflow++;
+        rp_mutex_unlock(&q->lock);
+        return;
+    }
+    
+    QueueSlot *slot = &q->slots[q->head];
+    size_t needed = channel_len + message_len + 2;
+    
+    if (slot->buf_size < needed) {
+        size_t new_size = (needed + 63) & ~(size_t)63;
+        char *buf = (char*)realloc(slot->buf, new_size);
+        if (!buf) {
+            q->overflow++;
+            rp_mutex_unlock(&q->lock);
+            return;
+        }
+        slot->buf = buf;
+        slot->buf_size = new_size;
+    }
+    
+    memcpy(slot->buf, channel, channel_len);
+    slot->buf[channel_len] = '\0';
+    memcpy(slot->buf + channel_len + 1, message, message_len);
+    slot->buf[channel_len + 1 + message_len] = '\0';
+    slot->channel_len = channel_len;
+    slot->data_len = message_len;
+    
+    q->head = (q->head + 1) % q->capacity;
+    q->count++;
+    q->enqueued++;
+    
+    int depth = q->count - q->inflight;
+    if (depth > q->high_watermark) {
+        q->high_watermark = depth;
+    }
+    
+    /* 从空变为非空时唤醒等待的poll和事件循环 */
+    if (depth == 1) {
+        rp_cond_signal(&q->cond);
+        if (q->wakeup_write != RP_INVALID_SOCKET) {
+            rp_send(q->wakeup_write, "x", 1);
+        }
+    }
+    
+    rp_mutex_unlock(&q->lock);
+}
+
+/* 等待直到有待取消息或超时（调用时必须持有client->queue.lock） */
+static void queue_wait(redis_client* client, int timeout_ms) {
+    MessageQueue *q = &client->queue;
+    
+    if (timeout_ms == 0) {
+        return;
+    }
+    
+    long long deadline = rp_now_ms() + (timeout_ms > 0 ? timeout_ms : 0);
+    
+    while (client->running && q->slots && q->count - q->inflight == 0) {
+        int wait_ms = -1;
+        if (timeout_ms > 0) {
+            long long now = rp_now_ms();
+            if (now >= deadline) {
+                break;
+            }
+            wait_ms = (int)(deadline - now);
+        }
+        rp_cond_wait(&q->cond, &q->lock, wait_ms);
+    }
+}
+
+/* ==================== 唤醒socket ==================== */
+
+static void wakeup_close(rp_socket *read_end, rp_socket *write_end) {
+    if (*read_end != RP_INVALID_SOCKET) {
+        rp_socket_close(*read_end);
+        *read_end = RP_INVALID_SOCKET;
+    }
+    if (*write_end != RP_INVALID_SOCKET) {
+        rp_socket_close(*write_end);
+        *write_end = RP_INVALID_SOCKET;
+    }
+}
+
+/* 读空唤醒socket中积压的字节 */
+static void wakeup_drain(rp_socket read_end) {
+    char buf[64];
+    
+    if (read_end == RP_INVALID_SOCKET) {
+        return;
+    }
+    while (rp_recv(read_end, buf, sizeof(buf)) > 0) {
+    }
+}
+
+REDIS_PUBSUB_API long long redis_client_get_wakeup_fd(redis_client* client) {
+    if (!client || client->queue.wakeup_read == RP_INVALID_SOCKET) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        return -1;
+    }
+    
+    return (long long)client->queue.wakeup_read;
+}
+
+REDIS_PUBSUB_API int redis_client_set_queue_capacity(redis_client* client, int capacity) {
+    if (!client || capacity <= 0) {
+        fprintf(stderr, "[ERROR] Invalid queue capacity\n");
+        return -1;
+    }
+    
+    MessageQueue *q = &client->queue;
+    rp_mutex_lock(&q->lock);
+    
+    /* 尚未连接：只记录配置，在redis_client_connect时分配 */
+    if (!q->slots) {
+        q->config_capacity = capacity;
+        rp_mutex_unlock(&q->lock);
+        return 0;
+    }
+    
+    if (q->count > q->inflight) {
+        fprintf(stderr, "[ERROR] Queue is not empty\n");
+        rp_mutex_unlock(&q->lock);
+        return -1;
+    }
+    
+    queue_free(q);
+    if (queue_alloc(q, capacity) != 0) {
+        fprintf(stderr, "[ERROR] Failed to allocate message queue\n");
+        queue_alloc(q, q->config_capacity);
+        rp_mutex_unlock(&q->lock);
+        return -1;
+    }
+    q->config_capacity = capacity;
+    
+    rp_mutex_unlock(&q->lock);
+    return 0;
+}
+
+REDIS_PUBSUB_API int redis_client_poll_messages(redis_client* client, RedisMessage* buffer,
+                                                int max_count, int timeout_ms) {
+    if (!client || !client->queue.slots) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        return -1;
+    }
+    
+    if (!buffer || max_count <= 0) {
+        fprintf(stderr, "[ERROR] Invalid poll buffer\n");
+        return -1;
+    }
+    
+    MessageQueue *q = &client->queue;
+    rp_mutex_lock(&q->lock);
+    
+    if (!q->slots) {
+        rp_mutex_unlock(&q->lock);
+        return -1;
+    }
+    
+    /* 释放上一次交给调用方的槽位 */
+    q->tail = (q->tail + q->inflight) % q->capacity;
+    q->count -= q->inflight;
+    q->inflight = 0;
+    
+    queue_wait(client, timeout_ms);
+    
+    if (!q->slots) {
+        rp_mutex_unlock(&q->lock);
+        return -1;
+    }
+    
+    int count = q->count < max_count ? q->count : max_count;
+    for (int i = 0; i < count; i++) {
+        QueueSlot *slot = &q->slots[(q->tail + i) % q->capacity];
+        buffer[i].channel = slot->buf;
+        buffer[i].channel_len = slot->channel_len;
+        buffer[i].data = slot->buf + slot->channel_len + 1;
+        buffer[i].data_len = slot->data_len;
+    }
+    
+    q->inflight = count;
+    q->dequeued += count;
+    
+    /* 队列已被取空时复位唤醒socket；否则保持可读，让事件循环继续取 */
+    if (q->count == q->inflight) {
+        wakeup_drain(q->wakeup_read);
+    }
+    
+    rp_mutex_unlock(&q->lock);
+    return count;
+}
+
+REDIS_PUBSUB_API int redis_client_get_queue_stats(redis_client* client, RedisQueueStats* stats) {
+    if (!client || !stats) {
+        return -1;
+    }
+    
+    MessageQueue *q = &client->queue;
+    memset(stats, 0, sizeof(*stats));
+    
+    rp_mutex_lock(&q->lock);
+    if (!q->slots) {
+        stats->capacity = q->config_capacity;
+    } else {
+        stats->capacity = q->capacity;
+        stats->depth = q->count - q->inflight;
+        stats->high_watermark = q->high_watermark;
+        stats->enqueued = q->enqueued;
+        stats->dequeued = q->dequeued;
+        stats->overflow = q->overflow;
+    }
+    rp_mutex_unlock(&q->lock);
+    return 0;
+}
+
+/* ==================== 处理消息（可选） ==================== */
+
+REDIS_PUBSUB_API int redis_client_process_messages(redis_client* client, int timeout_ms) {
+    if (!client || !client->shards || !client->queue.slots) {
+        fprintf(stderr, "[ERROR] Redis not initialized\n");
+        return -1;
+    }
+    
+    /* 回调模式的消息由事件循环直接投递；这里只等待队列模式的消息到达 */
+    MessageQueue *q = &client->queue;
+    rp_mutex_lock(&q->lock);
+    queue_wait(client, timeout_ms);
+    int depth = q->slots ? q->count - q->inflight : 0;
+    rp_mutex_unlock(&q->lock);
+    return depth;
+}
+
+/* ==================== 旧接口（使用默认实例） ==================== */
+
+/* 获取默认实例，不存在时创建 */
+static redis_client* default_client(void) {
+    if (!g_default_client) {
+        g_default_client = redis_client_new();
+    }
+    return g_default_client;
+}
+
+REDIS_PUBSUB_API int redis_init(const char* hostname, int port) {
+    redis_client *client = default_client();
+    if (!client) {
+        return -1;
+    }
+    
+    return redis_client_connect(client, hostname, port);
+}
+
+REDIS_PUBSUB_API int redis_close() {
+    if (!g_default_client) {
+        return 0;
+    }
+    
+    return redis_client_close(g_default_client);
+}
+
+REDIS_PUBSUB_API int redis_publish(const char* channel, const char* message) {
+    return redis_client_publish(g_default_client, channel, message);
+}
+
+REDIS_PUBSUB_API int redis_publish_binary(const char* channel, size_t channel_len,
+                                          const char* message, size_t message_len) {
+    return redis_client_publish_binary(g_default_client, channel, channel_len, message, message_len);
+}
+
+REDIS_PUBSUB_API int redis_publish_batch(int count,
+                                         const char** channels, const size_t* channel_lens,
+                                         const char** messages, const size_t* message_lens,
+                                         int* results) {
+    return redis_client_publish_batch(g_default_client, count, channels, channel_lens,
+                                      messages, message_lens, results);
+}
+
+REDIS_PUBSUB_API int redis_set_publish_pool(int size, int mode) {
+    return redis_client_set_publish_pool(default_client(), size, mode);
+}
+
+REDIS_PUBSUB_API int redis_get_pool_stats(RedisPoolStats* stats) {
+    return redis_client_get_pool_stats(default_client(), stats);
+}
+
+REDIS_PUBSUB_API int redis_set_async_publish(int max_batch, int max_pending, int linger_ms) {
+    return redis_client_set_async_publish(default_client(), max_batch, max_pending, linger_ms);
+}
+
+REDIS_PUBSUB_API long long redis_publish_nowait(const char* channel, size_t channel_len,
+                                                const char* message, size_t message_len,
+                                                PublishCompletion callback, void* userdata) {
+    return redis_client_publish_nowait(g_default_client, channel, channel_len,
+                                       message, message_len, callback, userdata);
+}
+
+REDIS_PUBSUB_API int redis_flush(int timeout_ms) {
+    return redis_client_flush(g_default_client, timeout_ms);
+}
+
+REDIS_PUBSUB_API int redis_get_async_stats(RedisAsyncStats* stats) {
+    return redis_client_get_async_stats(default_client(), stats);
+}
+
+REDIS_PUBSUB_API int redis_set_reconnect(int initial_ms, int max_ms, int spool_max) {
+    return redis_client_set_reconnect(default_client(), initial_ms, max_ms, spool_max);
+}
+
+REDIS_PUBSUB_API int redis_get_reconnect_stats(RedisReconnectStats* stats) {
+    return redis_client_get_reconnect_stats(default_client(), stats);
+}
+
+REDIS_PUBSUB_API int redis_set_subscriber_shards(int count) {
+    return redis_client_set_subscriber_shards(default_client(), count);
+}
+
+REDIS_PUBSUB_API int redis_get_shard_stats(RedisShardStats* stats, int max_count) {
+    return redis_client_get_shard_stats(default_client(), stats, max_count);
+}
+
+REDIS_PUBSUB_API int redis_set_sharded_pubsub(int enabled) {
+    return redis_client_set_sharded_pubsub(default_client(), enabled);
+}
+
+REDIS_PUBSUB_API int redis_set_moved_handler(ClusterMovedHook hook, void* userdata) {
+    return redis_client_set_moved_handler(default_client(), hook, userdata);
+}
+
+REDIS_PUBSUB_API int redis_cluster_slots(RedisClusterSlots* slots, int max_count) {
+    return redis_client_cluster_slots(default_client(), slots, max_count);
+}
+
+REDIS_PUBSUB_API int redis_get_stats(RedisStats* stats) {
+    return redis_client_get_stats(default_client(), stats);
+}
+
+REDIS_PUBSUB_API int redis_get_channel_stats(RedisChannelStats* stats, int max_count) {
+    return redis_client_get_channel_stats(default_client(), stats, max_count);
+}
+
+REDIS_PUBSUB_API int redis_set_channel_stats(int max_channels) {
+    return redis_client_set_channel_stats(default_client(), max_channels);
+}
+
+REDIS_PUBSUB_API int redis_set_slow_handler(long long threshold_us, SlowHandlerHook hook, void* userdata) {
+    return redis_client_set_slow_handler(default_client(), threshold_us, hook, userdata);
+}
+
+REDIS_PUBSUB_API int redis_set_local_delivery(int enabled, int suppress_echo) {
+    return redis_client_set_local_delivery(default_client(), enabled, suppress_echo);
+}
+
+REDIS_PUBSUB_API int redis_get_local_stats(RedisLocalStats* stats) {
+    return redis_client_get_local_stats(default_client(), stats);
+}
+
+REDIS_PUBSUB_API int redis_stream_add(int count, const char** streams, const size_t* stream_lens,
+                                      const char** messages, const size_t* message_lens,
+                                      long long maxlen, char* ids) {
+    return redis_client_stream_add(default_client(), count, streams, stream_lens,
+                                   messages, message_lens, maxlen, ids);
+}
+
+REDIS_PUBSUB_API int redis_stream_group_create(const char* stream, size_t stream_len,
+                                               const char* group, size_t group_len, const char* start_id) {
+    return redis_client_stream_group_create(default_client(), stream, stream_len, group, group_len, start_id);
+}
+
+REDIS_PUBSUB_API redis_stream_reader* redis_stream_reader_new(const char* group, size_t group_len,
+                                                              const char* consumer, size_t consumer_len) {
+    return redis_client_stream_reader_new(default_client(), group, group_len, consumer, consumer_len);
+}
+
+REDIS_PUBSUB_API int redis_subscribe(const char* channel, PubSubCallback callback) {
+    return redis_client_subscribe(g_default_client, channel, callback);
+}
+
+REDIS_PUBSUB_API int redis_subscribe_binary(const char* channel, size_t channel_len,
+                                            PubSubBinaryCallback callback) {
+    return redis_client_subscribe_binary(g_default_client, channel, channel_len, callback);
+}
+
+REDIS_PUBSUB_API int redis_subscribe_queued(const char* channel, size_t channel_len) {
+    return redis_client_subscribe_queued(g_default_client, channel, channel_len);
+}
+
+REDIS_PUBSUB_API int redis_subscribe_many(int count, const char** channels, const size_t* channel_lens,
+                                          PubSubBinaryCallback callback) {
+    return redis_client_subscribe_many(g_default_client, count, channels, channel_lens, callback);
+}
+
+REDIS_PUBSUB_API int redis_subscribe_many_queued(int count, const char** channels, const size_t* channel_lens) {
+    return redis_client_subscribe_many_queued(g_default_client, count, channels, channel_lens);
+}
+
+REDIS_PUBSUB_API int redis_subscribe_batch(const char* channel, size_t channel_len,
+                                           int max_batch, int max_delay_ms, size_t record_size,
+                                           PubSubBatchCallback callback, void* userdata) {
+    return redis_client_subscribe_batch(g_default_client, channel, channel_len,
+                                        max_batch, max_delay_ms, record_size, callback, userdata);
+}
+
+REDIS_PUBSUB_API int redis_unsubscribe(const char* channel, size_t channel_len) {
+    return redis_client_unsubscribe(g_default_client, channel, channel_len);
+}
+
+REDIS_PUBSUB_API int redis_unsubscribe_many(int count, const char** channels, const size_t* channel_lens) {
+    return redis_client_unsubscribe_many(g_default_client, count, channels, channel_lens);
+}
+
+REDIS_PUBSUB_API int redis_set_conflation(const char* channel, size_t channel_len, int enabled) {
+    return redis_client_set_conflation(g_default_client, channel, channel_len, enabled);
+}
+
+REDIS_PUBSUB_API int redis_set_filter(int is_pattern, const char* name, size_t name_len,
+                                      int count, const RedisFilter* filters) {
+    return redis_client_set_filter(g_default_client, is_pattern, name, name_len, count, filters);
+}
+
+REDIS_PUBSUB_API int redis_get_filter_stats(int is_pattern, const char* name, size_t name_len,
+                                            RedisFilterStats* stats) {
+    return redis_client_get_filter_stats(g_default_client, is_pattern, name, name_len, stats);
+}
+
+REDIS_PUBSUB_API int redis_psubscribe(const char* pattern, PubSubCallback callback) {
+    return redis_client_psubscribe(g_default_client, pattern, callback);
+}
+
+REDIS_PUBSUB_API int redis_psubscribe_binary(const char* pattern, size_t pattern_len,
+                                             PubSubBinaryCallback callback) {
+    return redis_client_psubscribe_binary(g_default_client, pattern, pattern_len, callback);
+}
+
+REDIS_PUBSUB_API int redis_psubscribe_queued(const char* pattern, size_t pattern_len) {
+    return redis_client_psubscribe_queued(g_default_client, pattern, pattern_len);
+}
+
+REDIS_PUBSUB_API int redis_punsubscribe(const char* pattern, size_t pattern_len) {
+    return redis_client_punsubscribe(g_default_client, pattern, pattern_len);
+}
+
+REDIS_PUBSUB_API int redis_set_queue_capacity(int capacity) {
+    return redis_client_set_queue_capacity(default_client(), capacity);
+}
+
+REDIS_PUBSUB_API int redis_poll_messages(RedisMessage* buffer, int max_count, int timeout_ms) {
+    return redis_client_poll_messages(g_default_client, buffer, max_count, timeout_ms);
+}
+
+REDIS_PUBSUB_API int redis_get_queue_stats(RedisQueueStats* stats) {
+    return redis_client_get_queue_stats(default_client(), stats);
+}
+
+REDIS_PUBSUB_API long long redis_get_wakeup_fd(void) {
+    return redis_client_get_wakeup_fd(g_default_client);
+}
+
+REDIS_PUBSUB_API int redis_process_messages(int timeout_ms) {
+    return redis_client_process_messages(g_default_client, timeout_ms);
+}
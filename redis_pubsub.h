@@ -3,13 +3,459 @@
 
 #ifdef _WIN32
     #define REDIS_PUBSUB_API __declspec(dllexport)
+#elif defined(__GNUC__)
+    #define REDIS_PUBSUB_API __attribute__((visibility("default")))
 #else
     #define REDIS_PUBSUB_API
 #endif
 
+#include <stddef.h>
+
 /* 回调函数类型定义 */
 typedef void (*PubSubCallback)(const char* channel, const char* message);
 
+/* 二进制安全回调函数类型定义（显式长度，数据可包含'\0'） */
+typedef void (*PubSubBinaryCallback)(const char* channel, size_t channel_len,
+                                     const char* message, size_t message_len);
+
+/* 带用户数据的二进制安全回调，userdata为订阅时传入的指针（供语言绑定把消息直接交给对应的处理对象） */
+typedef void (*PubSubDataCallback)(void* userdata, const char* channel, size_t channel_len,
+                                   const char* message, size_t message_len);
+
+/* 批量回调：count条消息的payload首尾相接存放在data中，第i条的长度为lens[i]
+ * data和lens只在回调期间有效 */
+typedef void (*PubSubBatchCallback)(void* userdata, const char* channel, size_t channel_len,
+                                    int count, const char* data, const size_t* lens);
+
+/* 异步发布完成回调（在实例的事件循环线程中调用）
+ * subscribers为接收消息的订阅者数量，发送失败为-1（分片模式下槽位不属于该节点时为REDIS_PUBLISH_MOVED） */
+typedef void (*PublishCompletion)(void* userdata, long long subscribers);
+
+/* 慢回调通知（在执行该回调的线程中调用），elapsed_ns为回调执行时间（纳秒） */
+typedef void (*SlowHandlerHook)(void* userdata, const char* channel, size_t channel_len,
+                                long long elapsed_ns);
+
+/* 投递队列中的一条消息（由redis_poll_messages填充）
+ * 指针指向库内部的预分配缓冲区，在下一次调用redis_poll_messages之前有效
+ * channel和data末尾额外保证有'\0'，但长度以*_len为准 */
+typedef struct RedisMessage {
+    const char* channel;
+    size_t channel_len;
+    const char* data;
+    size_t data_len;
+} RedisMessage;
+
+/* 投递队列统计信息 */
+typedef struct RedisQueueStats {
+    long long capacity;        /* 槽位总数 */
+    long long depth;           /* 当前待取消息数 */
+    long long high_watermark;  /* 历史最大深度 */
+    long long enqueued;        /* 累计入队数 */
+    long long dequeued;        /* 累计出队数 */
+    long long overflow;        /* 队列满时丢弃的消息数 */
+} RedisQueueStats;
+
+/* 发布连接池的连接选择方式 */
+#define REDIS_POOL_ROUND_ROBIN   0  /* 轮询，优先选择空闲连接 */
+#define REDIS_POOL_THREAD_AFFINE 1  /* 按线程固定连接，同一线程的发布保持顺序 */
+
+/* 发布连接池统计信息 */
+typedef struct RedisPoolStats {
+    long long size;            /* 连接数 */
+    long long acquired;        /* 累计获取连接次数 */
+    long long contended;       /* 没有空闲连接、需要等待的次数 */
+    long long wait_total_us;   /* 累计等待时间（微秒） */
+    long long wait_max_us;     /* 单次最长等待时间（微秒） */
+} RedisPoolStats;
+
+/* 异步发布统计信息 */
+typedef struct RedisAsyncStats {
+    long long submitted;       /* 累计提交数 */
+    long long completed;       /* 累计发送成功数 */
+    long long failed;          /* 累计发送失败数 */
+    long long pending;         /* 已提交、尚未完成的消息数 */
+    long long batches;         /* 事件循环发送的批次数 */
+} RedisAsyncStats;
+
+/* 断线重连统计信息 */
+typedef struct RedisReconnectStats {
+    long long reconnects;      /* 累计重连成功次数（订阅、发布连接合计） */
+    long long failed_attempts; /* 累计重连失败次数 */
+    long long disconnected;    /* 当前处于断开状态、等待重连的连接数 */
+    long long last_outage_ms;  /* 最近一次从断开到恢复的时长（毫秒） */
+    long long max_outage_ms;   /* 历史最长断开时长（毫秒） */
+    long long spool_depth;     /* 断开期间积压、等待重连后补发的消息数 */
+    long long spool_max;       /* spool容量（消息数） */
+    long long spool_dropped;   /* spool已满被拒绝的消息数 */
+} RedisReconnectStats;
+
+/* 同步发布时连接断开，消息已进入spool、将在重连后补发（redis_client_publish*的返回值） */
+#define REDIS_PUBLISH_SPOOLED (-2)
+
+/* 分片发布/订阅（Redis Cluster）：频道所在的槽位不属于该节点（MOVED），刷新槽位表后到新节点重试 */
+#define REDIS_PUBLISH_MOVED (-3)
+
+/* 集群槽位数，频道名按CRC16（取"{...}"中的hash tag）对它取模 */
+#define REDIS_CLUSTER_SLOTS 16384
+#define REDIS_CLUSTER_HOST_MAX 256
+
+/* CLUSTER SLOTS中的一段槽位及其主节点（由redis_client_cluster_slots填充） */
+typedef struct RedisClusterSlots {
+    int start;
+    int end;                               /* 含 */
+    int port;
+    char host[REDIS_CLUSTER_HOST_MAX];
+} RedisClusterSlots;
+
+/* 分片频道的槽位已迁移（在订阅分片的事件循环线程中调用，不要在其中执行阻塞操作）
+ * channel不为NULL时，服务器主动取消了该分片频道的订阅（SUNSUBSCRIBE），它已从订阅表中移除；
+ * channel为NULL时，error为订阅命令收到的重定向错误（"MOVED slot host:port"） */
+typedef void (*ClusterMovedHook)(void* userdata, const char* channel, size_t channel_len, const char* error);
+
+/* 订阅分片统计信息（每个分片一项） */
+typedef struct RedisShardStats {
+    long long channels;        /* 分配到该分片的频道数 */
+    long long patterns;        /* 分配到该分片的模式数 */
+    long long messages;        /* 该分片累计收到的消息数 */
+    long long connected;       /* 订阅连接是否正常（1/0） */
+} RedisShardStats;
+
+/* 本地投递统计信息 */
+typedef struct RedisLocalStats {
+    long long delivered;        /* 在发布线程中直接投递给本实例订阅的消息数 */
+    long long echo_suppressed;  /* 丢弃的Redis回传副本数 */
+    long long echo_expired;     /* 超时（10秒）或窗口已满、未等到回传就丢弃的指纹数 */
+} RedisLocalStats;
+
+/* 延迟直方图（纳秒）：对数-线性分桶，每个2的幂区间再分8个桶，相对误差不超过12.5%
+ * 桶i（i<8）对应[i, i+1)；i>=8时令k=(i-8)/8+3、s=(i-8)%8，对应[(8+s)<<(k-3), (9+s)<<(k-3))
+ * 最后一个桶同时计入超出范围（约1100秒以上）的值 */
+#define REDIS_HISTOGRAM_BUCKETS 312
+
+typedef struct RedisHistogram {
+    long long count;
+    long long sum_ns;
+    long long max_ns;
+    long long buckets[REDIS_HISTOGRAM_BUCKETS];
+} RedisHistogram;
+
+/* 客户端统计信息（计数器为累计值，可在任意线程中读取） */
+typedef struct RedisStats {
+    long long messages_in;          /* 订阅连接收到的消息数 */
+    long long bytes_in;             /* 收到消息的负载字节数 */
+    long long messages_out;         /* 发布成功或已进入异步发送队列/spool的消息数 */
+    long long bytes_out;            /* 发布消息的负载字节数 */
+    long long publish_errors;       /* 同步发布失败数 + 异步发布失败数 */
+    long long reconnects;           /* 重连成功次数 */
+    long long slow_callbacks;       /* 执行时间超过慢回调阈值的回调数 */
+    long long channels_tracked;     /* 有独立计数器的频道数 */
+    long long conflated;            /* 合并投递的频道上被更新的消息覆盖、没有投递的消息数 */
+    long long filtered;             /* 不满足订阅的过滤条件（或批量订阅的记录长度）、没有投递的消息数 */
+    RedisHistogram publish_rtt;     /* 发布往返时间：同步为一次PUBLISH或一批管道，异步为提交到收到回复 */
+    RedisHistogram callback_time;   /* 订阅回调执行时间（队列模式不计入） */
+} RedisStats;
+
+/* 单个频道的统计信息（由redis_client_get_channel_stats填充）
+ * channel指向库内部保存的频道名（末尾有'\0'），在redis_client_free之前有效 */
+typedef struct RedisChannelStats {
+    const char* channel;
+    size_t channel_len;
+    long long messages_in;
+    long long bytes_in;
+    long long messages_out;
+    long long bytes_out;
+    long long conflated;
+} RedisChannelStats;
+
+/* ==================== 过滤条件 ==================== */
+
+/* 过滤条件类型（对原始payload求值） */
+#define REDIS_FILTER_PREFIX     0   /* payload以value开头 */
+#define REDIS_FILTER_CONTAINS   1   /* payload包含value */
+#define REDIS_FILTER_BYTES      2   /* payload从offset起的value_len个字节等于value */
+#define REDIS_FILTER_JSON_FIELD 3   /* payload是JSON对象，顶层字段field的值按JSON文本等于value（例如"\"eu\""、42、true） */
+#define REDIS_FILTER_COMPRESSED 4   /* 标记而非条件：订阅的payload带redis_compress头部，未压缩的跳过头部求值，
+                                     * 压缩过的无法求值、直接通过；没有该标记时以魔数开头的payload照常求值 */
+
+/* 一个过滤条件，字符串在redis_client_set_filter中复制，调用后即可释放 */
+typedef struct RedisFilter {
+    int type;
+    int negate;                 /* 1表示取反（不满足时通过） */
+    size_t offset;              /* REDIS_FILTER_BYTES的起始偏移 */
+    const char* field;          /* REDIS_FILTER_JSON_FIELD的字段名（按原始JSON文本比较，不处理转义） */
+    size_t field_len;
+    const char* value;
+    size_t value_len;
+} RedisFilter;
+
+/* 一个订阅的过滤统计 */
+typedef struct RedisFilterStats {
+    long long passed;           /* 满足过滤条件、已投递的消息数 */
+    long long rejected;         /* 被拒绝的消息数 */
+} RedisFilterStats;
+
+/* ==================== Streams ==================== */
+
+#define REDIS_STREAM_ID_MAX 48      /* 流条目ID（"毫秒-序号"）加'\0'的最大长度 */
+#define REDIS_STREAM_FIELD  "data"  /* 负载保存在条目的这个字段中 */
+
+/* redis_stream_reader_read返回的一个条目，指针指向读取器保存的回复，在下一次读取或释放读取器之前有效 */
+typedef struct RedisStreamEntry {
+    const char* stream;
+    size_t stream_len;
+    const char* id;
+    size_t id_len;
+    const char* data;           /* REDIS_STREAM_FIELD字段的值（没有该字段时为第一个字段的值） */
+    size_t data_len;
+} RedisStreamEntry;
+
+/* 流读取器统计信息 */
+typedef struct RedisStreamReaderStats {
+    long long reads;            /* XREADGROUP次数 */
+    long long entries;          /* 读到的条目数 */
+    long long acked;            /* Redis确认的XACK条目数 */
+    long long pending_acks;     /* 已排队、尚未随下一次读取发出的XACK命令数 */
+    long long reconnects;       /* 读取连接重连成功次数 */
+} RedisStreamReaderStats;
+
+/* 流读取器：消费者组中的一个消费者，拥有独立的阻塞连接（XREADGROUP BLOCK期间不占用发布连接池），
+ * 同一读取器只能在一个线程中使用 */
+typedef struct redis_stream_reader redis_stream_reader;
+
+/* ==================== 客户端实例（句柄接口） ====================
+ * 每个实例拥有独立的发布/订阅连接、事件循环线程、订阅表和投递队列，
+ * 同一进程内可以创建多个实例（例如每个工作线程一个发布者，或连接多个Redis服务器）。
+ * 订阅连接和异步发布连接都是非阻塞的，由事件循环线程（poll）驱动，
+ * 不再为每类连接各占一个阻塞线程；同步发布仍在调用线程中使用发布连接池。
+ * 订阅可以分为多个分片，每个分片有自己的订阅连接和事件循环线程（见redis_client_set_subscriber_shards）。
+ * 同一实例的函数可以在多个线程中调用；回调在该实例的事件循环线程中执行，
+ * 不能在回调中调用redis_client_close/redis_client_free。 */
+typedef struct redis_client redis_client;
+
+/* 创建/销毁实例，redis_client_free会先关闭连接 */
+REDIS_PUBSUB_API redis_client* redis_client_new(void);
+REDIS_PUBSUB_API void redis_client_free(redis_client* client);
+
+/* 连接/关闭，关闭时等待事件循环发送完异步消息并退出 */
+REDIS_PUBSUB_API int redis_client_connect(redis_client* client, const char* hostname, int port);
+REDIS_PUBSUB_API int redis_client_close(redis_client* client);
+
+/* 发布消息，语义与对应的redis_publish*相同 */
+REDIS_PUBSUB_API int redis_client_publish(redis_client* client, const char* channel, const char* message);
+REDIS_PUBSUB_API int redis_client_publish_binary(redis_client* client,
+                                                 const char* channel, size_t channel_len,
+                                                 const char* message, size_t message_len);
+REDIS_PUBSUB_API int redis_client_publish_batch(redis_client* client, int count,
+                                                const char** channels, const size_t* channel_lens,
+                                                const char** messages, const size_t* message_lens,
+                                                int* results);
+
+/* 设置发布连接池（连接数1~64，mode为REDIS_POOL_*），只能在连接前调用，默认1个连接
+ * 每个发布连接独立加锁，发布不再与订阅分发或其他线程的发布共用同一把锁 */
+REDIS_PUBSUB_API int redis_client_set_publish_pool(redis_client* client, int size, int mode);
+
+/* 获取发布连接池统计信息 */
+REDIS_PUBSUB_API int redis_client_get_pool_stats(redis_client* client, RedisPoolStats* stats);
+
+/* 异步发布（不等待回复）：消息复制到原生队列后立即返回，
+ * 由事件循环通过专用连接合并为管道写出（攒够max_batch条或等待linger_ms后发送）
+ * callback可为NULL；不为NULL时在事件循环线程中收到订阅者数量
+ * 返回消息序号（从1开始递增），错误返回-1；未完成消息超过max_pending时阻塞等待 */
+REDIS_PUBSUB_API long long redis_client_publish_nowait(redis_client* client,
+                                                       const char* channel, size_t channel_len,
+                                                       const char* message, size_t message_len,
+                                                       PublishCompletion callback, void* userdata);
+
+/* 等待调用前提交的所有异步消息发送完成
+ * timeout_ms: <0表示一直等待；返回0表示已完成，超时返回-1 */
+REDIS_PUBSUB_API int redis_client_flush(redis_client* client, int timeout_ms);
+
+/* 设置异步发布参数，对之后提交的消息生效
+ * 默认max_batch=1024，max_pending=65536，linger_ms=0（事件循环被唤醒后立即发送） */
+REDIS_PUBSUB_API int redis_client_set_async_publish(redis_client* client, int max_batch,
+                                                    int max_pending, int linger_ms);
+
+/* 获取异步发布统计信息 */
+REDIS_PUBSUB_API int redis_client_get_async_stats(redis_client* client, RedisAsyncStats* stats);
+
+/* 设置断线重连（默认启用：initial_ms=100，max_ms=5000，spool_max=10000）
+ * 连接断开后立即重连一次，之后按initial_ms起、每次翻倍、不超过max_ms的退避时间（带随机抖动）重试。
+ * 订阅连接恢复后，订阅表中的全部频道/模式各用一条SUBSCRIBE/PSUBSCRIBE重新订阅；
+ * 断开期间的订阅/取消订阅只更新订阅表，立即返回成功。
+ * 断开期间的发布进入spool（异步发布队列，最多spool_max条），重连后以管道一次补发：
+ * 同步发布返回REDIS_PUBLISH_SPOOLED，spool已满时返回-1；异步发布不再因max_pending阻塞。
+ * 已写出但未收到回复的异步消息无法确认是否送达，按失败通知。
+ * 同步发布连接在下一次发布时才重连，空闲期间仍计入disconnected。
+ * initial_ms为0时关闭自动重连（断开后发布返回-1，订阅连接不再恢复） */
+REDIS_PUBSUB_API int redis_client_set_reconnect(redis_client* client, int initial_ms, int max_ms,
+                                                int spool_max);
+
+/* 获取断线重连统计信息 */
+REDIS_PUBSUB_API int redis_client_get_reconnect_stats(redis_client* client, RedisReconnectStats* stats);
+
+/* 设置订阅分片数（1~64），只能在连接前调用，默认1个分片
+ * 频道/模式按名称哈希固定分配到分片，每个分片使用独立的订阅连接和事件循环线程，
+ * 不同分片的RESP解析和消息分发在各自线程中并行执行；异步发布由0号分片的事件循环驱动。
+ * 同一频道的消息总在同一个线程中按顺序回调，不同分片的回调可能并发执行 */
+REDIS_PUBSUB_API int redis_client_set_subscriber_shards(redis_client* client, int count);
+
+/* 获取各分片的统计信息，最多写入max_count项，返回写入的项数（未连接过时为0），错误返回-1 */
+REDIS_PUBSUB_API int redis_client_get_shard_stats(redis_client* client, RedisShardStats* stats,
+                                                  int max_count);
+
+/* 使用分片发布/订阅（Redis 7 Cluster的SPUBLISH/SSUBSCRIBE/SUNSUBSCRIBE），只能在连接前调用
+ * 实例只连接一个节点，只应发布/订阅槽位属于该节点的频道（由调用方按redis_cluster_keyslot路由）；
+ * 不支持模式订阅。槽位不属于该节点时发布返回REDIS_PUBLISH_MOVED，订阅由moved_hook通知 */
+REDIS_PUBSUB_API int redis_client_set_sharded_pubsub(redis_client* client, int enabled);
+
+/* 设置槽位迁移通知（见ClusterMovedHook），只能在连接前调用，hook为NULL时关闭 */
+REDIS_PUBSUB_API int redis_client_set_moved_handler(redis_client* client, ClusterMovedHook hook, void* userdata);
+
+/* 查询所连节点的CLUSTER SLOTS，最多写入max_count段，返回写入的段数，错误返回-1 */
+REDIS_PUBSUB_API int redis_client_cluster_slots(redis_client* client, RedisClusterSlots* slots, int max_count);
+
+/* 频道名的集群槽位（0~16383），与Redis的CLUSTER KEYSLOT相同 */
+REDIS_PUBSUB_API int redis_cluster_keyslot(const char* key, size_t key_len);
+
+/* 设置本地投递（默认关闭，可随时调用）
+ * enabled为1时，publish/publish_binary/publish_batch/publish_nowait照常把消息发送到Redis供其他进程订阅，
+ * 消息发出（收到回复、进入spool或进入异步发布队列）后在调用线程中直接投递给本实例对该频道的订阅
+ * （回调或投递队列），发送失败的消息不在本地投递；
+ * 只匹配普通订阅，模式订阅仍只通过Redis收到消息。本地投递的回调在发布线程中执行，
+ * 可能与事件循环线程中的回调并发。
+ * suppress_echo为1时丢弃Redis回传给本实例的副本：按消息内容指纹（哈希+长度）匹配，
+ * 每个频道最多记录256条、10秒内未回传的记录作废；其他进程在此期间发布的内容完全相同的消息也可能被当作副本丢弃。
+ * suppress_echo为0时该频道的订阅会收到两次（本地一次、Redis回传一次） */
+REDIS_PUBSUB_API int redis_client_set_local_delivery(redis_client* client, int enabled, int suppress_echo);
+
+/* 获取本地投递统计信息 */
+REDIS_PUBSUB_API int redis_client_get_local_stats(redis_client* client, RedisLocalStats* stats);
+
+/* 获取统计信息（计数器和直方图都用原子操作更新，读取时不加锁，各字段之间不保证是同一时刻的快照） */
+REDIS_PUBSUB_API int redis_client_get_stats(redis_client* client, RedisStats* stats);
+
+/* 获取各频道的收发计数，最多写入max_count项，返回写入的项数，错误返回-1
+ * 收到的消息按实际频道名计数（模式订阅也一样） */
+REDIS_PUBSUB_API int redis_client_get_channel_stats(redis_client* client, RedisChannelStats* stats,
+                                                    int max_count);
+
+/* 设置最多为多少个频道单独计数（默认1024，0表示不按频道计数）
+ * 频道计数器创建后一直保留到redis_client_free，超出上限的频道只计入总数 */
+REDIS_PUBSUB_API int redis_client_set_channel_stats(redis_client* client, int max_channels);
+
+/* 设置慢回调阈值：回调执行时间达到threshold_us时计入slow_callbacks，hook不为NULL时同时调用hook
+ * threshold_us为0时关闭；hook在执行慢回调的线程中、回调返回后调用 */
+REDIS_PUBSUB_API int redis_client_set_slow_handler(redis_client* client, long long threshold_us,
+                                                   SlowHandlerHook hook, void* userdata);
+
+/* 以管道方式追加一批流条目（每条一个XADD，一次网络往返）
+ * 负载保存在REDIS_STREAM_FIELD字段中；maxlen大于0时附带"MAXLEN ~ maxlen"近似裁剪
+ * ids不为NULL时写入每条的ID（count * REDIS_STREAM_ID_MAX字节，每项以'\0'结尾，失败的项为空字符串）
+ * 返回成功追加的条目数，连接错误返回-1 */
+REDIS_PUBSUB_API int redis_client_stream_add(redis_client* client, int count,
+                                             const char** streams, const size_t* stream_lens,
+                                             const char** messages, const size_t* message_lens,
+                                             long long maxlen, char* ids);
+
+/* 创建消费者组（XGROUP CREATE ... MKSTREAM），start_id为"$"（只读新条目）或"0"（从头读）
+ * 组已存在时也返回0 */
+REDIS_PUBSUB_API int redis_client_stream_group_create(redis_client* client,
+                                                      const char* stream, size_t stream_len,
+                                                      const char* group, size_t group_len,
+                                                      const char* start_id);
+
+/* 创建/释放流读取器，连接到客户端当前连接的服务器；释放前会发出已排队的XACK */
+REDIS_PUBSUB_API redis_stream_reader* redis_client_stream_reader_new(redis_client* client,
+                                                                     const char* group, size_t group_len,
+                                                                     const char* consumer, size_t consumer_len);
+REDIS_PUBSUB_API void redis_stream_reader_free(redis_stream_reader* reader);
+
+/* 从stream_count个流读取（XREADGROUP GROUP g c COUNT count BLOCK block_ms STREAMS ... id ...）
+ * id为">"时读取新条目，为"0"时重读本消费者已读取、尚未确认的条目；block_ms为0时不等待
+ * 已排队的XACK与XREADGROUP一起写出，只占用同一次网络往返
+ * buffer至少要有count * stream_count项；返回读到的条目数，超时返回0，错误返回-1 */
+REDIS_PUBSUB_API int redis_stream_reader_read(redis_stream_reader* reader, int stream_count,
+                                              const char** streams, const size_t* stream_lens,
+                                              const char* id, int count, int block_ms,
+                                              RedisStreamEntry* buffer, int max_entries);
+
+/* 排队确认一批条目（一条XACK），随下一次redis_stream_reader_read或redis_stream_reader_flush发出 */
+REDIS_PUBSUB_API int redis_stream_reader_ack(redis_stream_reader* reader,
+                                             const char* stream, size_t stream_len, int count,
+                                             const char** ids, const size_t* id_lens);
+
+/* 立即发出已排队的XACK并等待回复，返回确认的条目数，错误返回-1 */
+REDIS_PUBSUB_API int redis_stream_reader_flush(redis_stream_reader* reader);
+
+/* 获取读取器统计信息 */
+REDIS_PUBSUB_API int redis_stream_reader_get_stats(redis_stream_reader* reader, RedisStreamReaderStats* stats);
+
+/* 订阅/模式订阅，语义与对应的redis_subscribe*、redis_psubscribe*相同 */
+REDIS_PUBSUB_API int redis_client_subscribe(redis_client* client, const char* channel,
+                                            PubSubCallback callback);
+REDIS_PUBSUB_API int redis_client_subscribe_binary(redis_client* client,
+                                                   const char* channel, size_t channel_len,
+                                                   PubSubBinaryCallback callback);
+REDIS_PUBSUB_API int redis_client_subscribe_queued(redis_client* client,
+                                                   const char* channel, size_t channel_len);
+REDIS_PUBSUB_API int redis_client_subscribe_many(redis_client* client, int count,
+                                                 const char** channels, const size_t* channel_lens,
+                                                 PubSubBinaryCallback callback);
+REDIS_PUBSUB_API int redis_client_subscribe_many_queued(redis_client* client, int count,
+                                                        const char** channels, const size_t* channel_lens);
+REDIS_PUBSUB_API int redis_client_unsubscribe(redis_client* client,
+                                              const char* channel, size_t channel_len);
+REDIS_PUBSUB_API int redis_client_unsubscribe_many(redis_client* client, int count,
+                                                   const char** channels, const size_t* channel_lens);
+REDIS_PUBSUB_API int redis_client_set_conflation(redis_client* client,
+                                                 const char* channel, size_t channel_len, int enabled);
+REDIS_PUBSUB_API int redis_client_set_filter(redis_client* client, int is_pattern,
+                                             const char* name, size_t name_len,
+                                             int count, const RedisFilter* filters);
+REDIS_PUBSUB_API int redis_client_get_filter_stats(redis_client* client, int is_pattern,
+                                                   const char* name, size_t name_len,
+                                                   RedisFilterStats* stats);
+/* 暂存名称的订阅选项（合并投递、过滤条件），下一次订阅该名称（新订阅或替换处理方式）时在发送SUBSCRIBE之前生效，
+ * 因此从第一条消息起就按这些选项投递；订阅失败时用redis_client_discard_options丢弃 */
+REDIS_PUBSUB_API int redis_client_stage_options(redis_client* client, int is_pattern,
+                                                const char* name, size_t name_len, int conflate,
+                                                int filter_count, const RedisFilter* filters);
+REDIS_PUBSUB_API int redis_client_discard_options(redis_client* client, int is_pattern,
+                                                  const char* name, size_t name_len);
+REDIS_PUBSUB_API int redis_client_psubscribe(redis_client* client, const char* pattern,
+                                             PubSubCallback callback);
+REDIS_PUBSUB_API int redis_client_psubscribe_binary(redis_client* client,
+                                                    const char* pattern, size_t pattern_len,
+                                                    PubSubBinaryCallback callback);
+REDIS_PUBSUB_API int redis_client_psubscribe_queued(redis_client* client,
+                                                    const char* pattern, size_t pattern_len);
+REDIS_PUBSUB_API int redis_client_punsubscribe(redis_client* client,
+                                               const char* pattern, size_t pattern_len);
+
+/* 订阅/模式订阅，回调额外收到userdata，其余语义与redis_client_subscribe_binary相同
+ * 取消订阅返回时事件循环可能仍在投递该订阅的最后一条消息，userdata应至少保持有效到redis_client_close返回 */
+REDIS_PUBSUB_API int redis_client_subscribe_data(redis_client* client,
+                                                 const char* channel, size_t channel_len,
+                                                 PubSubDataCallback callback, void* userdata);
+REDIS_PUBSUB_API int redis_client_psubscribe_data(redis_client* client,
+                                                  const char* pattern, size_t pattern_len,
+                                                  PubSubDataCallback callback, void* userdata);
+REDIS_PUBSUB_API int redis_client_subscribe_batch(redis_client* client,
+                                                  const char* channel, size_t channel_len,
+                                                  int max_batch, int max_delay_ms, size_t record_size,
+                                                  PubSubBatchCallback callback, void* userdata);
+
+/* 投递队列，语义与对应的redis_*相同 */
+REDIS_PUBSUB_API int redis_client_set_queue_capacity(redis_client* client, int capacity);
+REDIS_PUBSUB_API int redis_client_poll_messages(redis_client* client, RedisMessage* buffer,
+                                                int max_count, int timeout_ms);
+REDIS_PUBSUB_API int redis_client_get_queue_stats(redis_client* client, RedisQueueStats* stats);
+REDIS_PUBSUB_API long long redis_client_get_wakeup_fd(redis_client* client);
+REDIS_PUBSUB_API int redis_client_process_messages(redis_client* client, int timeout_ms);
+
+/* ==================== 旧接口 ====================
+ * 以下函数作用于进程内的一个默认实例（首次调用redis_init时创建），保持与旧版本兼容 */
+
 /* 初始化连接 */
 REDIS_PUBSUB_API int redis_init(const char* hostname, int port);
 
@@ -19,10 +465,134 @@ REDIS_PUBSUB_API int redis_close();
 /* 发布消息 */
 REDIS_PUBSUB_API int redis_publish(const char* channel, const char* message);
 
+/* 发布消息（二进制安全，显式长度） */
+REDIS_PUBSUB_API int redis_publish_binary(const char* channel, size_t channel_len,
+                                          const char* message, size_t message_len);
+
+/* 批量发布消息（管道，一次写出、一次收齐回复）
+ * channel_lens/message_lens 可为NULL（按字符串长度计算）
+ * results 可为NULL，否则写入每条消息的订阅者数量（失败为-1）
+ * 返回成功发布的消息数，连接错误返回-1 */
+REDIS_PUBSUB_API int redis_publish_batch(int count,
+                                         const char** channels, const size_t* channel_lens,
+                                         const char** messages, const size_t* message_lens,
+                                         int* results);
+
+/* 设置/查询默认实例的发布连接池 */
+REDIS_PUBSUB_API int redis_set_publish_pool(int size, int mode);
+REDIS_PUBSUB_API int redis_get_pool_stats(RedisPoolStats* stats);
+
+/* 默认实例的异步发布 */
+REDIS_PUBSUB_API int redis_set_async_publish(int max_batch, int max_pending, int linger_ms);
+REDIS_PUBSUB_API long long redis_publish_nowait(const char* channel, size_t channel_len,
+                                                const char* message, size_t message_len,
+                                                PublishCompletion callback, void* userdata);
+REDIS_PUBSUB_API int redis_flush(int timeout_ms);
+REDIS_PUBSUB_API int redis_get_async_stats(RedisAsyncStats* stats);
+
+/* 设置/查询默认实例的断线重连 */
+REDIS_PUBSUB_API int redis_set_reconnect(int initial_ms, int max_ms, int spool_max);
+REDIS_PUBSUB_API int redis_get_reconnect_stats(RedisReconnectStats* stats);
+
+/* 设置/查询默认实例的订阅分片 */
+REDIS_PUBSUB_API int redis_set_subscriber_shards(int count);
+REDIS_PUBSUB_API int redis_get_shard_stats(RedisShardStats* stats, int max_count);
+
+/* 默认实例的分片发布/订阅 */
+REDIS_PUBSUB_API int redis_set_sharded_pubsub(int enabled);
+REDIS_PUBSUB_API int redis_set_moved_handler(ClusterMovedHook hook, void* userdata);
+REDIS_PUBSUB_API int redis_cluster_slots(RedisClusterSlots* slots, int max_count);
+
+/* 默认实例的统计信息 */
+REDIS_PUBSUB_API int redis_get_stats(RedisStats* stats);
+REDIS_PUBSUB_API int redis_get_channel_stats(RedisChannelStats* stats, int max_count);
+REDIS_PUBSUB_API int redis_set_channel_stats(int max_channels);
+REDIS_PUBSUB_API int redis_set_slow_handler(long long threshold_us, SlowHandlerHook hook, void* userdata);
+
+/* 设置/查询默认实例的本地投递 */
+REDIS_PUBSUB_API int redis_set_local_delivery(int enabled, int suppress_echo);
+REDIS_PUBSUB_API int redis_get_local_stats(RedisLocalStats* stats);
+
+/* 默认实例的Streams */
+REDIS_PUBSUB_API int redis_stream_add(int count, const char** streams, const size_t* stream_lens,
+                                      const char** messages, const size_t* message_lens,
+                                      long long maxlen, char* ids);
+REDIS_PUBSUB_API int redis_stream_group_create(const char* stream, size_t stream_len,
+                                               const char* group, size_t group_len, const char* start_id);
+REDIS_PUBSUB_API redis_stream_reader* redis_stream_reader_new(const char* group, size_t group_len,
+                                                              const char* consumer, size_t consumer_len);
+
 /* 订阅频道（异步） */
 REDIS_PUBSUB_API int redis_subscribe(const char* channel, PubSubCallback callback);
 
-/* 处理订阅消息（需要在主线程调用） */
+/* 订阅频道（二进制安全，回调携带显式长度） */
+REDIS_PUBSUB_API int redis_subscribe_binary(const char* channel, size_t channel_len,
+                                            PubSubBinaryCallback callback);
+
+/* 订阅频道（队列模式）：消息进入预分配的环形队列，由redis_poll_messages批量取出 */
+REDIS_PUBSUB_API int redis_subscribe_queued(const char* channel, size_t channel_len);
+
+/* 批量订阅频道：按分片合并为一条SUBSCRIBE，各分片的命令先全部提交再等待确认，
+ * 订阅N个频道只需要一个网络往返；所有频道共用一个回调（或进入投递队列），已订阅的频道只替换处理方式 */
+REDIS_PUBSUB_API int redis_subscribe_many(int count, const char** channels, const size_t* channel_lens,
+                                          PubSubBinaryCallback callback);
+REDIS_PUBSUB_API int redis_subscribe_many_queued(int count, const char** channels, const size_t* channel_lens);
+
+/* 订阅频道（批量投递）：事件循环把该频道的消息依次复制到一块连续缓冲区，
+ * 攒够max_batch条，或第一条到达后经过max_delay_ms毫秒（0表示本轮读取结束时）才调用一次回调，
+ * 回调次数由消息速率/max_batch决定而不是每条一次；关闭连接时未满的批次也会投递。
+ * record_size不为0时只接受长度等于record_size的消息（定长记录，data可直接按记录数组解释），
+ * 其他长度的消息丢弃并计入RedisStats.filtered。本地投递的消息以1条的批次立即投递 */
+REDIS_PUBSUB_API int redis_subscribe_batch(const char* channel, size_t channel_len,
+                                           int max_batch, int max_delay_ms, size_t record_size,
+                                           PubSubBatchCallback callback, void* userdata);
+
+/* 取消订阅频道；批量版本按分片合并为一条UNSUBSCRIBE，跳过未订阅的频道并返回取消的频道数 */
+REDIS_PUBSUB_API int redis_unsubscribe(const char* channel, size_t channel_len);
+REDIS_PUBSUB_API int redis_unsubscribe_many(int count, const char** channels, const size_t* channel_lens);
+
+/* 开启/关闭已订阅频道的合并投递（只保留最新值，不支持模式订阅）
+ * 事件循环把连接上已到达的数据读完（最多约1MB）后，每个合并频道只投递其中最新的一条，
+ * 回调执行期间积压的消息因此只触发一次回调；被覆盖的消息计入RedisStats/RedisChannelStats的conflated。
+ * 频道取消订阅后设置随之清除，本地投递的消息不合并 */
+REDIS_PUBSUB_API int redis_set_conflation(const char* channel, size_t channel_len, int enabled);
+
+/* 设置已订阅频道（is_pattern为1时为模式）的过滤条件：count个条件全部满足的消息才投递，count为0时清除
+ * 条件在事件循环线程（本地投递时在发布线程）中求值，被拒绝的消息不调用回调、不进入投递队列，
+ * 计入RedisStats.filtered；重复设置时替换原有条件并清零该订阅的过滤统计。取消订阅后条件随之清除 */
+REDIS_PUBSUB_API int redis_set_filter(int is_pattern, const char* name, size_t name_len,
+                                      int count, const RedisFilter* filters);
+
+/* 获取订阅的过滤统计，没有设置过滤条件时各项为0 */
+REDIS_PUBSUB_API int redis_get_filter_stats(int is_pattern, const char* name, size_t name_len,
+                                            RedisFilterStats* stats);
+
+/* 模式订阅（PSUBSCRIBE，glob风格），回调收到的是实际频道名
+ * 可与普通订阅共用同一个订阅连接 */
+REDIS_PUBSUB_API int redis_psubscribe(const char* pattern, PubSubCallback callback);
+REDIS_PUBSUB_API int redis_psubscribe_binary(const char* pattern, size_t pattern_len,
+                                             PubSubBinaryCallback callback);
+REDIS_PUBSUB_API int redis_psubscribe_queued(const char* pattern, size_t pattern_len);
+
+/* 取消模式订阅 */
+REDIS_PUBSUB_API int redis_punsubscribe(const char* pattern, size_t pattern_len);
+
+/* 设置投递队列容量（槽位数），只能在队列为空时调用 */
+REDIS_PUBSUB_API int redis_set_queue_capacity(int capacity);
+
+/* 批量取出队列中的消息
+ * timeout_ms: 0表示不等待，<0表示一直等待直到有消息
+ * 返回取出的消息数，错误返回-1 */
+REDIS_PUBSUB_API int redis_poll_messages(RedisMessage* buffer, int max_count, int timeout_ms);
+
+/* 获取投递队列统计信息 */
+REDIS_PUBSUB_API int redis_get_queue_stats(RedisQueueStats* stats);
+
+/* 获取投递队列的唤醒描述符（Windows下为SOCKET，其他平台为socketpair的一端）
+ * 队列由空变为非空时变为可读，poll把队列取空后复位，可交给select/事件循环监听 */
+REDIS_PUBSUB_API long long redis_get_wakeup_fd(void);
+
+/* 等待队列中有消息或超时，返回当前队列深度（兼容旧接口） */
 REDIS_PUBSUB_API int redis_process_messages(int timeout_ms);
 
 #endif /* REDIS_PUBSUB_H */
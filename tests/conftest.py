@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+测试公共设施
+
+测试连接bench/resp_server.py启动的本地服务器（本机有redis-server时使用它，否则使用替身服务器），
+不需要预先运行Redis；库文件没有编译时跳过全部测试。
+"""
+
+import os
+import sys
+import time
+from typing import Callable
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+from redis_client import RedisPubSubDLL
+from resp_server import LocalServer
+
+
+def wait_until(predicate: Callable[[], bool], timeout: float = 5.0) -> bool:
+    """轮询predicate直到为真，超时返回False"""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture(scope="session")
+def server():
+    with LocalServer() as server:
+        yield server
+
+
+@pytest.fixture
+def make_client(server):
+    """
+    创建并连接客户端：make_client(setup=None, target=None)
+    setup(client)在connect()之前调用（设置分片数、重连参数等），target默认为会话级的server
+    """
+    clients = []
+
+    def make(setup=None, target=None) -> RedisPubSubDLL:
+        try:
+            client = RedisPubSubDLL()
+        except FileNotFoundError:
+            pytest.skip("redis_pubsub library is not built")
+        clients.append(client)
+        if setup is not None:
+            setup(client)
+        target = target or server
+        assert client.connect(target.host, target.port)
+        return client
+
+    yield make
+    for client in clients:
+        if client.is_connected():
+            client.disconnect()
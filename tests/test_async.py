@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""asyncio客户端：订阅后、listen()之前收到的消息暂存在backlog中，不会被丢弃"""
+
+import asyncio
+import uuid
+
+import pytest
+
+from redis_async import AsyncRedisPubSub
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 10))
+
+
+async def take(client, count, *channels):
+    received = []
+    async for message in client.listen(*channels):
+        received.append((message.channel, message.data))
+        if len(received) == count:
+            break
+    return received
+
+
+@pytest.fixture
+def async_client():
+    try:
+        return AsyncRedisPubSub()
+    except FileNotFoundError:
+        pytest.skip("redis_pubsub library is not built")
+
+
+def test_messages_before_listen_are_kept(async_client, make_client, server):
+    publisher = make_client()
+    first = f"test:async:{uuid.uuid4().hex}"
+    second = f"test:async:{uuid.uuid4().hex}"
+
+    async def scenario():
+        async with async_client as client:
+            assert await client.connect(server.host, server.port)
+            assert await client.subscribe(first, second)
+            for i in range(3):
+                assert await client.publish_many([(first, f"a{i}"), (second, f"b{i}")]) == [1, 1]
+            await asyncio.sleep(0.2)
+
+            # 只监听first：second的消息留在backlog中，交给之后监听second的listen()
+            assert await take(client, 3, first) == [(first, f"a{i}".encode()) for i in range(3)]
+            assert await take(client, 3, second) == [(second, f"b{i}".encode()) for i in range(3)]
+
+            # listen()自动订阅的频道：订阅确认后立即发布的消息由它收到
+            third = f"test:async:{uuid.uuid4().hex}"
+            listening = asyncio.ensure_future(take(client, 1, third))
+            while third not in client._subscribed:
+                await asyncio.sleep(0.01)
+            assert await client.publish(third, "c") == 1
+            assert await listening == [(third, b"c")]
+            assert not client._backlog
+
+    run(scenario())
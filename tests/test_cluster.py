@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""集群分片发布/订阅：按槽位路由、MOVED后重试、槽位迁移后重新订阅（替身集群）"""
+
+import threading
+
+import pytest
+
+from conftest import wait_until
+from redis_cluster import RedisClusterPubSub
+from resp_server import LocalCluster, keyslot, split_slots
+
+
+@pytest.fixture
+def cluster():
+    with LocalCluster(3) as cluster:
+        yield cluster
+
+
+@pytest.fixture
+def make_cluster_client(cluster):
+    clients = []
+
+    def make() -> RedisClusterPubSub:
+        client = RedisClusterPubSub()
+        clients.append(client)
+        try:
+            assert client.connect(cluster.startup_nodes)
+        except FileNotFoundError:
+            pytest.skip("redis_pubsub library is not built")
+        return client
+
+    yield make
+    for client in clients:
+        client.disconnect()
+
+
+class Collector:
+    def __init__(self):
+        self.messages = []
+        self.lock = threading.Lock()
+
+    def __call__(self, message):
+        with self.lock:
+            self.messages.append((message.channel, message.data))
+
+    def take(self):
+        with self.lock:
+            messages, self.messages = self.messages, []
+        return messages
+
+
+def owner(cluster, channel):
+    slot = keyslot(channel.encode())
+    for start, end, host, port in cluster.slot_map():
+        if start <= slot <= end:
+            return host, port
+
+
+def test_routes_by_slot(cluster, make_cluster_client):
+    subscriber = make_cluster_client()
+    publisher = make_cluster_client()
+    channels = [f"test:cluster:{i}" for i in range(30)]
+    collector = Collector()
+    assert subscriber.subscribe_many(channels, collector, binary=True)
+
+    for channel in channels:
+        assert subscriber.slot_for(channel) == keyslot(channel.encode())
+        assert subscriber._node_address(channel) == owner(cluster, channel)
+    assert publisher.publish_many([(channel, channel.encode()) for channel in channels]) == [1] * len(channels)
+    assert wait_until(lambda: len(collector.messages) == len(channels))
+    assert sorted(collector.take()) == sorted((channel, channel.encode()) for channel in channels)
+
+    # 每个节点只收到自己槽位上的频道的消息
+    expected = {}
+    for channel in channels:
+        host, port = owner(cluster, channel)
+        expected[f"{host}:{port}"] = expected.get(f"{host}:{port}", 0) + 1
+    assert {node: stats['messages_in'] for node, stats in subscriber.stats().items() if stats['messages_in']} == expected
+
+
+def test_publish_retries_after_moved(cluster, make_cluster_client):
+    publisher = make_cluster_client()
+    start, end = split_slots(3)[0]
+    channel = next(name for name in (f"test:cluster:{i}" for i in range(100))
+                   if start <= keyslot(name.encode()) <= end)
+    refreshes = publisher.refreshes
+
+    # 发布端的槽位表已过期：第一次SPUBLISH收到MOVED，刷新后发往新节点
+    cluster.move_slots(start, end, 2)
+    assert publisher.publish(channel, b"after move") == 0
+    assert publisher.refreshes > refreshes
+    assert publisher._node_address(channel) == owner(cluster, channel)
+
+
+def test_subscriptions_follow_migration(cluster, make_cluster_client):
+    subscriber = make_cluster_client()
+    publisher = make_cluster_client()
+    channels = [f"test:cluster:{i}" for i in range(30)]
+    collector = Collector()
+    assert subscriber.subscribe_many(channels, collector, binary=True)
+    assert publisher.publish_many([(channel, b"before") for channel in channels]) == [1] * len(channels)
+    assert wait_until(lambda: len(collector.messages) == len(channels))
+    collector.take()
+
+    start, end = split_slots(3)[0]
+    moved = [channel for channel in channels if start <= keyslot(channel.encode()) <= end]
+    assert moved
+    cluster.move_slots(start, end, 2)
+
+    # 服务器取消0号节点上的订阅后，订阅端在后台刷新槽位表并在2号节点重新订阅
+    assert wait_until(lambda: all(publisher.publish(channel, b"probe") == 1 for channel in moved), timeout=10)
+    messages = [(channel, f"m{i}".encode()) for i in range(20) for channel in channels]
+    assert all(result == 1 for result in publisher.publish_many(messages))
+    received = []
+
+    def all_received():
+        received.extend(item for item in collector.take() if item[1] != b"probe")
+        return len(received) == len(messages)
+
+    assert wait_until(all_received)
+    for channel in channels:
+        assert [data for name, data in received if name == channel] == [f"m{i}".encode() for i in range(20)]
+
+    # 不再持有槽位的0号节点保留在统计中，迁移前收到的消息仍然计入
+    host, port = cluster.startup_nodes[0]
+    assert subscriber.stats()[f"{host}:{port}"]['messages_in'] >= len(moved)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""压缩：只有开启了压缩的频道才解析头部，其他频道的二进制payload原样投递"""
+
+import threading
+import uuid
+
+import pytest
+
+from redis_compress import MAGIC, Compression
+from redis_filter import prefix
+
+# 以魔数开头、看起来像压缩头部的原始二进制payload
+COLLIDING = MAGIC + b'\x00\xff\x10not deflate'
+
+
+def test_unconfigured_channel_passes_magic_payload_through():
+    compression = Compression()
+    compression.configure("other", threshold=0)
+    assert compression.decompress("raw", COLLIDING) == COLLIDING
+    assert compression.stats() == {}
+
+
+def test_configured_channel_frames_every_payload():
+    compression = Compression()
+    compression.configure("zipped", threshold=64)
+    large = b'{"price": 1.0, "size": 2}' * 40
+    for payload in (b'', b'small', COLLIDING, large):
+        framed = compression.compress("zipped", payload)
+        assert framed[:3] == MAGIC
+        assert compression.decompress("zipped", framed) == payload
+    assert len(compression.compress("zipped", large)) < len(large)
+
+
+def test_corrupt_frame_is_dropped(capsys):
+    compression = Compression()
+    compression.configure("zipped")
+    assert compression.decompress("zipped", COLLIDING) is None
+    assert "Decompress error" in capsys.readouterr().out
+    assert compression.stats()["zipped"]["errors"] == 1
+
+
+def receive(client, channel, count, **kwargs):
+    received = []
+    done = threading.Event()
+
+    def on_message(message):
+        received.append(message.data)
+        if len(received) == count:
+            done.set()
+
+    assert client.subscribe(channel, on_message, binary=True, **kwargs)
+    return received, done
+
+
+def test_magic_payload_delivered_unchanged(make_client):
+    publisher = make_client()
+    subscriber = make_client()
+    channel = f"test:compress:{uuid.uuid4().hex}"
+    # 订阅方为其他频道开启了压缩，不影响本频道
+    subscriber.set_compression("elsewhere", threshold=0)
+    received, done = receive(subscriber, channel, 1)
+    assert subscriber.subscribe(f"{channel}:queued", None)
+
+    assert publisher.publish(channel, COLLIDING) >= 1
+    assert publisher.publish(f"{channel}:queued", COLLIDING) >= 1
+    assert done.wait(5)
+    assert received == [COLLIDING]
+    assert [message.data for message in subscriber.poll(16, 5)] == [COLLIDING]
+
+
+def test_compressed_channel_round_trip(make_client):
+    publisher = make_client()
+    subscriber = make_client()
+    channel = f"test:compress:{uuid.uuid4().hex}"
+    large = b'{"price": 1.0, "size": 2}' * 40
+    for client in (publisher, subscriber):
+        assert client.set_compression(channel, threshold=64)
+    received, done = receive(subscriber, channel, 3)
+
+    for payload in (COLLIDING, b'small', large):
+        assert publisher.publish(channel, payload) >= 1
+    assert done.wait(5)
+    assert received == [COLLIDING, b'small', large]
+
+
+def test_native_filter_on_magic_payload(make_client):
+    publisher = make_client()
+    subscriber = make_client()
+    raw_channel = f"test:compress:{uuid.uuid4().hex}"
+    framed_channel = f"test:compress:{uuid.uuid4().hex}"
+    for client in (publisher, subscriber):
+        assert client.set_compression(framed_channel, threshold=1 << 20)
+
+    # 没有开启压缩的频道：以魔数开头的payload照常求值，被拒绝
+    raw, raw_done = receive(subscriber, raw_channel, 1, filters=[prefix(b"ok")])
+    # 开启了压缩的频道：跳过未压缩头部，对原始payload求值
+    framed, framed_done = receive(subscriber, framed_channel, 1, filters=[prefix(b"ok")])
+
+    publisher.publish(raw_channel, COLLIDING)
+    publisher.publish(raw_channel, b"ok raw")
+    publisher.publish(framed_channel, b"no")
+    publisher.publish(framed_channel, b"ok framed")
+    assert raw_done.wait(5) and framed_done.wait(5)
+    assert raw == [b"ok raw"]
+    assert framed == [b"ok framed"]
+    assert subscriber.filter_stats(raw_channel) == {'passed': 1, 'rejected': 1}
+    assert subscriber.filter_stats(framed_channel) == {'passed': 1, 'rejected': 1}
+
+
+def test_extension_magic_payload_delivered_unchanged(make_client, server):
+    redis_fast = pytest.importorskip("redis_fast")
+    if not redis_fast.HAVE_EXTENSION:
+        pytest.skip("_redis_pubsub extension is not built")
+    publisher = make_client()
+    channel = f"test:compress:{uuid.uuid4().hex}"
+    with redis_fast.RedisPubSubExt() as subscriber:
+        assert subscriber.connect(server.host, server.port)
+        received, done = receive(subscriber, channel, 1)
+        assert publisher.publish(channel, COLLIDING) >= 1
+        assert done.wait(5)
+    assert received == [COLLIDING]
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""合并投递：回调忙时积压的消息只保留最新的一条（原生层按频道，key_fn时由合并线程池按key）"""
+
+import threading
+import time
+import uuid
+
+from conftest import wait_until
+
+
+class SlowHandler:
+    """第一条消息阻塞到release()，之后的消息直接记录"""
+
+    def __init__(self):
+        self.received = []
+        self.entered = threading.Event()
+        self.released = threading.Event()
+
+    def __call__(self, message):
+        self.received.append(message.data)
+        self.entered.set()
+        self.released.wait(5)
+
+    def release(self):
+        self.released.set()
+
+
+def test_native_conflation_keeps_newest(make_client):
+    publisher = make_client()
+    subscriber = make_client()
+    channel = f"test:conflate:{uuid.uuid4().hex}"
+    handler = SlowHandler()
+    assert subscriber.subscribe(channel, handler, binary=True, conflate=True)
+
+    assert publisher.publish(channel, b"first") == 1
+    assert handler.entered.wait(5)
+    # 回调阻塞期间到达的100条消息在订阅连接上积压，回调返回后的一轮读取中合并为最新的一条
+    assert publisher.publish_many([(channel, f"m{i}".encode()) for i in range(100)]) == [1] * 100
+    time.sleep(0.1)
+    handler.release()
+
+    assert wait_until(lambda: subscriber.stats()['messages_in'] == 101)
+    assert wait_until(lambda: len(handler.received) == 2)
+    time.sleep(0.1)
+    assert handler.received == [b"first", b"m99"]
+    assert subscriber.conflation_stats() == {'native_conflated': 99}
+    assert subscriber.stats(channels=True)['channels'][channel]['conflated'] == 99
+
+
+def test_key_fn_conflation_keeps_newest_per_key(make_client):
+    publisher = make_client()
+    subscriber = make_client()
+    assert subscriber.enable_conflation(workers=1)
+    channel = f"test:conflate:{uuid.uuid4().hex}"
+    handler = SlowHandler()
+    assert subscriber.subscribe(channel, handler, binary=True, key_fn=lambda message: message.data[:1])
+
+    assert publisher.publish(channel, b"first") == 1
+    assert handler.entered.wait(5)
+    messages = [(channel, f"{key}{i}".encode()) for i in range(10) for key in "ab"]
+    assert publisher.publish_many(messages) == [1] * len(messages)
+    assert wait_until(lambda: subscriber.conflation_stats()['submitted'] == 21)
+    handler.release()
+
+    # 每个key只保留最新一条，按key第一次进入队列的顺序执行
+    assert wait_until(lambda: subscriber.conflation_stats()['processed'] == 3)
+    assert handler.received == [b"first", b"a9", b"b9"]
+    stats = subscriber.conflation_stats()
+    assert stats['conflated'] == 18 and stats['pending'] == 0 and stats['errors'] == 0
+    assert stats['native_conflated'] == 0
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""扩展模块客户端：发布的连接检查和压缩与RedisPubSubDLL一致"""
+
+import threading
+import time
+import uuid
+
+import pytest
+
+from conftest import wait_until
+from resp_server import LocalServer
+
+redis_fast = pytest.importorskip("redis_fast")
+pytestmark = pytest.mark.skipif(not redis_fast.HAVE_EXTENSION, reason="_redis_pubsub extension is not built")
+
+
+@pytest.fixture
+def make_ext(server):
+    clients = []
+
+    def make():
+        client = redis_fast.RedisPubSubExt()
+        clients.append(client)
+        assert client.connect(server.host, server.port)
+        return client
+
+    yield make
+    for client in clients:
+        if client.is_connected():
+            client.disconnect()
+
+
+def test_publish_requires_connection(capsys):
+    client = redis_fast.RedisPubSubExt()
+    assert client.publish("test:fast", b"x") == -1
+    assert client.publish_many([("test:fast", b"x"), ("test:fast", "y")]) == [-1, -1]
+    assert "Not connected" in capsys.readouterr().out
+
+
+def test_compressed_publish_round_trip(make_client, make_ext):
+    channel = f"test:fast:{uuid.uuid4().hex}"
+    large = b'{"price": 1.0, "size": 2}' * 40
+    publisher = make_ext()
+    subscriber = make_client()
+    ext_subscriber = make_ext()
+    for client in (publisher, subscriber, ext_subscriber):
+        assert client.set_compression(channel, threshold=64)
+
+    received = []
+    ext_received = []
+    lock = threading.Lock()
+
+    def on_message(message):
+        with lock:
+            received.append(message.data)
+
+    assert subscriber.subscribe(channel, on_message, binary=True)
+    assert ext_subscriber.subscribe(channel, lambda message: ext_received.append(message.data), binary=True)
+
+    assert publisher.publish(channel, large) == 2
+    assert publisher.publish_many([(channel, b"small"), (channel, "text")]) == [2, 2]
+    assert wait_until(lambda: len(received) == 3 and len(ext_received) == 3)
+    assert received == [large, b"small", b"text"]
+    assert ext_received == received
+    assert subscriber.stats()['compression'][channel]['decompressed'] == 1
+
+
+def test_unsubscribe_removes_callback(make_ext):
+    client = make_ext()
+    assert client.subscribe("test:fast:unsub", lambda message: None, binary=True)
+    assert client.unsubscribe("test:fast:unsub")
+    assert client.get_subscribed_channels() == []
+    assert not client.unsubscribe("test:fast:unsub")
+
+
+class FailingUnsubscribe:
+    """原生层删除订阅表中的记录后UNSUBSCRIBE发送失败"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def unsubscribe(self, name):
+        self._client.unsubscribe(name)
+        return -1
+
+
+def test_failed_unsubscribe_drops_callback(make_client, make_ext, capsys):
+    client = make_ext()
+    assert client.subscribe("test:fast:failed", lambda message: None, binary=True)
+    client._client = FailingUnsubscribe(client._client)
+    assert not client.unsubscribe("test:fast:failed")
+    assert "Unsubscribe failed" in capsys.readouterr().out
+    assert client.get_subscribed_channels() == []
+    assert client.subscribe("test:fast:failed", lambda message: None, binary=True)
+    assert client.get_subscribed_channels() == ["test:fast:failed"]
+
+    # RedisPubSubDLL在订阅连接断开、不重连时同样返回False并移除订阅
+    with LocalServer() as server:
+        dll = make_client(setup=lambda c: c.set_reconnect(initial_ms=0), target=server)
+        assert dll.subscribe("test:fast:failed", lambda message: None, binary=True)
+        server.stop()
+        time.sleep(0.2)     # 等待订阅连接发现断开
+        assert not dll.unsubscribe("test:fast:failed")
+        assert dll.get_subscribed_channels() == []
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""本地投递：发出的消息在发布线程中交给本实例的订阅，Redis回传的副本按指纹丢弃，发送失败的消息不投递"""
+
+import threading
+import time
+import uuid
+
+from conftest import wait_until
+from resp_server import LocalServer
+
+
+class Collector:
+    def __init__(self):
+        self.messages = []
+        self.threads = set()
+        self.lock = threading.Lock()
+
+    def __call__(self, message):
+        with self.lock:
+            self.messages.append(message.data)
+            self.threads.add(threading.get_ident())
+
+
+def test_local_delivery_suppresses_echo(make_client):
+    client = make_client()
+    assert client.set_local_delivery(True, suppress_echo=True)
+    channel = f"test:local:{uuid.uuid4().hex}"
+    collector = Collector()
+    assert client.subscribe(channel, collector, binary=True)
+
+    assert client.publish(channel, b"one") == 1
+    assert client.publish_many([(channel, b"two"), (channel, b"three")]) == [1, 1]
+    # 发布返回时本地订阅已在发布线程中收到消息
+    assert collector.messages == [b"one", b"two", b"three"]
+    assert collector.threads == {threading.get_ident()}
+
+    assert wait_until(lambda: client.local_stats()['echo_suppressed'] == 3)
+    time.sleep(0.1)
+    assert collector.messages == [b"one", b"two", b"three"]
+    stats = client.local_stats()
+    assert stats['delivered'] == 3 and stats['echo_expired'] == 0
+
+
+def test_local_delivery_without_suppression_delivers_twice(make_client):
+    client = make_client()
+    assert client.set_local_delivery(True, suppress_echo=False)
+    channel = f"test:local:{uuid.uuid4().hex}"
+    collector = Collector()
+    assert client.subscribe(channel, collector, binary=True)
+
+    assert client.publish(channel, b"both") == 1
+    assert wait_until(lambda: collector.messages == [b"both", b"both"])
+    assert client.local_stats()['echo_suppressed'] == 0
+
+
+def test_failed_publish_is_not_delivered_locally(make_client):
+    with LocalServer() as server:
+        client = make_client(setup=lambda c: c.set_reconnect(initial_ms=0), target=server)
+        assert client.set_local_delivery(True, suppress_echo=True)
+        channel = f"test:local:{uuid.uuid4().hex}"
+        collector = Collector()
+        assert client.subscribe(channel, collector, binary=True)
+        server.stop()
+
+        # 连接已断开且不重连：发布失败，本地订阅也收不到
+        assert client.publish(channel, b"lost") == -1
+        assert client.publish_many([(channel, b"lost"), (channel, b"lost")]) == [-1, -1]
+        # 进入异步发布队列的消息算作已发出，照常在本地投递
+        assert client.publish_nowait(channel, b"queued")
+        client.flush(1)
+        assert collector.messages == [b"queued"]
+        assert client.local_stats()['delivered'] == 1
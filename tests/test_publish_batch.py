@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""批量发布：无效条目单独记为失败，不影响同一连接上之后的发布"""
+
+import threading
+import uuid
+from ctypes import c_char_p, c_int, c_size_t
+
+from conftest import wait_until
+
+
+def publish_raw(client, entries):
+    """直接调用redis_client_publish_batch，entries中的None原样传给原生层"""
+    count = len(entries)
+    channels = (c_char_p * count)(*[channel for channel, _ in entries])
+    channel_lens = (c_size_t * count)(*[len(channel or b"") for channel, _ in entries])
+    messages = (c_char_p * count)(*[message for _, message in entries])
+    message_lens = (c_size_t * count)(*[len(message or b"") for _, message in entries])
+    results = (c_int * count)()
+    published = client._redis_publish_batch(client._handle, count, channels, channel_lens,
+                                             messages, message_lens, results)
+    return published, list(results)
+
+
+def test_invalid_entry_does_not_desync_connection(make_client):
+    publisher = make_client()
+    subscriber = make_client()
+    channel = f"test:batch:{uuid.uuid4().hex}"
+    received = []
+    lock = threading.Lock()
+
+    def on_message(message):
+        with lock:
+            received.append(message.data)
+
+    assert subscriber.subscribe(channel, on_message, binary=True)
+    name = channel.encode()
+    assert publish_raw(publisher, [(name, b"x"), (None, b"y"), (name, b"z")]) == (2, [1, -1, 1])
+    assert publish_raw(publisher, [(None, b"y")]) == (0, [-1])
+    assert wait_until(lambda: received == [b"x", b"z"])
+
+    # 同一发布连接上的后续命令读到的是自己的回复
+    for _ in range(4):
+        assert publisher.publish(f"test:batch:{uuid.uuid4().hex}", b"nobody") == 0
+        assert publisher.publish_many([(channel, b"again")]) == [1]
+    assert wait_until(lambda: len(received) == 6)
+    assert received[2:] == [b"again"] * 4
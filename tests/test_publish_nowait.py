@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""异步发布：publish_nowait()按调用顺序发送，flush()等待全部完成，完成回调收到订阅者数量"""
+
+import threading
+import uuid
+
+from conftest import wait_until
+
+
+def test_publish_nowait_flush_and_callbacks(make_client):
+    publisher = make_client()
+    subscriber = make_client()
+    channel = f"test:nowait:{uuid.uuid4().hex}"
+    received = []
+    completed = []
+    lock = threading.Lock()
+
+    def on_message(message):
+        with lock:
+            received.append(message.data)
+
+    def on_complete(subscribers):
+        with lock:
+            completed.append(subscribers)
+
+    assert subscriber.subscribe(channel, on_message, binary=True)
+    for i in range(200):
+        assert publisher.publish_nowait(channel, f"m{i}", on_complete if i % 2 else None)
+    future = publisher.publish_async(f"test:nowait:{uuid.uuid4().hex}", b"nobody")
+    assert publisher.flush(5)
+
+    # flush()返回时所有回调都已执行
+    assert completed == [1] * 100
+    assert future.result(0) == 0
+    stats = publisher.async_publish_stats()
+    assert stats['completed'] == 201 and stats['pending'] == 0 and stats['failed'] == 0
+    assert wait_until(lambda: len(received) == 200)
+    assert received == [f"m{i}".encode() for i in range(200)]
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""断线重连：重启服务器后自动重新订阅，断开期间的发布进入spool并在重连后补发"""
+
+import pytest
+
+from conftest import wait_until
+from resp_server import LocalServer
+
+
+@pytest.fixture
+def restartable():
+    """本测试独占的服务器，stop()后可以再次start()，端口不变"""
+    server = LocalServer().start()
+    yield server
+    server.stop()
+
+
+def fast_reconnect(client):
+    client.set_reconnect(initial_ms=20, max_ms=200)
+
+
+def test_spool_depth_reported_immediately(make_client, restartable):
+    publisher = make_client(setup=fast_reconnect, target=restartable)
+    assert publisher.publish("test:spool", "before") >= 0
+
+    restartable.stop()
+    results = [publisher.publish("test:spool", f"m{i}") for i in range(3)]
+    assert results == [publisher.PUBLISH_SPOOLED] * 3
+    # 异步发布连接还没有发现断开时，已返回PUBLISH_SPOOLED的消息也要计入
+    assert publisher.reconnect_stats()['spool_depth'] == 3
+
+    restartable.start()
+    subscriber = make_client(target=restartable)
+    received = []
+    assert subscriber.subscribe("test:spool", lambda channel, message: received.append(message))
+    assert wait_until(lambda: received == ["m0", "m1", "m2"])
+    assert publisher.reconnect_stats()['spool_depth'] == 0
+
+
+def test_spool_full_rejects(make_client, restartable):
+    publisher = make_client(setup=lambda client: client.set_reconnect(20, 200, spool_max=2), target=restartable)
+    restartable.stop()
+    results = [publisher.publish("test:spool", f"m{i}") for i in range(3)]
+    assert results == [publisher.PUBLISH_SPOOLED, publisher.PUBLISH_SPOOLED, -1]
+    stats = publisher.reconnect_stats()
+    assert stats['spool_depth'] == 2
+    assert stats['spool_dropped'] == 1
+
+
+def test_resubscribe_after_restart(make_client, restartable):
+    subscriber = make_client(setup=fast_reconnect, target=restartable)
+    channel_messages, pattern_messages = [], []
+    assert subscriber.subscribe("test:resub", lambda channel, message: channel_messages.append(message))
+    assert subscriber.psubscribe("test:presub.*", lambda channel, message: pattern_messages.append(channel))
+
+    restartable.stop()
+    assert wait_until(lambda: subscriber.reconnect_stats()['disconnected'] > 0)
+    restartable.start()
+
+    publisher = make_client(target=restartable)
+
+    # 重新订阅完成之前发布的消息没有接收者，重复发布直到收到
+    def delivered() -> bool:
+        publisher.publish("test:resub", "after")
+        publisher.publish("test:presub.x", "after")
+        return bool(channel_messages) and bool(pattern_messages)
+
+    assert wait_until(delivered)
+    assert set(channel_messages) == {"after"}
+    assert set(pattern_messages) == {"test:presub.x"}
+    assert subscriber.reconnect_stats()['reconnects'] >= 1
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""订阅分片：频道按名称分配到多个订阅连接，消息全部投递且保持每个频道内的顺序"""
+
+import threading
+
+import pytest
+
+from conftest import wait_until
+
+
+@pytest.mark.parametrize("shards", [1, 4])
+def test_sharded_subscriber_delivers_in_order(make_client, shards):
+    subscriber = make_client(setup=lambda client: client.set_subscriber_shards(shards))
+    publisher = make_client()
+
+    channels = [f"test:shards:{shards}:{i}" for i in range(32)]
+    received = {name: [] for name in channels}
+    lock = threading.Lock()
+
+    def on_message(message):
+        with lock:
+            received[message.channel].append(int(message.data))
+
+    for name in channels:
+        assert subscriber.subscribe(name, on_message, binary=True)
+
+    publisher.publish_many([(channels[i % len(channels)], str(i // len(channels))) for i in range(32 * 50)])
+    assert wait_until(lambda: sum(map(len, received.values())) == 32 * 50)
+    assert all(values == list(range(50)) for values in received.values())
+
+    stats = subscriber.shard_stats()
+    assert len(stats) == shards
+    assert sum(shard['channels'] for shard in stats) == len(channels)
+    assert sum(shard['messages'] for shard in stats) == 32 * 50
+    if shards > 1:
+        assert sum(1 for shard in stats if shard['messages'] > 0) > 1
+
+
+def test_queued_delivery_across_shards(make_client):
+    subscriber = make_client(setup=lambda client: client.set_subscriber_shards(4))
+    publisher = make_client()
+
+    channels = [f"test:shards:queued:{i}" for i in range(16)]
+    for name in channels:
+        assert subscriber.subscribe(name)
+
+    publisher.publish_many([(name, b"x") for name in channels] * 10)
+    messages = []
+
+    def drained() -> bool:
+        messages.extend(subscriber.poll(256, 0.05))
+        return len(messages) >= 160
+
+    assert wait_until(drained)
+    assert len(messages) == 160
+    assert sorted({message.channel for message in messages}) == sorted(channels)
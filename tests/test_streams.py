@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Streams：消费者组读取、自动确认和未确认条目的重读"""
+
+import threading
+import uuid
+
+from conftest import wait_until
+
+
+def test_consumer_acks_every_handled_entry(make_client):
+    publisher = make_client()
+    consumer_client = make_client()
+    stream = f"test:stream:{uuid.uuid4().hex}"
+    assert publisher.stream_create_group(stream, "g", "0")
+
+    results = publisher.stream_publish_many([(stream, f"entry-{i}") for i in range(500)])
+    assert all(isinstance(entry_id, str) and entry_id for entry_id in results)
+
+    received = []
+    done = threading.Event()
+
+    def on_entry(message):
+        received.append(message.text)
+        if len(received) == 500:
+            done.set()
+
+    consumer = consumer_client.stream_consume(stream, "g", on_entry, consumer="c1", count=100, block_ms=50)
+    assert consumer is not None
+    assert done.wait(10)
+    assert received == [f"entry-{i}" for i in range(500)]
+    assert wait_until(lambda: consumer.stats()['acked'] == 500)
+    consumer.stop()
+
+    # 全部确认后，以同一名称重启的消费者没有需要重读的条目
+    again = []
+    consumer = consumer_client.stream_consume(stream, "g", again.append, consumer="c1", block_ms=50)
+    assert consumer is not None
+    assert wait_until(lambda: consumer.stats()['reads'] >= 2)
+    consumer.stop()
+    assert again == []
+
+
+def test_failed_entries_stay_pending(make_client):
+    publisher = make_client()
+    consumer_client = make_client()
+    stream = f"test:stream:{uuid.uuid4().hex}"
+    assert publisher.stream_create_group(stream, "g", "0")
+    publisher.stream_publish_many([(stream, f"entry-{i}") for i in range(10)])
+
+    def on_entry(message):
+        if message.text in ("entry-3", "entry-7"):
+            raise ValueError("rejected")
+
+    consumer = consumer_client.stream_consume(stream, "g", on_entry, consumer="c1", block_ms=50)
+    assert wait_until(lambda: consumer.stats()['handled'] + consumer.stats()['errors'] == 10)
+    assert wait_until(lambda: consumer.stats()['acked'] == 8)
+    consumer.stop()
+
+    # 处理失败的条目没有确认，以同一名称重启时重读
+    retried = []
+    consumer = consumer_client.stream_consume(stream, "g", lambda m: retried.append(m.text),
+                                              consumer="c1", block_ms=50)
+    assert wait_until(lambda: len(retried) == 2)
+    consumer.stop()
+    assert retried == ["entry-3", "entry-7"]
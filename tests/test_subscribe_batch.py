@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""批量订阅：攒够max_batch条或等待max_delay_ms后投递一批，dtype订阅丢弃长度不符的记录"""
+
+import threading
+import uuid
+
+import pytest
+
+from conftest import wait_until
+
+
+class Batches:
+    def __init__(self):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def __call__(self, batch):
+        with self.lock:
+            self.batches.append(batch)
+
+    def total(self):
+        with self.lock:
+            return sum(len(batch) for batch in self.batches)
+
+
+def test_batches_flush_on_size_and_delay(make_client):
+    publisher = make_client()
+    subscriber = make_client()
+    channel = f"test:batch:{uuid.uuid4().hex}"
+    batches = Batches()
+    assert subscriber.subscribe_batch(channel, batches, max_batch=50, max_delay_ms=50)
+
+    assert publisher.publish_many([(channel, f"m{i}") for i in range(120)]) == [1] * 120
+    # 两批攒够50条立即投递，剩下的20条在第一条到达50毫秒后投递
+    assert wait_until(lambda: batches.total() == 120)
+    assert [len(batch) for batch in batches.batches] == [50, 50, 20]
+    messages = [message for batch in batches.batches for message in batch]
+    assert [message.channel for message in messages] == [channel] * 120
+    assert [message.data for message in messages] == [f"m{i}".encode() for i in range(120)]
+
+
+def test_dtype_batches_drop_wrong_size_records(make_client):
+    np = pytest.importorskip("numpy")
+    publisher = make_client()
+    subscriber = make_client()
+    channel = f"test:batch:{uuid.uuid4().hex}"
+    dtype = np.dtype([('sensor', '<u4'), ('value', '<f8')])
+    batches = Batches()
+    assert subscriber.subscribe_batch(channel, batches, max_batch=50, max_delay_ms=50, dtype=dtype)
+
+    records = np.zeros(120, dtype=dtype)
+    records['sensor'] = np.arange(120)
+    records['value'] = np.arange(120) * 0.5
+    messages = [(channel, record.tobytes()) for record in records]
+    messages.insert(60, (channel, b"short"))
+    filtered = subscriber.stats()['filtered']
+    assert publisher.publish_many(messages) == [1] * 121
+
+    assert wait_until(lambda: batches.total() == 120)
+    assert [len(batch) for batch in batches.batches] == [50, 50, 20]
+    assert all(batch.dtype == dtype and batch.flags.writeable for batch in batches.batches)
+    assert np.array_equal(np.concatenate(batches.batches), records)
+    assert subscriber.stats()['filtered'] == filtered + 1
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""订阅选项：过滤条件和合并投递在SUBSCRIBE之前装上，订阅失败时编解码器注册随订阅回滚"""
+
+import threading
+import time
+import uuid
+
+from conftest import wait_until
+from redis_filter import prefix
+from resp_server import LocalServer
+
+
+def test_filter_applies_from_first_message(make_client):
+    publisher = make_client()
+    subscriber = make_client()
+    channels = [f"test:options:{uuid.uuid4().hex}" for _ in range(20)]
+    stop = threading.Event()
+
+    # 订阅期间持续发布会被拒绝的消息：SUBSCRIBE确认后立即到达的消息也必须经过过滤
+    def flood():
+        while not stop.is_set():
+            publisher.publish_many([(channel, b"drop") for channel in channels])
+
+    thread = threading.Thread(target=flood)
+    thread.start()
+    received = []
+    try:
+        for channel in channels[:10]:
+            assert subscriber.subscribe(channel, lambda message: received.append(message.data),
+                                        binary=True, filters=[prefix(b"keep")])
+        assert subscriber.subscribe_many(channels[10:], lambda message: received.append(message.data),
+                                         binary=True, filters=[prefix(b"keep")])
+        assert wait_until(lambda: all(subscriber.filter_stats(channel).get('rejected') for channel in channels))
+    finally:
+        stop.set()
+        thread.join()
+
+    assert received == []
+    publisher.publish(channels[0], b"keep")
+    assert wait_until(lambda: received == [b"keep"])
+
+
+def test_failed_subscribe_many_rolls_back_codecs(make_client):
+    with LocalServer() as server:
+        client = make_client(setup=lambda c: c.set_reconnect(initial_ms=0), target=server)
+        assert client.subscribe("test:options:kept", lambda message: None, codec="text")
+        server.stop()
+        time.sleep(0.2)     # 等待订阅连接发现断开
+
+        # 订阅连接已断开且不重连：本次新增的订阅和它们的编解码器全部撤销
+        assert not client.subscribe_many(["test:options:a", "test:options:b"], lambda message: None, codec="json")
+        assert not client.subscribe("test:options:c", lambda message: None, codec="json")
+        assert client.get_subscribed_channels() == ["test:options:kept"]
+        assert set(client._codecs) == {"test:options:kept"}